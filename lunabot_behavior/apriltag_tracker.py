@@ -0,0 +1,324 @@
+import rospy
+from apriltag_ros.msg import AprilTagDetection, AprilTagDetectionArray
+from geometry_msgs.msg import PoseStamped
+import tf2_geometry_msgs
+from tf.transformations import euler_from_matrix, quaternion_from_matrix, quaternion_matrix
+
+import math
+import os
+import threading
+
+import numpy as np
+import yaml
+
+import transforms
+
+'''
+Tracks the apriltags in the odom frame, for every module that needs them (finding the start tag, homing on the berm).
+Every detection of a known bundle (lunabot_config/config/apriltags/tags.yaml) is converted to the pose of the bundle,
+and filtered over time, so a module asking for a tag gets a smoothed pose and how sure it is, instead of the latest
+(noisy, maybe missing) detection of the first tag in the message.
+'''
+
+DEFAULT_TAGS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lunabot_config", "config", "apriltags", "tags.yaml")
+
+
+def pose_to_matrix(pose) -> np.ndarray:
+    matrix = quaternion_matrix([pose.orientation.x, pose.orientation.y, pose.orientation.z, pose.orientation.w])
+    matrix[:3, 3] = [pose.position.x, pose.position.y, pose.position.z]
+    return matrix
+
+def matrix_to_pose(matrix: np.ndarray, pose):
+    pose.position.x, pose.position.y, pose.position.z = matrix[:3, 3]
+    pose.orientation.x, pose.orientation.y, pose.orientation.z, pose.orientation.w = quaternion_from_matrix(matrix)
+    return pose
+
+def wrap_angle(angle: float) -> float:
+    return (angle + np.pi) % (2 * np.pi) - np.pi
+
+
+def load_targets(path: str) -> dict:
+    """
+    What can be tracked, from the apriltag_ros tags file: each bundle by name, and each standalone tag that isn't in
+    a bundle by id. Maps the target to {tag id: transform from the tag to the target's origin}.
+    """
+
+    with open(path) as tags_file:
+        config = yaml.safe_load(tags_file)
+
+    targets = {}
+    for bundle in config.get("tag_bundles") or []:
+        tags = {}
+        for tag in bundle["layout"]:
+            # Unmeasured rotations are written as a zero quaternion, quaternion_matrix makes them the identity
+            layout = quaternion_matrix([tag.get("qx", 0), tag.get("qy", 0), tag.get("qz", 0), tag.get("qw", 1)])
+            layout[:3, 3] = [tag.get("x", 0), tag.get("y", 0), tag.get("z", 0)]
+            tags[tag["id"]] = np.linalg.inv(layout)
+        targets[bundle["name"]] = tags
+
+    in_bundles = {tag_id for tags in targets.values() for tag_id in tags}
+    for tag in config.get("standalone_tags") or []:
+        if tag["id"] not in in_bundles:
+            targets[tag["id"]] = {tag["id"]: np.identity(4)}
+
+    return targets
+
+
+class PoseFilter:
+    '''
+    Kalman filter of a target's (x, y, yaw) in odom. Tags don't move, so predicting only grows the covariance (by
+    PROCESS_NOISE per second, odometry drifting under them), and each detection measures the state directly.
+    Detections further than GATE (squared Mahalanobis distance) from the estimate are outliers and dropped, unless
+    the estimate is older than STALE_TIME or MAX_REJECTED were dropped in a row: then it restarts from the detection.
+    '''
+
+    PROCESS_NOISE = np.diag([0.0004, 0.0004, 0.0001])  # per second
+    GATE = 11.34  # chi-squared, 3 degrees of freedom, 99%
+    STALE_TIME = 2.0  # seconds
+    MAX_REJECTED = 5
+
+    def __init__(self):
+        self.state: np.ndarray = None
+        self.covariance: np.ndarray = None
+        self.stamp: float = None
+        self.rejected = 0
+
+    def predict(self, stamp: float):
+        dt = max(stamp - self.stamp, 0.0)
+        self.covariance = self.covariance + self.PROCESS_NOISE * dt
+        self.stamp = max(stamp, self.stamp)
+
+    def update(self, measurement: np.ndarray, noise: np.ndarray, stamp: float) -> bool:
+        """
+        Returns False if the measurement was dropped as an outlier
+        """
+
+        if self.state is None or stamp - self.stamp > self.STALE_TIME:
+            self.reset(measurement, noise, stamp)
+            return True
+
+        self.predict(stamp)
+
+        innovation = measurement - self.state
+        innovation[2] = wrap_angle(innovation[2])
+        innovation_covariance = self.covariance + noise
+
+        if innovation @ np.linalg.solve(innovation_covariance, innovation) > self.GATE:
+            self.rejected += 1
+            if self.rejected >= self.MAX_REJECTED:
+                self.reset(measurement, noise, stamp)
+                return True
+            return False
+
+        gain = self.covariance @ np.linalg.inv(innovation_covariance)
+        self.state = self.state + gain @ innovation
+        self.state[2] = wrap_angle(self.state[2])
+        self.covariance = (np.identity(3) - gain) @ self.covariance
+        self.rejected = 0
+        return True
+
+    def reset(self, measurement: np.ndarray, noise: np.ndarray, stamp: float):
+        self.state = measurement.copy()
+        self.covariance = noise.copy()
+        self.stamp = stamp
+        self.rejected = 0
+
+
+class TagEstimate:
+    '''
+    Filtered pose of a target in odom: (x, y, yaw) with its covariance, and as a PoseStamped (height and tilt from the
+    latest detection) for the modules that used the detection's pose. yaw is the yaw of the tag frame, like
+    euler_from_quaternion of the detection transformed to odom, so the modules' conventions don't change.
+    '''
+
+    def __init__(self, target, state: np.ndarray, covariance: np.ndarray, pose: PoseStamped, stamp: float, detections: int, camera_frame: str):
+        self.target = target
+        self.x, self.y, self.yaw = state
+        self.covariance = covariance
+        self.pose = pose
+        self.stamp = stamp
+        self.detections = detections  # fused so far
+        self.camera_frame = camera_frame  # of the latest detection
+
+    def age(self) -> float:
+        """
+        Seconds since the target was last seen
+        """
+
+        return rospy.get_time() - self.stamp
+
+
+class AprilTagTracker:
+    '''
+    Subscribes to the detections of the cameras it's asked to watch, and keeps a PoseFilter per target. Each
+    detection is transformed to odom at the time it was taken (the shared tf buffer), so the estimate stays put while
+    the robot moves. When a message has a whole bundle detection, the single tag detections of that bundle in it are
+    skipped (apriltag_ros publishes both, from the same corners).
+
+    Measurement noise grows with the distance to the camera: POSITION_NOISE + POSITION_NOISE_PER_M2 * range^2 meters,
+    YAW_NOISE + YAW_NOISE_PER_M * range radians (standard deviations).
+
+    The estimate of each target is built once per update, get_estimate() only returns it. Listeners are called with
+    (target, estimate) after each update, from the subscriber's thread.
+    '''
+
+    POSITION_NOISE = 0.02  # TODO find values
+    POSITION_NOISE_PER_M2 = 0.01
+    YAW_NOISE = 0.03
+    YAW_NOISE_PER_M = 0.02
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.targets: dict = None
+        self.tag_targets = {}  # tag id -> target
+        self.topics = set()
+        self.filters = {}
+        self.estimates = {}
+        self.latest_detection = {}  # target -> transform of the latest detection in odom
+        self.camera_frames = {}
+        self.counts = {}
+        self.listeners = []
+
+    def load(self):
+        with self.lock:
+            if self.targets is not None:
+                return
+
+            self.targets = load_targets(rospy.get_param("/behavior/apriltag_tags_file", DEFAULT_TAGS_FILE))
+            for target, tags in self.targets.items():
+                for tag_id in tags:
+                    self.tag_targets[tag_id] = target
+
+    def watch(self, topic: str):
+        """
+        Track the detections published on topic (once per topic, however many modules ask)
+        """
+
+        self.load()
+        transforms.start()
+
+        with self.lock:
+            if topic in self.topics:
+                return
+            self.topics.add(topic)
+
+        rospy.Subscriber(topic, AprilTagDetectionArray, self.detections_callback)
+
+    def add_listener(self, callback):
+        with self.lock:
+            self.listeners.append(callback)
+
+    def target_of(self, detection: AprilTagDetection) -> tuple:
+        """
+        (target, transform from the detected tag(s) to the target's origin), (None, None) for unknown tags
+        """
+
+        ids = set(detection.id)
+        if len(ids) > 1:
+            for target, tags in self.targets.items():
+                if set(tags) == ids:
+                    return target, np.identity(4)  # apriltag_ros already gives the bundle's origin
+            return None, None
+
+        tag_id = detection.id[0]
+        target = self.tag_targets.get(tag_id)
+        if target is None:
+            return None, None
+        return target, self.targets[target][tag_id]
+
+    def detections_callback(self, msg: AprilTagDetectionArray):
+        detections = []
+        for detection in msg.detections:
+            if len(detection.id) == 0:
+                continue
+            target, to_origin = self.target_of(detection)
+            if target is not None:
+                detections.append((target, len(detection.id) > 1, detection, to_origin))
+
+        bundles = {target for target, whole, _, _ in detections if whole}
+
+        updated = []
+        for target, whole, detection, to_origin in detections:
+            if target in bundles and not whole:
+                continue
+
+            in_camera = pose_to_matrix(detection.pose.pose.pose) @ to_origin
+
+            pose = tf2_geometry_msgs.PoseStamped()
+            pose.header = detection.pose.header if detection.pose.header.frame_id else msg.header
+            matrix_to_pose(in_camera, pose.pose)
+
+            pose_in_odom = transforms.transform_pose(pose, "odom")
+            if pose_in_odom is None:
+                continue
+
+            in_odom = pose_to_matrix(pose_in_odom.pose)
+            roll, pitch, yaw = euler_from_matrix(in_odom)
+            distance = np.linalg.norm(in_camera[:3, 3])
+
+            position_noise = self.POSITION_NOISE + self.POSITION_NOISE_PER_M2 * distance ** 2
+            yaw_noise = self.YAW_NOISE + self.YAW_NOISE_PER_M * distance
+            noise = np.diag([position_noise ** 2, position_noise ** 2, yaw_noise ** 2])
+
+            stamp = pose.header.stamp.to_sec() if not pose.header.stamp.is_zero() else rospy.get_time()
+
+            with self.lock:
+                pose_filter = self.filters.setdefault(target, PoseFilter())
+                if pose_filter.update(np.array([in_odom[0, 3], in_odom[1, 3], yaw]), noise, stamp):
+                    self.latest_detection[target] = in_odom
+                    self.camera_frames[target] = pose.header.frame_id
+                    self.counts[target] = self.counts.get(target, 0) + 1
+                    updated.append(target)
+
+        for target in dict.fromkeys(updated):
+            estimate = self.build_estimate(target)
+            with self.lock:
+                self.estimates[target] = estimate
+                listeners = list(self.listeners)
+
+            for listener in listeners:
+                listener(target, estimate)
+
+    def build_estimate(self, target) -> TagEstimate:
+        with self.lock:
+            pose_filter = self.filters[target]
+            state, covariance, stamp = pose_filter.state.copy(), pose_filter.covariance.copy(), pose_filter.stamp
+            detected = self.latest_detection[target]
+            count = self.counts[target]
+            camera_frame = self.camera_frames[target]
+
+        # The latest detection, turned about z to the filtered yaw and moved to the filtered position
+        turn = wrap_angle(state[2] - euler_from_matrix(detected)[2])
+        rotation = np.identity(4)
+        rotation[:2, :2] = [[math.cos(turn), -math.sin(turn)], [math.sin(turn), math.cos(turn)]]
+        in_odom = rotation @ detected
+        in_odom[:3, 3] = [state[0], state[1], detected[2, 3]]
+
+        pose = PoseStamped()
+        pose.header.frame_id = "odom"
+        pose.header.stamp = rospy.Time.from_sec(stamp)
+        matrix_to_pose(in_odom, pose.pose)
+
+        return TagEstimate(target, state, covariance, pose, stamp, count, camera_frame)
+
+    def get_estimate(self, target, max_age: float = None) -> TagEstimate:
+        with self.lock:
+            estimate = self.estimates.get(target)
+
+        if estimate is None or (max_age is not None and estimate.age() > max_age):
+            return None
+        return estimate
+
+
+tracker = AprilTagTracker()
+
+def watch(topic: str):
+    # This is done so, in every other module, you can call apriltag_tracker.get_estimate()
+    # and the detections are only filtered once
+    tracker.watch(topic)
+
+def add_listener(callback):
+    tracker.add_listener(callback)
+
+def get_estimate(target, max_age: float = None) -> TagEstimate:
+    return tracker.get_estimate(target, max_age)
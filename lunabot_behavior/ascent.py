@@ -1,19 +1,18 @@
 import rospy
 
-from lunabot_msgs.msg import RobotSensors
 from std_msgs.msg import Int8
 
-import time
+import clock
+import filters
 import interrupts
+import sensor_cache
+from runtime import runtime
 
 class Ascent:
 	'''
 	This is a transition state used to raise the linear actuators to the maximum height.
 	'''
 
-	def sensors_callback(self, msg: RobotSensors):
-		self.robot_sensors = msg
-	
 	def __init__(self, lin_act_publisher: rospy.Publisher = None):
 		"""
 		If passed a publisher, then it is assumed a node is already running, and the publisher is shared.
@@ -26,15 +25,13 @@ class Ascent:
 		else:
 			self.lin_act_publisher = lin_act_publisher
 
-		self.robot_sensors = RobotSensors()
-
-		rospy.Subscriber("/sensors", RobotSensors, self.sensors_callback)
-
-		self.rate = rospy.Rate(10)  # 10hz
-
-		self.ACTUATOR_CURRENT_THRESHOLD = 0.01 #TODO adjust as needed
+		# End of travel: the (filtered) current rose above the moving current, then stayed under the threshold
+		self.ACTUATOR_MOVING_CURRENT = 0.5 # Amps; TODO adjust as needed
+		self.ACTUATOR_CURRENT_THRESHOLD = 0.1 # Amps; TODO adjust as needed
+		self.END_OF_TRAVEL_TIME = 0.5 # seconds the current has to stay under the threshold
+		self.CURRENT_TIME_CONSTANT = 0.2 # seconds, of the current filter
 
-		self.RAISING_TIME = 30
+		self.RAISING_TIME = 30 # upper bound, if the end of travel isn't detected
 
 		self.LIN_ACT_POWER = 110
 
@@ -42,38 +39,56 @@ class Ascent:
 
 	def raise_linear_actuators(self):
 		"""
-		Raise linear actuators to the max. height by turning them on until the current received is 0.
+		Blocking version of raise_linear_actuators_async
+		"""
+
+		return runtime.run(self.raise_linear_actuators_async())
+
+	async def raise_linear_actuators_async(self):
+		"""
+		Raise linear actuators to the max. height by turning them on until the current received drops to 0
+		(end of travel), or for RAISING_TIME at most.
+		Runs as a task on the behavior runtime, so it can overlap with other modules.
 		"""
 
 		# don't run if in sim
 		if (self.is_sim):
 			rospy.loginfo("Ascent: would raise actuators")
-			time.sleep(2)
+			await clock.sleep(2)
 			return True
 
-		time.sleep(0.1)
+		await clock.sleep(0.1)
 
 		lin_act_msg = Int8()
 		lin_act_msg.data = self.LIN_ACT_POWER
 
 		start_time = rospy.get_time()
 
-		while (rospy.get_time() - start_time < self.RAISING_TIME):
-			self.lin_act_publisher.publish(lin_act_msg)
+		end_of_travel = filters.EndOfTravelDetector(self.ACTUATOR_MOVING_CURRENT, self.ACTUATOR_CURRENT_THRESHOLD, self.END_OF_TRAVEL_TIME, self.CURRENT_TIME_CONSTANT)
+		seq = sensor_cache.get_snapshot().seq
+
+		# The effort factory keeps sending the last command, so only wake up on new sensor values or interrupts
+		self.lin_act_publisher.publish(lin_act_msg)
 
-			#TODO check for new sensor message / values
-			if (self.robot_sensors.act_right_curr - 0) < self.ACTUATOR_CURRENT_THRESHOLD:
-				# If the current is within EPSILON of 0, then end
-				#break
-				pass
+		try:
+			while (rospy.get_time() - start_time < self.RAISING_TIME):
 
-			if (interrupts.check_for_interrupts() != interrupts.Errors.FINE):
-				return False
+				if (interrupts.check_for_interrupts() != interrupts.Errors.FINE):
+					return False
 
-			self.rate.sleep()
+				remaining = self.RAISING_TIME - (rospy.get_time() - start_time)
+				snapshot = await sensor_cache.next_sample(seq, timeout=max(remaining, 0))
 
-		lin_act_msg.data = 0
-		self.lin_act_publisher.publish(lin_act_msg)
+				# Only filter new sensor messages
+				if snapshot.seq != seq:
+					seq = snapshot.seq
+					if end_of_travel.update(snapshot.msg.act_right_curr, snapshot.stamp):
+						rospy.loginfo("Ascent: end of travel after %.1f s", rospy.get_time() - start_time)
+						break
+		finally:
+			# Also stops the actuators if the task is cancelled
+			lin_act_msg.data = 0
+			self.lin_act_publisher.publish(lin_act_msg)
 		
 		return True
 	
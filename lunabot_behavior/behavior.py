@@ -7,11 +7,14 @@ import numpy as np
 
 from tf.transformations import euler_from_quaternion, quaternion_from_euler
 from geometry_msgs.msg import Twist, PoseStamped
-from nav_msgs.msg import Path, Odometry
-from apriltag_ros.msg import AprilTagDetectionArray, AprilTagDetection
-from lunabot_msgs.msg import RobotEffort, RobotSensors, RobotErrors, Behavior
+from nav_msgs.msg import Path, Odometry, OccupancyGrid
+from lunabot_msgs.msg import RobotEffort, RobotErrors, Behavior
 from std_msgs.msg import Bool, Int8
 
+from lunabot_nav.cost_field import CostField
+from lunabot_nav.global_planner import Map
+
+import apriltag_tracker
 import ascent
 import find_apriltag
 import zones
@@ -20,6 +23,10 @@ import homing_controller
 import deposition
 import interrupts
 import escape
+import profiler
+import scheduler
+from events import Events, bus
+from runtime import runtime
 
 class States(Enum):
     ASCENT_INIT = auto()
@@ -38,25 +45,49 @@ class Behavior:
     Consists of a variety of states, most of which are imported python modules. Publishes robot effort and cmd_vel,
     along with the various submodules (which share publishers when possible). For autonomous driving, the class
     publishes a boolean state that enables or disables MPC.
+
+    The state machine is event driven: each state is a handler returning the next state, and handlers block on the
+    shared event bus (events.bus), which the odometry/error/apriltag callbacks post to, instead of polling.
     '''
 
-    def robot_state_callback(self, msg: RobotSensors):
-        self.robot_state = msg
+    COST_FIELD_PERIOD = 2.0 # seconds between cost-to-go field rebuilds on map updates
 
     def errors_callback(self, msg: RobotErrors):
         self.robot_errors = msg
 
     def odom_callback(self, msg: Odometry):
         self.robot_odom = msg
+        bus.notify(Events.ODOM)
+
+        # Trigger the transition out of traversal as soon as odometry shows the goal is reached
+        goal = self.active_goal
+        if goal is not None and self.is_close_to_goal(goal):
+            self.active_goal = None
+            bus.post(Events.GOAL_REACHED, goal)
+
+    def map_callback(self, msg: OccupancyGrid):
+        self.map_msg = msg
+
+        # Keep the cost-to-go field of the goal being driven to up to date, at most every COST_FIELD_PERIOD
+        goal = self.active_goal
+        now = rospy.get_time()
+        if goal is not None and now - self.cost_field_time >= self.COST_FIELD_PERIOD:
+            self.update_cost_field(goal, msg)
+            self.cost_field_time = now
 
     def __init__(self):
 
         rospy.init_node('behavior_node')
 
-        self.robot_state: RobotSensors = RobotSensors()
         self.robot_errors: RobotErrors = RobotErrors()
         self.robot_odom: Odometry = Odometry()
 
+        # (goal, cost-to-go field to it), built when traversal starts and rebuilt by the map callback, so the
+        # odometry callback only looks it up
+        self.map_msg: OccupancyGrid = None
+        self.cost_field: 'tuple[PoseStamped, CostField]' = None
+        self.cost_field_time = 0.0
+
         self.lin_act_publisher = rospy.Publisher("/lin_act", Int8, queue_size=1, latch=True)
         self.left_drive_publisher = rospy.Publisher("/left_drive", Int8, queue_size=1, latch=True)
         self.right_drive_publisher = rospy.Publisher("/right_drive", Int8, queue_size=1, latch=True)
@@ -70,57 +101,262 @@ class Behavior:
 
         self.current_state = States.ASCENT_INIT
 
-        self.start_apriltag: AprilTagDetection = AprilTagDetection()
+        self.start_apriltag: apriltag_tracker.TagEstimate = None
 
         self.mining_zone = None
         self.berm_zone = None
 
-        self.rate = rospy.Rate(1) #hz
+        # Goal the odometry callback is watching for, only set during traversal
+        self.active_goal: PoseStamped = None
+
+        # Raising the actuators after mining runs on the behavior runtime while driving to the berm
+        self.ascent_task = None
+
+        self.state_handlers = {
+            States.TRAVERSAL_MINE: self.traversal_mine,
+            States.PLUNGE: self.plunge,
+            States.TRENCH: self.trench,
+            States.ASCENT_MINING: self.ascent_mining,
+            States.TRAVERSAL_BERM: self.traversal_berm,
+            States.ALIGN: self.align,
+            States.DEPOSIT: self.deposit,
+        }
 
         self.is_sim = rospy.get_param("/is_sim")
 
         odom_topic = rospy.get_param("/odom_topic")
+        map_topic = rospy.get_param("/nav/map_topic")
+        self.occupancy_threshold = rospy.get_param("/nav/occ_threshold")
 
         # TODO change to parameters, determine which are needed
-        rospy.Subscriber("/sensors", RobotSensors, self.robot_state_callback)
         rospy.Subscriber("/errors", RobotErrors, self.errors_callback)
         rospy.Subscriber(odom_topic, Odometry, self.odom_callback)
+        rospy.Subscriber(map_topic, OccupancyGrid, self.map_callback)
 
 
-    def is_close_to_goal(self, goal: PoseStamped) -> bool:
+    def update_cost_field(self, goal: PoseStamped, map_msg: OccupancyGrid):
         """
-        Checks if the robot is close to a given goal
+        Builds the cost-to-go field to a goal on a costmap (a distance transform and a wavefront over the
+        whole map), kept for distance_to_goal. Nothing without a map.
         """
 
-        THRESHOLD = 0.6 # meters
+        if map_msg is None:
+            return
+
+        costmap = Map(self.occupancy_threshold)
+        costmap.from_msg(map_msg)
+        self.cost_field = (goal, CostField(costmap, np.array([goal.pose.position.x, goal.pose.position.y])))
+
+
+    def distance_to_goal(self, goal: PoseStamped) -> float:
+        """
+        Distance the robot has to drive to a given goal, along the costmap when a cost-to-go field to it
+        has been built (a lookup, cheap enough for the odometry callback). Falls back to straight-line
+        distance otherwise, or if the goal is unreachable.
+        """
 
         x = self.robot_odom.pose.pose.position.x
         y = self.robot_odom.pose.pose.position.y
 
-        goal_x = goal.pose.position.x
-        goal_y = goal.pose.position.y
+        distance = math.sqrt((x - goal.pose.position.x)**2 + (y - goal.pose.position.y)**2)
+
+        cost_field = self.cost_field
+        if cost_field is None or cost_field[0] is not goal:
+            return distance
+
+        path_distance = cost_field[1].cost_to_go(np.array([x, y]))
+        if math.isinf(path_distance):
+            return distance
+
+        return path_distance
+
+
+    def is_close_to_goal(self, goal: PoseStamped) -> bool:
+        """
+        Checks if the robot is close to a given goal
+        """
+
+        THRESHOLD = 0.6 # meters
 
-        distance = math.sqrt((x - goal_x)**2 + (y - goal_y)**2)
+        distance = self.distance_to_goal(goal)
 
         rospy.logdebug("Behavior: Distance to goal: " + str(distance))
 
         return distance < THRESHOLD
 
 
+    def goal_from_pose(self, pose: np.ndarray) -> PoseStamped:
+        """
+        Goal (in odom) from an (x, y, yaw) pose
+        """
+
+        goal = PoseStamped()
+        goal.header.stamp = rospy.Time.now()
+        goal.header.frame_id = "odom"
+
+        goal.pose.position.x = float(pose[0])
+        goal.pose.position.y = float(pose[1])
+        goal.pose.position.z = 0
+
+        quaternion = quaternion_from_euler(0, 0, float(pose[2]))
+        goal.pose.orientation.x = quaternion[0]
+        goal.pose.orientation.y = quaternion[1]
+        goal.pose.orientation.z = quaternion[2]
+        goal.pose.orientation.w = quaternion[3]
+
+        return goal
+
+    def next_mining_goal(self) -> PoseStamped:
+        """
+        Goal at the next dig site the scheduler picks from where the robot is
+        """
+
+        position = (self.robot_odom.pose.pose.position.x, self.robot_odom.pose.pose.position.y)
+        dig_site = self.dig_site_scheduler.next_dig_site(position, self.map_msg)
+
+        if dig_site is None:
+            rospy.logwarn("Behavior: mining zone dug out, going back to the middle")
+            self.fallback_mining_goal.header.stamp = rospy.Time.now()
+            return self.fallback_mining_goal
+
+        return self.goal_from_pose(dig_site)
+
+    def next_berm_goal(self) -> PoseStamped:
+        """
+        Records what was just dug, and returns a goal in front of the next dump spot
+        """
+
+        self.dig_site_scheduler.record_dig(self.excavation_module.excavation_controller.volume, self.excavation_module.trench_distance)
+
+        position = (self.mining_goal.pose.position.x, self.mining_goal.pose.position.y)
+        return self.goal_from_pose(self.dig_site_scheduler.next_dump_site(position, self.map_msg))
+
+    def traverse(self, goal: PoseStamped) -> bool:
+        """
+        Enables traversal and blocks until the odometry callback reports the goal is reached.
+        Returns False if interrupted first.
+        """
+
+        rospy.loginfo("State: Traversal")
+
+        bus.clear()
+        self.update_cost_field(goal, self.map_msg)
+        self.cost_field_time = rospy.get_time()
+        self.active_goal = goal
+
+        traversal_message = Bool()
+        traversal_message.data = True
+        self.traversal_publisher.publish(traversal_message)
+
+        # An interrupt posted before the clear() is gone from the queue, but shows up here
+        if interrupts.check_for_interrupts() != interrupts.Errors.FINE:
+            event = Events.INTERRUPT
+        else:
+            event, _ = bus.get(Events.GOAL_REACHED, Events.INTERRUPT)
+
+        self.active_goal = None
+        traversal_message.data = False
+        self.traversal_publisher.publish(traversal_message)
+
+        return event == Events.GOAL_REACHED
+
+    # State handlers: each runs one state and returns the next one, or None if interrupted
+
+    def traversal_mine(self):
+        # Drive to the mining area
+        if not self.traverse(self.mining_goal):
+            return None
+        return States.PLUNGE
+
+    def plunge(self):
+        # Lower linear actuators and begin spinning excavation
+        rospy.loginfo("State: Plunging")
+        if self.excavation_module.plunge() == False:
+            return None
+        return States.TRENCH
+
+    def trench(self):
+        # Mine, and possibly drive while mining
+        rospy.loginfo("State: Trenching")
+        if self.excavation_module.trench() == False:
+            return None
+
+        self.berm_goal = self.next_berm_goal()
+        return States.ASCENT_MINING
+
+    def ascent_mining(self):
+        # Raise linear actuators, without waiting for them: traversal to the berm starts right away
+        rospy.loginfo("State: Ascent")
+        self.ascent_task = runtime.spawn(self.ascent_module.raise_linear_actuators_async())
+
+        # Set a goal to the berm zone and publish it
+        self.berm_goal.header.stamp = rospy.Time.now()
+        self.goal_publisher.publish(self.berm_goal)
+        self.berm_zone.visualize_zone(self.zone_visual_publisher)
+
+        return States.TRAVERSAL_BERM
+
+    def traversal_berm(self):
+        # Drive to berm area
+        if not self.traverse(self.berm_goal):
+            return None
+        return States.ALIGN
+
+    def align(self):
+        # The actuators have to be up before aligning and depositing
+        if self.ascent_task is not None:
+            with profiler.span("wait_for_ascent"):
+                ascent_status = runtime.join(self.ascent_task)
+            self.ascent_task = None
+            if ascent_status == False: # Interrupted, raise them again (we're already at the berm)
+                return States.ASCENT_MINING
+
+        # Align with an apriltag at the berm, homing turns towards where it should be to find it
+        rospy.loginfo("State: Alignment")
+
+        # Finds the tag, then turns and backs up to the berm at the same time, in front of the chosen dump spot
+        self.homing_module.dock_offset = self.dig_site_scheduler.dump_offset()
+        with profiler.span("home"):
+            if self.homing_module.home() == False:
+                return None
+
+        return States.DEPOSIT
+
+    def deposit(self):
+        # Deposit regolith w/ auger
+        rospy.loginfo("State: Deposit")
+
+        if self.deposition_module.deposit() == False:
+            return None
+
+        # Set a goal to the mining zone and publish it
+        self.dig_site_scheduler.record_dump(self.excavation_module.excavation_controller.volume)
+        self.mining_goal = self.next_mining_goal()
+        self.goal_publisher.publish(self.mining_goal)
+        self.mining_zone.visualize_zone(self.zone_visual_publisher)
+
+        profiler.next_cycle()
+
+        return States.TRAVERSAL_MINE
+
+
     def behavior_loop(self):
         """
         The main method of the class: enables autonomous behavior. Starts up with a few states,
         then goes in a loop of mining/deposition.
         """
 
+        # Record the timeline of states (see profiler.py and profile_report.py)
+        profiler.start_run()
+
         # Initialize all of the modules (before the loop)
-        ascent_module = ascent.Ascent(self.lin_act_publisher)
+        self.ascent_module = ascent.Ascent(self.lin_act_publisher)
         find_apriltag_module = find_apriltag.FindAprilTag(self.velocity_publisher)
-        excavation_module = excavate.Excavate(self.excavate_publisher, self.lin_act_publisher, self.velocity_publisher)
-        homing_module = homing_controller.HomingController(self.velocity_publisher)
-        deposition_module = deposition.Deposition(self.deposition_publisher)
+        self.excavation_module = excavate.Excavate(self.excavate_publisher, self.lin_act_publisher, self.velocity_publisher)
+        self.homing_module = homing_controller.HomingController(self.velocity_publisher)
+        self.deposition_module = deposition.Deposition(self.deposition_publisher)
 
-        escape_module = escape.Escape(self.velocity_publisher)
+        escape_module = escape.Escape(self.velocity_publisher, self.excavate_publisher)
 
         # Startup:
 
@@ -133,7 +369,8 @@ class Behavior:
         rospy.loginfo("State: Ascent")
         self.current_state = States.ASCENT_INIT
 
-        ascent_status = ascent_module.raise_linear_actuators()
+        with profiler.span(self.current_state.name):
+            ascent_status = self.ascent_module.raise_linear_actuators()
         if ascent_status == False: # Robot error
             pass # TODO implement the error functions here
 
@@ -144,7 +381,8 @@ class Behavior:
 
         # find_apriltag_module.spin()
 
-        apriltag_status = find_apriltag_module.find_apriltag()
+        with profiler.span(self.current_state.name):
+            apriltag_status = find_apriltag_module.find_apriltag()
 
         if apriltag_status == "Error": # Robot error
             pass # TODO implement the error functions here
@@ -154,18 +392,24 @@ class Behavior:
             self.start_apriltag = apriltag_status
 
         # Translate the apriltag into the odom frame
-        apriltag_pose_in_odom: PoseStamped = find_apriltag_module.convert_to_odom_frame(self.start_apriltag)
+        self.apriltag_pose_in_odom: PoseStamped = find_apriltag_module.convert_to_odom_frame(self.start_apriltag)
+        apriltag_pose_in_odom = self.apriltag_pose_in_odom
 
-        # Find the mininz/berm zones in the odom frame
-        self.mining_zone: zones.Zone = zones.find_mining_zone(apriltag_pose_in_odom, self.is_sim)
-        self.berm_zone: zones.Zone = zones.find_berm_zone(apriltag_pose_in_odom, self.is_sim)
+        # Find the mininz/berm zones in the odom frame, all from the same arena frame
+        self.arena_frame = zones.ArenaFrame(apriltag_pose_in_odom, self.is_sim)
+        self.mining_zone: zones.Zone = zones.find_mining_zone(apriltag_pose_in_odom, self.is_sim, self.arena_frame)
+        self.berm_zone: zones.Zone = zones.find_berm_zone(apriltag_pose_in_odom, self.is_sim, self.arena_frame)
+        self.homing_module.predicted_apriltag = zones.find_berm_apriltag(apriltag_pose_in_odom, self.is_sim, self.arena_frame)
 
-        # Set a goal to the mining zone and publish it
+        # Dig and dump spots change every cycle, the first dig site is the best one from here
+        self.dig_site_scheduler = scheduler.DigSiteScheduler(self.mining_zone, self.berm_zone, self.homing_module.predicted_apriltag, self.excavation_module.TARGET_VOLUME, self.occupancy_threshold)
+
+        # Fallback goals, used once the mining zone is dug out
         mining_goal = PoseStamped()
         mining_goal.pose.position.x = self.mining_zone.middle[0]
         mining_goal.pose.position.y = self.mining_zone.middle[1]
 
-        offset = zones.calc_offset(-1, 0, apriltag_pose_in_odom, self.is_sim)
+        offset = self.arena_frame.rotate((-1, 0))
         mining_goal.pose.position.x += offset[0]
         mining_goal.pose.position.y += offset[1]
 
@@ -179,7 +423,7 @@ class Behavior:
         berm_goal.pose.position.x = mining_goal.pose.position.x
         berm_goal.pose.position.y = mining_goal.pose.position.y
 
-        offset = zones.calc_offset(1, -1.5, apriltag_pose_in_odom, self.is_sim)
+        offset = self.arena_frame.rotate((1, -1.5))
         berm_goal.pose.position.x += offset[0]
         berm_goal.pose.position.y += offset[1]
 
@@ -188,133 +432,40 @@ class Behavior:
         berm_goal.header.stamp = rospy.Time.now()
         berm_goal.header.frame_id = "odom"
 
+        self.fallback_mining_goal = mining_goal
+
+        self.mining_goal = self.next_mining_goal()
+        self.berm_goal = berm_goal
+        mining_goal = self.mining_goal
+
         self.current_state = States.TRAVERSAL_MINE
 
-        homing_module.align_to_angle(apriltag_pose_in_odom.pose, np.pi / 2)
+        with profiler.span("align_to_angle"):
+            self.homing_module.align_to_angle(apriltag_pose_in_odom.pose, np.pi / 2)
 
         self.goal_publisher.publish(mining_goal)
 
         # This visualizes the given zone as a red square (visible in rviz)
         self.mining_zone.visualize_zone(self.zone_visual_publisher)
 
+        # Startup done, the first mining cycle starts
+        profiler.next_cycle()
+
         #This loop always running until we end the program
         while(not rospy.is_shutdown()):
 
-            #This loop is running while things are fine. Break out if interrupts
+            #This loop is running while things are fine. Break out if interrupted, staying in the same state
             while (interrupts.check_for_interrupts() == interrupts.Errors.FINE):
+                with profiler.span(self.current_state.name) as span:
+                    next_state = self.state_handlers[self.current_state]()
+                    span.interrupted = next_state is None
+                if next_state is None:
+                    break
+                self.current_state = next_state
 
-                # Drive to the mining area
-                if (self.current_state == States.TRAVERSAL_MINE):
-                    # Enable traversal (to mining zone)
-                    rospy.loginfo("State: Traversal")
-                    traversal_message.data = True
-                    self.traversal_publisher.publish(traversal_message)
-
-
-                    while (not self.is_close_to_goal(mining_goal)):
-                        # Wait until close enough
-                        self.rate.sleep()
-                        if (interrupts.check_for_interrupts() != interrupts.Errors.FINE):
-                            break
-
-                    traversal_message.data = False
-                    self.traversal_publisher.publish(traversal_message)
-                    
-                    self.current_state = States.PLUNGE
-                
-                # Lower linear actuators and begin spinning excavation
-                if (self.current_state == States.PLUNGE):
-                    rospy.loginfo("State: Plunging")
-
-                    plunge_status = excavation_module.plunge()
-                    if plunge_status == False:
-                        break
-
-                    self.current_state = States.TRENCH
-
-                # Mine, and possibly drive while mining
-                if (self.current_state == States.TRENCH):
-                    rospy.loginfo("State: Trenching")
-                    
-                    trench_status = excavation_module.trench()
-                    if trench_status == False:
-                        break
-
-                    self.current_state = States.ASCENT_MINING
-
-                # Raise linear actuators
-                if (self.current_state == States.ASCENT_MINING):
-                    rospy.loginfo("State: Ascent")
-                    ascent_status = ascent_module.raise_linear_actuators()
-
-                    if ascent_status == False: # Robot error
-                        break
-                        
-                    # Set a goal to the berm zone and publish it
-                    berm_goal.header.stamp = rospy.Time.now()
-                    self.goal_publisher.publish(berm_goal)
-                    self.berm_zone.visualize_zone(self.zone_visual_publisher)
-                    
-                    self.current_state = States.TRAVERSAL_BERM
-
-                # Drive to berm area
-                if (self.current_state == States.TRAVERSAL_BERM):
-                    # Enable traversal (to berm)
-                    rospy.loginfo("State: Traversal")
-
-                    traversal_message.data = True
-                    self.traversal_publisher.publish(traversal_message)
-
-                    while (not self.is_close_to_goal(berm_goal)):
-                        # Wait until close enough
-                        self.rate.sleep()
-                        if (interrupts.check_for_interrupts() != interrupts.Errors.FINE):
-                            break
-
-                    traversal_message.data = False
-                    self.traversal_publisher.publish(traversal_message)
-
-                    # Detect when reached berm
-                    self.current_state = States.ALIGN
-            
-                # Align with an apriltag at the berm
-                if (self.current_state == States.ALIGN):
-                    rospy.loginfo("State: Alignment")
-
-                    homing_module.align_to_angle(apriltag_pose_in_odom.pose, np.pi / 2)
-
-                    alignment_status = homing_module.home()
-                    if alignment_status == False:
-                        break
-
-                    rospy.loginfo("State: approach")
-                    approach_status = homing_module.approach()
-                    if approach_status == False:
-                        break
-
-                    self.current_state = States.DEPOSIT
-            
-                # Deposit regolith w/ auger
-                if (self.current_state == States.DEPOSIT):
-                    rospy.loginfo("State: Deposit")
-                    
-                    deposition_status = deposition_module.deposit()
-
-                    if deposition_status == False:
-                        break
-
-                    # Set a goal to the mining zone and publish it
-                    mining_goal.header.stamp = rospy.Time.now()
-                    self.goal_publisher.publish(mining_goal)
-                    self.mining_zone.visualize_zone(self.zone_visual_publisher)
-
-                    self.current_state = States.TRAVERSAL_MINE
-
-                self.rate.sleep()
-                
-            
             # This block runs when we have an interrupt (some kind of error)
             problem = interrupts.check_for_interrupts()
+            profiler.mark_interrupt(problem)
             if problem == interrupts.Errors.ROS_ENDED:
                 #simply exit this loop and the whole program
                 break
@@ -322,11 +473,17 @@ class Behavior:
                 # also exit the loop/stop autonomy
                 break
             elif problem == interrupts.Errors.OVERCURRENT:
-                #TODO: what goes here?
-                pass
+                #TODO: what goes here? For now, wait for the error state to change. The error can clear between
+                # check_for_interrupts() and here, so wake up now and then to check again
+                with profiler.span(problem.name):
+                    bus.wait_for_update(Events.INTERRUPT, timeout=0.5)
             elif problem == interrupts.Errors.STUCK:
                 #if the robot is stuck, unstick it
-                escape_module.unstickRobot()
+                with profiler.span(problem.name):
+                    escape_module.unstickRobot()
+
+        # stage -> (count, mean, max) seconds from an error arriving to the reaction
+        rospy.loginfo("Behavior: interrupt latency: " + str(interrupts.latency_summary()))
          
 
 if __name__ == "__main__":
@@ -0,0 +1,32 @@
+import asyncio
+
+import profiler
+
+'''
+Rate of ROS time relative to wall-clock time, for the waits that go through Python primitives (threading, asyncio)
+instead of rospy. It's 1 on the robot; the behavior simulator (sim/run_sim.py) runs the clock faster, and sets it here
+so every module's sleeps and timeouts stay in ROS seconds.
+'''
+
+rate = 1.0
+
+def set_rate(new_rate: float):
+    global rate
+    rate = new_rate
+
+def to_wall(seconds: float) -> float:
+    """
+    Convert a duration in ROS seconds to wall-clock seconds (None stays None, for "no timeout")
+    """
+
+    if seconds is None:
+        return None
+    return seconds / rate
+
+async def sleep(seconds: float):
+    """
+    asyncio.sleep for a duration in ROS seconds
+    """
+
+    with profiler.waiting():
+        await asyncio.sleep(to_wall(seconds))
@@ -2,14 +2,16 @@
 
 import rospy
 
-from lunabot_msgs.msg import RobotSensors
 from std_msgs.msg import Int8
 from geometry_msgs.msg import Twist
 
 from homing_controller import HomingController
 
-import time
+import clock
+import filters
 import interrupts
+import sensor_cache
+from runtime import runtime
 import sys
 
 class Deposition:
@@ -17,9 +19,6 @@ class Deposition:
     State to deposit collected regolith onto the berm by spinning the auger
     '''
 
-    def sensors_callback(self, msg: RobotSensors):
-        self.robot_sensors = msg
-
     def __init__(self, deposition_publisher: rospy.Publisher = None):
         """
         If passed a publisher, then it is assumed a node is already running, and the publisher is shared.
@@ -32,60 +31,76 @@ class Deposition:
         else:
             self.deposition_publisher = deposition_publisher
 
-        self.robot_sensors = RobotSensors()
-
-        rospy.Subscriber("/sensors", RobotSensors, self.sensors_callback)
-
-        self.rate = rospy.Rate(10)  # 10hz
-
         self.deposition_power = 127 # TODO change if needed
 
-        # self.load_cell_threshold = 1 # in kilograms, TODO test / verify WHEN LOAD CELLS EXIST
+        # Bin empty: the (filtered) load cell weight stays under the threshold, or without load cells, the auger current
+        self.load_cell_threshold = 1 # in kilograms, TODO test / verify WHEN LOAD CELLS EXIST
+        self.empty_auger_current = 2.0 # Amps, TODO find value
+        self.EMPTY_TIME = 1.0 # seconds the bin has to look empty
+        self.FILTER_TIME_CONSTANT = 0.5 # seconds
+        self.SPIN_UP_TIME = 3.0 # seconds before the current means anything
+        self.CLEAR_TIME = 1.0 # seconds to keep spinning once empty, to clear the auger
 
-        self.DEPOSITION_TIME = 45.00
+        self.DEPOSITION_TIME = 45.00 # upper bound, if the bin never looks empty
 
         self.is_sim = rospy.get_param("is_sim")
 
     def deposit(self):
         """
-        Spin the auger until the load cell detects that the bin is empty
+        Blocking version of deposit_async
+        """
+
+        return runtime.run(self.deposit_async())
+
+    async def deposit_async(self):
+        """
+        Spin the auger until the load cells (or the auger current) show that the bin is empty, or for DEPOSITION_TIME at most
+        Runs as a task on the behavior runtime, so it can overlap with other modules.
         """
 
         if (self.is_sim):
             rospy.loginfo("Deposition: would deposit")
-            time.sleep(2)
+            await clock.sleep(2)
             return True
 
-        time.sleep(0.1)
+        await clock.sleep(0.1)
 
         deposition_msg = Int8()
         deposition_msg.data = self.deposition_power
 
         start_time = rospy.get_time()
+        end_time = start_time + self.DEPOSITION_TIME
 
-        while True:
-            self.deposition_publisher.publish(deposition_msg)
-            
-            if rospy.get_time() - start_time > self.DEPOSITION_TIME:
-                break
-
-            '''
-            # no load cells yet... :(
-
-            weight = self.robot_sensors.load_cell_weights[0] + self.robot_sensors.load_cell_weights[1]
-
-            if weight < self.load_cell_threshold:
-                break
-            '''
+        bin_empty = filters.BinEmptyDetector(self.load_cell_threshold, self.empty_auger_current, self.EMPTY_TIME, self.FILTER_TIME_CONSTANT)
+        seq = sensor_cache.get_snapshot().seq
 
-            if (interrupts.check_for_interrupts() != interrupts.Errors.FINE):
-                return False
-
-            self.rate.sleep()
-
-        deposition_msg.data = 0
+        # The effort factory keeps sending the last command, so only wake up on new sensor values or interrupts
         self.deposition_publisher.publish(deposition_msg)
 
+        try:
+            while True:
+                remaining = end_time - rospy.get_time()
+                if remaining <= 0:
+                    break
+
+                if (interrupts.check_for_interrupts() != interrupts.Errors.FINE):
+                    return False
+
+                snapshot = await sensor_cache.next_sample(seq, timeout=remaining)
+
+                # Only filter new sensor messages
+                if snapshot.seq != seq:
+                    seq = snapshot.seq
+                    now = snapshot.stamp
+                    empty = bin_empty.update(snapshot.msg.load_cell_weights, snapshot.msg.dep_curr, now)
+                    if empty and now - start_time > self.SPIN_UP_TIME and end_time > now + self.CLEAR_TIME:
+                        rospy.loginfo("Deposition: bin empty after %.1f s", now - start_time)
+                        end_time = now + self.CLEAR_TIME
+        finally:
+            # Also stops the auger if the task is cancelled
+            deposition_msg.data = 0
+            self.deposition_publisher.publish(deposition_msg)
+
         return True
     
 if __name__ == "__main__":
@@ -100,6 +115,4 @@ if __name__ == "__main__":
         homing_controller = HomingController(cmd_vel_publisher)
 
         homing_controller.home()
-        rospy.sleep(0.5)
-        homing_controller.approach()
         deposition.deposit()
@@ -1,49 +1,227 @@
 import rospy
+import asyncio
+import math
 
 from geometry_msgs.msg import Twist
+from nav_msgs.msg import Odometry
+from std_msgs.msg import Float32, Int8
+
+import interrupts
+import sensor_cache
+from events import Events
+from runtime import runtime
 
 
 """
 A class that controls the behavior for if the robot becomes 'stuck'
-Rocks back and fowards in order to become unstuck- (TODO - this might displace us too much)
+Tries maneuvers from a small library (reverse, pivot, oscillate, excavate-assisted), watching odometry, the wheel
+velocities and the stuck node's slip estimate, and stops as soon as the robot moves again.
 """
 class Escape:
-	NUM_ITERATIONS = 6  # how many times to rock back and forth
-	ESCAPE_SPEED = 1    # m/s
+	ESCAPE_SPEED = 0.3	# m/s to start with, adapted while escaping
+	MIN_SPEED = 0.1
+	MAX_SPEED = 0.6
+	PIVOT_SPEED = 0.8	# rad/s
+	EXCAVATION_EFFORT = 100
+
+	# Each maneuver is a list of steps: (linear, angular, excavation), as fractions of the speeds above, and seconds
+	MANEUVERS = {
+		"reverse": [(-1, 0, 0, 2.0)],
+		"pivot": [(0, 1, 0, 1.5), (0, -1, 0, 3.0)],
+		"oscillate": [(-1, 0, 0, 0.5), (1, 0, 0, 0.5), (-1, 0, 0, 1.0), (1, 0, 0, 1.0), (-1, 0, 0, 1.5), (1, 0, 0, 1.5)],
+		"excavate_assisted": [(-1, 0, 1, 3.0)],
+	}
+
+	CONTROL_PERIOD = 0.1	# seconds, the longest between two checks (odometry wakes it up sooner)
+	FREE_DISTANCE = 0.1	# meters moved since the start of the maneuver
+	FREE_ANGLE = 0.2	# radians turned
+	FREE_SLIP = 0.5	# the slip estimate has to be below this too, when the stuck node publishes one
+	SLIP_TIMEOUT = 1.0	# seconds, older slip estimates are ignored
+	CLEAR_TIMEOUT = 2.0	# seconds to wait for the stuck error to clear once free
+
+	SPINNING = 0.5	# wheels turning at this fraction of the command, without moving the robot: less speed
+	SPEED_UP = 1.3	# stalled wheels: more speed
+	SLOW_DOWN = 0.7
+
+	CELL_SIZE = 0.5	# meters, what worked is remembered per cell of the odom frame
+	WHEEL_RADIUS = 0.1397
+	WHEEL_BASE = 0.5588
+
+	def odom_callback(self, msg: Odometry):
+		self.odom = msg
 
-	def __init__(self, velocity_publisher: rospy.Publisher = None):
+	def slip_callback(self, msg: Float32):
+		self.slip = msg.data
+		self.slip_time = rospy.get_time()
+
+	def __init__(self, velocity_publisher: rospy.Publisher = None, excavation_publisher: rospy.Publisher = None):
 		if velocity_publisher is None:
 			self.velocity_publisher = rospy.Publisher("/cmd_vel", Twist, queue_size=1, latch=True)
 			rospy.init_node('escape_node')
 		else:
 			self.velocity_publisher = velocity_publisher
 
-	def drive_in_line(self, speed: float):
-		velocity_message = Twist()
-		velocity_message.linear.x = speed
+		if excavation_publisher is None:
+			self.excavation_publisher = rospy.Publisher("/excavate", Int8, queue_size=1, latch=True)
+		else:
+			self.excavation_publisher = excavation_publisher
 
-		self.velocity_publisher.publish(velocity_message)
-		
-	def unstickRobot(self):
-		# rock backwards and forwards
-		for i in range(self.NUM_ITERATIONS):
+		self.odom: Odometry = None
+		rospy.Subscriber(rospy.get_param("/odom_topic"), Odometry, self.odom_callback)
 
-			rospy.sleep((i+1)/2)
-			self.drive_in_line(-self.ESCAPE_SPEED)
+		self.slip: float = None
+		self.slip_time = 0.0
+		rospy.Subscriber("/slip", Float32, self.slip_callback)
 
-			rospy.sleep((i+1)/2)
-			self.drive_in_line(self.ESCAPE_SPEED)
+		self.speed = self.ESCAPE_SPEED
 
-		rospy.sleep(2)
+		# cell -> name of the maneuver that got the robot out there, and how often each one worked anywhere
+		self.worked_in_cell = {}
+		self.successes = {name: 0 for name in self.MANEUVERS}
 
-		# stop
+	def drive(self, linear: float, angular: float, excavation: int = 0):
 		velocity_message = Twist()
-		velocity_message.linear.x = 0
-		velocity_message.angular.z = 0
+		velocity_message.linear.x = linear
+		velocity_message.angular.z = angular
+
 		self.velocity_publisher.publish(velocity_message)
+		self.excavation_publisher.publish(Int8(excavation))
 
+	def stop(self):
+		self.drive(0, 0)
+
+	def pose(self) -> tuple:
+		"""
+		(x, y, yaw) from odometry, None before the first message
+		"""
+
+		if self.odom is None:
+			return None
+
+		pose = self.odom.pose.pose
+		yaw = 2 * math.atan2(pose.orientation.z, pose.orientation.w)
+		return pose.position.x, pose.position.y, yaw
+
+	def cell(self, pose: tuple) -> tuple:
+		if pose is None:
+			return None
+		return (math.floor(pose[0] / self.CELL_SIZE), math.floor(pose[1] / self.CELL_SIZE))
+
+	def maneuver_order(self, cell: tuple) -> list:
+		"""
+		What worked in this cell before first, then the ones that worked most often
+		"""
+
+		names = sorted(self.MANEUVERS, key=lambda name: -self.successes[name])
+		remembered = self.worked_in_cell.get(cell)
+		if remembered is not None:
+			names.remove(remembered)
+			names.insert(0, remembered)
+		return names
+
+	def is_free(self, start: tuple) -> bool:
+		pose = self.pose()
+		if start is None or pose is None:
+			return False
+
+		moved = math.hypot(pose[0] - start[0], pose[1] - start[1])
+		turned = abs(math.atan2(math.sin(pose[2] - start[2]), math.cos(pose[2] - start[2])))
+		if moved < self.FREE_DISTANCE and turned < self.FREE_ANGLE:
+			return False
+
+		# Odometry from the wheels alone moves while they spin, the slip estimate doesn't
+		if self.slip is not None and rospy.get_time() - self.slip_time < self.SLIP_TIMEOUT:
+			return self.slip < self.FREE_SLIP
 		return True
-	
+
+	def adapt_speed(self, linear: float, angular: float):
+		"""
+		Wheels spinning without moving the robot: slow down for traction. Wheels stalled: push harder.
+		Applies from the next step.
+		"""
+
+		commanded = abs(linear) + abs(angular) * self.WHEEL_BASE / 2
+		if commanded == 0:
+			return
+
+		# Filtered by the sensor cache, and only if the encoders still report
+		if sensor_cache.is_stale():
+			return
+
+		sensors = sensor_cache.get_snapshot()
+		wheels = (abs(sensors.drive_left_vel) + abs(sensors.drive_right_vel)) / 2 * self.WHEEL_RADIUS
+		if wheels > self.SPINNING * commanded:
+			self.speed = max(self.speed * self.SLOW_DOWN, self.MIN_SPEED)
+		else:
+			self.speed = min(self.speed * self.SPEED_UP, self.MAX_SPEED)
+
+	async def run_maneuver(self, name: str) -> bool:
+		"""
+		Runs the steps of a maneuver until the robot is free (True), or they're all done (False)
+		"""
+
+		start = self.pose()
+
+		for linear, angular, excavation, duration in self.MANEUVERS[name]:
+			end_time = rospy.get_time() + duration
+
+			while rospy.get_time() < end_time:
+				# Another error on top of being stuck: give up like a cancelled task
+				errors = interrupts.get_errors()
+				if errors.manual_stop or errors.overcurrent or rospy.is_shutdown():
+					raise asyncio.CancelledError()
+
+				if self.is_free(start):
+					return True
+
+				step_linear = linear * self.speed
+				step_angular = angular * self.PIVOT_SPEED * self.speed / self.ESCAPE_SPEED
+				self.drive(step_linear, step_angular, excavation * self.EXCAVATION_EFFORT)
+
+				await runtime.wait_for(Events.ODOM, timeout=self.CONTROL_PERIOD)
+
+			# The wheels have caught up with the command by the end of a step
+			self.adapt_speed(step_linear, step_angular)
+
+		return self.is_free(start)
+
+	async def unstick_async(self) -> bool:
+		"""
+		Tries the maneuvers until one frees the robot. Returns False if none did.
+		Runs as a task on the behavior runtime while the stuck error is active.
+		"""
+
+		try:
+			cell = self.cell(self.pose())
+			self.speed = self.ESCAPE_SPEED
+
+			for name in self.maneuver_order(cell):
+				rospy.loginfo("Escape: trying " + name)
+				free = await self.run_maneuver(name)
+				self.stop()
+
+				if free:
+					rospy.loginfo("Escape: free after " + name)
+					self.worked_in_cell[cell] = name
+					self.successes[name] += 1
+
+					# Give the stuck node time to see the robot moving
+					if interrupts.get_errors().stuck:
+						await runtime.wait_for(Events.INTERRUPT, timeout=self.CLEAR_TIMEOUT)
+					return True
+
+			return False
+		except asyncio.CancelledError:
+			self.stop()
+			raise
+
+	def unstickRobot(self):
+		"""
+		Blocking version of unstick_async
+		"""
+
+		return runtime.run(self.unstick_async(), during=interrupts.Errors.STUCK)
+
 if __name__ == "__main__":
 	escape = Escape()
-	escape.unstickRobot()
\ No newline at end of file
+	escape.unstickRobot()
@@ -0,0 +1,110 @@
+import rospy
+
+from collections import Counter, deque
+from enum import Enum, auto
+import threading
+import time
+
+import clock
+import profiler
+
+
+class Events(Enum):
+    ODOM = auto()
+    SENSORS = auto()
+    APRILTAG = auto()
+    GOAL_REACHED = auto()
+    INTERRUPT = auto()
+    TIMEOUT = auto()
+
+
+class EventQueue:
+    '''
+    Thread-safe event queue shared by the behavior modules. rospy callbacks and timers post events from
+    their own threads, and the state machine / modules block on the queue instead of polling at a fixed rate,
+    so a transition happens as soon as the callback that causes it runs.
+
+    There are two ways of signalling:
+    - post() queues an event (with data) that is consumed once with get(), for state transitions.
+    - notify() only wakes up anyone blocked in wait_for_update(), for high rate updates like odometry
+      that nobody needs to consume one by one.
+    '''
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.queue = deque()
+        self.counts = Counter()  # how many times each event happened, to detect new ones
+        self.listeners = []
+
+    def add_listener(self, callback):
+        """
+        Call callback(event, data) on every notify/post, from the thread that sent it. Used to forward events
+        to code that can't block on the condition (e.g. the asyncio runtime).
+        """
+
+        with self.condition:
+            self.listeners.append(callback)
+
+    def notify(self, event: Events):
+        with self.condition:
+            self.counts[event] += 1
+            self.condition.notify_all()
+            for listener in self.listeners:
+                listener(event, None)
+
+    def post(self, event: Events, data=None):
+        with self.condition:
+            self.queue.append((event, data))
+            self.counts[event] += 1
+            self.condition.notify_all()
+            for listener in self.listeners:
+                listener(event, data)
+
+    def clear(self):
+        with self.condition:
+            self.queue.clear()
+
+    def get(self, *events: Events, timeout: float = None):
+        """
+        Block until one of the given events (any event if none given) is queued, and remove it.
+        Queued events that aren't asked for are stale for the caller and are dropped.
+        Returns (event, data), or (None, None) on timeout (in ROS seconds, like every timeout here).
+        """
+
+        with self.condition, profiler.waiting():
+            timeout = clock.to_wall(timeout)
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while True:
+                while self.queue:
+                    event, data = self.queue.popleft()
+                    if not events or event in events:
+                        return event, data
+
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None, None
+                self.condition.wait(remaining)
+
+    def wait_for_update(self, *events: Events, timeout: float = None) -> bool:
+        """
+        Block until one of the given events is notified or posted after this call.
+        Returns False on timeout.
+        """
+
+        with self.condition, profiler.waiting():
+            start = [self.counts[event] for event in events]
+            return self.condition.wait_for(
+                lambda: any(self.counts[event] != count for event, count in zip(events, start)),
+                clock.to_wall(timeout),
+            )
+
+    def start_timer(self, duration: float, event: Events = Events.TIMEOUT, data=None) -> rospy.Timer:
+        """
+        Post event after duration seconds (of ROS time). Call shutdown() on the returned timer to cancel it.
+        """
+
+        return rospy.Timer(rospy.Duration(duration), lambda _: self.post(event, data), oneshot=True)
+
+
+# Shared by every module, like interrupts.check_for_interrupts()
+bus = EventQueue()
@@ -1,13 +1,16 @@
 import rospy
-import time
+import asyncio
+import clock
 
-from lunabot_msgs.msg import RobotEffort, RobotSensors
+from lunabot_msgs.msg import RobotEffort
 import interrupts
+import sensor_cache
+from runtime import runtime
 from geometry_msgs.msg import Twist
-#from lunabot_control.scripts.pid_controller import VelocityPIDController
 #from lunabot_control.scripts.clamp_output import clamp_output
-from pid_controller import VelocityPIDController 
 from clamp_output import clamp_output  
+from excavation_controller import ExcavationController
+import filters
 import ascent
 
 from std_msgs.msg import Int8
@@ -16,12 +19,10 @@ from std_msgs.msg import Int8
 class Excavate:
     """
     A state used to autonomously excavate. Plunge lowers linear actuators while spinning the buckets,
-    and excavate drives forwards/spins the buckets to try and meet a target depth of cut.
+    and excavate drives forwards/spins the buckets. Both feed at the rate the ExcavationController gives to hold
+    the depth of cut, and excavation ends once TARGET_VOLUME is dug.
     """
 
-    def sensors_callback(self, msg: RobotSensors):
-        self.robot_sensors = msg
-
     def __init__(
         self,
         excavation_publisher: rospy.Publisher = None,
@@ -49,25 +50,12 @@ class Excavate:
         else:
             self.cmd_vel_publisher: rospy.Publisher = cmd_vel_publisher
 
-        self.robot_sensors = RobotSensors()
-
-        rospy.Subscriber("/sensors", RobotSensors, self.sensors_callback)
-
-        self.rate = rospy.Rate(10)
+        # Longest wait for a new sensor reading (s), interrupts cancel the task while it waits
+        self.CONTROL_PERIOD = 0.1
 
         # 90 percent of max speed
-        TARGET_EXCAVATION_VELOCITY = 8 * 0.9
-
-        self.excavation_pid_controller = VelocityPIDController(
-            TARGET_EXCAVATION_VELOCITY, 1, 0, 0, 127
-        )  # TODO find values
-
-        self.left_drivetrain_pid_controller = VelocityPIDController(
-            1, 1, 0, 0, 127
-        )  # TODO find values
-        self.right_drivetrain_pid_controller = VelocityPIDController(
-            1, 1, 0, 0, 127
-        )  # TODO find values
+        MAX_EXCAVATION_VELOCITY = 8
+        TARGET_EXCAVATION_VELOCITY = MAX_EXCAVATION_VELOCITY * 0.9
 
         # Constants (in meters)
         self.TARGET_DEPTH_OF_CUT = 0.005  # Currently set to .5 cm
@@ -76,215 +64,214 @@ class Excavate:
         self.BUCKET_SPACING = 0.0853
 
         self.LOWERING_TIME = 30  # seconds
-        self.TRENCHING_TIME = 5  # seconds
+        self.MAX_TRENCHING_TIME = 60  # seconds, trenching ends on TARGET_VOLUME before this
+        self.MAX_TRENCH_DISTANCE = 1.0  # Stay inside the mining zone. TODO get from the zone size
+        self.MAX_TRENCH_SPEED = 0.1  # m/s
+
+        self.TARGET_VOLUME = 0.01  # m^3 dug per cycle, TODO find value (what the bin holds)
 
-        self.load_cell_weight_threshold = 0  # TODO find value
         self.max_lin_act_vel = (
             0.00688405797
         )  # In meters/s, the speed of the linear actuators at the max power
         self.lin_act_max_power = 110
         # from experiment - 19 cm / 27.6 seconds
 
-        self.lin_act_curr_threshold = 10  # TODO find value
+        # Same as ascent.py: the actuators draw current while moving, none once lowered
+        self.ACTUATOR_MOVING_CURRENT = 0.5  # Amps
+        self.ACTUATOR_CURRENT_THRESHOLD = 0.1  # Amps
+        self.END_OF_TRAVEL_TIME = 0.5  # seconds
+        self.CURRENT_TIME_CONSTANT = 0.2  # seconds
+        self.lin_act_min_effort = 20  # Slower than this, the current says nothing about the end of travel. TODO find value
 
         self.excavation_current_threshold = 25  # Amps; TODO find/confirm value
 
+        self.excavation_controller = ExcavationController(
+            TARGET_EXCAVATION_VELOCITY,
+            MAX_EXCAVATION_VELOCITY,
+            self.BUCKET_RADIUS,
+            self.BUCKET_SPACING,
+            self.TARGET_DEPTH_OF_CUT,
+            self.excavation_current_threshold,
+        )
+
         self.is_sim = rospy.get_param("is_sim")
 
-        self.exc_failure_counter = 0
+        self.trench_distance = 0.0  # meters driven by the last trench
 
     def excavate(self):
-        self.plunge()
-        self.trench()
+        return runtime.run(self.excavate_async())
+
+    async def excavate_async(self):
+        if not await self.plunge_async():
+            return False
+        return await self.trench_async()
 
     def plunge(self):
         """
-        Controls plunging (moving linear actuators down + spinning excavation)
+        Blocking version of plunge_async
         """
 
-        time.sleep(0.1)  # Why is time.sleep() here. TODO investigate
-
-        print("Excavation: Plunging")
+        return runtime.run(self.plunge_async())
 
-        if self.is_sim:
-            rospy.loginfo("Plunge: would plunge")
-            time.sleep(3)
-            return True
-
-        excavation_message = Int8()
-        lin_act_message = Int8()
-
-        excavation_ang = (
-            self.robot_sensors.exc_ang
-        )  # TODO have firmware give excavation angle directly?
-        start_time = rospy.get_time()
-        current_time = start_time
+    async def plunge_async(self):
+        """
+        Controls plunging (moving linear actuators down + spinning excavation)
+        Runs as a task on the behavior runtime, so it can overlap with other modules.
+        """
 
-        # Until the linear actuators reach the end (based on time), keep moving them down
-        while rospy.get_time() - start_time < self.LOWERING_TIME:
+        try:
+            await clock.sleep(0.1)  # Why is time.sleep() here. TODO investigate
 
-            if interrupts.check_for_interrupts() != interrupts.Errors.FINE:
-                return False
+            print("Excavation: Plunging")
 
-            new_time = rospy.get_time()
-            new_excavation_ang = self.robot_sensors.exc_ang
+            if self.is_sim:
+                rospy.loginfo("Plunge: would plunge")
+                await clock.sleep(3)
+                return True
 
-            dt = new_time - current_time
+            # A new excavation cycle: the volume dug while plunging counts towards trenching
+            controller = self.excavation_controller
+            controller.reset()
+            end_of_travel = filters.EndOfTravelDetector(
+                self.ACTUATOR_MOVING_CURRENT, self.ACTUATOR_CURRENT_THRESHOLD, self.END_OF_TRAVEL_TIME, self.CURRENT_TIME_CONSTANT
+            )
+            seq = sensor_cache.get_snapshot().seq
+            start_time = rospy.get_time()
 
-            # Set excavation based on the PID controller
-            excavation_velocity = (
-                new_excavation_ang - excavation_ang
-            ) / dt  # TODO check calculations are good
-            
-            #print("exc vel: ", excavation_velocity)
-            #print("filtered: ", self.robot_sensors.exc_vel)
+            # Lower the linear actuators as fast as the controller feeds, until they reach the end (or the time limit)
+            while rospy.get_time() - start_time < self.LOWERING_TIME:
 
-            excavation_control = self.excavation_pid_controller.update(
-                excavation_velocity, dt
-            )
-            #print(excavation_control, "control")
-            excavation_message.data = clamp_output(excavation_control)
-
-            # Set the target linear actuator velocity to target the depth of cut
-            target_actuator_velocity = (
-                self.TARGET_DEPTH_OF_CUT
-                * excavation_velocity
-                * self.BUCKET_RADIUS
-                / self.BUCKET_SPACING
-            )
+                if interrupts.check_for_interrupts() != interrupts.Errors.FINE:
+                    self.stop()
+                    return False
 
-            lin_act_message.data = clamp_output(-target_actuator_velocity / self.max_lin_act_vel * self.lin_act_max_power)  # No encoders so cannot do PID, estimating (will slighly underestimate on lower voltage)
+                # Only new readings go through the controller, without them the feed stops
+                snapshot = await sensor_cache.next_sample(seq, timeout=self.CONTROL_PERIOD)
+                if snapshot.seq == seq:
+                    if sensor_cache.is_stale():
+                        self.lin_act_publisher.publish(Int8(0))
+                    continue
 
-            self.lin_act_publisher.publish(lin_act_message)
-            self.excavation_publisher.publish(excavation_message)
+                seq = snapshot.seq
+                robot_sensors = snapshot.msg
+                now = snapshot.stamp
 
-            # Check for excavation getting stuck (high current)
-            if self.robot_sensors.exc_curr > self.excavation_current_threshold:
-                self.exc_failure_counter += 1
-                self.spin_excavation_backwards()
+                excavation_effort, feed = controller.update(
+                    robot_sensors.exc_vel, robot_sensors.exc_curr, now, robot_sensors.load_cell_weights, self.max_lin_act_vel
+                )
+                lin_act_effort = clamp_output(-feed / self.max_lin_act_vel * self.lin_act_max_power)  # No encoders so cannot do PID, estimating (will slighly underestimate on lower voltage)
 
-            if (self.exc_failure_counter >= 7):
-                break
+                self.lin_act_publisher.publish(Int8(lin_act_effort))
+                self.excavation_publisher.publish(Int8(excavation_effort))
 
-            current_time = new_time
-            excavation_ang = new_excavation_ang
+                if end_of_travel.update(robot_sensors.act_right_curr, now, lin_act_effort <= -self.lin_act_min_effort):
+                    print("Excavation: linear actuators lowered")
+                    break
 
-            self.rate.sleep()
+                if controller.failed or controller.volume >= self.TARGET_VOLUME:
+                    break
 
-        lin_act_message.data = 0
-        self.lin_act_publisher.publish(lin_act_message)
+            self.lin_act_publisher.publish(Int8(0))
 
-        return True
+            return True
+        except asyncio.CancelledError:
+            # Stop what this state was driving, then let the runtime finish the cancellation
+            self.stop()
+            raise
 
     def trench(self):
         """
-        Controls trenching (spinning excavation + driving forward)
+        Blocking version of trench_async
         """
 
-        time.sleep(0.1)  # Why is time.sleep() here. TODO investigate
-
-        print("Excavation: Trenching")
-
-        if self.is_sim:
-            rospy.loginfo("Trenching: would trench")
-            time.sleep(3)
-            return True
-
-        excavation_message = Int8()
-        cmd_vel_message = Twist()
-
-        excavation_ang = self.robot_sensors.exc_ang 
-        current_time = rospy.get_time()
-        start_time = current_time
+        return runtime.run(self.trench_async())
 
+    async def trench_async(self):
         """
-        TODO: no load cells yet
-
-        load_cell_weight = self.robot_sensors.load_cell_weights[0] + self.robot_sensors.load_cell_weights[1]
-
-        original while condition: load_cell_weight < self.load_cell_weight_threshold
+        Controls trenching (spinning excavation + driving forward)
+        Runs as a task on the behavior runtime, so it can overlap with other modules.
         """
 
-        # TODO add logic for stopping if obstacles exist (both rocks and craters)
+        try:
+            await clock.sleep(0.1)  # Why is time.sleep() here. TODO investigate
 
-        # Until the set amount of time, keep moving the robot forward and spinning excavation
-        while rospy.get_time() - start_time < self.TRENCHING_TIME:
+            print("Excavation: Trenching")
 
-            if interrupts.check_for_interrupts() != interrupts.Errors.FINE:
-                return False
+            if self.is_sim:
+                rospy.loginfo("Trenching: would trench")
+                await clock.sleep(3)
+                return True
 
-            new_time = rospy.get_time()
-            new_excavation_ang = self.robot_sensors.exc_ang
+            controller = self.excavation_controller
+            cmd_vel_message = Twist()
+            seq = sensor_cache.get_snapshot().seq
+            start_time = rospy.get_time()
+            last_time = start_time
+            distance = 0.0
 
-            dt = new_time - current_time
+            # TODO add logic for stopping if obstacles exist (both rocks and craters)
 
-            excavation_velocity = self.robot_sensors.exc_vel
+            # Drive forwards as fast as the controller feeds until enough was dug (plunging included),
+            # within the time limit and the mining zone
+            while (
+                controller.volume < self.TARGET_VOLUME
+                and not controller.failed
+                and distance < self.MAX_TRENCH_DISTANCE
+                and rospy.get_time() - start_time < self.MAX_TRENCHING_TIME
+            ):
 
-            excavation_control = self.excavation_pid_controller.update(excavation_velocity, dt)
+                if interrupts.check_for_interrupts() != interrupts.Errors.FINE:
+                    self.stop()
+                    return False
 
-            excavation_message.data = clamp_output(excavation_control)
+                # Only new readings go through the controller, without them the robot stops
+                snapshot = await sensor_cache.next_sample(seq, timeout=self.CONTROL_PERIOD)
+                now = rospy.get_time()
+                distance += cmd_vel_message.linear.x * (now - last_time)
+                last_time = now
 
-            self.excavation_publisher.publish(excavation_message)
+                if snapshot.seq == seq:
+                    if sensor_cache.is_stale() and cmd_vel_message.linear.x != 0:
+                        cmd_vel_message.linear.x = 0
+                        self.cmd_vel_publisher.publish(cmd_vel_message)
+                    continue
 
-            target_linear_vel = (
-                self.TARGET_DEPTH_OF_CUT
-                * excavation_velocity
-                * self.BUCKET_RADIUS
-                / self.BUCKET_SPACING
-            )
+                seq = snapshot.seq
+                robot_sensors = snapshot.msg
 
-            cmd_vel_message.linear.x = target_linear_vel
-            cmd_vel_message.angular.z = 0
+                excavation_effort, feed = controller.update(
+                    robot_sensors.exc_vel, robot_sensors.exc_curr, snapshot.stamp, robot_sensors.load_cell_weights, self.MAX_TRENCH_SPEED
+                )
 
-            self.cmd_vel_publisher.publish(cmd_vel_message)
+                cmd_vel_message.linear.x = feed
+                cmd_vel_message.angular.z = 0
 
-            # Check for excavation getting stuck (high current)
-            if self.robot_sensors.exc_curr > self.excavation_current_threshold:
-                self.exc_failure_counter += 1
-                self.spin_excavation_backwards()
+                self.excavation_publisher.publish(Int8(excavation_effort))
+                self.cmd_vel_publisher.publish(cmd_vel_message)
 
-            if (self.exc_failure_counter >= 7):
-                break
+            self.trench_distance = distance
 
-            current_time = new_time
-            excavation_ang = new_excavation_ang
+            if controller.failed:
+                print("Excavation: giving up after", controller.jams, "jams")
+            print("Excavation: dug %.4f m^3" % controller.volume)
 
-            #load_cell_weight = (
-            #    self.robot_sensors.load_cell_weights[0]
-            #    + self.robot_sensors.load_cell_weights[1]
-            #)
+            self.excavation_publisher.publish(Int8(0))
+            self.cmd_vel_publisher.publish(Twist())
 
-            self.rate.sleep()
-
-        excavation_message.data = 0
-        cmd_vel_message.linear.x = 0
-        cmd_vel_message.angular.z = 0
-
-        self.excavation_publisher.publish(excavation_message)
-        
-        self.cmd_vel_publisher.publish(cmd_vel_message)
-
-        return True
+            return True
+        except asyncio.CancelledError:
+            # Stop what this state was driving, then let the runtime finish the cancellation
+            self.stop()
+            raise
 
-    def spin_excavation_backwards(self):
+    def stop(self):
         """
-        Spins excavation backwards for 1 second. Used to unstick rocks from buckets (if excavation gets high current)
+        Stops excavation, the linear actuators and the drivetrain
         """
 
-        print("Excavation: spinning backwards (", self.exc_failure_counter, ")")
-
-        # 90% of max speed, backwards
-        EXCAVATION_SPEED = int(-127 * 0.9)
-
-        excavation_message = Int8()
-        excavation_message.data = EXCAVATION_SPEED
-
-        self.excavation_publisher.publish(excavation_message)
-
-        rospy.sleep(1)
-
-        excavation_message.data = 0
-        self.excavation_publisher.publish(excavation_message)
+        self.excavation_publisher.publish(Int8(0))
+        self.lin_act_publisher.publish(Int8(0))
+        self.cmd_vel_publisher.publish(Twist())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,168 @@
+from lunabot_control.pid import PIDBank
+
+import filters
+
+'''
+Closed loop excavation: holds the buckets at speed, feeds them into the ground (lowering the linear actuators or
+driving forward) as fast as the regolith allows, recovers from jams without blocking, and keeps track of how much
+has been dug so the phase can end on volume instead of time.
+'''
+
+class ExcavationController:
+    '''
+    Each bucket takes a slice depth_of_cut thick, so feeding at depth_of_cut * bucket speed * radius / spacing holds
+    it. The depth of cut itself adapts to the load: it grows while the excavation current is below target_current
+    (loose regolith) and shrinks above it, and the feed backs off further as the current nears the jam current.
+
+    A jam (current above jam_current, or the buckets stalling) spins them backwards and backs the feed off for
+    RECOVERY_TIME, then cuts again at half the depth. After MAX_JAMS, failed is set and the caller should give up.
+
+    Call update() with each new sensor message, it returns (excavation effort, feed rate in m/s, down or forwards).
+    '''
+
+    DIGGING = "digging"
+    RECOVERING = "recovering"
+
+    def __init__(self, target_velocity: float, max_velocity: float, bucket_radius: float, bucket_spacing: float,
+                 target_depth_of_cut: float, jam_current: float):
+        self.target_velocity = target_velocity  # rad/s
+        self.bucket_radius = bucket_radius
+        self.bucket_spacing = bucket_spacing
+        self.target_depth_of_cut = target_depth_of_cut
+        self.jam_current = jam_current
+
+        # Bucket speed PI, feedforward is max effort / max speed
+        self.VELOCITY_FEEDFORWARD = 127 / max_velocity
+        self.VELOCITY_KP = 8  # TODO find values
+        self.VELOCITY_KI = 10
+        self.velocity_pid = PIDBank(
+            self.VELOCITY_KP, self.VELOCITY_KI, 0, self.VELOCITY_FEEDFORWARD, channels=1, output_limits=(-127, 127)
+        )
+
+        # Depth of cut adaptation
+        self.MIN_DEPTH_OF_CUT = target_depth_of_cut / 4
+        self.MAX_DEPTH_OF_CUT = target_depth_of_cut * 2
+        self.target_current = jam_current * 0.7  # Amps, cutting at this load leaves room for rocks
+        self.FREE_CURRENT = 6  # Amps, below this the buckets are spinning in the air. TODO find value
+        self.ADAPTATION_RATE = 0.0001  # m of depth of cut per second, per Amp away from target_current
+        self.CURRENT_TIME_CONSTANT = 0.1
+
+        # Jams
+        self.STALL_FRACTION = 0.3  # of target_velocity, slower than this (once spun up) is a stall
+        self.STALL_TIME = 0.5
+        self.RECOVERY_TIME = 1  # seconds
+        self.REVERSE_EFFORT = int(-127 * 0.9)
+        self.BACK_OFF_SPEED = 0.005  # m/s, away from the cut while recovering
+        self.MAX_JAMS = 7
+
+        # Volume, each bucket slice is depth of cut * BUCKET_WIDTH * bucket spacing
+        self.BUCKET_WIDTH = 0.2  # meters, TODO measure
+        self.REGOLITH_DENSITY = 1500  # kg/m^3 in the bin, only used with the load cells
+        self.load_cell_threshold = 1  # kg, above the starting weight before the load cells are trusted
+
+        self.current_filter = filters.LowPassFilter(self.CURRENT_TIME_CONSTANT)
+        self.stalled = filters.Debounce(self.STALL_TIME)
+        self.reset()
+
+    def reset(self):
+        """
+        Start of an excavation cycle: clears the volume, the jam count and the adaptation
+        """
+
+        self.current_filter.reset()
+        self.stalled.reset()
+        self.state = self.DIGGING
+        self.depth_of_cut = self.target_depth_of_cut
+        self.velocity_pid.reset()
+        self.spun_up = False
+        self.recover_until = 0.0
+        self.jams = 0
+
+        self.estimated_volume = 0.0  # m^3
+        self.start_weight: float = None
+        self.weight_volume: float = None  # m^3, from the load cells once they show a load
+        self.feed = 0.0
+        self.stamp: float = None
+
+    @property
+    def failed(self) -> bool:
+        return self.jams >= self.MAX_JAMS
+
+    @property
+    def volume(self) -> float:
+        """
+        Excavated volume (m^3), from the load cells if they show the bin filling, else estimated from the feed
+        """
+
+        if self.weight_volume is not None:
+            return self.weight_volume
+        return self.estimated_volume
+
+    def update(self, velocity: float, current: float, stamp: float, weights: 'list[float]' = None, max_feed: float = None) -> tuple:
+        """
+        velocity: bucket speed (rad/s), current: excavation current, stamp: ROS time of the sensor reading,
+        max_feed: how fast the feed can go (m/s). Returns (excavation effort, feed rate)
+        """
+
+        dt = stamp - self.stamp if self.stamp is not None else 0.0
+        self.stamp = stamp
+        current = self.current_filter.update(abs(current), stamp)
+        cutting = current > self.FREE_CURRENT
+
+        # Volume, from what was fed since the last reading
+        if cutting and self.feed > 0:
+            self.estimated_volume += self.feed * dt * self.bucket_spacing * self.BUCKET_WIDTH
+        if weights:
+            if self.start_weight is None:
+                self.start_weight = sum(weights)
+            gained = sum(weights) - self.start_weight
+            if self.weight_volume is not None or gained > self.load_cell_threshold:
+                self.weight_volume = max(gained, 0.0) / self.REGOLITH_DENSITY
+
+        if self.state == self.RECOVERING:
+            if stamp < self.recover_until:
+                return self.REVERSE_EFFORT, self.set_feed(-self.BACK_OFF_SPEED)
+
+            self.state = self.DIGGING
+            self.velocity_pid.reset()
+            self.spun_up = False
+            self.stalled.reset()
+            self.current_filter.reset()
+
+        # Jams
+        if velocity >= self.target_velocity * self.STALL_FRACTION:
+            self.spun_up = True
+        stalled = self.stalled.update(self.spun_up and velocity < self.target_velocity * self.STALL_FRACTION, stamp)
+
+        if current > self.jam_current or stalled:
+            self.jams += 1
+            print("Excavation: jammed (", self.jams, "), spinning backwards")
+            self.state = self.RECOVERING
+            self.recover_until = stamp + self.RECOVERY_TIME
+            self.depth_of_cut = max(self.depth_of_cut / 2, self.MIN_DEPTH_OF_CUT)
+            return self.REVERSE_EFFORT, self.set_feed(-self.BACK_OFF_SPEED)
+
+        # Bucket speed
+        effort = int(self.velocity_pid.update(self.target_velocity - velocity, dt, setpoint=self.target_velocity)[0])
+
+        # Back off the feed between the target and the jam current
+        margin = (self.jam_current - current) / (self.jam_current - self.target_current)
+        margin = min(max(margin, 0.0), 1.0)
+
+        feed = self.depth_of_cut * max(velocity, 0.0) * self.bucket_radius / self.bucket_spacing * margin
+        limited = max_feed is not None and feed > max_feed
+        if limited:
+            feed = max_feed
+
+        # Depth of cut, only adapted while the buckets are in the ground. It can't grow while the feed is at its
+        # limit, the buckets wouldn't cut any deeper.
+        if cutting:
+            change = self.ADAPTATION_RATE * (self.target_current - current) * dt
+            if change < 0 or not limited:
+                self.depth_of_cut = min(max(self.depth_of_cut + change, self.MIN_DEPTH_OF_CUT), self.MAX_DEPTH_OF_CUT)
+
+        return effort, self.set_feed(feed)
+
+    def set_feed(self, feed: float) -> float:
+        self.feed = feed
+        return feed
@@ -0,0 +1,112 @@
+import math
+
+'''
+Small filters for noisy sensor values (currents, load cells), and the detectors built on them that modules use to
+decide when they're done instead of running for a fixed time. Samples are timestamped (ROS seconds), since sensor
+messages don't arrive at a perfectly regular rate.
+'''
+
+class LowPassFilter:
+    '''
+    First order low-pass filter (exponential moving average), weighting each sample by the time since the last one
+    '''
+
+    def __init__(self, time_constant: float):
+        self.time_constant = time_constant
+        self.value: float = None
+        self.stamp: float = None
+
+    def reset(self):
+        self.value = None
+        self.stamp = None
+
+    def update(self, value: float, stamp: float) -> float:
+        if self.value is None:
+            self.value = value
+        else:
+            dt = max(stamp - self.stamp, 0.0)
+            alpha = 1 - math.exp(-dt / self.time_constant) if self.time_constant > 0 else 1.0
+            self.value += alpha * (value - self.value)
+
+        self.stamp = stamp
+        return self.value
+
+
+class Debounce:
+    '''
+    Becomes true once a condition has held for hold_time seconds in a row
+    '''
+
+    def __init__(self, hold_time: float):
+        self.hold_time = hold_time
+        self.since: float = None
+
+    def reset(self):
+        self.since = None
+
+    def update(self, condition: bool, stamp: float) -> bool:
+        if not condition:
+            self.since = None
+            return False
+
+        if self.since is None:
+            self.since = stamp
+        return stamp - self.since >= self.hold_time
+
+
+class EndOfTravelDetector:
+    '''
+    Linear actuators draw current while moving, and nothing once a limit switch stops them at the end of travel.
+    Done when the filtered current went above moving_current, then stayed below stopped_current for hold_time.
+
+    It never triggers if the current never rose (already at the end, or no current reading), callers keep their time limit.
+    Pass commanded=False while the actuators are stopped or driven too slowly to draw current.
+    '''
+
+    def __init__(self, moving_current: float, stopped_current: float, hold_time: float, time_constant: float):
+        self.moving_current = moving_current
+        self.stopped_current = stopped_current
+        self.filter = LowPassFilter(time_constant)
+        self.stopped = Debounce(hold_time)
+        self.moving = False
+
+    def update(self, current: float, stamp: float, commanded: bool = True) -> bool:
+        current = self.filter.update(abs(current), stamp)
+
+        if not commanded:
+            self.stopped.reset()
+            return False
+
+        if current > self.moving_current:
+            self.moving = True
+
+        return self.stopped.update(self.moving and current < self.stopped_current, stamp)
+
+
+class BinEmptyDetector:
+    '''
+    Done when the filtered load cell weight stays below empty_weight for hold_time. If the load cells never showed
+    a load (missing, or the bin was empty to begin with), the auger current is used instead: spinning empty, it
+    stays below empty_current.
+    '''
+
+    def __init__(self, empty_weight: float, empty_current: float, hold_time: float, time_constant: float):
+        self.empty_weight = empty_weight
+        self.empty_current = empty_current
+        self.weight_filter = LowPassFilter(time_constant)
+        self.current_filter = LowPassFilter(time_constant)
+        self.empty = Debounce(hold_time)
+        self.has_weight = False
+
+    def update(self, weights: 'list[float]', current: float, stamp: float) -> bool:
+        current = self.current_filter.update(abs(current), stamp)
+
+        if weights:
+            weight = self.weight_filter.update(sum(weights), stamp)
+            if weight > self.empty_weight:
+                self.has_weight = True
+
+        if self.has_weight:
+            return self.empty.update(self.weight_filter.value < self.empty_weight, stamp)
+
+        return self.empty.update(current < self.empty_current, stamp)
@@ -1,12 +1,15 @@
 import rospy
 from geometry_msgs.msg import Twist, PoseStamped
-from apriltag_ros.msg import AprilTagDetectionArray, AprilTagDetection
-import tf2_ros
-import tf2_geometry_msgs
+from nav_msgs.msg import Odometry
+from tf.transformations import euler_from_quaternion
 
+import math
+
+import apriltag_tracker
 import interrupts
+import tag_search
+from events import Events, bus
 
-import time
 
 '''
 Called init_mapping in the concept of operations, this is the first behavior state- spinning until an apriltag is found
@@ -14,20 +17,18 @@ and then reporting back on the estimated locations of the mining zone and berm z
 '''
 class FindAprilTag:
 
-    def apriltag_callback(self, msg: AprilTagDetectionArray):
-        self.apriltag_detections = msg;
-        #print(len(msg.detections))
-        if len(msg.detections) > 0:
-            #xprint(self.found_apriltag)
-            detection = msg.detections[0]
-            frameid = detection.pose.header.frame_id
-
-            if (not self.is_sim and frameid != "d455_back_color_optical_frame"): # only use front camera
-                print("wrong camera")
-                #return
+    def apriltag_callback(self, target, estimate: apriltag_tracker.TagEstimate):
+        # The first target seen is the start tag, the tracker keeps filtering it while the robot stops
+        if self.target is None:
+            self.target = target
+            bus.post(Events.APRILTAG, estimate)
 
+        if target == self.target:
             self.found_apriltag = True
 
+    def odom_callback(self, msg: Odometry):
+        self.odom = msg
+
 
     def __init__(self, velocity_publisher: rospy.Publisher = None):
         """
@@ -42,7 +43,7 @@ class FindAprilTag:
             self.velocity_publisher = velocity_publisher
 
         self.found_apriltag = False
-        self.apriltag_detections = AprilTagDetectionArray()
+        self.target = None
 
         self.is_sim = rospy.get_param("/is_sim")
         if self.is_sim:
@@ -50,25 +51,62 @@ class FindAprilTag:
         else:
             cam_topic = "/d455_back/camera/color/tag_detections"
         #print(cam_topic)
-        rospy.Subscriber(cam_topic, AprilTagDetectionArray, self.apriltag_callback)
+        apriltag_tracker.watch(cam_topic)
+        apriltag_tracker.add_listener(self.apriltag_callback)
+
+        self.odom: Odometry = None
+        rospy.Subscriber(rospy.get_param("/odom_topic"), Odometry, self.odom_callback)
 
         self.rate = rospy.Rate(10)  # 10hz
 
+        self.SEARCH_TIME = 45 # seconds, give up if no tags are found
+        self.CONTROL_PERIOD = 0.05 # seconds between search commands
+
+        # Blind, it spins at SPIN_SPEED (rad/s) like it always did. Knowing where the tag was, it turns the camera
+        # (facing backwards) there the shortest way, up to MAX_SPEED, slowing down to SLOW_SPEED near it.
+        self.CAMERA_YAW = math.pi
+        self.SPIN_SPEED = -0.5 #0.261799 # Around 15 degrees
+        self.MAX_SPEED = 1.0
+        self.SLOW_SPEED = 0.3
+
+    def robot_pose(self) -> tuple:
+        """
+        (x, y, yaw) from odometry, None before the first message
+        """
+
+        if self.odom is None:
+            return None
+
+        pose = self.odom.pose.pose
+        yaw = euler_from_quaternion([pose.orientation.x, pose.orientation.y, pose.orientation.z, pose.orientation.w])[2]
+        return pose.position.x, pose.position.y, yaw
+
     def find_apriltag(self):
         """
         Spin in a circle (in the starting zone) until an apriltag is found. Then stop and return.
         """
 
-        # TODO look for the right apriltag bundle
-        
-        time.sleep(0.1)
+        rospy.sleep(0.1)
+
+        # Where it was last seen, if this isn't the first search
+        predicted = None
+        if self.target is not None:
+            last_seen = apriltag_tracker.get_estimate(self.target)
+            predicted = (last_seen.x, last_seen.y)
 
-        start = rospy.get_time()
+        self.found_apriltag = False
+        search = tag_search.TagSearch(self.CAMERA_YAW, self.SPIN_SPEED, self.MAX_SPEED, self.SLOW_SPEED)
+        search.start(self.robot_pose(), predicted)
 
         velocity_message = Twist()
 
+        # Keep turning and searching for apriltags until the detection callback, an interrupt, or the search timer
+        search_timeout = object()
+        timer = bus.start_timer(self.SEARCH_TIME, Events.TIMEOUT, search_timeout)
+
         while True:
             if self.found_apriltag:
+                timer.shutdown()
                 rospy.loginfo("Behavior: found apriltag")
                 velocity_message.linear.x = 0
                 velocity_message.angular.z = 0
@@ -77,47 +115,32 @@ class FindAprilTag:
                     self.velocity_publisher.publish(velocity_message)
                     rospy.sleep(0.25)
 
-                return self.apriltag_detections.detections[0]
+                return apriltag_tracker.get_estimate(self.target)
                 
-            if rospy.get_time() - start >= 45: #no tags for too long
-                break # exit and return false
+            if interrupts.check_for_interrupts() != interrupts.Errors.FINE:
+                timer.shutdown()
+                return "Error"
 
-            # keep turning and searching for april_tags
             velocity_message.linear.x = 0
-            velocity_message.angular.z = -0.5 #0.261799 # Around 15 degrees
+            velocity_message.angular.z = search.angular_velocity(self.robot_pose())
             self.velocity_publisher.publish(velocity_message)
 
-            if interrupts.check_for_interrupts() != interrupts.Errors.FINE:
-                return "Error"
+            event, data = bus.get(Events.APRILTAG, Events.TIMEOUT, Events.INTERRUPT, timeout=self.CONTROL_PERIOD)
+            if event == Events.TIMEOUT and data is search_timeout: #no tags for too long
+                break # exit and return false
 
-            self.rate.sleep()
-            
         velocity_message.linear.x = 0
         velocity_message.angular.z = 0
         self.velocity_publisher.publish(velocity_message)
 
         return None
     
-    def convert_to_odom_frame(self, apriltag_detection: AprilTagDetection):
+    def convert_to_odom_frame(self, apriltag_estimate: apriltag_tracker.TagEstimate):
         """
-        Convert the first apriltag detection to the odom frame
+        The apriltag found in the odom frame, filtered over every detection since (the robot stopped to see it better)
         """
-        tf_buffer = tf2_ros.Buffer()
-        tf_listener = tf2_ros.TransformListener(tf_buffer)
-
-        source_frame = self.apriltag_detections.header.frame_id
-        target_frame = "odom"
-
-        pose = tf2_geometry_msgs.PoseStamped()
-        pose.header = self.apriltag_detections.header
-        pose.pose = apriltag_detection.pose.pose.pose
-
-        # Set the time to 0 to get the latest available transform
-        pose.header.stamp = rospy.Time(0)
-
-        pose_in_odom = tf_buffer.transform(pose, target_frame, rospy.Duration(5.0))
 
-        return pose_in_odom
+        return apriltag_tracker.get_estimate(apriltag_estimate.target).pose
     
     def spin(self):
 
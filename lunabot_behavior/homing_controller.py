@@ -3,28 +3,48 @@
 import numpy as np
 
 import rospy
-from apriltag_ros.msg import AprilTagDetectionArray
 from geometry_msgs.msg import Pose, Twist, PoseStamped
 from nav_msgs.msg import Odometry
-from std_msgs.msg import Header
-import tf2_ros
-import tf2_geometry_msgs
 from tf.transformations import euler_from_quaternion
 
+from lunabot_control.pid import PIDBank
+
+import asyncio
+import apriltag_tracker
 import interrupts
+import tag_search
+from events import Events, bus
+from runtime import runtime
+import transforms
+
+def wrap_angle(angle: float) -> float:
+    return (angle + np.pi) % (2 * np.pi) - np.pi
+
 
 class HomingController:
     """
     This class aligns the robot to the apriltag for deposition
     """
 
-    # How far should the robot be from the apriltag pos / angle
-    linear_setpoint = 0.8
-    angular_setpoint = 0
+    # How far should the camera be from the apriltag
+    linear_setpoint = 0.6
 
     alignment_threshold = 0.1 # in rad, how close to align before stopping
 
-    # Linear, Angular
+    # Docking, polar coordinates control law gains (Astolfi). Strongly stable for K_RHO > 0, K_BETA < 0 and
+    # K_ALPHA + 5/3 K_BETA - 2/pi K_RHO > 0: here 2.0 - 1.333 - 0.382 = 0.285
+    K_RHO = 0.6
+    K_ALPHA = 2.0
+    K_BETA = -0.8
+
+    DOCK_TOLERANCE = 0.05 # m, how close to the docking goal before stopping
+    MIN_DOCK_SPEED = 0.08 # m/s, so the last few centimeters don't take forever
+    DOCK_TIME = 60 # seconds, give up docking (and deposit where the robot is) after this long
+
+    LINEAR_ACCELERATION = 0.5 # m/s^2
+    ANGULAR_ACCELERATION = 2.0 # rad/s^2
+
+    # Aligning to an angle, Linear, Angular. KI and KD are per control period
     KP = np.array([0.0, 5.0])
     KI = np.array([0.0, 0.0])
     KD = np.array([0.0, 0.0])
@@ -72,12 +92,16 @@ class HomingController:
                 self.cam_mode = "front"
                 rospy.loginfo("Homing Controller: Using front cam")
 
-        self.apriltag_subscriber = rospy.Subscriber(cam_topic,  AprilTagDetectionArray, self.apritag_callback)
+        # The berm bundle (or tag id) in lunabot_config/config/apriltags/tags.yaml
+        self.berm_target = rospy.get_param("/behavior/berm_apriltag", "berm")
 
-        self.cmd_vel = Twist()
+        apriltag_tracker.watch(cam_topic)
+        apriltag_tracker.add_listener(self.apritag_callback)
 
-        self.berm_apriltag_position: Pose = None
-        self.berm_apriltag_header: Header = None
+        # Fill the shared tf buffer before homing needs it
+        transforms.start()
+
+        self.cmd_vel = Twist()
 
         odom_topic = rospy.get_param("/odom_topic")
 
@@ -86,170 +110,223 @@ class HomingController:
 
         self.apriltag_publisher = rospy.Publisher("/apriltag_visual", PoseStamped, queue_size=1)
 
-        self.prev_error = np.zeros(2)
-        self.curr_error = np.zeros(2)
-        self.error_total = np.zeros(2)
+        # Control loop period (s), the wait between iterations ends early on interrupts
+        self.CONTROL_PERIOD = 0.05
 
-        self.rate = rospy.Rate(20)
+        # The tracked apriltag stays put in odom while the robot moves, so it's used until it wasn't seen for this long
+        self.LOST_TIME = 3.0 # seconds
 
-    def apritag_callback(self, msg: AprilTagDetectionArray):
-        if len(msg.detections) != 0:
-            
-            frameid = msg.detections[0].pose.header.frame_id
+        # Where the berm apriltag should be (x, y in odom) before it's seen, set once the start apriltag is found
+        self.predicted_apriltag: tuple = None
 
-            if (self.cam_mode == "front" and frameid != "d455_back_color_optical_frame"): #TODO check this!
-                return
-            
-            if (self.cam_mode == "back" and frameid != "usb_cam_link"):  # TODO check this!
-                return
+        # (x, y) in odom from the berm apriltag to the spot to dock in front of, along the berm (see scheduler.py)
+        self.dock_offset = np.zeros(2)
 
-            self.berm_apriltag_position = msg.detections[0].pose.pose.pose
-            self.berm_apriltag_header = msg.detections[0].pose.header
+        self.CAMERA_YAW = np.pi # rad, both back cameras face backwards
 
-            tag_pose_stamped = PoseStamped()
-            tag_pose_stamped.header = self.berm_apriltag_header
-            tag_pose_stamped.pose = self.berm_apriltag_position
-            self.apriltag_publisher.publish(tag_pose_stamped)
+    def apritag_callback(self, target, estimate: apriltag_tracker.TagEstimate):
+        if target != self.berm_target:
+            return
 
-        else:
-            self.berm_apriltag_position = None
+        bus.notify(Events.APRILTAG)
 
-    def odom_callback(self, msg: Odometry):
-        self.odom = msg
+        self.apriltag_publisher.publish(estimate.pose)
 
-    def spin_until_apriltag(self):
+    def berm_apriltag_estimate(self) -> apriltag_tracker.TagEstimate:
+        """
+        The filtered berm apriltag, None if it wasn't seen for LOST_TIME
+        """
 
-        # TODO look for the right apriltag bundle
+        return apriltag_tracker.get_estimate(self.berm_target, self.LOST_TIME)
 
-        self.cmd_vel.angular.z = 0.785398 # around 45 degrees per second
+    def odom_callback(self, msg: Odometry):
+        self.odom = msg
+        bus.notify(Events.ODOM)
 
-        if self.cam_mode == "sim":
-            self.cmd_vel.angular.z = 0.392699 # around 22.5 degrees per second this needs to be slower
+    def robot_pose(self) -> tuple:
+        """
+        (x, y, yaw) from odometry, None before the first message
+        """
 
-        while self.berm_apriltag_position is None:
-            self.cmd_vel_publisher.publish(self.cmd_vel)
-            rospy.sleep(0.1)
+        if self.odom is None:
+            return None
 
-        self.stop()
+        pose = self.odom.pose.pose
+        yaw = euler_from_quaternion([pose.orientation.x, pose.orientation.y, pose.orientation.z, pose.orientation.w])[2]
+        return pose.position.x, pose.position.y, yaw
 
-    def home(self):
+    def predict_apriltag(self) -> tuple:
         """
-        Align the robot to the apriltag
+        (x, y) in odom where the berm apriltag should be: where it was last seen, else where the start apriltag puts it
         """
-        
-        self.spin_until_apriltag()
 
-        while (True):
+        last_seen = apriltag_tracker.get_estimate(self.berm_target)
+        if last_seen is not None:
+            return last_seen.x, last_seen.y
+        return self.predicted_apriltag
 
-            if interrupts.check_for_interrupts() != interrupts.Errors.FINE:
-                return False
+    async def spin_until_apriltag(self):
 
-            tf_buffer = tf2_ros.Buffer()
-            tf_listener = tf2_ros.TransformListener(tf_buffer)
+        # Turn towards where the tag should be, then sweep around it, and spin if it isn't there
+        if self.cam_mode == "sim":
+            search = tag_search.TagSearch(self.CAMERA_YAW, 0.392699, 0.392699, 0.2) # around 22.5 degrees per second this needs to be slower
+        else:
+            search = tag_search.TagSearch(self.CAMERA_YAW, 0.785398, 1.0, 0.3) # around 45 degrees per second
 
-            target_frame = "odom"
+        search.start(self.robot_pose(), self.predict_apriltag())
 
-            pose = tf2_geometry_msgs.PoseStamped()
-            pose.header = self.berm_apriltag_header
-            pose.pose = self.berm_apriltag_position
+        try:
+            while self.berm_apriltag_estimate() is None:
+                if interrupts.check_for_interrupts() != interrupts.Errors.FINE:
+                    return False
 
-            # Set the time to 0 to get the latest available transform
-            pose.header.stamp = rospy.Time(0)
-            try:
-                pose_in_odom = tf_buffer.transform(pose, target_frame, rospy.Duration(1.0))
-            except AttributeError:
-                continue
+                self.cmd_vel.linear.x = 0
+                self.cmd_vel.angular.z = search.angular_velocity(self.robot_pose())
+                self.cmd_vel_publisher.publish(self.cmd_vel)
 
-            euler_angles = euler_from_quaternion([pose_in_odom.pose.orientation.x, pose_in_odom.pose.orientation.y, pose_in_odom.pose.orientation.z, pose_in_odom.pose.orientation.w])
-            if (self.cam_mode == "back"):
-                apriltag_yaw = euler_angles[2] - np.pi / 2
-            elif (self.cam_mode == "sim"):
-                apriltag_yaw = euler_angles[2] + np.pi / 2 # In sim, adjust the apriltag to point 'out' of the apriltag, by 90 deg
-            elif (self.cam_mode == "front"):
-                apriltag_yaw += np.pi  # TODO check if this is right
+                await runtime.wait_for(Events.APRILTAG, Events.INTERRUPT, timeout=self.CONTROL_PERIOD)
+        finally:
+            self.stop()
 
-            robot_yaw = euler_from_quaternion([self.odom.pose.pose.orientation.x, self.odom.pose.pose.orientation.y, self.odom.pose.pose.orientation.z, self.odom.pose.pose.orientation.w])[2]
+        return True
 
-            angular_error = apriltag_yaw - robot_yaw
-            angular_error = (angular_error + np.pi) % (2 * np.pi) - np.pi
+    def home(self):
+        """
+        Blocking version of home_async
+        """
 
-            print(angular_error)
-            
-            # Stopping point
-            if abs(angular_error) < self.alignment_threshold:
-                self.stop()
-                rospy.loginfo("Homing Controller: Done Homing")
-                break
+        return runtime.run(self.home_async())
 
-            # TODO unused
-            linear_dist = np.sqrt((pose_in_odom.pose.position.x - self.odom.pose.pose.orientation.x) ** 2 + (pose_in_odom.pose.position.y - self.odom.pose.pose.orientation.y) ** 2)
+    async def home_async(self):
+        """
+        Find the apriltag and dock in front of it
+        Runs as a task on the behavior runtime, so it can overlap with other modules.
+        """
+        
+        if not await self.spin_until_apriltag():
+            return False
 
-            self.curr_error = np.array([self.linear_setpoint - linear_dist, angular_error])
+        try:
+            return await self.dock()
+        except asyncio.CancelledError:
+            self.stop()
+            raise
 
-            self.error_total += self.curr_error # add for I
+    def apriltag_heading(self, apriltag: apriltag_tracker.TagEstimate) -> float:
+        """
+        Yaw of the robot facing away from the apriltag (the back cameras facing it)
+        """
 
-            # Computing PID control from error
-            control = self.curr_error * self.KP
-            control += self.error_total * self.KI
-            control += (self.curr_error - self.prev_error) * self.KD
+        if (self.cam_mode == "back"):
+            return apriltag.yaw - np.pi / 2
+        elif (self.cam_mode == "sim"):
+            return apriltag.yaw + np.pi / 2 # In sim, adjust the apriltag to point 'out' of the apriltag, by 90 deg
+        else:
+            return apriltag.yaw + np.pi  # TODO check if this is right
 
-            # Set current error to previous error (for D)
-            self.prev_error = self.curr_error
+    def docking_goal(self, apriltag: apriltag_tracker.TagEstimate) -> tuple:
+        """
+        (x, y, yaw) in odom to dock at: facing away from the apriltag, the camera linear_setpoint in front of it,
+        moved along the berm by dock_offset
+        """
 
-            # Publish the control (and constrain it)
-            cmd_vel_message = Twist()
-            cmd_vel_message.linear.x = 0
-            cmd_vel_message.angular.z = np.clip(control[1]*2, self.angular_limits[0], self.angular_limits[1])
+        heading = self.apriltag_heading(apriltag)
 
-            self.cmd_vel_publisher.publish(cmd_vel_message)
+        # The camera is behind base_link, the robot stops that much further out
+        camera = transforms.lookup_latest("base_link", apriltag.camera_frame)
+        camera_offset = -camera.transform.translation.x if camera is not None else 0.0
 
-            self.rate.sleep()
+        distance = self.linear_setpoint + camera_offset
+        x = apriltag.x + self.dock_offset[0] + distance * np.cos(heading)
+        y = apriltag.y + self.dock_offset[1] + distance * np.sin(heading)
+        return x, y, heading
 
-        return True
-    
-    def approach(self):
+    def docking_control(self, pose: tuple, goal: tuple) -> tuple:
         """
-        Approach the apriltag. After you have homed/ are facing the apriltag, drive in straight line
+        Polar coordinates control law (Astolfi) from pose to goal, both (x, y, yaw). The robot docks backwards, so
+        it's a virtual robot facing the other way that drives forwards, unless the goal is in front of the real one.
+        rho is the distance to the goal, alpha the angle of the goal from the heading, beta the angle between the
+        final heading and the direction to the goal: v = K_RHO rho (at least MIN_DOCK_SPEED), w = K_ALPHA alpha + K_BETA beta.
+        Returns (linear, angular) velocities, without limits.
         """
 
-        DIST_THRESHOLD = 0.6 # meters, how close to the apriltag to stop
-        APPROACH_SPEED = -0.2 # m/s
+        dx, dy = goal[0] - pose[0], goal[1] - pose[1]
+        rho = np.hypot(dx, dy)
+
+        direction = -1
+        heading, goal_heading = pose[2] + np.pi, goal[2] + np.pi
+        bearing = np.arctan2(dy, dx)
+
+        alpha = wrap_angle(bearing - heading)
+        if abs(alpha) > np.pi / 2:
+            direction = 1
+            heading, goal_heading = pose[2], goal[2]
+            alpha = wrap_angle(bearing - heading)
+
+        # Close enough, only the heading is left
+        if rho < self.DOCK_TOLERANCE:
+            return 0.0, self.K_ALPHA * wrap_angle(goal_heading - heading)
+
+        beta = wrap_angle(goal_heading - bearing)
 
-        last_apriltag_position = self.berm_apriltag_position
+        linear = direction * max(self.K_RHO * rho, self.MIN_DOCK_SPEED) * np.cos(alpha)
+        angular = self.K_ALPHA * alpha + self.K_BETA * beta
+        return linear, angular
 
-        missed_apriltag_counter = 0
+    async def dock(self):
+        """
+        Drive to the docking goal in front of the apriltag, correcting the distance, the offset and the heading at
+        the same time, with acceleration and speed limits
+        """
+
+        linear, angular = 0.0, 0.0
+        start = rospy.get_time()
+        stamp = start
 
         while (True):
 
             if interrupts.check_for_interrupts() != interrupts.Errors.FINE:
                 return False
-            
-            if (last_apriltag_position != self.berm_apriltag_position and self.berm_apriltag_position is not None):
-                last_apriltag_position = self.berm_apriltag_position
-            
-            if (self.berm_apriltag_position is None):
-                self.berm_apriltag_position = last_apriltag_position
-                missed_apriltag_counter += 1
-
-                if (missed_apriltag_counter >= 6):
-                    self.stop()
-                    rospy.loginfo("Homing: Early end")
-                    return True
-
-            print("apriltag", self.berm_apriltag_position.position.z)
-            
-            #print(distance_notsquared)
-            if (self.berm_apriltag_position.position.z < DIST_THRESHOLD):
+
+            # Filtered in odom by the tracker, it's still valid while the robot moves away from the last detection
+            apriltag = self.berm_apriltag_estimate()
+            pose = self.robot_pose()
+
+            if apriltag is None or rospy.get_time() - start > self.DOCK_TIME:
                 self.stop()
+                rospy.loginfo("Homing: Early end")
                 return True
 
-            self.cmd_vel.linear.x = APPROACH_SPEED
-            self.cmd_vel.angular.z = 0
+            if pose is None:
+                await runtime.wait_for(Events.ODOM, timeout=self.CONTROL_PERIOD)
+                continue
 
-            self.cmd_vel_publisher.publish(self.cmd_vel)
+            goal = self.docking_goal(apriltag)
+            heading_error = wrap_angle(goal[2] - pose[2])
+            distance = np.hypot(goal[0] - pose[0], goal[1] - pose[1])
 
-            self.rate.sleep()
+            # Stopping point
+            if distance < self.DOCK_TOLERANCE and abs(heading_error) < self.alignment_threshold:
+                self.stop()
+                rospy.loginfo("Homing Controller: Done Homing")
+                return True
+
+            target_linear, target_angular = self.docking_control(pose, goal)
+
+            now = rospy.get_time()
+            dt = max(now - stamp, 0.0)
+            stamp = now
 
+            linear += np.clip(target_linear - linear, -self.LINEAR_ACCELERATION * dt, self.LINEAR_ACCELERATION * dt)
+            angular += np.clip(target_angular - angular, -self.ANGULAR_ACCELERATION * dt, self.ANGULAR_ACCELERATION * dt)
+            linear = np.clip(linear, self.linear_limits[0], self.linear_limits[1])
+            angular = np.clip(angular, self.angular_limits[0], self.angular_limits[1])
+
+            self.cmd_vel.linear.x = linear
+            self.cmd_vel.angular.z = angular
+            self.cmd_vel_publisher.publish(self.cmd_vel)
+
+            await runtime.wait_for(Events.ODOM, timeout=self.CONTROL_PERIOD)
 
     def align_to_angle(self, apriltag_pos_in_odom: Pose, angle: float):
         """
@@ -268,9 +345,13 @@ class HomingController:
         # apply angle
         apriltag_yaw += angle
 
-        local_error_total = np.zeros(2)
-        local_curr_error = np.zeros(2)
-        local_prev_error = np.zeros(2)
+        # The *2 was applied to the control before, TODO why *2
+        pid = PIDBank(
+            2 * self.KP,
+            2 * self.KI / self.CONTROL_PERIOD,
+            2 * self.KD * self.CONTROL_PERIOD,
+            output_limits=(np.array([self.linear_limits[0], self.angular_limits[0]]), np.array([self.linear_limits[1], self.angular_limits[1]])),
+        )
 
         while True:
 
@@ -289,26 +370,17 @@ class HomingController:
                 break
 
 
-            local_curr_error = np.array([0, angular_error])
-
-            local_error_total += local_curr_error # add for I
-
             # Computing PID control from error
-            control = local_curr_error * self.KP
-            control += local_error_total * self.KI
-            control += (local_curr_error - local_prev_error) * self.KD
-
-            # Set current error to previous error (for D)
-            local_prev_error = local_curr_error
+            control = pid.update(np.array([0, angular_error]), self.CONTROL_PERIOD)
 
-            # Publish the control (and constrain it)
+            # Publish the control (constrained by the controller)
             cmd_vel_message = Twist()
             cmd_vel_message.linear.x = 0
-            cmd_vel_message.angular.z = np.clip(control[1]*2, self.angular_limits[0], self.angular_limits[1]) #TODO why *2
+            cmd_vel_message.angular.z = control[1]
  
             self.cmd_vel_publisher.publish(cmd_vel_message)
 
-            self.rate.sleep()
+            bus.wait_for_update(Events.INTERRUPT, timeout=self.CONTROL_PERIOD)
 
 
     def stop(self):
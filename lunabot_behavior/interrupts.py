@@ -1,6 +1,13 @@
 import rospy
 from enum import Enum, auto
 from lunabot_msgs.msg import RobotErrors
+from geometry_msgs.msg import Twist
+from std_msgs.msg import Bool, Int8
+
+import threading
+import time
+
+from events import Events, bus
 
 #TODO: add catastrophic failure state? (manual control)
 class Errors(Enum):
@@ -11,14 +18,168 @@ class Errors(Enum):
     MANUAL_STOP = auto()
 
 
+class CancelToken:
+    '''
+    Cancelled by the next interrupt. Loops can check token.cancelled, or register on_cancel callbacks,
+    instead of polling check_for_interrupts().
+    '''
+
+    def __init__(self):
+        self.cancelled = False
+        self.reason: Errors = None
+        self.callbacks = []
+
+    def on_cancel(self, callback):
+        """
+        Call callback(reason) when cancelled (right away if already cancelled)
+        """
+
+        if self.cancelled:
+            callback(self.reason)
+        else:
+            self.callbacks.append(callback)
+
+    def cancel(self, reason: Errors):
+        if self.cancelled:
+            return
+        self.cancelled = True
+        self.reason = reason
+        for callback in self.callbacks:
+            callback(reason)
+
+
+class LatencyStats:
+    '''
+    Time from receiving an error to each reaction (zero effort published, task cancelled, ...), per stage
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {}  # stage -> [count, total (s), max (s)]
+
+    def record(self, stage: str, seconds: float):
+        with self.lock:
+            count, total, worst = self.stats.get(stage, (0, 0.0, 0.0))
+            self.stats[stage] = (count + 1, total + seconds, max(worst, seconds))
+
+        rospy.loginfo("Interrupts: %s %.2f ms after the error", stage, seconds * 1000)
+
+    def summary(self) -> dict:
+        """
+        stage -> (count, mean (s), max (s))
+        """
+
+        with self.lock:
+            return {stage: (count, total / count, worst) for stage, (count, total, worst) in self.stats.items()}
+
+
 class Interrupts:
+    '''
+    Reacts to /errors as soon as the message arrives: when an error starts, effort is zeroed (for overcurrent and
+    manual stop), registered callbacks run, outstanding cancel tokens are cancelled, and the error is posted on the
+    event bus (which also cancels the tasks running on the behavior runtime).
+    '''
+
     def errors_callback(self, msg: RobotErrors):
+        received = time.perf_counter()
+
+        previous_msg = self.robot_errors
+        previous = self.main()
         self.robot_errors = msg
 
+        # Stop the robot first, independently of which error main() reports first
+        if (msg.overcurrent and not previous_msg.overcurrent) or (msg.manual_stop and not previous_msg.manual_stop):
+            self.zero_effort()
+            self.latency.record("zero effort", time.perf_counter() - received)
+
+        problem = self.main()
+        if problem == previous:
+            return
+
+        if problem == Errors.FINE:
+            # Wake up anything waiting on the event bus when the error clears
+            bus.notify(Events.INTERRUPT)
+            return
+
+        self.interrupt(problem, received)
+
+    def shutdown_callback(self):
+        self.interrupt(Errors.ROS_ENDED, time.perf_counter())
+
+    def interrupt(self, problem: Errors, received: float):
+        self.last_interrupt = (problem, received)
+
+        with self.lock:
+            callbacks = list(self.callbacks.values())
+            tokens, self.tokens = self.tokens, []
+
+        for callback in callbacks:
+            callback(problem)
+        for token in tokens:
+            token.cancel(problem)
+        self.latency.record("callbacks", time.perf_counter() - received)
+
+        # Queue the error for the state machine
+        bus.post(Events.INTERRUPT, problem)
+
     def __init__(self):
         self.robot_errors = RobotErrors()
 
+        self.lock = threading.Lock()
+        self.callbacks = {}
+        self.next_handle = 0
+        self.tokens = []
+
+        self.latency = LatencyStats()
+        self.last_interrupt = (None, None)  # (Errors, time.perf_counter() when received)
+
+        # Shared with the behavior modules (rospy publishers to the same topic in one node are the same connection)
+        self.effort_publishers = [
+            rospy.Publisher(topic, Int8, queue_size=1, latch=True)
+            for topic in ("/lin_act", "/left_drive", "/right_drive", "/excavate", "/deposition")
+        ]
+        self.velocity_publisher = rospy.Publisher("/cmd_vel", Twist, queue_size=1, latch=True)
+        self.traversal_publisher = rospy.Publisher("/behavior/traversal_enabled", Bool, queue_size=1, latch=True)
+
         rospy.Subscriber("/errors", RobotErrors, self.errors_callback)
+        rospy.on_shutdown(self.shutdown_callback)
+
+    def zero_effort(self):
+        self.traversal_publisher.publish(Bool(False))
+        self.velocity_publisher.publish(Twist())
+        for publisher in self.effort_publishers:
+            publisher.publish(Int8(0))
+
+    def register(self, callback) -> int:
+        """
+        Call callback(Errors) from the /errors callback thread whenever an error starts.
+        Returns a handle for unregister.
+        """
+
+        with self.lock:
+            handle = self.next_handle
+            self.next_handle += 1
+            self.callbacks[handle] = callback
+        return handle
+
+    def unregister(self, handle: int):
+        with self.lock:
+            self.callbacks.pop(handle, None)
+
+    def cancel_token(self) -> CancelToken:
+        """
+        A token cancelled by the next error (already cancelled if there is one right now)
+        """
+
+        token = CancelToken()
+        problem = self.main()
+        if problem != Errors.FINE:
+            token.cancel(problem)
+            return token
+
+        with self.lock:
+            self.tokens.append(token)
+        return token
 
     def main(self):
         if self.robot_errors.stuck:
@@ -31,10 +192,38 @@ class Interrupts:
             return Errors.ROS_ENDED
 
         return Errors.FINE
-    
+
 interrupt_class = Interrupts()
 
 def check_for_interrupts():
     # This is done so, in every other module, you can call interrupts.check_for_interrupts()
     # and not every module needs a copy of the class
     return interrupt_class.main()
+
+def get_errors() -> RobotErrors:
+    """
+    The latest /errors message: every error that's set, where check_for_interrupts() only reports the first one
+    """
+
+    return interrupt_class.robot_errors
+
+def register(callback) -> int:
+    return interrupt_class.register(callback)
+
+def unregister(handle: int):
+    interrupt_class.unregister(handle)
+
+def cancel_token() -> CancelToken:
+    return interrupt_class.cancel_token()
+
+def latency_summary() -> dict:
+    return interrupt_class.latency.summary()
+
+def record_latency(stage: str):
+    """
+    Record the time since the last interrupt was received, for reactions that happen elsewhere (e.g. a task ending)
+    """
+
+    problem, received = interrupt_class.last_interrupt
+    if received is not None:
+        interrupt_class.latency.record(stage, time.perf_counter() - received)
@@ -3,6 +3,7 @@ import rospy
 from lunabot_msgs.msg import RobotEffort, RobotSensors
 from std_msgs.msg import Int8
 import interrupts
+import sensor_cache
 
 import time
 
@@ -12,8 +13,9 @@ class Plunge:
     Outdated: Use excavate.py which has plunge/trench
     '''
     
-    def sensors_callback(self, msg: RobotSensors):
-        self.robot_sensors = msg
+    @property
+    def robot_sensors(self) -> RobotSensors:
+        return sensor_cache.get_sensors()
 
     def __init__(self, excavation_publisher: rospy.Publisher = None, lin_act_publisher: rospy.Publisher = None):
         """
@@ -32,10 +34,6 @@ class Plunge:
         else:
             self.lin_act_publisher = lin_act_publisher
 
-        self.robot_sensors = RobotSensors()
-
-        rospy.Subscriber("/sensors", RobotSensors, self.sensors_callback)
-
         self.rate = rospy.Rate(10)
 
         self.exc_stuck = False
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+'''
+Summarises the mission timeline written by profiler.py: a Gantt-style chart of each cycle, time per state
+(waiting vs running), cycles per hour, and regressions against an earlier run.
+
+    python3 profile_report.py ~/.ros/behavior_profile.log             # last run, compared to the one before
+    python3 profile_report.py LOG --run -3 --baseline 0
+    python3 profile_report.py LOG --baseline-log old.log --fail-on-regression
+'''
+
+import argparse
+import collections
+import os
+import sys
+import time
+
+CHART_WIDTH = 50
+
+# Same as profiler.DEFAULT_LOG (not imported, so this runs without ROS)
+DEFAULT_LOG = os.path.join(os.environ.get("ROS_HOME", os.path.expanduser("~/.ros")), "behavior_profile.log")
+
+
+class SpanRecord:
+    def __init__(self, path: str, cycle: int, start: float):
+        self.path = path
+        self.cycle = cycle
+        self.start = start
+        self.duration = None  # None if the run ended inside the span
+        self.sleep = 0.0
+        self.status = "unfinished"
+
+    @property
+    def depth(self) -> int:
+        return self.path.count("/")
+
+    @property
+    def name(self) -> str:
+        return self.path.rsplit("/", 1)[-1]
+
+
+class Run:
+    def __init__(self, start: float, unix_time: float, label: str):
+        self.start = start
+        self.unix_time = unix_time
+        self.label = label
+        self.end = start
+        self.spans = []
+        self.cycle_starts = {0: start}
+        self.interrupts = []  # (time, cycle, error)
+
+    def cycle_bounds(self, cycle: int) -> tuple:
+        """
+        (start, end) of a cycle, end is None if it didn't finish
+        """
+
+        return self.cycle_starts[cycle], self.cycle_starts.get(cycle + 1)
+
+    @property
+    def complete_cycles(self) -> list:
+        return [cycle for cycle in self.cycle_starts if cycle > 0 and cycle + 1 in self.cycle_starts]
+
+    def cycles_per_hour(self) -> float:
+        cycles = self.complete_cycles
+        if not cycles:
+            return 0.0
+        duration = self.cycle_starts[cycles[-1] + 1] - self.cycle_starts[cycles[0]]
+        return len(cycles) / duration * 3600
+
+    def state_stats(self) -> dict:
+        """
+        path -> (count, mean duration, max duration, mean waiting fraction), over the finished spans of complete cycles
+        """
+
+        durations = collections.defaultdict(list)
+        sleeps = collections.defaultdict(float)
+        for span in self.spans:
+            if span.duration is not None and span.cycle in self.complete_cycles:
+                durations[span.path].append(span.duration)
+                sleeps[span.path] += span.sleep
+
+        stats = {}
+        for path, values in durations.items():
+            total = sum(values)
+            stats[path] = (len(values), total / len(values), max(values), sleeps[path] / total if total > 0 else 0.0)
+        return stats
+
+
+def read_runs(path: str) -> list:
+    runs = []
+    open_spans = {}
+
+    with open(path) as file:
+        for line in file:
+            fields = line.split()
+            if len(fields) < 3:
+                continue  # cut short
+
+            kind, stamp, cycle = fields[0], float(fields[1]), int(fields[2])
+
+            if kind == "R":
+                runs.append(Run(stamp, float(fields[3]), fields[4]))
+                open_spans = {}
+                continue
+            if not runs:
+                continue
+
+            run = runs[-1]
+            run.end = max(run.end, stamp)
+
+            if kind == "E":
+                span = SpanRecord(fields[3], cycle, stamp)
+                run.spans.append(span)
+                open_spans[span.path] = span
+            elif kind == "X" and fields[3] in open_spans:
+                span = open_spans.pop(fields[3])
+                span.duration = float(fields[4])
+                span.sleep = float(fields[5])
+                span.status = fields[6]
+            elif kind == "C":
+                run.cycle_starts[cycle] = stamp
+            elif kind == "I":
+                run.interrupts.append((stamp, cycle, fields[3]))
+
+    return runs
+
+
+def describe(index: int, run: Run) -> str:
+    started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(run.unix_time))
+    return "Run %d (%s, %s)" % (index, started, run.label)
+
+
+def print_cycle(run: Run, cycle: int):
+    start, end = run.cycle_bounds(cycle)
+    finished = end is not None
+    if not finished:
+        end = run.end
+    length = max(end - start, 1e-9)
+
+    title = "Startup" if cycle == 0 else "Cycle %d" % cycle
+    print("%s: %.1f s%s" % (title, end - start, "" if finished else " (unfinished)"))
+
+    for span in run.spans:
+        if span.cycle != cycle:
+            continue
+
+        duration = span.duration if span.duration is not None else run.end - span.start
+        offset = int((span.start - start) / length * CHART_WIDTH)
+        width = max(1, int(round(duration / length * CHART_WIDTH)))
+        bar = (" " * offset + "#" * width)[:CHART_WIDTH].ljust(CHART_WIDTH)
+
+        label = ("  " * span.depth + span.name)[:24]
+        waiting = span.sleep / duration * 100 if duration > 0 else 0
+        status = "" if span.status == "ok" else "  " + span.status
+        print("  %-24s |%s| %7.1f s  %3.0f%% waiting%s" % (label, bar, duration, waiting, status))
+
+    for stamp, interrupt_cycle, error in run.interrupts:
+        if interrupt_cycle == cycle and error != "ROS_ENDED":
+            print("  interrupt: %s at %.1f s" % (error, stamp - start))
+
+
+def print_summary(run: Run):
+    cycles = run.complete_cycles
+    print("%d complete cycles, %.1f cycles/hour" % (len(cycles), run.cycles_per_hour()))
+    if not cycles:
+        return
+
+    print("  %-24s %5s %9s %9s %8s" % ("state", "count", "mean (s)", "max (s)", "waiting"))
+    for path, (count, mean, worst, waiting) in sorted(run.state_stats().items()):
+        print("  %-24s %5d %9.1f %9.1f %7.0f%%" % (path, count, mean, worst, waiting * 100))
+
+
+def compare(run: Run, baseline: Run, threshold: float, min_seconds: float) -> list:
+    """
+    Print the change in mean duration of each state against the baseline, return the regressions
+    """
+
+    current_stats = run.state_stats()
+    baseline_stats = baseline.state_stats()
+
+    regressions = []
+    print("  %-24s %9s %9s %8s" % ("state", "base (s)", "now (s)", "change"))
+    for path in sorted(set(current_stats) | set(baseline_stats)):
+        if path not in current_stats or path not in baseline_stats:
+            print("  %-24s %9s %9s" % (path, "-" if path not in baseline_stats else "%.1f" % baseline_stats[path][1],
+                                          "-" if path not in current_stats else "%.1f" % current_stats[path][1]))
+            continue
+
+        before, after = baseline_stats[path][1], current_stats[path][1]
+        change = (after - before) / before if before > 0 else 0.0
+        regressed = change > threshold and after - before > min_seconds
+        if regressed:
+            regressions.append(path)
+        print("  %-24s %9.1f %9.1f %+7.0f%%%s" % (path, before, after, change * 100, "  REGRESSION" if regressed else ""))
+
+    before, after = baseline.cycles_per_hour(), run.cycles_per_hour()
+    if before > 0 and after > 0:
+        regressed = after < before * (1 - threshold)
+        if regressed:
+            regressions.append("cycles/hour")
+        print("  %-24s %9.1f %9.1f %+7.0f%%%s" % ("cycles/hour", before, after, (after - before) / before * 100, "  REGRESSION" if regressed else ""))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report on the behavior mission timeline")
+    parser.add_argument("log", nargs="?", default=DEFAULT_LOG)
+    parser.add_argument("--run", type=int, default=-1, help="index of the run to report on (negative from the end)")
+    parser.add_argument("--baseline", type=int, default=None, help="index of the run to compare to (default: the one before)")
+    parser.add_argument("--baseline-log", help="compare to the last run of another log instead")
+    parser.add_argument("--threshold", type=float, default=0.1, help="slowdown that counts as a regression (fraction)")
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="ignore slowdowns shorter than this")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with 1 if something regressed")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.log):
+        print("No profile log at " + args.log)
+        return 1
+
+    runs = read_runs(args.log)
+    if not runs:
+        print("No runs in " + args.log)
+        return 1
+
+    index = args.run % len(runs)
+    run = runs[index]
+    print(describe(index, run))
+    for cycle in sorted(run.cycle_starts):
+        print_cycle(run, cycle)
+    print()
+    print_summary(run)
+
+    if args.baseline_log:
+        baseline_runs = read_runs(args.baseline_log)
+        baseline, baseline_name = (baseline_runs[-1], args.baseline_log) if baseline_runs else (None, None)
+    elif args.baseline is not None:
+        baseline_index = args.baseline % len(runs)
+        baseline, baseline_name = runs[baseline_index], describe(baseline_index, runs[baseline_index])
+    elif index > 0:
+        baseline, baseline_name = runs[index - 1], describe(index - 1, runs[index - 1])
+    else:
+        baseline = None
+
+    if baseline is None:
+        return 0
+
+    print()
+    print("Compared to " + baseline_name + ":")
+    regressions = compare(run, baseline, args.threshold, args.min_seconds)
+    if regressions and args.fail_on_regression:
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+import rospy
+
+from contextlib import contextmanager
+import os
+import threading
+import time
+
+# Override with the /behavior/profile_log param, an empty string turns profiling off.
+# /behavior/profile_label names the runs (e.g. the commit or the configuration being tried).
+DEFAULT_LOG = os.path.join(os.environ.get("ROS_HOME", os.path.expanduser("~/.ros")), "behavior_profile.log")
+
+
+class Span:
+    '''
+    One visit of a state or sub-step. Paths are nested with "/", e.g. ALIGN/home
+    '''
+
+    def __init__(self, path: str, start: float):
+        self.path = path
+        self.start = start
+        self.sleep = 0.0  # seconds spent waiting inside the span
+        self.interrupted = False
+
+
+class MissionProfiler:
+    '''
+    Timeline of the mission: when each state (and sub-step) starts and ends, how much of it was spent waiting (on the
+    event bus, the runtime or clock.sleep, rospy.sleep isn't counted) instead of running, when each mining cycle
+    starts, and interrupts.
+
+    It's written as it happens, one line per event, to an append-only log that profile_report.py summarises:
+        R <time> <cycle> <unix time> <label>           a new run (behavior started)
+        E <time> <cycle> <path>                        a span starts
+        X <time> <cycle> <path> <duration> <sleep> ok|interrupted
+        C <time> <cycle>                               cycle <cycle> starts (0 is the startup)
+        I <time> <cycle> <error>                       an interrupt
+    Times are ROS times in seconds.
+
+    Only the state machine thread (the one that called start_run) opens spans. Waits count towards its open spans
+    when they happen in that thread, or in the runtime while the state machine blocks on it (see delegate).
+    Overlapping waits are only counted once.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.file = None
+
+        self.owner = None  # the state machine thread
+        self.delegate_thread = None
+        self.stack = []
+        self.cycle = 0
+
+        self.waiting_count = 0
+        self.wait_start = 0.0
+
+    def start_run(self, label: str = ""):
+        path = rospy.get_param("/behavior/profile_log", DEFAULT_LOG)
+        if not path:
+            return
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Line buffered, so the log is complete up to the last event even if the node is killed
+        self.file = open(path, "a", buffering=1)
+        self.owner = threading.get_ident()
+        self.cycle = 0
+        label = label or rospy.get_param("/behavior/profile_label", "")
+        self.write("R", "%.3f" % time.time(), label.replace(" ", "_") or "-")
+
+    def write(self, kind: str, *fields: str):
+        if self.file is None:
+            return
+
+        line = " ".join((kind, "%.3f" % rospy.get_time(), str(self.cycle)) + fields) + "\n"
+        with self.lock:
+            self.file.write(line)
+
+    def in_foreground(self) -> bool:
+        thread = threading.get_ident()
+        return thread == self.owner or thread == self.delegate_thread
+
+    @contextmanager
+    def span(self, name: str):
+        """
+        Time a state or sub-step: with profiler.span("PLUNGE") as span: ...
+        Set span.interrupted if it didn't finish.
+        """
+
+        if self.file is None or threading.get_ident() != self.owner:
+            yield Span(name, 0.0)
+            return
+
+        with self.lock:
+            path = self.stack[-1].path + "/" + name if self.stack else name
+            span = Span(path, rospy.get_time())
+            self.stack.append(span)
+        self.write("E", path)
+
+        try:
+            yield span
+        finally:
+            with self.lock:
+                self.stack.remove(span)
+            duration = rospy.get_time() - span.start
+            self.write("X", path, "%.3f" % duration, "%.3f" % min(span.sleep, duration), "interrupted" if span.interrupted else "ok")
+
+    @contextmanager
+    def waiting(self):
+        """
+        Wrap a wait (on an event, a timeout or a sleep), to count it as sleeping
+        """
+
+        if not self.stack or not self.in_foreground():
+            yield
+            return
+
+        with self.lock:
+            self.waiting_count += 1
+            if self.waiting_count == 1:
+                self.wait_start = rospy.get_time()
+
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.waiting_count -= 1
+                if self.waiting_count == 0:
+                    slept = rospy.get_time() - self.wait_start
+                    for span in self.stack:
+                        span.sleep += slept
+
+    @contextmanager
+    def delegate(self, thread: int):
+        """
+        The state machine is blocked until work in another thread (the runtime's) is done: count the waits in that
+        thread as the state's
+        """
+
+        if threading.get_ident() != self.owner:
+            yield
+            return
+
+        self.delegate_thread = thread
+        try:
+            yield
+        finally:
+            self.delegate_thread = None
+
+    def next_cycle(self):
+        self.cycle += 1
+        self.write("C")
+
+    def mark_interrupt(self, problem):
+        self.write("I", problem.name)
+
+
+profiler = MissionProfiler()
+
+def start_run(label: str = ""):
+    # This is done so, in every other module, you can call profiler.span()
+    # and every module writes to the same timeline
+    profiler.start_run(label)
+
+def span(name: str):
+    return profiler.span(name)
+
+def waiting():
+    return profiler.waiting()
+
+def delegate(thread: int):
+    return profiler.delegate(thread)
+
+def next_cycle():
+    profiler.next_cycle()
+
+def mark_interrupt(problem):
+    profiler.mark_interrupt(problem)
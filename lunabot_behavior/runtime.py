@@ -0,0 +1,111 @@
+import asyncio
+from collections import defaultdict
+import threading
+
+import clock
+import interrupts
+import profiler
+from events import Events, bus
+
+
+class Runtime:
+    '''
+    Cooperative task runtime for the behavior modules. One asyncio event loop runs in a background thread, each
+    module operation is a coroutine running on it as a task, so independent operations (e.g. raising the linear
+    actuators while driving to the berm) can run at the same time.
+
+    Tasks wait on events from the shared event bus instead of sleeping, and every running task is cancelled as soon
+    as an error starts (see interrupts.register). A cancelled task returns False, like a module that noticed an interrupt itself.
+    '''
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="behavior_runtime", daemon=True)
+        self.thread.start()
+
+        # Only touched from the loop thread
+        self.waiters = defaultdict(set)  # Events -> futures waiting for it
+        self.tasks = set()
+
+        bus.add_listener(self.event_listener)
+        interrupts.register(self.interrupt_callback)
+
+    def event_listener(self, event: Events, data):
+        # Called from whichever thread sent the event, hand it over to the loop thread
+        self.loop.call_soon_threadsafe(self.dispatch, event, data)
+
+    def dispatch(self, event: Events, data):
+        for future in self.waiters.pop(event, ()):
+            if not future.done():
+                future.set_result((event, data))
+
+    def interrupt_callback(self, problem: interrupts.Errors):
+        # Called from the /errors callback thread when an error starts, cancel everything that's running
+        self.loop.call_soon_threadsafe(self.cancel_all)
+
+    def cancel_all(self):
+        for task in list(self.tasks):
+            task.cancel()
+
+    async def wait_for(self, *events: Events, timeout: float = None):
+        """
+        Wait until one of the given events is notified or posted.
+        Returns (event, data), or (None, None) on timeout.
+        """
+
+        future = self.loop.create_future()
+        for event in events:
+            self.waiters[event].add(future)
+
+        try:
+            with profiler.waiting():
+                return await asyncio.wait_for(future, clock.to_wall(timeout))
+        except asyncio.TimeoutError:
+            return None, None
+        finally:
+            for event in events:
+                self.waiters[event].discard(future)
+
+    async def guard(self, coroutine, during: interrupts.Errors = None):
+        task = asyncio.current_task()
+        self.tasks.add(task)
+        try:
+            # Don't start anything if there already is a problem (other than the one being recovered from)
+            if interrupts.check_for_interrupts() not in (interrupts.Errors.FINE, during):
+                coroutine.close()
+                return False
+            return await coroutine
+        except asyncio.CancelledError:
+            interrupts.record_latency("task cancelled")
+            return False
+        finally:
+            self.tasks.discard(task)
+
+    def spawn(self, coroutine, during: interrupts.Errors = None):
+        """
+        Start a coroutine on the runtime without waiting for it.
+        Returns a concurrent.futures.Future, result() blocks until the coroutine is done.
+        Recoveries (e.g. escaping when stuck) pass the error they handle as during, to start while it's active.
+        """
+
+        return asyncio.run_coroutine_threadsafe(self.guard(coroutine, during), self.loop)
+
+    def run(self, coroutine, during: interrupts.Errors = None):
+        """
+        Run a coroutine on the runtime and block until it's done. Used for the blocking versions of the modules.
+        """
+
+        return self.join(self.spawn(coroutine, during))
+
+    def join(self, task):
+        """
+        Block until a task started with spawn() is done, and return its result
+        """
+
+        # The caller is only waiting for the task, its time is the task's
+        with profiler.delegate(self.thread.ident):
+            return task.result()
+
+
+# Shared by every module, like interrupts.check_for_interrupts()
+runtime = Runtime()
@@ -0,0 +1,169 @@
+import math
+import numpy as np
+
+from nav_msgs.msg import OccupancyGrid
+
+from lunabot_nav.cost_field import CostField
+from lunabot_nav.global_planner import Map
+
+import zones
+
+'''
+Picks where to dig and where to dump each mining cycle, instead of going back to the same spots every time.
+'''
+
+class DigSiteScheduler:
+    '''
+    The mining zone is split into a grid of dig sites (zones.Zone.candidate_poses), each with the regolith left
+    within reach of the buckets, and the berm zone into dump spots, each with the room left on the berm.
+
+    The next dig site is the one that moves the most regolith per second: what's left there (up to a cycle's worth)
+    over the time of the cycle, CYCLE_TIME plus the drive there and back. Drives are measured along the planner's
+    costmap (cost-to-go field from where the robot is), or in a straight line without a map. The dump spot is the
+    closest one with room left, from the dig site. The robot stops in front of it, then homing docks on the berm
+    apriltag, offset along the berm by dump_offset, so the regolith lands on the chosen spot.
+
+    Dump spots are a row along the berm, DUMP_SPACING apart and at most MAX_DOCK_OFFSET to the side of the berm
+    apriltag, so the back cameras still see it once docked.
+
+    Dug sites are only marked as such once record_dig says how much came out of them, and how far the trench went.
+    '''
+
+    def __init__(self, mining_zone: zones.Zone, berm_zone: zones.Zone, berm_apriltag: 'tuple[float, float]', volume_per_cycle: float, occupancy_threshold: float):
+        # Dig sites are a robot width apart, far enough from the border that the whole robot stays inside
+        self.DIG_SPACING = 0.6  # meters
+        self.DIG_MARGIN = 0.5
+        self.DIG_DEPTH = 0.1  # meters the buckets reach below the surface. TODO find value
+
+        self.DUMP_SPACING = 0.2
+        self.DUMP_MARGIN = 0.4
+        self.MAX_DOCK_OFFSET = 0.4  # meters along the berm from the apriltag. TODO find value
+        self.DUMP_CAPACITY = 0.05  # m^3 of berm per dump spot. TODO find value
+        self.DUMP_STANDOFF = 1.5  # meters out of the berm zone to stop at, before homing on the berm apriltag
+
+        # For the regolith per second estimate
+        self.DRIVE_SPEED = 0.3  # m/s, on average along a path. TODO measure
+        self.CYCLE_TIME = 90  # seconds of a cycle not spent driving (plunge, trench, align, deposit)
+
+        self.volume_per_cycle = volume_per_cycle
+        self.occupancy_threshold = occupancy_threshold
+
+        self.mining_zone = mining_zone
+        self.dig_sites = mining_zone.candidate_poses(self.DIG_SPACING, self.DIG_MARGIN)  # (x, y, yaw)
+        self.remaining = np.full(len(self.dig_sites), self.DIG_SPACING ** 2 * self.DIG_DEPTH)  # m^3
+
+        # Offsets along the berm from the apriltag that keep the robot DUMP_MARGIN inside the berm zone
+        along = np.array([math.cos(berm_zone.heading), math.sin(berm_zone.heading)])
+        extent = berm_zone.corners @ along
+        apriltag = np.dot(berm_apriltag, along)
+        steps = int(self.MAX_DOCK_OFFSET // self.DUMP_SPACING)
+        offsets = self.DUMP_SPACING * np.arange(-steps, steps + 1)
+        offsets = offsets[(apriltag + offsets >= extent.min() + self.DUMP_MARGIN) & (apriltag + offsets <= extent.max() - self.DUMP_MARGIN)]
+        if len(offsets) == 0:
+            offsets = np.zeros(1)
+
+        # (x, y) in odom from the apriltag to each spot, and the spots on the line through the middle of the berm zone
+        self.dump_offsets = offsets[:, None] * along
+        self.dump_sites = np.empty((len(offsets), 3))
+        self.dump_sites[:, :2] = berm_zone.middle + (apriltag + offsets - np.dot(berm_zone.middle, along))[:, None] * along
+        self.dump_sites[:, 2] = berm_zone.heading
+        self.room = np.full(len(self.dump_sites), self.DUMP_CAPACITY)  # m^3
+
+        # Where the robot stops for each dump spot: out of the berm zone, towards the mining zone
+        normal = np.array([-math.sin(berm_zone.heading), math.cos(berm_zone.heading)])
+        if np.dot(np.subtract(mining_zone.middle, berm_zone.middle), normal) < 0:
+            normal = -normal
+        self.dump_goals = self.dump_sites.copy()
+        self.dump_goals[:, :2] += self.DUMP_STANDOFF * normal
+
+        self.dig_index: int = None
+        self.dump_index: int = None
+
+    def travel_costs(self, start: np.ndarray, targets: np.ndarray, map_msg: OccupancyGrid) -> np.ndarray:
+        """
+        Distance (m) to drive from start to each target. One cost-to-go field rooted at start answers for all the
+        targets (moves cost the same both ways). Targets the planner can't reach are inf, and everything falls back
+        to straight lines without a map, or if start itself is blocked.
+        """
+
+        straight = np.linalg.norm(targets[:, :2] - start, axis=1)
+        if map_msg is None:
+            return straight
+
+        costmap = Map(self.occupancy_threshold)
+        costmap.from_msg(map_msg)
+        field = CostField(costmap, start)
+
+        costs = np.array([field.cost_to_go(target[:2]) for target in targets])
+        if np.all(np.isinf(costs)):
+            return straight
+        return costs
+
+    def next_dig_site(self, position: 'tuple[float, float]', map_msg: OccupancyGrid = None) -> np.ndarray:
+        """
+        (x, y, yaw) of the dig site to go to from position (in odom), None once the mining zone is dug out
+        """
+
+        volumes = np.minimum(self.remaining, self.volume_per_cycle)
+        if not np.any(volumes > 0):
+            return None
+
+        costs = self.travel_costs(np.asarray(position, dtype=float), self.dig_sites, map_msg)
+        rates = volumes / (self.CYCLE_TIME + 2 * costs / self.DRIVE_SPEED)  # 0 if unreachable
+
+        self.dig_index = int(np.argmax(rates))
+        if rates[self.dig_index] <= 0:
+            return None
+
+        return self.dig_sites[self.dig_index]
+
+    def next_dump_site(self, position: 'tuple[float, float]', map_msg: OccupancyGrid = None) -> np.ndarray:
+        """
+        (x, y, yaw) to stop at, DUMP_STANDOFF in front of the closest dump spot with room left from position (in odom).
+        The spot with the most room once the berm is full.
+        """
+
+        costs = self.travel_costs(np.asarray(position, dtype=float), self.dump_goals, map_msg)
+        costs = np.where(self.room > 0, costs, np.inf)
+
+        if np.all(np.isinf(costs)):
+            self.dump_index = int(np.argmax(self.room))
+        else:
+            self.dump_index = int(np.argmin(costs))
+
+        return self.dump_goals[self.dump_index]
+
+    def dump_offset(self) -> np.ndarray:
+        """
+        (x, y) in odom from the berm apriltag to the last dump spot, for homing to dock in front of it
+        """
+
+        if self.dump_index is None:
+            return np.zeros(2)
+        return self.dump_offsets[self.dump_index]
+
+    def record_dig(self, volume: float, trench_length: float = 0.0):
+        """
+        volume (m^3) came out of the last dig site, along a trench trench_length long in front of it. It's taken
+        evenly from the dig sites the trench went through.
+        """
+
+        if self.dig_index is None:
+            return
+
+        x, y, yaw = self.dig_sites[self.dig_index]
+        offsets = self.dig_sites[:, :2] - (x, y)
+        along = offsets @ (math.cos(yaw), math.sin(yaw))
+        across = offsets @ (-math.sin(yaw), math.cos(yaw))
+
+        half = self.DIG_SPACING / 2
+        dug = (along > -half) & (along < trench_length + half) & (np.abs(across) < half)
+        self.remaining[dug] = np.maximum(self.remaining[dug] - volume / np.count_nonzero(dug), 0.0)
+
+    def record_dump(self, volume: float):
+        """
+        volume (m^3) was dumped at the last dump spot
+        """
+
+        if self.dump_index is not None:
+            self.room[self.dump_index] = max(self.room[self.dump_index] - volume, 0.0)
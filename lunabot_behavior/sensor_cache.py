@@ -0,0 +1,125 @@
+import rospy
+from lunabot_msgs.msg import RobotSensors
+
+import threading
+
+import filters
+from events import Events, bus
+
+
+class SensorSnapshot:
+    '''
+    One /sensors message (msg), when it was received (stamp, ROS seconds) and how many came before it (seq), with the
+    values derived from it computed once for every module: the currents and velocities low-pass filtered over
+    FILTER_TIME_CONSTANT, and the total load cell weight (None without load cells).
+
+    Modules that filter on their own (the detectors in filters.py, the excavation controller) keep using msg.
+    '''
+
+    def __init__(self, msg: RobotSensors, stamp: float, seq: int, filtered: dict):
+        self.msg = msg
+        self.stamp = stamp
+        self.seq = seq
+
+        self.act_right_curr = filtered["act_right_curr"]
+        self.dep_curr = filtered["dep_curr"]
+        self.exc_curr = filtered["exc_curr"]
+        self.drive_left_curr = filtered["drive_left_curr"]
+        self.drive_right_curr = filtered["drive_right_curr"]
+        self.drive_left_vel = filtered["drive_left_vel"]
+        self.drive_right_vel = filtered["drive_right_vel"]
+        self.exc_vel = filtered["exc_vel"]
+
+        self.load_cell_weight: float = sum(msg.load_cell_weights) if msg.load_cell_weights else None
+
+    def age(self) -> float:
+        """
+        Seconds since the message was received
+        """
+
+        return rospy.get_time() - self.stamp
+
+
+class SensorCache:
+    '''
+    Latest /sensors message, shared by every module instead of each subscribing on its own (every subscriber
+    deserializes every message again). Every new message is turned into a SensorSnapshot once, and wakes up anything
+    waiting for Events.SENSORS on the event bus.
+
+    Before the first message, the snapshot is an empty message received at time 0 (stale, seq 0).
+    '''
+
+    FILTER_TIME_CONSTANT = 0.1  # seconds
+    STALE_TIME = 0.5  # seconds, the embedded side publishes much faster than this. TODO find value
+
+    def sensors_callback(self, msg: RobotSensors):
+        stamp = rospy.get_time()
+
+        with self.lock:
+            filtered = {name: value_filter.update(getattr(msg, name), stamp) for name, value_filter in self.filters.items()}
+            self.snapshot = SensorSnapshot(msg, stamp, self.snapshot.seq + 1, filtered)
+
+        bus.notify(Events.SENSORS)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.filters = {
+            name: filters.LowPassFilter(self.FILTER_TIME_CONSTANT)
+            for name in ("act_right_curr", "dep_curr", "exc_curr", "drive_left_curr", "drive_right_curr", "drive_left_vel", "drive_right_vel", "exc_vel")
+        }
+
+        msg = RobotSensors()
+        self.snapshot = SensorSnapshot(msg, 0.0, 0, {name: getattr(msg, name) for name in self.filters})
+
+        rospy.Subscriber("/sensors", RobotSensors, self.sensors_callback)
+
+    def is_stale(self, max_age: float = None) -> bool:
+        snapshot = self.snapshot
+        return snapshot.seq == 0 or snapshot.age() > (self.STALE_TIME if max_age is None else max_age)
+
+    def wait_for_sample(self, after: int, timeout: float = None) -> SensorSnapshot:
+        """
+        Block until a message newer than seq after arrives. Returns it, or None on timeout (ROS seconds).
+        """
+
+        deadline = None if timeout is None else rospy.get_time() + timeout
+        while self.snapshot.seq <= after:
+            remaining = None if deadline is None else deadline - rospy.get_time()
+            if remaining is not None and remaining <= 0:
+                return None
+            bus.wait_for_update(Events.SENSORS, timeout=remaining)
+        return self.snapshot
+
+    async def next_sample(self, after: int, timeout: float = None) -> SensorSnapshot:
+        """
+        Wait (on the behavior runtime) until a message newer than seq after arrives, an interrupt happens, or
+        timeout. Returns the latest snapshot either way, compare its seq to see if it's new.
+        """
+
+        # Not imported at the top: nodes other than behavior (stuck.py) use the cache too, and importing the runtime
+        # pulls in interrupts, which stops the robot on every error
+        from runtime import runtime
+
+        if self.snapshot.seq <= after:
+            await runtime.wait_for(Events.SENSORS, Events.INTERRUPT, timeout=timeout)
+        return self.snapshot
+
+
+sensor_cache_class = SensorCache()
+
+def get_sensors() -> RobotSensors:
+    # This is done so, in every other module, you can call sensor_cache.get_sensors()
+    # and not every module needs its own subscriber
+    return sensor_cache_class.snapshot.msg
+
+def get_snapshot() -> SensorSnapshot:
+    return sensor_cache_class.snapshot
+
+def is_stale(max_age: float = None) -> bool:
+    return sensor_cache_class.is_stale(max_age)
+
+def wait_for_sample(after: int, timeout: float = None) -> SensorSnapshot:
+    return sensor_cache_class.wait_for_sample(after, timeout)
+
+async def next_sample(after: int, timeout: float = None) -> SensorSnapshot:
+    return await sensor_cache_class.next_sample(after, timeout)
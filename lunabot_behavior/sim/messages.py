@@ -0,0 +1,269 @@
+import math
+import os
+import types
+
+'''
+Stand-ins for the ROS message classes used by the behavior modules (what genpy generates on the robot), built from
+message definitions in the .msg format. lunabot_msgs are read from the repo, the few standard messages that are used
+are defined below (trimmed to the fields that exist upstream, in the same order).
+'''
+
+class Time:
+    '''
+    genpy.Time / rospy.Time stand-in: a point in ROS time, stored in seconds
+    '''
+
+    def __init__(self, secs=0, nsecs=0):
+        self._sec = float(secs) + nsecs * 1e-9
+
+    @classmethod
+    def from_sec(cls, sec: float):
+        return cls(sec)
+
+    def to_sec(self) -> float:
+        return self._sec
+
+    def to_nsec(self) -> int:
+        return int(round(self._sec * 1e9))
+
+    def is_zero(self) -> bool:
+        return self._sec == 0
+
+    @property
+    def secs(self) -> int:
+        return int(math.floor(self._sec))
+
+    @property
+    def nsecs(self) -> int:
+        return int(round((self._sec - self.secs) * 1e9))
+
+    def __add__(self, other: "Duration"):
+        return type(self)(self._sec + other.to_sec())
+
+    def __sub__(self, other):
+        if isinstance(other, Duration):
+            return type(self)(self._sec - other.to_sec())
+        return Duration(self._sec - other.to_sec())
+
+    def __eq__(self, other):
+        return isinstance(other, Time) and self._sec == other._sec
+
+    def __lt__(self, other):
+        return self._sec < other.to_sec()
+
+    def __le__(self, other):
+        return self._sec <= other.to_sec()
+
+    def __gt__(self, other):
+        return self._sec > other.to_sec()
+
+    def __ge__(self, other):
+        return self._sec >= other.to_sec()
+
+    def __hash__(self):
+        return hash(self._sec)
+
+    def __repr__(self):
+        return "%s[%.3f]" % (type(self).__name__, self._sec)
+
+
+class Duration(Time):
+    '''
+    genpy.Duration / rospy.Duration stand-in
+    '''
+
+    def __add__(self, other):
+        if isinstance(other, Duration):
+            return Duration(self._sec + other.to_sec())
+        return type(other)(self._sec + other.to_sec())
+
+    def __sub__(self, other: "Duration"):
+        return Duration(self._sec - other.to_sec())
+
+    def __neg__(self):
+        return Duration(-self._sec)
+
+    def __mul__(self, factor: float):
+        return Duration(self._sec * factor)
+
+    def __eq__(self, other):
+        return isinstance(other, Duration) and self._sec == other._sec
+
+    def __hash__(self):
+        return hash(self._sec)
+
+
+DEFINITIONS = {
+    "std_msgs/Header": "uint32 seq\ntime stamp\nstring frame_id",
+    "std_msgs/Bool": "bool data",
+    "std_msgs/Int8": "int8 data",
+    "std_msgs/Float32": "float32 data",
+    "std_msgs/String": "string data",
+    "geometry_msgs/Point": "float64 x\nfloat64 y\nfloat64 z",
+    "geometry_msgs/Point32": "float32 x\nfloat32 y\nfloat32 z",
+    "geometry_msgs/Vector3": "float64 x\nfloat64 y\nfloat64 z",
+    "geometry_msgs/Quaternion": "float64 x\nfloat64 y\nfloat64 z\nfloat64 w",
+    "geometry_msgs/Pose": "Point position\nQuaternion orientation",
+    "geometry_msgs/PoseStamped": "Header header\nPose pose",
+    "geometry_msgs/PoseWithCovariance": "Pose pose\nfloat64[36] covariance",
+    "geometry_msgs/PoseWithCovarianceStamped": "Header header\nPoseWithCovariance pose",
+    "geometry_msgs/Twist": "Vector3 linear\nVector3 angular",
+    "geometry_msgs/TwistWithCovariance": "Twist twist\nfloat64[36] covariance",
+    "geometry_msgs/Transform": "Vector3 translation\nQuaternion rotation",
+    "geometry_msgs/TransformStamped": "Header header\nstring child_frame_id\nTransform transform",
+    "nav_msgs/Odometry": (
+        "Header header\nstring child_frame_id\n"
+        "geometry_msgs/PoseWithCovariance pose\ngeometry_msgs/TwistWithCovariance twist"
+    ),
+    "nav_msgs/Path": "Header header\ngeometry_msgs/PoseStamped[] poses",
+    "nav_msgs/MapMetaData": "time map_load_time\nfloat32 resolution\nuint32 width\nuint32 height\ngeometry_msgs/Pose origin",
+    "nav_msgs/OccupancyGrid": "Header header\nMapMetaData info\nint8[] data",
+    "apriltag_ros/AprilTagDetection": "int32[] id\nfloat64[] size\ngeometry_msgs/PoseWithCovarianceStamped pose",
+    "apriltag_ros/AprilTagDetectionArray": "Header header\nAprilTagDetection[] detections",
+}
+
+MSG_DIRECTORIES = {
+    "lunabot_msgs": os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "lunabot_msgs", "msg"),
+}
+
+PRIMITIVE_DEFAULTS = {
+    "bool": False,
+    "byte": 0,
+    "char": 0,
+    "int8": 0,
+    "uint8": 0,
+    "int16": 0,
+    "uint16": 0,
+    "int32": 0,
+    "uint32": 0,
+    "int64": 0,
+    "uint64": 0,
+    "float32": 0.0,
+    "float64": 0.0,
+    "string": "",
+}
+
+# package/Name -> message class
+registry = {}
+
+
+def parse_definition(package: str, text: str):
+    """
+    Parse a .msg definition into (fields, constants): fields are (name, type, array_length) in order,
+    array_length is None for scalars and -1 for variable length arrays
+    """
+
+    fields = []
+    constants = {}
+
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+
+        field_type, rest = line.split(None, 1)
+
+        if "=" in rest:
+            name, value = (part.strip() for part in rest.split("=", 1))
+            constants[name] = value if field_type == "string" else type(PRIMITIVE_DEFAULTS[field_type])(value)
+            continue
+
+        array_length = None
+        if field_type.endswith("]"):
+            field_type, length = field_type[:-1].split("[")
+            array_length = int(length) if length else -1
+
+        if field_type == "Header":
+            field_type = "std_msgs/Header"
+        elif field_type not in PRIMITIVE_DEFAULTS and field_type not in ("time", "duration") and "/" not in field_type:
+            field_type = package + "/" + field_type
+
+        fields.append((rest.strip(), field_type, array_length))
+
+    return fields, constants
+
+
+def default_value(field_type: str):
+    if field_type in PRIMITIVE_DEFAULTS:
+        return PRIMITIVE_DEFAULTS[field_type]
+    if field_type == "time":
+        return Time()
+    if field_type == "duration":
+        return Duration()
+    return get_class(field_type)()
+
+
+def make_class(full_name: str, text: str):
+    package, name = full_name.split("/")
+    fields, constants = parse_definition(package, text)
+    slots = [field[0] for field in fields]
+
+    def __init__(self, *args, **kwargs):
+        for (field_name, field_type, array_length), value in zip(fields, args):
+            setattr(self, field_name, value)
+        for field_name, field_type, array_length in fields[len(args):]:
+            if field_name in kwargs:
+                value = kwargs.pop(field_name)
+            elif array_length is None:
+                value = default_value(field_type)
+            elif array_length > 0:
+                value = [default_value(field_type) for _ in range(array_length)]
+            else:
+                value = []
+            setattr(self, field_name, value)
+        if kwargs:
+            raise AttributeError("%s has no field(s) %s" % (full_name, ", ".join(kwargs)))
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, slot) == getattr(other, slot) for slot in slots)
+
+    def __repr__(self):
+        return "%s(%s)" % (name, ", ".join("%s=%r" % (slot, getattr(self, slot)) for slot in slots))
+
+    namespace = dict(constants)
+    namespace.update({
+        "__slots__": slots,
+        "__init__": __init__,
+        "__eq__": __eq__,
+        "__hash__": None,
+        "__repr__": __repr__,
+        "_type": full_name,
+        "_slot_types": [field[1] for field in fields],
+    })
+
+    return type(name, (), namespace)
+
+
+def get_class(full_name: str):
+    if full_name not in registry:
+        package, name = full_name.split("/")
+        if full_name in DEFINITIONS:
+            text = DEFINITIONS[full_name]
+        else:
+            with open(os.path.join(MSG_DIRECTORIES[package], name + ".msg")) as file:
+                text = file.read()
+        registry[full_name] = make_class(full_name, text)
+
+    return registry[full_name]
+
+
+def build_modules() -> dict:
+    """
+    Message modules to put in sys.modules: {"std_msgs": ..., "std_msgs.msg": ..., ...}
+    """
+
+    names = list(DEFINITIONS)
+    for package, directory in MSG_DIRECTORIES.items():
+        names += [package + "/" + file[:-4] for file in sorted(os.listdir(directory)) if file.endswith(".msg")]
+
+    modules = {}
+    for full_name in names:
+        package, name = full_name.split("/")
+        if package not in modules:
+            package_module = types.ModuleType(package)
+            package_module.msg = types.ModuleType(package + ".msg")
+            modules[package] = package_module
+            modules[package + ".msg"] = package_module.msg
+        setattr(modules[package + ".msg"], name, get_class(full_name))
+
+    return modules
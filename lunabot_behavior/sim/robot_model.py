@@ -0,0 +1,463 @@
+import collections
+import math
+import threading
+
+import numpy as np
+
+import rospy
+from geometry_msgs.msg import Twist, PoseStamped
+from nav_msgs.msg import Odometry
+from apriltag_ros.msg import AprilTagDetection, AprilTagDetectionArray
+from lunabot_msgs.msg import RobotSensors, RobotErrors
+from std_msgs.msg import Bool, Int8
+
+import ros_standin
+
+'''
+Kinematic model of the robot in the arena, standing in for Gazebo (or the robot) and for the nodes the behavior
+talks to: it listens to the commands (/cmd_vel, the effort topics, /goal and /behavior/traversal_enabled) and
+publishes /odom, /sensors, /errors, the apriltag detections of both back cameras, and answers tf lookups.
+
+While traversal is enabled it drives straight to /goal, standing in for the planner + MPC.
+'''
+
+WHEEL_BASE = 0.5588  # m, between the left and right wheels
+WHEEL_RADIUS = 0.1397  # m
+MAX_WHEEL_SPEED = 0.6  # m/s
+DRIVE_TIME_CONSTANT = 0.15  # s, first order lag of the wheel speeds
+
+ARENA_SIZE = (6.88, 5.0)  # m, x (from the start wall) and y (from the bottom wall)
+ROBOT_RADIUS = 0.4  # m, how close the middle of the robot gets to a wall
+MINING_ZONE = ((3.78, 2.0), (6.78, 5.0))   # m, corners, where zones.find_mining_zone puts it from the start tag
+
+# Linear actuators, same numbers as excavate.py (19 cm in 27.6 s at 110 power)
+LIN_ACT_TRAVEL = 0.19  # m
+LIN_ACT_MAX_VEL = 0.00688405797  # m/s at LIN_ACT_MAX_POWER
+LIN_ACT_MAX_POWER = 110
+LIN_ACT_CURRENT = 1.5  # A while moving, 0 at either end (limit switches)
+
+# Bucket chain, same numbers as excavate.py. Feeding into the ground (lowering or driving) at feed m/s, each bucket
+# cuts a slice feed * BUCKET_SPACING / (bucket speed * BUCKET_RADIUS) thick: the depth of cut.
+DIG_HEIGHT = 0.10  # m, actuator position below which the buckets are in the ground
+BUCKET_RADIUS = 0.0948  # m
+BUCKET_SPACING = 0.0853  # m
+BUCKET_WIDTH = 0.2  # m
+REGOLITH_DENSITY = 1500.0  # kg/m^3
+MAX_EXCAVATION_VEL = 8.0  # rad/s at 127
+EXCAVATION_TIME_CONSTANT = 0.3  # s
+CUT_CURRENT = 2500.0  # A per m of depth of cut
+STALL_DEPTH_OF_CUT = 0.015  # m, the buckets stop at this depth of cut
+ROCK_CURRENT = 40.0  # A, buckets stopped on a rock
+BIN_CAPACITY = 40.0  # kg
+
+DEPOSITION_RATE = 0.5  # kg/s at 127
+
+PHYSICS_PERIOD = 0.02  # s
+MAX_STEP = 0.05  # s, longer steps are split
+ODOM_PERIOD = 1 / 30
+SENSORS_PERIOD = 1 / 20
+CAMERA_PERIOD = 1 / 10
+ERRORS_PERIOD = 1 / 10
+HISTORY_LENGTH = 10.0  # s of poses kept for tf lookups
+
+ROBOT_ERRORS = ("stuck", "overcurrent", "manual_stop")  # faults reported on /errors, "rock" only jams the buckets
+
+
+def wrap_angle(angle: float) -> float:
+    return (angle + math.pi) % (2 * math.pi) - math.pi
+
+def planar_matrix(x: float, y: float, yaw: float, z: float = 0.0) -> np.ndarray:
+    matrix = np.identity(4)
+    matrix[:2, :2] = [[math.cos(yaw), -math.sin(yaw)], [math.sin(yaw), math.cos(yaw)]]
+    matrix[:3, 3] = [x, y, z]
+    return matrix
+
+def facing_matrix(x: float, y: float, z: float, yaw: float) -> np.ndarray:
+    """
+    Frame with z horizontal at yaw, y down and x to the right (camera optical frames and apriltag frames)
+    """
+
+    matrix = np.identity(4)
+    matrix[:3, 0] = [math.sin(yaw), -math.cos(yaw), 0]
+    matrix[:3, 1] = [0, 0, -1]
+    matrix[:3, 2] = [math.cos(yaw), math.sin(yaw), 0]
+    matrix[:3, 3] = [x, y, z]
+    return matrix
+
+
+class Tag:
+    '''
+    An apriltag on a wall, normal_yaw is the direction it faces (into the arena)
+    '''
+
+    def __init__(self, tag_id: int, x: float, y: float, z: float, normal_yaw: float, size: float = 0.2):
+        self.id = tag_id
+        self.size = size
+        self.position = np.array([x, y, z])
+        self.normal_yaw = normal_yaw
+
+        # apriltag_ros tag frame: z into the tag, x to the right and y down as seen by the camera
+        self.matrix = facing_matrix(x, y, z, normal_yaw + math.pi)
+
+
+class Camera:
+    def __init__(self, topic: str, frame_id: str, x: float, y: float, z: float, yaw: float, fov: float, max_range: float = 6.0):
+        self.topic = topic
+        self.frame_id = frame_id
+        self.fov = fov
+        self.max_range = max_range
+
+        # Optical frame relative to base_link
+        self.mount = facing_matrix(x, y, z, yaw)
+
+
+# Start tag on the start wall, berm tag on the bottom wall under the berm zone (see zones.py). The berm tag is the
+# origin of the berm bundle in lunabot_config/config/apriltags/tags.yaml, what homing looks for
+TAGS = [
+    Tag(0, 0.0, 1.0, 0.5, 0.0),
+    Tag(2, 5.28, 0.0, 0.5, math.pi / 2),
+]
+
+# Both cameras face backwards. The usb camera's detections are in usb_cam_link (what homing_controller expects)
+CAMERAS = [
+    Camera("/d455_back/camera/color/tag_detections", "d455_back_color_optical_frame", -0.35, 0.0, 0.45, math.pi, math.radians(87)),
+    Camera("/usb_cam/tag_detections", "usb_cam_link", -0.35, 0.1, 0.40, math.pi, math.radians(70)),
+]
+
+MAX_TAG_VIEW_ANGLE = math.radians(60)  # tags seen more from the side than this aren't detected
+
+
+class RobotModel:
+    '''
+    Kinematic skid-steer and actuator model. Call start() to run it in the background on the simulated clock.
+    faults is a list of (field of RobotErrors or "rock", start, duration) in seconds since start().
+    '''
+
+    def __init__(self, start_pose: tuple = (1.0, 1.8, -1.0), faults: list = ()):
+        self.lock = threading.Lock()
+
+        # World (arena) frame: x from the start wall, y from the bottom wall. Odometry starts at the start pose.
+        self.x, self.y, self.yaw = start_pose
+        self.world_to_odom = planar_matrix(*start_pose)
+        self.odom_to_world = np.linalg.inv(self.world_to_odom)
+
+        self.left_speed = 0.0  # m/s at the wheels
+        self.right_speed = 0.0
+        self.left_angle = 0.0  # rad
+        self.right_angle = 0.0
+
+        self.lin_act_position = 0.0  # m, 0 is fully lowered
+        self.excavation_vel = 0.0  # rad/s
+        self.excavation_angle = 0.0
+        self.bin_mass = 0.0  # kg
+
+        # Totals, for reports
+        self.mined = 0.0
+        self.deposited = 0.0
+        self.distance = 0.0
+
+        self.faults = list(faults)
+        self.start_time = None
+
+        # Commands
+        self.twist = (0.0, 0.0)
+        self.efforts = {"/lin_act": 0, "/excavate": 0, "/deposition": 0}
+        self.traversal_enabled = False
+        self.goal: PoseStamped = None
+        self.efforts_now = dict(self.efforts)  # what the last step used, for the sensors
+        self.depth_of_cut = 0.0
+        self.on_rock = False
+
+        self.history = collections.deque(maxlen=int(HISTORY_LENGTH / PHYSICS_PERIOD))  # (time, x, y, yaw)
+
+        self.odom_publisher = rospy.Publisher("/odom", Odometry, queue_size=1)
+        self.sensors_publisher = rospy.Publisher("/sensors", RobotSensors, queue_size=1)
+        self.errors_publisher = rospy.Publisher("/errors", RobotErrors, queue_size=1)
+        self.camera_publishers = [rospy.Publisher(camera.topic, AprilTagDetectionArray, queue_size=1) for camera in CAMERAS]
+
+        rospy.Subscriber("/cmd_vel", Twist, self.cmd_vel_callback)
+        for topic in self.efforts:
+            rospy.Subscriber(topic, Int8, self.effort_callback, callback_args=topic)
+        rospy.Subscriber("/behavior/traversal_enabled", Bool, self.traversal_callback)
+        rospy.Subscriber("/goal", PoseStamped, self.goal_callback)
+
+        ros_standin.set_transform_provider(self.lookup)
+
+    # Commands
+
+    def cmd_vel_callback(self, msg: Twist):
+        with self.lock:
+            self.twist = (msg.linear.x, msg.angular.z)
+
+    def effort_callback(self, msg: Int8, topic: str):
+        with self.lock:
+            self.efforts[topic] = msg.data
+
+    def traversal_callback(self, msg: Bool):
+        with self.lock:
+            if self.traversal_enabled and not msg.data:
+                self.twist = (0.0, 0.0)  # the MPC stops the robot when disabled
+            self.traversal_enabled = msg.data
+
+    def goal_callback(self, msg: PoseStamped):
+        with self.lock:
+            self.goal = msg
+
+    def autopilot(self) -> tuple:
+        """
+        (linear, angular) velocity towards the goal: turn towards it, then drive while steering
+        """
+
+        goal = self.world_to_odom @ np.array([self.goal.pose.position.x, self.goal.pose.position.y, 0, 1])
+        dx, dy = goal[0] - self.x, goal[1] - self.y
+        if math.hypot(dx, dy) < 0.2:
+            return 0.0, 0.0
+
+        heading_error = wrap_angle(math.atan2(dy, dx) - self.yaw)
+        angular = float(np.clip(1.5 * heading_error, -0.8, 0.8))
+        linear = 0.4 * math.cos(heading_error) ** 2 if abs(heading_error) < math.pi / 3 else 0.0
+        return linear, angular
+
+    def active_faults(self, now: float) -> set:
+        if self.start_time is None:
+            return set()
+        elapsed = now - self.start_time
+        return {name for name, start, duration in self.faults if start <= elapsed < start + duration}
+
+    # Physics
+
+    def step(self, dt: float, faults: set):
+        with self.lock:
+            if self.traversal_enabled and self.goal is not None:
+                linear, angular = self.autopilot()
+            else:
+                linear, angular = self.twist
+            efforts = dict(self.efforts)
+
+        # Drivetrain
+        left_target = np.clip(linear - angular * WHEEL_BASE / 2, -MAX_WHEEL_SPEED, MAX_WHEEL_SPEED)
+        right_target = np.clip(linear + angular * WHEEL_BASE / 2, -MAX_WHEEL_SPEED, MAX_WHEEL_SPEED)
+        blend = 1 - math.exp(-dt / DRIVE_TIME_CONSTANT)
+        self.left_speed += (left_target - self.left_speed) * blend
+        self.right_speed += (right_target - self.right_speed) * blend
+        self.left_angle += self.left_speed / WHEEL_RADIUS * dt
+        self.right_angle += self.right_speed / WHEEL_RADIUS * dt
+
+        speed = 0.0
+        if "stuck" not in faults:  # wheels spin in place while stuck
+            speed = (self.left_speed + self.right_speed) / 2
+            yaw_rate = (self.right_speed - self.left_speed) / WHEEL_BASE
+            heading = self.yaw + yaw_rate * dt / 2
+            x = self.x + speed * math.cos(heading) * dt
+            y = self.y + speed * math.sin(heading) * dt
+            self.yaw = wrap_angle(self.yaw + yaw_rate * dt)
+
+            # Walls
+            x = min(max(x, ROBOT_RADIUS), ARENA_SIZE[0] - ROBOT_RADIUS)
+            y = min(max(y, ROBOT_RADIUS), ARENA_SIZE[1] - ROBOT_RADIUS)
+            self.distance += math.hypot(x - self.x, y - self.y)
+            self.x, self.y = x, y
+
+        # Linear actuators
+        position = self.lin_act_position
+        self.lin_act_position += efforts["/lin_act"] / LIN_ACT_MAX_POWER * LIN_ACT_MAX_VEL * dt
+        self.lin_act_position = min(max(self.lin_act_position, 0.0), LIN_ACT_TRAVEL)
+
+        # Excavation, digs when the buckets are in the ground, spinning forward and fed into it
+        feed = 0.0
+        if self.lin_act_position < DIG_HEIGHT:
+            feed = max(position - self.lin_act_position, 0.0) / dt + max(speed, 0.0)
+        tip_speed = max(self.excavation_vel, 0.0) * BUCKET_RADIUS
+        depth_of_cut = min(feed * BUCKET_SPACING / tip_speed, STALL_DEPTH_OF_CUT) if tip_speed > 0.01 else 0.0
+        self.on_rock = "rock" in faults and self.lin_act_position < DIG_HEIGHT
+
+        target_vel = efforts["/excavate"] / 127 * MAX_EXCAVATION_VEL
+        if target_vel > 0:  # slowed down by the load, stopped by a rock
+            target_vel *= 0.0 if self.on_rock else 1 - depth_of_cut / STALL_DEPTH_OF_CUT
+        self.excavation_vel += (target_vel - self.excavation_vel) * (1 - math.exp(-dt / EXCAVATION_TIME_CONSTANT))
+        self.excavation_angle += self.excavation_vel * dt
+
+        volume = depth_of_cut * BUCKET_WIDTH * tip_speed * dt
+        dug = min(volume * REGOLITH_DENSITY, BIN_CAPACITY - self.bin_mass)
+        self.bin_mass += dug
+        self.mined += dug
+
+        # Deposition
+        dumped = min(abs(efforts["/deposition"]) / 127 * DEPOSITION_RATE * dt, self.bin_mass)
+        self.bin_mass -= dumped
+        self.deposited += dumped
+
+        self.efforts_now = efforts
+        self.depth_of_cut = depth_of_cut
+
+    # Transforms
+
+    def base_pose(self, stamp: float) -> tuple:
+        """
+        (x, y, yaw, stamp) of base_link in the world at stamp (latest if None), interpolated
+        """
+
+        with self.lock:
+            history = list(self.history)
+
+        if not history:
+            raise ros_standin.LookupException("base_link has no pose yet")
+
+        latest, x, y, yaw = history[-1]
+        if stamp is None:
+            return x, y, yaw, latest
+
+        if stamp < history[0][0] or stamp > history[-1][0] + PHYSICS_PERIOD:
+            raise ros_standin.ExtrapolationException(
+                "lookup at %.3f, poses from %.3f to %.3f" % (stamp, history[0][0], history[-1][0])
+            )
+
+        for (t0, x0, y0, yaw0), (t1, x1, y1, yaw1) in zip(reversed(history[:-1]), reversed(history)):
+            if t0 <= stamp:
+                fraction = 0.0 if t1 == t0 else min((stamp - t0) / (t1 - t0), 1.0)
+                yaw = yaw0 + wrap_angle(yaw1 - yaw0) * fraction
+                return x0 + (x1 - x0) * fraction, y0 + (y1 - y0) * fraction, yaw, stamp
+
+        return x, y, yaw, latest
+
+    def frame_in_world(self, frame: str, stamp: float) -> tuple:
+        if frame in ("odom", "map"):
+            return self.world_to_odom, stamp
+
+        x, y, yaw, stamp = self.base_pose(stamp)
+        base = planar_matrix(x, y, yaw)
+        if frame == "base_link":
+            return base, stamp
+        for camera in CAMERAS:
+            if frame == camera.frame_id:
+                return base @ camera.mount, stamp
+
+        raise ros_standin.LookupException('"%s" passed to lookupTransform argument does not exist' % frame)
+
+    def lookup(self, target_frame: str, source_frame: str, stamp: float) -> tuple:
+        # Static frames have no stamp of their own, use the other one's
+        source, source_stamp = self.frame_in_world(source_frame, stamp)
+        target, target_stamp = self.frame_in_world(target_frame, stamp)
+        if source_stamp is None:
+            source_stamp = target_stamp if target_stamp is not None else rospy.get_time()
+        return np.linalg.inv(target) @ source, source_stamp
+
+    # Sensors
+
+    def publish_odom(self, now: rospy.Time):
+        pose = self.odom_to_world @ planar_matrix(self.x, self.y, self.yaw)
+
+        msg = Odometry()
+        msg.header.stamp = now
+        msg.header.frame_id = "odom"
+        msg.child_frame_id = "base_link"
+        ros_standin.set_pose(msg.pose.pose, pose)
+        msg.twist.twist.linear.x = (self.left_speed + self.right_speed) / 2
+        msg.twist.twist.angular.z = (self.right_speed - self.left_speed) / WHEEL_BASE
+        self.odom_publisher.publish(msg)
+
+    def publish_sensors(self, now: rospy.Time):
+        efforts = self.efforts_now
+        moving = efforts["/lin_act"] > 0 and self.lin_act_position < LIN_ACT_TRAVEL or efforts["/lin_act"] < 0 and self.lin_act_position > 0
+
+        msg = RobotSensors()
+        msg.act_right_curr = LIN_ACT_CURRENT if moving else 0.0
+        if self.on_rock and efforts["/excavate"] > 0:
+            msg.exc_curr = ROCK_CURRENT
+        else:
+            msg.exc_curr = (2.0 + 3.0 * abs(self.excavation_vel) / MAX_EXCAVATION_VEL + CUT_CURRENT * self.depth_of_cut) * (abs(self.excavation_vel) > 0.05)
+        msg.dep_curr = 1.5 + 0.15 * self.bin_mass if efforts["/deposition"] != 0 else 0.0
+        msg.drive_left_curr = 1.0 + 4.0 * abs(self.left_speed)
+        msg.drive_right_curr = 1.0 + 4.0 * abs(self.right_speed)
+        msg.drive_left_ang = self.left_angle
+        msg.drive_right_ang = self.right_angle
+        msg.drive_left_vel = self.left_speed / WHEEL_RADIUS
+        msg.drive_right_vel = self.right_speed / WHEEL_RADIUS
+        msg.exc_ang = self.excavation_angle
+        msg.exc_vel = self.excavation_vel
+        msg.load_cell_weights = [self.bin_mass / 2, self.bin_mass / 2]
+        self.sensors_publisher.publish(msg)
+
+    def publish_errors(self, faults: set):
+        msg = RobotErrors()
+        for name in faults & set(ROBOT_ERRORS):
+            setattr(msg, name, True)
+        self.errors_publisher.publish(msg)
+
+    def publish_detections(self, now: rospy.Time):
+        base = planar_matrix(self.x, self.y, self.yaw)
+
+        for camera, publisher in zip(CAMERAS, self.camera_publishers):
+            camera_in_world = base @ camera.mount
+            world_to_camera = np.linalg.inv(camera_in_world)
+
+            msg = AprilTagDetectionArray()
+            msg.header.stamp = now
+            msg.header.frame_id = camera.frame_id
+
+            for tag in TAGS:
+                in_camera = world_to_camera @ tag.matrix
+                x, y, z = in_camera[:3, 3]
+                if z < 0.2 or math.hypot(x, y, z) > camera.max_range or abs(math.atan2(x, z)) > camera.fov / 2:
+                    continue
+
+                to_camera = camera_in_world[:2, 3] - tag.position[:2]
+                if abs(wrap_angle(math.atan2(to_camera[1], to_camera[0]) - tag.normal_yaw)) > MAX_TAG_VIEW_ANGLE:
+                    continue
+
+                detection = AprilTagDetection()
+                detection.id = [tag.id]
+                detection.size = [tag.size]
+                detection.pose.header = msg.header
+                ros_standin.set_pose(detection.pose.pose.pose, in_camera)
+                msg.detections.append(detection)
+
+            publisher.publish(msg)
+
+    # Loop
+
+    def run(self):
+        now = rospy.get_time()
+        self.start_time = now
+        last = now
+        next_publish = {"odom": now, "sensors": now, "camera": now, "errors": now}
+        periods = {"odom": ODOM_PERIOD, "sensors": SENSORS_PERIOD, "camera": CAMERA_PERIOD, "errors": ERRORS_PERIOD}
+
+        while not rospy.is_shutdown():
+            now = rospy.get_time()
+            faults = self.active_faults(now)
+
+            dt = now - last
+            while dt > 1e-9:
+                step = min(dt, MAX_STEP)
+                self.step(step, faults)
+                dt -= step
+            last = now
+
+            with self.lock:
+                self.history.append((now, self.x, self.y, self.yaw))
+
+            stamp = rospy.Time(now)
+            due = [name for name, time in next_publish.items() if now >= time]
+            for name in due:
+                next_publish[name] += periods[name] * max(1, math.ceil((now - next_publish[name]) / periods[name]))
+
+            if "odom" in due:
+                self.publish_odom(stamp)
+            if "sensors" in due:
+                self.publish_sensors(stamp)
+            if "camera" in due:
+                self.publish_detections(stamp)
+            if "errors" in due:
+                self.publish_errors(faults)
+
+            rospy.sleep(PHYSICS_PERIOD)
+
+    def start(self) -> threading.Thread:
+        # Initial odometry and tf before anything needs them
+        with self.lock:
+            self.history.append((rospy.get_time(), self.x, self.y, self.yaw))
+
+        thread = threading.Thread(target=self.run, name="robot_model", daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,219 @@
+import math
+import sys
+import types
+
+import numpy as np
+
+import messages
+import rospy_standin
+
+'''
+Installs the ROS stand-ins (rospy, message packages, tf.transformations, tf2_ros, tf2_geometry_msgs) in sys.modules,
+so the behavior modules import them unmodified. Must be called before importing any of them.
+
+tf lookups are answered by a transform provider (the robot model, see set_transform_provider) instead of /tf.
+'''
+
+# Quaternions are [x, y, z, w] like tf.transformations, only the static xyz axes convention is supported
+
+def quaternion_from_euler(ai: float, aj: float, ak: float, axes: str = "sxyz") -> np.ndarray:
+    assert axes == "sxyz"
+    ci, si = math.cos(ai / 2), math.sin(ai / 2)
+    cj, sj = math.cos(aj / 2), math.sin(aj / 2)
+    ck, sk = math.cos(ak / 2), math.sin(ak / 2)
+
+    return np.array([
+        si * cj * ck - ci * sj * sk,
+        ci * sj * ck + si * cj * sk,
+        ci * cj * sk - si * sj * ck,
+        ci * cj * ck + si * sj * sk,
+    ])
+
+def euler_from_quaternion(quaternion, axes: str = "sxyz") -> tuple:
+    return euler_from_matrix(quaternion_matrix(quaternion), axes)
+
+def euler_from_matrix(matrix, axes: str = "sxyz") -> tuple:
+    assert axes == "sxyz"
+    cy = math.hypot(matrix[0][0], matrix[1][0])
+    if cy > 1e-9:
+        return (math.atan2(matrix[2][1], matrix[2][2]), math.atan2(-matrix[2][0], cy), math.atan2(matrix[1][0], matrix[0][0]))
+    return (math.atan2(-matrix[1][2], matrix[1][1]), math.atan2(-matrix[2][0], cy), 0.0)
+
+def quaternion_matrix(quaternion) -> np.ndarray:
+    """
+    4x4 homogeneous rotation matrix
+    """
+
+    q = np.array(quaternion, dtype=float)
+    n = np.dot(q, q)
+    matrix = np.identity(4)
+    if n < 1e-12:
+        return matrix
+
+    x, y, z, w = q * math.sqrt(2.0 / n)
+    matrix[:3, :3] = [
+        [1 - y * y - z * z, x * y - z * w, x * z + y * w],
+        [x * y + z * w, 1 - x * x - z * z, y * z - x * w],
+        [x * z - y * w, y * z + x * w, 1 - x * x - y * y],
+    ]
+    return matrix
+
+def quaternion_from_matrix(matrix) -> np.ndarray:
+    m = np.array(matrix, dtype=float)[:3, :3]
+    trace = np.trace(m)
+
+    if trace > 0:
+        s = 2 * math.sqrt(trace + 1)
+        q = [(m[2, 1] - m[1, 2]) / s, (m[0, 2] - m[2, 0]) / s, (m[1, 0] - m[0, 1]) / s, s / 4]
+    else:
+        i = int(np.argmax(np.diagonal(m)))
+        j, k = (i + 1) % 3, (i + 2) % 3
+        s = 2 * math.sqrt(1 + m[i, i] - m[j, j] - m[k, k])
+        q = [0.0] * 4
+        q[i] = s / 4
+        q[j] = (m[j, i] + m[i, j]) / s
+        q[k] = (m[k, i] + m[i, k]) / s
+        q[3] = (m[k, j] - m[j, k]) / s
+
+    return np.array(q)
+
+def pose_matrix(pose) -> np.ndarray:
+    """
+    4x4 transform from a geometry_msgs Pose (position + orientation) or Transform (translation + rotation)
+    """
+
+    position = pose.position if hasattr(pose, "position") else pose.translation
+    orientation = pose.orientation if hasattr(pose, "orientation") else pose.rotation
+
+    matrix = quaternion_matrix([orientation.x, orientation.y, orientation.z, orientation.w])
+    matrix[:3, 3] = [position.x, position.y, position.z]
+    return matrix
+
+def set_pose(pose, matrix):
+    """
+    Fill a Pose (or Transform) from a 4x4 transform
+    """
+
+    position = pose.position if hasattr(pose, "position") else pose.translation
+    orientation = pose.orientation if hasattr(pose, "orientation") else pose.rotation
+
+    position.x, position.y, position.z = (float(value) for value in matrix[:3, 3])
+    orientation.x, orientation.y, orientation.z, orientation.w = (float(value) for value in quaternion_from_matrix(matrix))
+
+
+# tf2
+
+class TransformException(Exception):
+    pass
+
+class LookupException(TransformException):
+    pass
+
+class ConnectivityException(TransformException):
+    pass
+
+class ExtrapolationException(TransformException):
+    pass
+
+class TimeoutException(TransformException):
+    pass
+
+
+# provider(target_frame, source_frame, stamp in seconds or None for latest) -> (4x4 transform, stamp in seconds),
+# raising one of the exceptions above
+transform_provider = None
+
+def set_transform_provider(provider):
+    global transform_provider
+    transform_provider = provider
+
+
+class Buffer:
+    def __init__(self, cache_time=None, debug: bool = False):
+        self.cache_time = cache_time
+
+    def lookup_transform(self, target_frame: str, source_frame: str, time, timeout=None):
+        if transform_provider is None:
+            raise LookupException("no transform provider")
+
+        stamp = None if time is None or time.is_zero() else time.to_sec()
+        matrix, stamp = transform_provider(target_frame, source_frame, stamp)
+
+        transform = sys.modules["geometry_msgs.msg"].TransformStamped()
+        transform.header.stamp = rospy_standin.Time(stamp)
+        transform.header.frame_id = target_frame
+        transform.child_frame_id = source_frame
+        set_pose(transform.transform, matrix)
+        return transform
+
+    def can_transform(self, target_frame: str, source_frame: str, time, timeout=None) -> bool:
+        try:
+            self.lookup_transform(target_frame, source_frame, time, timeout)
+        except TransformException:
+            return False
+        return True
+
+    def transform(self, object_stamped, target_frame: str, timeout=None):
+        transform = self.lookup_transform(target_frame, object_stamped.header.frame_id, object_stamped.header.stamp, timeout)
+        return do_transform_pose(object_stamped, transform)
+
+
+class TransformListener:
+    def __init__(self, buffer: Buffer, *args, **kwargs):
+        self.buffer = buffer
+
+
+def do_transform_pose(pose, transform):
+    result = sys.modules["geometry_msgs.msg"].PoseStamped()
+    result.header.seq = pose.header.seq
+    result.header.stamp = transform.header.stamp
+    result.header.frame_id = transform.header.frame_id
+    set_pose(result.pose, pose_matrix(transform.transform) @ pose_matrix(pose.pose))
+    return result
+
+
+def module(name: str, **attributes) -> types.ModuleType:
+    new_module = types.ModuleType(name)
+    new_module.__dict__.update(attributes)
+    return new_module
+
+
+def install(rate: float = 1.0):
+    """
+    Put the stand-ins in sys.modules and start the simulated clock at rate times wall-clock time.
+    Returns the rospy stand-in.
+    """
+
+    rospy_standin.clock.set_rate(rate)
+
+    modules = messages.build_modules()
+    modules["rospy"] = rospy_standin
+
+    modules["tf.transformations"] = module(
+        "tf.transformations",
+        quaternion_from_euler=quaternion_from_euler,
+        euler_from_quaternion=euler_from_quaternion,
+        euler_from_matrix=euler_from_matrix,
+        quaternion_matrix=quaternion_matrix,
+        quaternion_from_matrix=quaternion_from_matrix,
+    )
+    modules["tf"] = module("tf", transformations=modules["tf.transformations"])
+
+    modules["tf2_ros"] = module(
+        "tf2_ros",
+        Buffer=Buffer,
+        TransformListener=TransformListener,
+        TransformException=TransformException,
+        LookupException=LookupException,
+        ConnectivityException=ConnectivityException,
+        ExtrapolationException=ExtrapolationException,
+        TimeoutException=TimeoutException,
+    )
+    modules["tf2_geometry_msgs"] = module(
+        "tf2_geometry_msgs",
+        PoseStamped=modules["geometry_msgs.msg"].PoseStamped,
+        do_transform_pose=do_transform_pose,
+    )
+
+    sys.modules.update(modules)
+    return rospy_standin
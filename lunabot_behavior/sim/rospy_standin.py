@@ -0,0 +1,341 @@
+import copy
+import sys
+import threading
+import time
+import traceback
+
+import messages
+
+'''
+In-process stand-in for the parts of rospy the behavior modules use: publishers/subscribers delivering messages
+directly to the callbacks (no master, no serialization), parameters, ROS time and sleeps on a simulated clock that
+runs at a multiple of wall-clock time, timers and shutdown hooks. ros_standin.install() puts it in sys.modules as rospy.
+'''
+
+STARTING_TIME = 1000.0  # ROS time when the clock starts, not 0 so Time(0) still means "latest" for tf
+
+
+class ROSException(Exception):
+    pass
+
+
+class ROSInterruptException(ROSException, KeyboardInterrupt):
+    pass
+
+
+class SimClock:
+    '''
+    ROS time, running `rate` times faster than wall-clock time
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rate = 1.0
+        self.start = STARTING_TIME
+        self.wall_start = time.monotonic()
+
+    def now(self) -> float:
+        with self.lock:
+            return self.start + (time.monotonic() - self.wall_start) * self.rate
+
+    def set_rate(self, rate: float):
+        now = self.now()
+        with self.lock:
+            self.start = now
+            self.wall_start = time.monotonic()
+            self.rate = rate
+
+    def to_wall(self, seconds: float) -> float:
+        return seconds / self.rate
+
+
+clock = SimClock()
+
+
+class Time(messages.Time):
+    @classmethod
+    def now(cls):
+        return cls(clock.now())
+
+
+class Duration(messages.Duration):
+    pass
+
+
+def get_time() -> float:
+    return clock.now()
+
+def get_rostime() -> Time:
+    return Time.now()
+
+def to_seconds(duration) -> float:
+    return duration.to_sec() if hasattr(duration, "to_sec") else float(duration)
+
+def sleep(duration):
+    """
+    Sleep for a duration of ROS time. Returns early when shutting down (rospy raises instead, but nothing here
+    relies on that, and it keeps the threads of a finished simulation quiet).
+    """
+
+    seconds = to_seconds(duration)
+    if seconds > 0:
+        shutdown_event.wait(clock.to_wall(seconds))
+
+
+class Rate:
+    def __init__(self, hz: float):
+        self.period = 1.0 / hz
+        self.last = clock.now()
+
+    def remaining(self) -> Duration:
+        return Duration(self.last + self.period - clock.now())
+
+    def sleep(self):
+        target = self.last + self.period
+        sleep(target - clock.now())
+
+        # Keep the cadence, unless we fell behind by more than a period
+        now = clock.now()
+        self.last = target if now - target < self.period else now
+
+
+class TimerEvent:
+    def __init__(self, last_expected, last_real, current_expected, current_real, last_duration):
+        self.last_expected = last_expected
+        self.last_real = last_real
+        self.current_expected = current_expected
+        self.current_real = current_real
+        self.last_duration = last_duration
+
+
+class Timer(threading.Thread):
+    '''
+    Calls callback(TimerEvent) every period of ROS time (once if oneshot), from its own thread like rospy
+    '''
+
+    def __init__(self, period, callback, oneshot: bool = False, reset: bool = False):
+        super().__init__(daemon=True)
+        self.period = to_seconds(period)
+        self.callback = callback
+        self.oneshot = oneshot
+        self.stopped = threading.Event()
+        self.start()
+
+    def shutdown(self):
+        self.stopped.set()
+
+    def run(self):
+        last_expected = last_real = None
+        expected = clock.now() + self.period
+
+        while True:
+            self.stopped.wait(clock.to_wall(max(expected - clock.now(), 0.0)))
+            if self.stopped.is_set() or is_shutdown():
+                return
+
+            current_real = Time.now()
+            self.callback(TimerEvent(last_expected, last_real, Time(expected), current_real, None))
+            if self.oneshot:
+                return
+
+            last_expected, last_real = Time(expected), current_real
+            expected += self.period
+
+
+# Topics
+
+class Topic:
+    def __init__(self, name: str):
+        self.name = name
+        self.data_class = None
+        self.publishers = 0
+        self.subscribers = []
+        self.latched = None
+
+
+topics_lock = threading.RLock()
+topics = {}  # name -> Topic
+
+def resolve_name(name: str) -> str:
+    return name if name.startswith("/") else "/" + name
+
+def get_topic(name: str) -> Topic:
+    with topics_lock:
+        if name not in topics:
+            topics[name] = Topic(name)
+        return topics[name]
+
+
+class Publisher:
+    def __init__(self, name: str, data_class, queue_size: int = None, latch: bool = False, **kwargs):
+        self.name = resolve_name(name)
+        self.data_class = data_class
+        self.latch = latch
+
+        self.topic = get_topic(self.name)
+        with topics_lock:
+            self.topic.data_class = data_class
+            self.topic.publishers += 1
+
+    def publish(self, *args, **kwargs):
+        if len(args) == 1 and not kwargs and isinstance(args[0], self.data_class):
+            msg = args[0]
+        else:
+            msg = self.data_class(*args, **kwargs)
+
+        if is_shutdown():
+            return
+
+        # Subscribers get their own copy, like they would after deserializing
+        msg = copy.deepcopy(msg)
+
+        with topics_lock:
+            if self.latch:
+                self.topic.latched = msg
+            subscribers = list(self.topic.subscribers)
+
+        for subscriber in subscribers:
+            subscriber.deliver(msg)
+
+    def get_num_connections(self) -> int:
+        return len(self.topic.subscribers)
+
+    def unregister(self):
+        with topics_lock:
+            self.topic.publishers -= 1
+
+
+class Subscriber:
+    '''
+    Callbacks run in the publishing thread, one at a time per subscriber (rospy also runs each subscription's callbacks
+    in order, on its own thread). A latched message is delivered from a separate thread, after the constructor returns.
+    '''
+
+    def __init__(self, name: str, data_class, callback=None, callback_args=None, queue_size: int = None, **kwargs):
+        self.name = resolve_name(name)
+        self.data_class = data_class
+        self.callback = callback
+        self.callback_args = callback_args
+        self.lock = threading.RLock()
+
+        self.topic = get_topic(self.name)
+        with topics_lock:
+            self.topic.subscribers.append(self)
+            latched = self.topic.latched
+
+        if latched is not None:
+            threading.Thread(target=self.deliver, args=(latched,), daemon=True).start()
+
+    def deliver(self, msg):
+        if self.callback is None or is_shutdown():
+            return
+
+        with self.lock:
+            try:
+                if self.callback_args is None:
+                    self.callback(msg)
+                else:
+                    self.callback(msg, self.callback_args)
+            except Exception:
+                logerr("bad callback: %s\n%s", self.callback, traceback.format_exc())
+
+    def unregister(self):
+        with topics_lock:
+            if self in self.topic.subscribers:
+                self.topic.subscribers.remove(self)
+
+
+def get_published_topics(namespace: str = "/"):
+    with topics_lock:
+        return [
+            [name, topic.data_class._type]
+            for name, topic in topics.items()
+            if topic.publishers > 0 and name.startswith(namespace)
+        ]
+
+
+# Parameters
+
+params = {}
+_unset = object()
+
+def get_param(name: str, default=_unset):
+    name = resolve_name(name)
+    if name in params:
+        return params[name]
+    if default is _unset:
+        raise KeyError(name)
+    return default
+
+def set_param(name: str, value):
+    params[resolve_name(name)] = value
+
+def has_param(name: str) -> bool:
+    return resolve_name(name) in params
+
+def delete_param(name: str):
+    del params[resolve_name(name)]
+
+
+# Node lifetime
+
+node_name = None
+shutdown_event = threading.Event()
+shutdown_hooks = []
+
+def init_node(name: str, anonymous: bool = False, **kwargs):
+    global node_name
+    node_name = "/" + name
+
+def get_name() -> str:
+    return node_name
+
+def is_shutdown() -> bool:
+    return shutdown_event.is_set()
+
+def on_shutdown(hook):
+    shutdown_hooks.append(hook)
+
+def signal_shutdown(reason: str):
+    if shutdown_event.is_set():
+        return
+    shutdown_event.set()
+    loginfo("signal_shutdown [%s]", reason)
+
+    for hook in shutdown_hooks:
+        try:
+            hook()
+        except Exception:
+            logerr("shutdown hook failed:\n%s", traceback.format_exc())
+
+def spin():
+    shutdown_event.wait()
+
+
+# Logging, to stderr (the modules print a lot to stdout)
+
+DEBUG, INFO, WARN, ERROR, FATAL = 1, 2, 4, 8, 16
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARN: "WARN", ERROR: "ERROR", FATAL: "FATAL"}
+log_level = INFO
+
+def log(level: int, msg, *args):
+    if level < log_level:
+        return
+    if args:
+        msg = msg % args
+    sys.stderr.write("[%s] [%.3f]: %s\n" % (LEVEL_NAMES[level], clock.now(), msg))
+
+def logdebug(msg, *args, **kwargs):
+    log(DEBUG, msg, *args)
+
+def loginfo(msg, *args, **kwargs):
+    log(INFO, msg, *args)
+
+def logwarn(msg, *args, **kwargs):
+    log(WARN, msg, *args)
+
+def logerr(msg, *args, **kwargs):
+    log(ERROR, msg, *args)
+
+def logfatal(msg, *args, **kwargs):
+    log(FATAL, msg, *args)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+'''
+Runs the behavior state machine (behavior.py, unmodified) against the robot model, on a simulated clock running
+faster than real time, without ROS or Gazebo:
+
+    python3 lunabot_behavior/sim/run_sim.py --cycles 2 --rate 100
+    python3 lunabot_behavior/sim/run_sim.py --fault overcurrent:120:5 --fault stuck:300:10
+    python3 lunabot_behavior/sim/run_sim.py --fault rock:60:3     # jams the buckets if they're in the ground
+    python3 lunabot_behavior/sim/run_sim.py --cycles 3 --profile-log sim.log && python3 lunabot_behavior/profile_report.py sim.log
+
+Counts mining cycles (deposit done, mining goal published again), prints how long each took in ROS time and the
+regolith moved. Exits with 1 if the cycles aren't done before the timeout (in ROS time), or if behavior stops.
+'''
+
+import argparse
+import collections
+import contextlib
+import os
+import sys
+import threading
+import time
+
+SIM_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+BEHAVIOR_DIRECTORY = os.path.dirname(SIM_DIRECTORY)
+sys.path[:0] = [
+    SIM_DIRECTORY,
+    BEHAVIOR_DIRECTORY,
+    os.path.join(BEHAVIOR_DIRECTORY, "..", "lunabot_nav", "src"),
+    os.path.join(BEHAVIOR_DIRECTORY, "..", "lunabot_control", "src"),
+]
+
+import ros_standin
+
+PARAMS = {
+    "/is_sim": False,  # run the real robot code paths, is_sim skips most of them
+    "/odom_topic": "/odom",
+    "/nav/map_topic": "/maps/costmap_node/global_costmap/costmap",
+    "/nav/occ_threshold": 50,
+}
+
+
+def parse_fault(text: str) -> tuple:
+    name, start, duration = text.split(":")
+    if name not in ("stuck", "overcurrent", "manual_stop", "rock"):
+        raise argparse.ArgumentTypeError("unknown fault: " + name)
+    return name, float(start), float(duration)
+
+def parse_pose(text: str) -> tuple:
+    return tuple(float(value) for value in text.split(","))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Faster than real time behavior simulation")
+    parser.add_argument("--rate", type=float, default=100.0, help="ROS time / wall-clock time")
+    parser.add_argument("--cycles", type=int, default=1, help="mining cycles to run")
+    parser.add_argument("--timeout", type=float, default=1800.0, help="give up after this much ROS time (s)")
+    parser.add_argument("--start", type=parse_pose, default=(1.0, 1.8, -1.0), help="start pose in the arena: x,y,yaw")
+    parser.add_argument("--fault", type=parse_fault, action="append", default=[], help="error:start:duration (s)")
+    parser.add_argument("--profile-log", default="", help="append the mission timeline to this log (see profiler.py)")
+    parser.add_argument("--label", default="sim", help="name of the run in the profile log")
+    parser.add_argument("--verbose", action="store_true", help="show the modules' output and ROS info logs")
+    args = parser.parse_args()
+
+    rospy = ros_standin.install(args.rate)
+    rospy.log_level = rospy.INFO if args.verbose else rospy.WARN
+    for name, value in PARAMS.items():
+        rospy.set_param(name, value)
+    rospy.set_param("/behavior/profile_log", args.profile_log)
+    rospy.set_param("/behavior/profile_label", args.label)
+
+    # Modules imported after the stand-ins are installed
+    import clock
+    clock.set_rate(args.rate)
+
+    from geometry_msgs.msg import PoseStamped
+    import robot_model
+
+    model = robot_model.RobotModel(args.start, args.fault)
+
+    # ROS time of every mining goal (one in the mining zone, after a berm goal): the first one ends the startup, each
+    # one after it a cycle. (The berm goal can be published more than once per cycle, when the ascent is interrupted,
+    # and the dig site changes from cycle to cycle.)
+    mining_goal_times = []
+    last_goal_mining = [False]
+
+    def goal_callback(msg: PoseStamped):
+        x, y, _, _ = model.world_to_odom @ (msg.pose.position.x, msg.pose.position.y, 0, 1)
+        # Well inside: the berm goal can be right on the border
+        (min_x, min_y), (max_x, max_y) = robot_model.MINING_ZONE
+        margin = 0.25
+        mining = min_x + margin <= x <= max_x - margin and min_y + margin <= y <= max_y - margin
+        if mining and not last_goal_mining[0]:
+            mining_goal_times.append(rospy.get_time())
+        last_goal_mining[0] = mining
+
+    rospy.Subscriber("/goal", PoseStamped, goal_callback)
+
+    output = sys.stdout if args.verbose else open(os.devnull, "w")
+    with contextlib.redirect_stdout(output):
+        import behavior
+
+        model.start()
+        behavior_node = behavior.Behavior()
+        behavior_thread = threading.Thread(target=behavior_node.behavior_loop, name="behavior", daemon=True)
+
+        wall_start = time.monotonic()
+        start = rospy.get_time()
+        behavior_thread.start()
+
+        # Sample the state now and then, for the time spent in each
+        state_time = collections.Counter()
+        last = start
+        while behavior_thread.is_alive():
+            time.sleep(0.001)
+            now = rospy.get_time()
+            state_time[behavior_node.current_state.name] += now - last
+            last = now
+
+            if len(mining_goal_times) > args.cycles or now - start > args.timeout:
+                break
+
+        rospy.signal_shutdown("simulation done")
+        behavior_thread.join(timeout=5)
+
+    elapsed = rospy.get_time() - start
+    wall_elapsed = time.monotonic() - wall_start
+    cycle_ends = mining_goal_times[1:args.cycles + 1]
+
+    print("Simulated %.1f s in %.1f s of wall-clock time (%.0fx)" % (elapsed, wall_elapsed, elapsed / wall_elapsed))
+    if mining_goal_times:
+        print("Startup (ascent, find apriltag, align): %.1f s" % (mining_goal_times[0] - start))
+    for i, end in enumerate(cycle_ends):
+        print("Cycle %d: %.1f s" % (i + 1, end - mining_goal_times[i]))
+    print("Time in each state: " + ", ".join("%s %.1f s" % item for item in state_time.most_common()))
+    print("Mined %.1f kg, deposited %.1f kg, drove %.1f m" % (model.mined, model.deposited, model.distance))
+    if len(cycle_ends) > 0:
+        print("Deposited %.1f kg/hour over the cycles" % (model.deposited / (cycle_ends[-1] - mining_goal_times[0]) * 3600))
+
+    if len(cycle_ends) < args.cycles:
+        print("FAILED: %d of %d cycles done" % (len(cycle_ends), args.cycles))
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
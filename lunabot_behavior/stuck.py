@@ -1,29 +1,154 @@
 import rospy
-from geometry_msgs.msg import Twist
-from std_msgs.msg import Bool
+import numpy as np
+from nav_msgs.msg import Odometry
+from std_msgs.msg import Float32
 
-from lunabot_msgs.msg import RobotEffort, RobotErrors, RobotSensors
+from lunabot_msgs.msg import RobotEffort, RobotErrors
+
+import sensor_cache
 
 import time
 
 '''
 A node that detects if the robot is stuck (trying to move, and not moving), and publishes to the error topic.
+It also publishes a graded slip estimate (0 rolling freely, 1 not moving at all) on /slip.
 TODO add this to roslaunch so it always runs
 '''
+
+class RingBuffer:
+    '''
+    The last size samples of width values each, in a preallocated array (no allocation per sample)
+    '''
+
+    def __init__(self, size: int, width: int):
+        self.data = np.zeros((size, width))
+        self.index = 0
+        self.count = 0
+
+    def append(self, values):
+        self.data[self.index] = values
+        self.index = (self.index + 1) % len(self.data)
+        self.count = min(self.count + 1, len(self.data))
+
+    def window(self) -> np.ndarray:
+        """
+        The samples in the buffer, in no particular order
+        """
+
+        return self.data[:self.count]
+
+
+class SlipEstimator:
+    '''
+    Keeps a sliding window of commanded wheel speed (from the drive efforts), achieved wheel speed (encoders) and
+    ground speed under each wheel (odometry), per side, all in m/s. Over the window:
+    - tracking: how much of the commanded wheel speed was achieved, the zero-lag cross-correlation of achieved and
+      commanded normalized by the command's energy. ~1 when the wheels follow, ~0 when they're stalled, negative
+      when pushed back. Signed, so reversing counts like driving forwards.
+    - slip ratio: 1 - the same gain of ground speed on wheel speed. 0 rolling, 1 spinning in place.
+    The estimate is the worse of the two (1 - tracking, slip), in [0, 1]. Windows where the wheels weren't asked to
+    move (or didn't turn, for the slip) are 0.
+    '''
+
+    # Columns of the window
+    COMMANDED = slice(0, 2)
+    WHEELS = slice(2, 4)
+    GROUND = slice(4, 6)
+
+    def __init__(self, window_size: int, max_wheel_speed: float, wheel_base: float, min_speed: float):
+        self.buffer = RingBuffer(window_size, 6)
+        self.max_wheel_speed = max_wheel_speed  # m/s at 127 effort
+        self.wheel_base = wheel_base
+        self.min_speed = min_speed  # m/s, RMS over the window below which nothing is moving
+
+    def add(self, left_effort: float, right_effort: float, left_wheel: float, right_wheel: float, linear: float, angular: float):
+        """
+        Efforts in [-127, 127], wheel speeds in m/s, the robot's velocity from odometry
+        """
+
+        self.buffer.append((
+            left_effort / 127 * self.max_wheel_speed,
+            right_effort / 127 * self.max_wheel_speed,
+            left_wheel,
+            right_wheel,
+            linear - angular * self.wheel_base / 2,
+            linear + angular * self.wheel_base / 2,
+        ))
+
+    def gain(self, reference: slice, response: slice) -> float:
+        """
+        Least squares gain of response on reference over the window, None if the reference barely moved
+        """
+
+        window = self.buffer.window()
+        reference, response = window[:, reference], window[:, response]
+
+        energy = np.sum(reference ** 2)
+        if energy < reference.size * self.min_speed ** 2:
+            return None
+        return float(np.sum(reference * response) / energy)
+
+    def tracking(self) -> float:
+        return self.gain(self.COMMANDED, self.WHEELS)
+
+    def slip_ratio(self) -> float:
+        gain = self.gain(self.WHEELS, self.GROUND)
+        if gain is None:
+            return 0.0
+        return 1 - min(max(gain, 0.0), 1.0)
+
+    def estimate(self) -> float:
+        tracking = self.tracking()
+        stall = 0.0 if tracking is None else 1 - min(max(tracking, 0.0), 1.0)
+        return max(stall, self.slip_ratio())
+
+
 class Stuck:
     MIN_STUCK_TIME = 3.0 # seconds
+    STUCK_SLIP = 0.8 # slip estimate above which the robot is stuck
 
-    def robot_sensors_callback(self, msg):
-        self.robot_sensors = msg
+    RATE = 20 # Hz, samples and publishes at this rate whatever the sensors do
+    WINDOW_TIME = 1.0 # seconds
 
+    MAX_WHEEL_SPEED = 2.0 # rad/s at full effort, same as the differential drive controller
+    WHEEL_RADIUS = 0.1397 # meters
+    WHEEL_BASE = 0.5588 # meters
+    MIN_SPEED = 0.02 # m/s
 
     def effort_callback(self, msg):
         self.robot_effort = msg
 
+    def odom_callback(self, msg):
+        self.robot_odom = msg
+
 
     def __init__(self):
-        self.robot_sensors = RobotSensors()
         self.robot_effort = RobotEffort()
+        self.robot_odom = Odometry()
+
+        self.slip_estimator = SlipEstimator(
+            int(self.WINDOW_TIME * self.RATE), self.MAX_WHEEL_SPEED * self.WHEEL_RADIUS, self.WHEEL_BASE, self.MIN_SPEED
+        )
+
+    def sample(self):
+        """
+        Adds the latest readings to the window, unless the sensors stopped reporting (the wheel speeds would be stale)
+        """
+
+        if sensor_cache.is_stale():
+            return
+
+        sensors = sensor_cache.get_sensors()
+        twist = self.robot_odom.twist.twist
+
+        self.slip_estimator.add(
+            self.robot_effort.left_drive,
+            self.robot_effort.right_drive,
+            sensors.drive_left_vel * self.WHEEL_RADIUS,
+            sensors.drive_right_vel * self.WHEEL_RADIUS,
+            twist.linear.x,
+            twist.angular.z,
+        )
 
     def stuck(self):
         time.sleep(0.1)
@@ -31,8 +156,9 @@ class Stuck:
         rospy.init_node("stuck_node")
 
         error_publisher = rospy.Publisher("/errors", RobotErrors, queue_size=1)
+        slip_publisher = rospy.Publisher("/slip", Float32, queue_size=1)
         rospy.Subscriber("/effort", RobotEffort, self.effort_callback)
-        rospy.Subscriber("/sensors", RobotSensors, self.robot_sensors_callback)
+        rospy.Subscriber(rospy.get_param("/odom_topic"), Odometry, self.odom_callback)
 
         stuck_msg = RobotErrors()
         stuck_msg.stuck = False
@@ -41,26 +167,24 @@ class Stuck:
         currently_stuck = False
         stuck_time = rospy.get_time()
 
-        rate = rospy.Rate(20)
+        rate = rospy.Rate(self.RATE)
 
         while not rospy.is_shutdown():
-            if rospy.get_time() - stuck_time >= self.MIN_STUCK_TIME and currently_stuck:
-                stuck_msg.stuck = True
+            self.sample()
+            slip = self.slip_estimator.estimate()
+            slip_publisher.publish(Float32(slip))
+
+            # Stuck once the slip stayed high for long enough
+            if slip >= self.STUCK_SLIP:
+                if not currently_stuck:
+                    currently_stuck = True
+                    stuck_time = rospy.get_time()
             else:
-                stuck_msg.stuck = False
+                currently_stuck = False
 
+            stuck_msg.stuck = currently_stuck and rospy.get_time() - stuck_time >= self.MIN_STUCK_TIME
             error_publisher.publish(stuck_msg)
 
-            # check if trying to go somewhere
-            if self.robot_effort.left_drive >= 15 or self.robot_effort.right_drive >= 15:
-                # check if not going anywhere
-                if self.robot_sensors.drive_left_vel <= 0.1 and self.robot_sensors.drive_right_vel <= 0.1:
-                    if not currently_stuck:
-                        currently_stuck = True
-                        stuck_time = rospy.get_time()
-                    continue
-
-            currently_stuck = False
             rate.sleep()
 
         stuck_msg.stuck = False
@@ -69,4 +193,4 @@ class Stuck:
 if __name__ == "__main__":
     stuck = Stuck()
     stuck.stuck()
-    rospy.spin()
\ No newline at end of file
+    rospy.spin()
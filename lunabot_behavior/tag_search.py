@@ -0,0 +1,87 @@
+import math
+
+'''
+Turning in place to find an apriltag, shared by find_apriltag and homing_controller. Each control period, the module
+gives the robot's pose from odometry and publishes the angular velocity it gets back, until the tag is seen.
+'''
+
+def wrap_angle(angle: float) -> float:
+    return math.atan2(math.sin(angle), math.cos(angle))
+
+
+class TagSearch:
+    '''
+    With a predicted position of the tag (in odom, e.g. where it was last seen, or where it should be from the start
+    apriltag), the camera is turned towards it the shortest way, at max_speed until it's within SLOW_ANGLE and at
+    slow_speed after that, so the last frames before seeing it aren't blurred. If it isn't there, the camera sweeps
+    either side of the predicted bearing, SWEEP_STEP wider each time. Without a prediction, or once the sweeps cover
+    the whole circle, it spins at spin_speed in a fixed direction like before.
+    '''
+
+    TURN = "turn"
+    SWEEP = "sweep"
+    SPIN = "spin"
+
+    def __init__(self, camera_yaw: float, spin_speed: float, max_speed: float, slow_speed: float):
+        self.camera_yaw = camera_yaw  # of the camera, in the robot's frame
+        self.spin_speed = spin_speed  # rad/s, signed
+        self.max_speed = max_speed
+        self.slow_speed = slow_speed
+
+        self.SLOW_ANGLE = 0.5  # rad, about half the cameras' field of view
+        self.TOLERANCE = 0.05  # rad
+        self.SWEEP_STEP = 0.5  # rad
+
+        self.state = self.SPIN
+        self.bearing: float = None
+        self.sweep = 0
+
+    def start(self, pose: tuple, predicted: tuple = None):
+        """
+        pose: (x, y, yaw) of the robot, predicted: (x, y) of the tag, None if unknown
+        """
+
+        self.sweep = 0
+        if predicted is None or pose is None:
+            self.state = self.SPIN
+            self.bearing = None
+            return
+
+        # The robot's yaw that points the camera at the tag
+        self.state = self.TURN
+        self.bearing = math.atan2(predicted[1] - pose[1], predicted[0] - pose[0]) - self.camera_yaw
+
+    def sweep_target(self) -> float:
+        """
+        Sweeps alternate sides of the predicted bearing: +STEP, -STEP, +2 STEP, -2 STEP...
+        """
+
+        width = (self.sweep // 2 + 1) * self.SWEEP_STEP
+        return self.bearing + (width if self.sweep % 2 == 0 else -width)
+
+    def angular_velocity(self, pose: tuple) -> float:
+        """
+        Angular velocity (rad/s) to turn at now, pose: (x, y, yaw) of the robot
+        """
+
+        if self.state == self.SPIN or pose is None:
+            return self.spin_speed
+
+        target = self.bearing if self.state == self.TURN else self.sweep_target()
+        error = wrap_angle(target - pose[2])
+
+        if abs(error) < self.TOLERANCE:
+            if self.state == self.TURN:
+                self.state = self.SWEEP
+            else:
+                self.sweep += 1
+                if (self.sweep // 2 + 1) * self.SWEEP_STEP > math.pi:
+                    self.state = self.SPIN
+                    return self.spin_speed
+
+            target = self.sweep_target()
+            error = wrap_angle(target - pose[2])
+
+        # Sweeps are slow all the way, the tag could be anywhere in them
+        speed = self.slow_speed if self.state == self.SWEEP or abs(error) < self.SLOW_ANGLE else self.max_speed
+        return math.copysign(speed, error)
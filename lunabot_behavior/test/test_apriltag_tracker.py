@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+import math
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+# The behavior modules are scripts next to this folder, not a package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from apriltag_tracker import PoseFilter, load_targets
+
+
+class PoseFilterTest(unittest.TestCase):
+    def setUp(self):
+        self.filter = PoseFilter()
+        self.noise = np.diag([0.01, 0.01, 0.01])
+
+    def test_first_detection(self):
+        self.assertTrue(self.filter.update(np.array([1.0, 2.0, 0.5]), self.noise, 0.0))
+        np.testing.assert_array_equal(self.filter.state, [1.0, 2.0, 0.5])
+        np.testing.assert_array_equal(self.filter.covariance, self.noise)
+
+    def test_fuses(self):
+        self.filter.update(np.array([1.0, 2.0, 0.0]), self.noise, 0.0)
+        self.assertTrue(self.filter.update(np.array([1.1, 2.0, 0.0]), self.noise, 0.0))
+        # Same noise, no time between them: the average, and half the covariance
+        np.testing.assert_allclose(self.filter.state, [1.05, 2.0, 0.0])
+        np.testing.assert_allclose(self.filter.covariance, self.noise / 2)
+
+    def test_predict_grows_covariance(self):
+        self.filter.update(np.array([1.0, 2.0, 0.0]), self.noise, 0.0)
+        self.filter.predict(1.0)
+        np.testing.assert_allclose(self.filter.covariance, self.noise + PoseFilter.PROCESS_NOISE)
+        # Older stamps don't move it back
+        self.filter.predict(0.5)
+        self.assertEqual(self.filter.stamp, 1.0)
+
+    def test_yaw_wraps(self):
+        self.filter.update(np.array([0.0, 0.0, math.pi - 0.05]), self.noise, 0.0)
+        self.assertTrue(self.filter.update(np.array([0.0, 0.0, -math.pi + 0.05]), self.noise, 0.0))
+        self.assertAlmostEqual(abs(self.filter.state[2]), math.pi)
+
+    def test_outlier_dropped(self):
+        self.filter.update(np.array([1.0, 2.0, 0.0]), self.noise, 0.0)
+        self.assertFalse(self.filter.update(np.array([3.0, 2.0, 0.0]), self.noise, 0.1))
+        np.testing.assert_array_equal(self.filter.state, [1.0, 2.0, 0.0])
+        self.assertEqual(self.filter.rejected, 1)
+
+        # An inlier clears the count
+        self.assertTrue(self.filter.update(np.array([1.0, 2.0, 0.0]), self.noise, 0.2))
+        self.assertEqual(self.filter.rejected, 0)
+
+    def test_restarts_after_rejections(self):
+        self.filter.update(np.array([1.0, 2.0, 0.0]), self.noise, 0.0)
+        moved = np.array([3.0, 2.0, 0.0])
+        for i in range(1, PoseFilter.MAX_REJECTED):
+            self.assertFalse(self.filter.update(moved, self.noise, 0.1 * i))
+        self.assertTrue(self.filter.update(moved, self.noise, 0.1 * PoseFilter.MAX_REJECTED))
+        np.testing.assert_array_equal(self.filter.state, moved)
+        self.assertEqual(self.filter.rejected, 0)
+
+    def test_restarts_when_stale(self):
+        self.filter.update(np.array([1.0, 2.0, 0.0]), self.noise, 0.0)
+        moved = np.array([3.0, 2.0, 0.0])
+        self.assertTrue(self.filter.update(moved, self.noise, PoseFilter.STALE_TIME + 0.1))
+        np.testing.assert_array_equal(self.filter.state, moved)
+
+
+class LoadTargetsTest(unittest.TestCase):
+    def test_bundles_and_standalone_tags(self):
+        tags = """
+standalone_tags:
+  - {id: 0, size: 0.2}
+  - {id: 2, size: 0.2}
+tag_bundles:
+  - name: berm
+    layout:
+      - {id: 2, size: 0.2, x: 0.0, y: 0.0, z: 0.0, qw: 1, qx: 0, qy: 0, qz: 0}
+      - {id: 3, size: 0.2, x: 0.5, y: 0.0, z: 0.0, qw: 0, qx: 0, qy: 0, qz: 0}
+"""
+        with tempfile.NamedTemporaryFile("w", suffix=".yaml") as tags_file:
+            tags_file.write(tags)
+            tags_file.flush()
+            targets = load_targets(tags_file.name)
+
+        # Tag 2 is in the bundle, only tracked as part of it
+        self.assertEqual(set(targets), {"berm", 0})
+        self.assertEqual(set(targets["berm"]), {2, 3})
+        np.testing.assert_array_equal(targets[0][0], np.identity(4))
+
+        # From tag 3 back to the bundle's origin (the zero quaternion is the identity)
+        np.testing.assert_allclose(targets["berm"][3][:3, 3], [-0.5, 0.0, 0.0])
+        np.testing.assert_allclose(targets["berm"][3][:3, :3], np.identity(3))
+
+
+if __name__ == "__main__":
+    unittest.main()
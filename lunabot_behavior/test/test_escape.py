@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+import math
+import os
+import sys
+import unittest
+
+BEHAVIOR_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# The behavior modules are scripts next to this folder, not a package. Runs without a ROS master, on the behavior
+# simulator's stand-ins, with ROS time 20 times faster than wall-clock time
+sys.path[:0] = [BEHAVIOR_DIRECTORY, os.path.join(BEHAVIOR_DIRECTORY, "sim")]
+import ros_standin
+
+rospy = ros_standin.install(20.0)
+rospy.log_level = rospy.WARN
+rospy.set_param("/odom_topic", "/odom")
+
+import clock
+
+clock.set_rate(20.0)
+
+from geometry_msgs.msg import Twist
+from nav_msgs.msg import Odometry
+from std_msgs.msg import Float32, Int8
+
+import escape
+
+
+def odometry(x, y, yaw):
+    msg = Odometry()
+    msg.pose.pose.position.x = x
+    msg.pose.pose.position.y = y
+    msg.pose.pose.orientation.z = math.sin(yaw / 2)
+    msg.pose.pose.orientation.w = math.cos(yaw / 2)
+    return msg
+
+
+class EscapeTest(unittest.TestCase):
+    def setUp(self):
+        self.velocity_publisher = rospy.Publisher("/test/cmd_vel", Twist, queue_size=1)
+        self.excavation_publisher = rospy.Publisher("/test/excavate", Int8, queue_size=1)
+        self.escape = escape.Escape(self.velocity_publisher, self.excavation_publisher)
+        self.odom_publisher = rospy.Publisher("/odom", Odometry, queue_size=1)
+        self.slip_publisher = rospy.Publisher("/slip", Float32, queue_size=1)
+        self.commands = []
+        self.subscriber = rospy.Subscriber("/test/cmd_vel", Twist, self.command_callback)
+
+    def tearDown(self):
+        self.subscriber.unregister()
+
+    def command_callback(self, msg: Twist):
+        self.commands.append(msg)
+        # Only turning moves this robot
+        if msg.angular.z != 0:
+            x, y, yaw = self.escape.pose()
+            self.odom_publisher.publish(odometry(x, y, yaw + msg.angular.z * 0.1))
+
+    def test_not_free_without_odometry(self):
+        self.assertFalse(self.escape.is_free((0.0, 0.0, 0.0)))
+        self.odom_publisher.publish(odometry(1.0, 0.0, 0.0))
+        self.assertFalse(self.escape.is_free(None))
+
+    def test_free_once_moved_or_turned(self):
+        start = (1.0, 2.0, 0.5)
+        self.odom_publisher.publish(odometry(1.05, 2.0, 0.6))
+        self.assertFalse(self.escape.is_free(start))
+        self.odom_publisher.publish(odometry(1.15, 2.0, 0.5))
+        self.assertTrue(self.escape.is_free(start))
+        self.odom_publisher.publish(odometry(1.0, 2.0, 0.5 - 0.25))
+        self.assertTrue(self.escape.is_free(start))
+
+    def test_turned_across_pi(self):
+        self.odom_publisher.publish(odometry(0.0, 0.0, -math.pi + 0.05))
+        self.assertFalse(self.escape.is_free((0.0, 0.0, math.pi - 0.05)))
+
+    def test_slip_estimate(self):
+        start = (0.0, 0.0, 0.0)
+        self.odom_publisher.publish(odometry(0.5, 0.0, 0.0))
+
+        # Odometry moved, but the wheels are spinning
+        self.slip_publisher.publish(Float32(0.9))
+        self.assertFalse(self.escape.is_free(start))
+        self.slip_publisher.publish(Float32(0.1))
+        self.assertTrue(self.escape.is_free(start))
+
+        # Old estimates are ignored
+        self.slip_publisher.publish(Float32(0.9))
+        rospy.sleep(self.escape.SLIP_TIMEOUT + 0.1)
+        self.assertTrue(self.escape.is_free(start))
+
+    def test_maneuver_order(self):
+        self.escape.successes["oscillate"] = 2
+        self.escape.successes["pivot"] = 1
+        self.assertEqual(self.escape.maneuver_order((0, 0))[:2], ["oscillate", "pivot"])
+
+        # What worked in the cell goes first there only
+        self.escape.worked_in_cell[(3, 1)] = "excavate_assisted"
+        self.assertEqual(self.escape.maneuver_order((3, 1))[:2], ["excavate_assisted", "oscillate"])
+        self.assertEqual(self.escape.maneuver_order((0, 0))[0], "oscillate")
+        self.assertEqual(sorted(self.escape.maneuver_order((3, 1))), sorted(escape.Escape.MANEUVERS))
+
+    def test_cells(self):
+        self.assertEqual(self.escape.cell((0.2, -0.2, 1.0)), (0, -1))
+        self.assertEqual(self.escape.cell((1.2, 0.7, 0.0)), (2, 1))
+        self.assertIsNone(self.escape.cell(None))
+
+    def test_remembers_what_worked(self):
+        self.odom_publisher.publish(odometry(1.2, 0.7, 0.0))
+
+        self.assertTrue(self.escape.unstickRobot())
+        self.assertEqual(self.escape.worked_in_cell, {(2, 1): "pivot"})
+        self.assertEqual(self.escape.successes["pivot"], 1)
+        # Reversed first, and stopped at the end
+        self.assertLess(self.commands[0].linear.x, 0)
+        self.assertEqual((self.commands[-1].linear.x, self.commands[-1].angular.z), (0, 0))
+
+        # Back in the same cell, pivoting right away
+        self.commands.clear()
+        self.odom_publisher.publish(odometry(1.3, 0.6, 0.0))
+        self.assertTrue(self.escape.unstickRobot())
+        self.assertNotEqual(self.commands[0].angular.z, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+import os
+import sys
+import threading
+import unittest
+
+BEHAVIOR_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# The behavior modules are scripts next to this folder, not a package. Runs without a ROS master, on the behavior
+# simulator's stand-ins (rospy timers on a simulated clock). Timeouts are in ROS time, which can run faster than
+# wall-clock time when other tests set the rate
+sys.path[:0] = [BEHAVIOR_DIRECTORY, os.path.join(BEHAVIOR_DIRECTORY, "sim")]
+import ros_standin
+
+rospy = ros_standin.install()
+
+from events import EventQueue, Events
+
+
+def later(seconds, function, *args):
+    timer = threading.Timer(seconds, function, args)
+    timer.start()
+    return timer
+
+
+class EventQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.bus = EventQueue()
+
+    def test_post_get(self):
+        self.bus.post(Events.GOAL_REACHED, "goal")
+        self.assertEqual(self.bus.get(Events.GOAL_REACHED), (Events.GOAL_REACHED, "goal"))
+
+    def test_get_any(self):
+        self.bus.post(Events.ODOM)
+        self.assertEqual(self.bus.get(), (Events.ODOM, None))
+
+    def test_get_drops_other_events(self):
+        self.bus.post(Events.ODOM)
+        self.bus.post(Events.INTERRUPT, "stuck")
+        self.bus.post(Events.GOAL_REACHED)
+        self.assertEqual(self.bus.get(Events.INTERRUPT), (Events.INTERRUPT, "stuck"))
+        # The odometry event before it is gone, the goal after it is still queued
+        self.assertEqual(self.bus.get(timeout=0.01), (Events.GOAL_REACHED, None))
+        self.assertEqual(self.bus.get(timeout=0.01), (None, None))
+
+    def test_get_timeout(self):
+        start = rospy.get_time()
+        self.assertEqual(self.bus.get(Events.GOAL_REACHED, timeout=0.05), (None, None))
+        self.assertGreaterEqual(rospy.get_time() - start, 0.04)
+
+    def test_get_blocks_until_posted(self):
+        later(0.05, self.bus.post, Events.GOAL_REACHED, 1)
+        self.assertEqual(self.bus.get(Events.GOAL_REACHED, timeout=20.0), (Events.GOAL_REACHED, 1))
+
+    def test_clear(self):
+        self.bus.post(Events.GOAL_REACHED)
+        self.bus.clear()
+        self.assertEqual(self.bus.get(timeout=0.01), (None, None))
+
+    def test_notify_isnt_queued(self):
+        self.bus.notify(Events.ODOM)
+        self.assertEqual(self.bus.get(timeout=0.01), (None, None))
+
+    def test_wait_for_update(self):
+        later(0.05, self.bus.notify, Events.SENSORS)
+        self.assertTrue(self.bus.wait_for_update(Events.SENSORS, timeout=20.0))
+
+        later(0.05, self.bus.post, Events.INTERRUPT)
+        self.assertTrue(self.bus.wait_for_update(Events.ODOM, Events.INTERRUPT, timeout=20.0))
+
+    def test_wait_for_update_only_new(self):
+        # Notified before the wait started
+        self.bus.notify(Events.SENSORS)
+        self.assertFalse(self.bus.wait_for_update(Events.SENSORS, timeout=0.05))
+
+    def test_wait_for_update_other_event(self):
+        later(0.01, self.bus.notify, Events.ODOM)
+        self.assertFalse(self.bus.wait_for_update(Events.SENSORS, timeout=0.1))
+
+    def test_listeners(self):
+        received = []
+        self.bus.add_listener(lambda event, data: received.append((event, data)))
+        self.bus.notify(Events.ODOM)
+        self.bus.post(Events.INTERRUPT, "stuck")
+        self.assertEqual(received, [(Events.ODOM, None), (Events.INTERRUPT, "stuck")])
+
+    def test_start_timer(self):
+        self.bus.start_timer(0.05, data="done")
+        self.assertEqual(self.bus.get(Events.TIMEOUT, timeout=20.0), (Events.TIMEOUT, "done"))
+
+    def test_cancel_timer(self):
+        timer = self.bus.start_timer(0.05, Events.GOAL_REACHED)
+        timer.shutdown()
+        self.assertEqual(self.bus.get(timeout=0.2), (None, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
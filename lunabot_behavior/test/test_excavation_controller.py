@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+import os
+import sys
+import unittest
+
+# The behavior modules are scripts next to this folder, not a package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from excavation_controller import ExcavationController
+
+
+class ExcavationControllerTest(unittest.TestCase):
+    def setUp(self):
+        self.controller = ExcavationController(
+            target_velocity=2.0,
+            max_velocity=4.0,
+            bucket_radius=0.2,
+            bucket_spacing=0.1,
+            target_depth_of_cut=0.01,
+            jam_current=20.0,
+        )
+        self.stamp = 0.0
+
+    def run_for(self, seconds, velocity, current, period=0.05, **kwargs):
+        result = None
+        for _ in range(int(round(seconds / period))):
+            self.stamp += period
+            result = self.controller.update(velocity, current, self.stamp, **kwargs)
+        return result
+
+    def test_first_reading_is_feedforward(self):
+        effort, feed = self.controller.update(2.0, 10.0, 0.0)
+        self.assertEqual(effort, int(127 / 4.0 * 2.0))
+        self.assertAlmostEqual(feed, 0.01 * 2.0 * 0.2 / 0.1)
+
+    def test_speeds_up_slow_buckets(self):
+        on_target, _ = self.run_for(0.5, 2.0, 10.0)
+        self.controller.reset()
+        slow, _ = self.run_for(0.5, 1.0, 10.0)
+        self.assertGreater(slow, on_target)
+
+    def test_jam_on_current(self):
+        self.run_for(0.5, 2.0, 10.0)
+        depth_of_cut = self.controller.depth_of_cut
+        effort, feed = self.run_for(0.5, 2.0, 30.0)
+        self.assertEqual(self.controller.state, ExcavationController.RECOVERING)
+        self.assertEqual(self.controller.jams, 1)
+        self.assertEqual(effort, self.controller.REVERSE_EFFORT)
+        self.assertLess(feed, 0)
+        self.assertLessEqual(self.controller.depth_of_cut, depth_of_cut / 2)
+
+        # Cuts again once the recovery is over
+        effort, feed = self.run_for(self.controller.RECOVERY_TIME + 0.1, 2.0, 10.0)
+        self.assertEqual(self.controller.state, ExcavationController.DIGGING)
+        self.assertGreater(effort, 0)
+        self.assertGreater(feed, 0)
+
+    def test_jam_on_stall(self):
+        self.run_for(0.5, 2.0, 10.0)
+        self.run_for(self.controller.STALL_TIME + 0.1, 0.1, 10.0)
+        self.assertEqual(self.controller.jams, 1)
+
+    def test_no_stall_before_spinning_up(self):
+        self.run_for(2.0, 0.1, 10.0)
+        self.assertEqual(self.controller.jams, 0)
+
+    def test_fails_after_max_jams(self):
+        for _ in range(self.controller.MAX_JAMS):
+            self.assertFalse(self.controller.failed)
+            self.run_for(0.2, 2.0, 30.0)
+            self.run_for(self.controller.RECOVERY_TIME + 0.1, 2.0, 10.0)
+        self.assertTrue(self.controller.failed)
+
+    def test_feed_backs_off_near_jam_current(self):
+        _, light = self.run_for(1.0, 2.0, 10.0)
+        self.controller.reset()
+        _, heavy = self.run_for(1.0, 2.0, 18.0)
+        self.assertLess(heavy, light)
+
+    def test_depth_of_cut_adapts(self):
+        self.run_for(2.0, 2.0, 10.0)
+        self.assertGreater(self.controller.depth_of_cut, 0.01)
+        self.controller.reset()
+        self.run_for(2.0, 2.0, 18.0)
+        self.assertLess(self.controller.depth_of_cut, 0.01)
+
+    def test_depth_of_cut_holds_at_feed_limit(self):
+        _, feed = self.run_for(2.0, 2.0, 10.0, max_feed=0.001)
+        self.assertAlmostEqual(feed, 0.001)
+        self.assertAlmostEqual(self.controller.depth_of_cut, 0.01)
+
+    def test_volume_from_feed(self):
+        self.run_for(1.0, 2.0, 10.0)
+        self.assertGreater(self.controller.volume, 0)
+
+        # Spinning in the air isn't digging
+        self.controller.reset()
+        self.run_for(1.0, 2.0, 1.0)
+        self.assertEqual(self.controller.volume, 0)
+
+    def test_volume_from_load_cells(self):
+        self.run_for(0.5, 2.0, 10.0, weights=[2.0, 2.0])
+        estimated = self.controller.volume
+        self.assertGreater(estimated, 0)
+
+        self.run_for(0.5, 2.0, 10.0, weights=[2.0, 17.0])
+        self.assertAlmostEqual(self.controller.volume, 15.0 / self.controller.REGOLITH_DENSITY)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+import os
+import sys
+import unittest
+
+# The behavior modules are scripts next to this folder, not a package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from filters import BinEmptyDetector, Debounce, EndOfTravelDetector, LowPassFilter
+
+
+class LowPassFilterTest(unittest.TestCase):
+    def test_first_sample(self):
+        low_pass = LowPassFilter(0.5)
+        self.assertEqual(low_pass.update(3.0, 10.0), 3.0)
+
+    def test_time_weighted(self):
+        low_pass = LowPassFilter(1.0)
+        low_pass.update(0.0, 0.0)
+        # One time constant later, 1 - 1/e of the way
+        self.assertAlmostEqual(low_pass.update(1.0, 1.0), 0.632, places=3)
+        # No time passed, no change
+        self.assertAlmostEqual(low_pass.update(100.0, 1.0), 0.632, places=3)
+
+    def test_no_filtering(self):
+        low_pass = LowPassFilter(0.0)
+        low_pass.update(0.0, 0.0)
+        self.assertEqual(low_pass.update(5.0, 0.1), 5.0)
+
+
+class DebounceTest(unittest.TestCase):
+    def test_hold(self):
+        debounce = Debounce(0.5)
+        self.assertFalse(debounce.update(True, 0.0))
+        self.assertFalse(debounce.update(True, 0.4))
+        self.assertTrue(debounce.update(True, 0.5))
+
+    def test_restarts(self):
+        debounce = Debounce(0.5)
+        debounce.update(True, 0.0)
+        self.assertFalse(debounce.update(False, 0.3))
+        self.assertFalse(debounce.update(True, 0.6))
+        self.assertTrue(debounce.update(True, 1.1))
+
+
+class EndOfTravelDetectorTest(unittest.TestCase):
+    def setUp(self):
+        self.detector = EndOfTravelDetector(moving_current=1.0, stopped_current=0.3, hold_time=0.2, time_constant=0.0)
+
+    def run_currents(self, currents, period=0.05, commanded=True):
+        return [self.detector.update(current, i * period, commanded) for i, current in enumerate(currents)]
+
+    def test_fires_after_moving(self):
+        done = self.run_currents([2.0] * 10 + [0.0] * 10)
+        self.assertFalse(any(done[:14]))
+        self.assertTrue(done[14])
+
+    def test_negative_current(self):
+        done = self.run_currents([-2.0] * 10 + [0.0] * 10)
+        self.assertTrue(done[-1])
+
+    def test_not_without_moving(self):
+        # Already at the end of travel, the current never rose
+        self.assertFalse(any(self.run_currents([0.0] * 40)))
+
+    def test_not_while_moving(self):
+        self.assertFalse(any(self.run_currents([2.0] * 40)))
+
+    def test_not_when_not_commanded(self):
+        self.run_currents([2.0] * 10)
+        done = [self.detector.update(0.0, 1.0 + i * 0.05, commanded=False) for i in range(20)]
+        self.assertFalse(any(done))
+
+
+class BinEmptyDetectorTest(unittest.TestCase):
+    def setUp(self):
+        self.detector = BinEmptyDetector(empty_weight=1.0, empty_current=0.5, hold_time=0.2, time_constant=0.0)
+
+    def test_weight(self):
+        self.assertFalse(self.detector.update([5.0, 5.0], 2.0, 0.0))
+        self.assertFalse(self.detector.update([0.2, 0.2], 0.1, 0.1))
+        self.assertTrue(self.detector.update([0.2, 0.2], 0.1, 0.4))
+
+    def test_current_without_load_cells(self):
+        self.assertFalse(self.detector.update([], 2.0, 0.0))
+        self.assertFalse(self.detector.update([], 0.1, 0.1))
+        self.assertTrue(self.detector.update([], 0.1, 0.4))
+
+
+if __name__ == "__main__":
+    unittest.main()
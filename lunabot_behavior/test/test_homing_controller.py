@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+import math
+import os
+import sys
+import threading
+import unittest
+
+import numpy as np
+
+BEHAVIOR_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# The behavior modules are scripts next to this folder, not a package. Runs without a ROS master, on the behavior
+# simulator's stand-ins, with ROS time 20 times faster than wall-clock time
+sys.path[:0] = [BEHAVIOR_DIRECTORY, os.path.join(BEHAVIOR_DIRECTORY, "sim")]
+import ros_standin
+
+rospy = ros_standin.install(20.0)
+rospy.log_level = rospy.WARN
+rospy.set_param("/is_sim", True)
+rospy.set_param("/odom_topic", "/odom")
+
+import clock
+
+clock.set_rate(20.0)
+
+from geometry_msgs.msg import PoseStamped, Twist
+from nav_msgs.msg import Odometry
+
+import apriltag_tracker
+import homing_controller
+from runtime import runtime
+
+
+def unicycle_step(pose, linear, angular, dt):
+    x, y, yaw = pose
+    return x + linear * math.cos(yaw) * dt, y + linear * math.sin(yaw) * dt, yaw + angular * dt
+
+
+class UnicycleRobot:
+    '''
+    Follows /cmd_vel, integrated over the ROS time between commands, and publishes its pose on /odom
+    '''
+
+    def __init__(self, pose):
+        self.lock = threading.Lock()
+        self.pose = pose
+        self.command = (0.0, 0.0)
+        self.stamp = rospy.get_time()
+        self.odom_publisher = rospy.Publisher("/odom", Odometry, queue_size=1)
+        self.subscriber = rospy.Subscriber("/test/cmd_vel", Twist, self.command_callback)
+        self.publish()
+
+    def command_callback(self, msg: Twist):
+        with self.lock:
+            now = rospy.get_time()
+            self.pose = unicycle_step(self.pose, *self.command, now - self.stamp)
+            self.command = (msg.linear.x, msg.angular.z)
+            self.stamp = now
+        self.publish()
+
+    def publish(self):
+        msg = Odometry()
+        msg.pose.pose.position.x, msg.pose.pose.position.y = self.pose[:2]
+        msg.pose.pose.orientation.z = math.sin(self.pose[2] / 2)
+        msg.pose.pose.orientation.w = math.cos(self.pose[2] / 2)
+        self.odom_publisher.publish(msg)
+
+
+class HomingControllerTest(unittest.TestCase):
+    def setUp(self):
+        self.homing = homing_controller.HomingController(rospy.Publisher("/test/cmd_vel", Twist, queue_size=1))
+
+        # Berm apriltag at (5, 0) facing +y (in sim, its yaw is 90 degrees off), docking 1 m along the berm
+        self.apriltag = apriltag_tracker.TagEstimate(
+            "berm", np.array([5.0, 0.0, 0.0]), np.identity(3) * 1e-4, PoseStamped(), rospy.get_time(), 1, "camera"
+        )
+        self.homing.berm_apriltag_estimate = lambda: self.apriltag
+        self.homing.dock_offset = np.array([0.3, 0.0])
+
+    def test_gain_condition(self):
+        # Astolfi: strongly stable for k_rho > 0, k_beta < 0 and k_alpha + 5/3 k_beta - 2/pi k_rho > 0
+        controller = homing_controller.HomingController
+        self.assertGreater(controller.K_RHO, 0)
+        self.assertLess(controller.K_BETA, 0)
+        self.assertGreater(controller.K_ALPHA + 5 / 3 * controller.K_BETA - 2 / math.pi * controller.K_RHO, 0)
+
+    def test_docking_goal(self):
+        goal = self.homing.docking_goal(self.apriltag)
+        np.testing.assert_allclose(goal, (5.3, self.homing.linear_setpoint, math.pi / 2), atol=1e-9)
+
+    def test_control_law_converges(self):
+        goal = self.homing.docking_goal(self.apriltag)
+        dt = self.homing.CONTROL_PERIOD
+
+        # Approaching from the mining zone side, at various headings and offsets
+        for start in [(5.3, 2.5, math.pi / 2), (4.0, 2.0, 0.0), (6.5, 1.8, -2.5), (5.0, 1.5, math.pi)]:
+            pose = start
+            for _ in range(int(self.homing.DOCK_TIME / dt)):
+                linear, angular = self.homing.docking_control(pose, goal)
+                linear = np.clip(linear, *self.homing.linear_limits)
+                angular = np.clip(angular, *self.homing.angular_limits)
+                pose = unicycle_step(pose, linear, angular, dt)
+
+            self.assertLess(math.hypot(goal[0] - pose[0], goal[1] - pose[1]), 2 * self.homing.DOCK_TOLERANCE, start)
+            heading_error = homing_controller.wrap_angle(goal[2] - pose[2])
+            self.assertLess(abs(heading_error), self.homing.alignment_threshold, start)
+
+    def test_docks_backwards(self):
+        # Facing away from the berm, the robot backs up to it
+        goal = self.homing.docking_goal(self.apriltag)
+        linear, _ = self.homing.docking_control((5.3, 2.0, math.pi / 2), goal)
+        self.assertLess(linear, 0)
+
+    def test_dock(self):
+        robot = UnicycleRobot((4.6, 2.2, math.pi / 3))
+        try:
+            self.assertTrue(runtime.run(self.homing.dock()))
+        finally:
+            robot.subscriber.unregister()
+
+        goal = self.homing.docking_goal(self.apriltag)
+        x, y, yaw = robot.pose
+        self.assertLess(math.hypot(goal[0] - x, goal[1] - y), 2 * self.homing.DOCK_TOLERANCE)
+        self.assertLess(abs(homing_controller.wrap_angle(goal[2] - yaw)), self.homing.alignment_threshold)
+        self.assertEqual(robot.command, (0.0, 0.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
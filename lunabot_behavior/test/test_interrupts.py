@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+import os
+import sys
+import threading
+import unittest
+
+BEHAVIOR_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# The behavior modules are scripts next to this folder, not a package. Runs without a ROS master, on the behavior
+# simulator's stand-ins, with ROS time 20 times faster than wall-clock time
+sys.path[:0] = [BEHAVIOR_DIRECTORY, os.path.join(BEHAVIOR_DIRECTORY, "sim")]
+import ros_standin
+
+rospy = ros_standin.install(20.0)
+rospy.log_level = rospy.WARN
+
+import clock
+
+clock.set_rate(20.0)
+
+from geometry_msgs.msg import Twist
+from lunabot_msgs.msg import RobotErrors
+from std_msgs.msg import Int8
+
+import interrupts
+from events import Events, bus
+
+
+class InterruptsTest(unittest.TestCase):
+    def setUp(self):
+        self.errors_publisher = rospy.Publisher("/errors", RobotErrors, queue_size=1)
+        self.drive_publisher = rospy.Publisher("/left_drive", Int8, queue_size=1)
+
+        # Everything published on the effort and velocity topics, after the latched messages are delivered
+        self.efforts = []
+        self.subscribers = [
+            rospy.Subscriber(topic, Int8, lambda msg, topic=topic: self.efforts.append((topic, msg.data)))
+            for topic in ("/lin_act", "/left_drive", "/right_drive", "/excavate", "/deposition")
+        ]
+        self.velocities = []
+        self.subscribers.append(rospy.Subscriber("/cmd_vel", Twist, self.velocities.append))
+        rospy.sleep(0.2)
+        del self.efforts[:], self.velocities[:]
+
+        self.problems = []
+        self.handle = interrupts.register(self.problems.append)
+        bus.clear()
+
+    def tearDown(self):
+        interrupts.unregister(self.handle)
+        for subscriber in self.subscribers:
+            subscriber.unregister()
+        self.errors_publisher.publish(RobotErrors())
+        bus.clear()
+
+    def test_fine(self):
+        self.errors_publisher.publish(RobotErrors())
+        self.assertEqual(interrupts.check_for_interrupts(), interrupts.Errors.FINE)
+        self.assertEqual(self.problems, [])
+        self.assertEqual(bus.get(timeout=0.1), (None, None))
+
+    def test_zero_effort_on_rising_edge(self):
+        self.drive_publisher.publish(Int8(100))
+        self.errors_publisher.publish(RobotErrors(overcurrent=True))
+
+        self.assertEqual(self.efforts[0], ("/left_drive", 100))
+        self.assertEqual(sorted(self.efforts[1:]), [("/deposition", 0), ("/excavate", 0), ("/left_drive", 0), ("/lin_act", 0), ("/right_drive", 0)])
+        self.assertEqual(len(self.velocities), 1)
+        self.assertEqual((self.velocities[0].linear.x, self.velocities[0].angular.z), (0.0, 0.0))
+
+        # Only once while the error lasts
+        del self.efforts[:]
+        self.errors_publisher.publish(RobotErrors(overcurrent=True))
+        self.assertEqual(self.efforts, [])
+
+    def test_manual_stop_zeroes_effort_behind_stuck(self):
+        # Stuck is reported first, the robot is still stopped for the manual stop
+        self.errors_publisher.publish(RobotErrors(stuck=True))
+        self.assertEqual(self.efforts, [])
+        self.errors_publisher.publish(RobotErrors(stuck=True, manual_stop=True))
+        self.assertEqual(len(self.efforts), 5)
+        self.assertEqual(interrupts.check_for_interrupts(), interrupts.Errors.STUCK)
+
+    def test_interrupt(self):
+        token = interrupts.cancel_token()
+        reasons = []
+        token.on_cancel(reasons.append)
+        self.assertFalse(token.cancelled)
+
+        self.errors_publisher.publish(RobotErrors(stuck=True))
+
+        self.assertEqual(interrupts.check_for_interrupts(), interrupts.Errors.STUCK)
+        self.assertEqual(self.problems, [interrupts.Errors.STUCK])
+        self.assertTrue(token.cancelled)
+        self.assertEqual(reasons, [interrupts.Errors.STUCK])
+        self.assertEqual(bus.get(Events.INTERRUPT, timeout=0.1), (Events.INTERRUPT, interrupts.Errors.STUCK))
+
+        # A token taken during the error is cancelled right away
+        self.assertTrue(interrupts.cancel_token().cancelled)
+
+        # The same error again isn't a new interrupt
+        self.errors_publisher.publish(RobotErrors(stuck=True))
+        self.assertEqual(self.problems, [interrupts.Errors.STUCK])
+        self.assertEqual(bus.get(Events.INTERRUPT, timeout=0.1), (None, None))
+
+    def test_new_problem(self):
+        self.errors_publisher.publish(RobotErrors(overcurrent=True))
+        token = interrupts.cancel_token()
+        self.assertTrue(token.cancelled)
+        self.assertEqual(token.reason, interrupts.Errors.OVERCURRENT)
+
+        # Stuck on top of the overcurrent is reported first, and is a new interrupt
+        self.errors_publisher.publish(RobotErrors(overcurrent=True, stuck=True))
+        self.assertEqual(self.problems, [interrupts.Errors.OVERCURRENT, interrupts.Errors.STUCK])
+        self.assertEqual(bus.get(Events.INTERRUPT, timeout=0.1), (Events.INTERRUPT, interrupts.Errors.OVERCURRENT))
+        self.assertEqual(bus.get(Events.INTERRUPT, timeout=0.1), (Events.INTERRUPT, interrupts.Errors.STUCK))
+
+    def test_clearing_notifies(self):
+        self.errors_publisher.publish(RobotErrors(overcurrent=True))
+        bus.clear()
+
+        woken = []
+        waiting = threading.Event()
+
+        def wait():
+            waiting.set()
+            woken.append(bus.wait_for_update(Events.INTERRUPT, timeout=20.0))
+
+        thread = threading.Thread(target=wait)
+        thread.start()
+        waiting.wait()
+        rospy.sleep(0.2)
+        self.errors_publisher.publish(RobotErrors())
+        thread.join()
+
+        self.assertEqual(woken, [True])
+        self.assertEqual(interrupts.check_for_interrupts(), interrupts.Errors.FINE)
+        # Clearing isn't queued, and isn't an interrupt
+        self.assertEqual(bus.get(timeout=0.1), (None, None))
+        self.assertEqual(self.problems, [interrupts.Errors.OVERCURRENT])
+
+    def test_unregister(self):
+        interrupts.unregister(self.handle)
+        self.errors_publisher.publish(RobotErrors(stuck=True))
+        self.assertEqual(self.problems, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
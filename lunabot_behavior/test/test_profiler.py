@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+BEHAVIOR_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# The behavior modules are scripts next to this folder, not a package. Runs without a ROS master, on the behavior
+# simulator's stand-ins, with ROS time 20 times faster than wall-clock time
+sys.path[:0] = [BEHAVIOR_DIRECTORY, os.path.join(BEHAVIOR_DIRECTORY, "sim")]
+import ros_standin
+
+rospy = ros_standin.install(20.0)
+rospy.log_level = rospy.WARN
+
+import clock
+
+clock.set_rate(20.0)
+
+import interrupts
+import profile_report
+from profiler import MissionProfiler
+
+
+class ProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.log = os.path.join(self.directory.name, "profile", "behavior.log")
+        rospy.set_param("/behavior/profile_log", self.log)
+
+    def tearDown(self):
+        rospy.delete_param("/behavior/profile_log")
+        self.directory.cleanup()
+
+    def write_run(self, label: str, deposit_time: float):
+        """
+        A startup and two cycles, each aligning (waiting half of it) and depositing. Returns the profiler.
+        """
+
+        profiler = MissionProfiler()
+        profiler.start_run(label)
+        with profiler.span("ASCENT_INIT"):
+            rospy.sleep(0.5)
+        for _ in range(2):
+            profiler.next_cycle()
+            with profiler.span("ALIGN"):
+                with profiler.span("home"):
+                    with profiler.waiting():
+                        rospy.sleep(1.0)
+                    rospy.sleep(1.0)
+            with profiler.span("DEPOSIT"):
+                rospy.sleep(deposit_time)
+        profiler.next_cycle()
+        profiler.file.close()
+        return profiler
+
+    def test_log_format(self):
+        profiler = self.write_run("first try", 1.0)
+        with open(self.log) as file:
+            lines = [line.split() for line in file]
+
+        self.assertEqual([line[0] for line in lines[:4]], ["R", "E", "X", "C"])
+        self.assertEqual(lines[0][4], "first_try")
+        self.assertEqual(lines[1][2:], ["0", "ASCENT_INIT"])
+        self.assertEqual(lines[3][2], "1")
+        self.assertEqual(lines[4][2:], ["1", "ALIGN"])
+        self.assertEqual(lines[5][2:], ["1", "ALIGN/home"])
+
+        exit_home = lines[6]
+        self.assertEqual(exit_home[:4], ["X", exit_home[1], "1", "ALIGN/home"])
+        self.assertAlmostEqual(float(exit_home[4]), 2.0, delta=0.3)
+        self.assertAlmostEqual(float(exit_home[5]), 1.0, delta=0.3)  # rospy.sleep isn't counted
+        self.assertEqual(exit_home[6], "ok")
+        self.assertEqual(profiler.stack, [])
+
+    def test_round_trip(self):
+        self.write_run("run", 1.0)
+        profiler = MissionProfiler()
+        profiler.start_run()
+        profiler.next_cycle()
+        with profiler.span("PLUNGE") as span:
+            span.interrupted = True
+        profiler.mark_interrupt(interrupts.Errors.STUCK)
+        with profiler.span("TRENCH"):
+            pass
+        # Killed inside TRENCH: the E line is the last one
+        profiler.file.write("E %.3f 1 TRENCH\nX %.3f" % (rospy.get_time(), rospy.get_time()))
+        profiler.file.close()
+
+        first, second = profile_report.read_runs(self.log)
+
+        self.assertEqual(first.label, "run")
+        self.assertEqual(first.complete_cycles, [1, 2])
+        self.assertEqual([span.path for span in first.spans], ["ASCENT_INIT"] + ["ALIGN", "ALIGN/home", "DEPOSIT"] * 2)
+        home = first.spans[2]
+        self.assertEqual((home.cycle, home.depth, home.name, home.status), (1, 1, "home", "ok"))
+        self.assertAlmostEqual(home.duration, 2.0, delta=0.3)
+        self.assertAlmostEqual(home.sleep, 1.0, delta=0.3)
+        self.assertAlmostEqual(first.cycles_per_hour(), 3600 / 3.0, delta=100)  # 2 s aligning, 1 s depositing
+
+        count, mean, worst, waiting = first.state_stats()["ALIGN"]
+        self.assertEqual(count, 2)
+        self.assertAlmostEqual(mean, 2.0, delta=0.3)
+        self.assertAlmostEqual(waiting, 0.5, delta=0.15)
+
+        self.assertEqual(second.label, "-")
+        self.assertEqual(second.complete_cycles, [])
+        self.assertEqual([(span.path, span.status) for span in second.spans], [("PLUNGE", "interrupted"), ("TRENCH", "ok"), ("TRENCH", "unfinished")])
+        self.assertEqual([error for _, _, error in second.interrupts], ["STUCK"])
+
+    def test_report(self):
+        self.write_run("before", 1.0)
+        self.write_run("after", 3.0)
+        before, after = profile_report.read_runs(self.log)
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            profile_report.print_cycle(after, 1)
+            regressions = profile_report.compare(after, before, threshold=0.1, min_seconds=0.5)
+
+        lines = output.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith("Cycle 1: "))
+        # Gantt chart: ALIGN from the start, DEPOSIT after it, to the end of the cycle
+        chart = {line.split("|")[0].strip(): line.split("|")[1] for line in lines[1:4]}
+        self.assertEqual(set(chart), {"ALIGN", "home", "DEPOSIT"})
+        self.assertTrue(chart["ALIGN"].startswith("#"))
+        self.assertTrue(chart["DEPOSIT"].startswith(" "))
+        self.assertTrue(chart["DEPOSIT"].endswith("#"))
+        self.assertEqual(len(chart["ALIGN"]), profile_report.CHART_WIDTH)
+
+        self.assertEqual(regressions, ["DEPOSIT", "cycles/hour"])
+        self.assertIn("REGRESSION", [line for line in lines if "DEPOSIT" in line][-1])
+        self.assertNotIn("REGRESSION", [line for line in lines if "ALIGN/home" in line][-1])
+
+    def test_other_threads(self):
+        profiler = MissionProfiler()
+        profiler.start_run()
+
+        # Only the thread that started the run opens spans
+        thread = threading.Thread(target=lambda: profiler.span("PLUNGE").__enter__())
+        thread.start()
+        thread.join()
+        self.assertEqual(profiler.stack, [])
+        profiler.file.close()
+
+    def test_off(self):
+        rospy.set_param("/behavior/profile_log", "")
+        profiler = MissionProfiler()
+        profiler.start_run()
+        with profiler.span("PLUNGE"):
+            profiler.next_cycle()
+        self.assertIsNone(profiler.file)
+        self.assertFalse(os.path.exists(self.log))
+
+
+if __name__ == "__main__":
+    unittest.main()
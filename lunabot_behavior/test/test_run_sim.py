@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+BEHAVIOR_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+RUN_SIM = os.path.join(BEHAVIOR_DIRECTORY, "sim", "run_sim.py")
+
+# The behavior modules are scripts next to this folder, not a package
+sys.path.insert(0, BEHAVIOR_DIRECTORY)
+
+import profile_report
+
+# Every state of a cycle (ASCENT_MINING can be skipped, the ascent is usually done while driving to the berm)
+CYCLE_STATES = ["ASCENT_INIT", "FIND_TAG", "TRAVERSAL_MINE", "PLUNGE", "TRENCH", "TRAVERSAL_BERM", "ALIGN", "DEPOSIT"]
+
+
+def run_sim(*args) -> subprocess.CompletedProcess:
+    """
+    Run the simulator in its own process (the stand-ins and the behavior modules are process-wide)
+    """
+
+    return subprocess.run(
+        [sys.executable, RUN_SIM, "--rate", "100", "--timeout", "600"] + list(args),
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, timeout=120,
+    )
+
+def states_reached(output: str) -> list:
+    for line in output.splitlines():
+        if line.startswith("Time in each state: "):
+            return [item.split()[0] for item in line[len("Time in each state: "):].split(", ")]
+    return []
+
+
+class TestRunSim(unittest.TestCase):
+    def test_one_cycle(self):
+        result = run_sim("--cycles", "1")
+
+        self.assertEqual(result.returncode, 0, result.stdout)
+        self.assertIn("Cycle 1:", result.stdout)
+        for state in CYCLE_STATES:
+            self.assertIn(state, states_reached(result.stdout))
+
+    def test_overcurrent(self):
+        with tempfile.TemporaryDirectory() as directory:
+            log = os.path.join(directory, "profile.log")
+            result = run_sim("--cycles", "1", "--fault", "overcurrent:100:3", "--profile-log", log)
+
+            self.assertEqual(result.returncode, 0, result.stdout)
+            self.assertIn("Cycle 1:", result.stdout)
+            for state in CYCLE_STATES:
+                self.assertIn(state, states_reached(result.stdout))
+
+            # The fault interrupted the state machine, and it waited it out
+            runs = profile_report.read_runs(log)
+            self.assertEqual(len(runs), 1)
+            self.assertIn("OVERCURRENT", [error for _, _, error in runs[0].interrupts])
+            self.assertIn("OVERCURRENT", [span.name for span in runs[0].spans])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+import asyncio
+import os
+import sys
+import threading
+import unittest
+
+BEHAVIOR_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# The behavior modules are scripts next to this folder, not a package. Runs without a ROS master, on the behavior
+# simulator's stand-ins, with ROS time 20 times faster than wall-clock time
+sys.path[:0] = [BEHAVIOR_DIRECTORY, os.path.join(BEHAVIOR_DIRECTORY, "sim")]
+import ros_standin
+
+rospy = ros_standin.install(20.0)
+rospy.log_level = rospy.WARN
+
+import clock
+
+clock.set_rate(20.0)
+
+from lunabot_msgs.msg import RobotErrors, RobotSensors
+
+import interrupts
+import sensor_cache
+from events import Events, bus
+from runtime import runtime
+
+
+def later(seconds, function, *args):
+    timer = threading.Timer(seconds, function, args)
+    timer.start()
+    return timer
+
+
+class RuntimeTest(unittest.TestCase):
+    def setUp(self):
+        self.errors_publisher = rospy.Publisher("/errors", RobotErrors, queue_size=1)
+        self.sensors_publisher = rospy.Publisher("/sensors", RobotSensors, queue_size=1)
+
+    def tearDown(self):
+        self.errors_publisher.publish(RobotErrors())
+
+    def test_run_returns_result(self):
+        async def add(a, b):
+            await asyncio.sleep(0)
+            return a + b
+
+        self.assertEqual(runtime.run(add(1, 2)), 3)
+
+    def test_spawn_runs_at_the_same_time(self):
+        async def wait(event):
+            return (await runtime.wait_for(event, timeout=10.0))[1]
+
+        first = runtime.spawn(wait(Events.GOAL_REACHED))
+        second = runtime.spawn(wait(Events.APRILTAG))
+        later(0.02, bus.post, Events.APRILTAG, "tag")
+        later(0.04, bus.post, Events.GOAL_REACHED, "goal")
+
+        self.assertEqual(runtime.join(second), "tag")
+        self.assertEqual(runtime.join(first), "goal")
+
+    def test_wait_for_timeout(self):
+        async def wait():
+            return await runtime.wait_for(Events.GOAL_REACHED, timeout=0.2)
+
+        self.assertEqual(runtime.run(wait()), (None, None))
+
+    def test_cancel_all(self):
+        cancelled = threading.Event()
+
+        async def forever():
+            try:
+                await runtime.wait_for(Events.GOAL_REACHED)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return True
+
+        task = runtime.spawn(forever())
+        later(0.02, runtime.loop.call_soon_threadsafe, runtime.cancel_all)
+
+        # join returns once the task is cancelled, with False like a module that noticed the interrupt
+        self.assertIs(runtime.join(task), False)
+        self.assertTrue(cancelled.is_set())
+        self.assertEqual(len(runtime.tasks), 0)
+
+    def test_interrupt_cancels_tasks(self):
+        async def forever():
+            await runtime.wait_for(Events.GOAL_REACHED)
+            return True
+
+        task = runtime.spawn(forever())
+        later(0.02, self.errors_publisher.publish, RobotErrors(stuck=True))
+        self.assertIs(runtime.join(task), False)
+
+    def test_no_start_during_error(self):
+        async def done():
+            return True
+
+        self.errors_publisher.publish(RobotErrors(stuck=True))
+        self.assertIs(runtime.run(done()), False)
+        # Unless it's the recovery from that error
+        self.assertIs(runtime.run(done(), during=interrupts.Errors.STUCK), True)
+
+    def test_next_sample(self):
+        after = sensor_cache.get_snapshot().seq
+
+        later(0.02, self.sensors_publisher.publish, RobotSensors())
+        snapshot = runtime.run(sensor_cache.next_sample(after, timeout=10.0))
+        self.assertEqual(snapshot.seq, after + 1)
+
+        # Already newer: returns right away
+        self.assertIs(runtime.run(sensor_cache.next_sample(after, timeout=10.0)), snapshot)
+
+        # Nothing new: the same snapshot after the timeout
+        self.assertIs(runtime.run(sensor_cache.next_sample(snapshot.seq, timeout=0.2)), snapshot)
+
+    def test_next_sample_interrupted(self):
+        after = sensor_cache.get_snapshot().seq
+
+        later(0.02, self.errors_publisher.publish, RobotErrors(overcurrent=True))
+        # The interrupt cancels the task
+        self.assertIs(runtime.run(sensor_cache.next_sample(after)), False)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+import os
+import sys
+import unittest
+
+import numpy as np
+from nav_msgs.msg import OccupancyGrid
+
+# The behavior modules are scripts next to this folder, not a package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import zones
+from scheduler import DigSiteScheduler
+
+
+def occupancy_grid(grid, resolution, origin):
+    """OccupancyGrid message of grid, indexed [x, y]"""
+    msg = OccupancyGrid()
+    msg.info.resolution = resolution
+    msg.info.width, msg.info.height = grid.shape
+    msg.info.origin.position.x, msg.info.origin.position.y = origin
+    msg.info.origin.orientation.w = 1.0
+    msg.data = grid.flatten(order="F").tolist()
+    return msg
+
+
+class DigSiteSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        # Mining zone from (2, 0) to (4, 2), berm zone under it, berm apriltag on its bottom edge
+        mining_zone = zones.Zone(top_left=(2, 2), top_right=(4, 2), bottom_left=(2, 0), bottom_right=(4, 0))
+        berm_zone = zones.Zone(top_left=(2, 0), top_right=(4, 0), bottom_left=(2, -1), bottom_right=(4, -1))
+        self.scheduler = DigSiteScheduler(mining_zone, berm_zone, (2.5, -1.0), 0.01, 50)
+        self.start = (0.0, 1.0)
+
+    def test_dig_sites(self):
+        # 1 m usable each way at 0.6 m spacing: 2 x 2 sites, as deep as the buckets reach
+        np.testing.assert_allclose(self.scheduler.dig_sites[:, :2], [[2.7, 0.7], [2.7, 1.3], [3.3, 0.7], [3.3, 1.3]])
+        np.testing.assert_allclose(self.scheduler.remaining, 0.6**2 * 0.1)
+
+    def test_closest_dig_site(self):
+        np.testing.assert_allclose(self.scheduler.next_dig_site(self.start)[:2], (2.7, 0.7))
+
+    def test_prefers_undug(self):
+        self.scheduler.next_dig_site(self.start)
+        self.scheduler.record_dig(1.0)
+        self.assertEqual(self.scheduler.remaining[0], 0.0)
+        np.testing.assert_allclose(self.scheduler.next_dig_site(self.start)[:2], (2.7, 1.3))
+
+    def test_prefers_more_regolith(self):
+        # A site with less than a cycle's worth left moves less per second than one a bit further away
+        self.scheduler.remaining[:2] = 0.002
+        np.testing.assert_allclose(self.scheduler.next_dig_site(self.start)[:2], (3.3, 0.7))
+
+    def test_trench_digs_sites_along_it(self):
+        self.scheduler.next_dig_site(self.start)
+        full = self.scheduler.remaining[0]
+        self.scheduler.record_dig(0.01, trench_length=0.6)
+        np.testing.assert_allclose(self.scheduler.remaining, [full - 0.005, full, full - 0.005, full])
+
+    def test_dug_out(self):
+        self.scheduler.remaining[:] = 0.0
+        self.assertIsNone(self.scheduler.next_dig_site(self.start))
+
+    def test_costmap_detour(self):
+        # A wall between the robot and the mining zone, with a gap at the top: the upper sites are closer to drive to
+        grid = np.zeros((60, 45), dtype=int)
+        grid[20:22, :30] = 100
+        map_msg = occupancy_grid(grid, 0.1, (-0.5, -1.5))
+
+        np.testing.assert_allclose(self.scheduler.next_dig_site(self.start, map_msg)[:2], (2.7, 1.3))
+
+        costs = self.scheduler.travel_costs(np.array(self.start), self.scheduler.dig_sites, map_msg)
+        straight = np.linalg.norm(self.scheduler.dig_sites[:, :2] - self.start, axis=1)
+        self.assertTrue(np.all(costs > straight))
+
+    def test_dump_spots(self):
+        # Along the berm within MAX_DOCK_OFFSET of the apriltag, DUMP_MARGIN inside the berm zone
+        np.testing.assert_allclose(self.scheduler.dump_offsets, [[0.0, 0.0], [0.2, 0.0], [0.4, 0.0]], atol=1e-9)
+        np.testing.assert_allclose(self.scheduler.dump_sites[:, :2], [[2.5, -0.5], [2.7, -0.5], [2.9, -0.5]])
+        # Stopped in front of them, towards the mining zone
+        np.testing.assert_allclose(self.scheduler.dump_goals[:, 1], 1.0)
+
+    def test_dump_spot_fills_up(self):
+        np.testing.assert_allclose(self.scheduler.dump_offset(), (0.0, 0.0))
+
+        self.scheduler.next_dump_site(self.start)
+        self.assertEqual(self.scheduler.dump_index, 0)
+
+        self.scheduler.record_dump(self.scheduler.DUMP_CAPACITY)
+        self.scheduler.next_dump_site(self.start)
+        self.assertEqual(self.scheduler.dump_index, 1)
+        np.testing.assert_allclose(self.scheduler.dump_offset(), (0.2, 0.0), atol=1e-9)
+
+    def test_only_spots_with_room(self):
+        self.scheduler.room[:2] = 0.0
+        self.scheduler.next_dump_site(self.start)
+        self.assertEqual(self.scheduler.dump_index, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
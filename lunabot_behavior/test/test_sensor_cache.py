@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+import os
+import sys
+import threading
+import unittest
+
+BEHAVIOR_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# The behavior modules are scripts next to this folder, not a package. Runs without a ROS master, on the behavior
+# simulator's stand-ins, with ROS time 20 times faster than wall-clock time
+sys.path[:0] = [BEHAVIOR_DIRECTORY, os.path.join(BEHAVIOR_DIRECTORY, "sim")]
+import ros_standin
+
+rospy = ros_standin.install(20.0)
+rospy.log_level = rospy.WARN
+
+import clock
+
+clock.set_rate(20.0)
+
+from lunabot_msgs.msg import RobotSensors
+
+from sensor_cache import SensorCache
+
+
+def later(seconds, function, *args):
+    timer = threading.Timer(seconds, function, args)
+    timer.start()
+    return timer
+
+
+class SensorCacheTest(unittest.TestCase):
+    def setUp(self):
+        # A cache of its own, to start without a message
+        self.cache = SensorCache()
+        self.publisher = rospy.Publisher("/sensors", RobotSensors, queue_size=1)
+
+    def test_first_message(self):
+        self.assertTrue(self.cache.is_stale())
+        self.assertEqual(self.cache.snapshot.seq, 0)
+        self.assertIsNone(self.cache.snapshot.load_cell_weight)
+
+        self.publisher.publish(RobotSensors(load_cell_weights=[1.0, 2.5]))
+        snapshot = self.cache.snapshot
+        self.assertEqual(snapshot.seq, 1)
+        self.assertEqual(snapshot.load_cell_weight, 3.5)
+        self.assertFalse(self.cache.is_stale())
+
+    def test_stale(self):
+        self.publisher.publish(RobotSensors())
+        rospy.sleep(SensorCache.STALE_TIME / 2)
+        self.assertFalse(self.cache.is_stale())
+        self.assertTrue(self.cache.is_stale(max_age=SensorCache.STALE_TIME / 4))
+
+        rospy.sleep(SensorCache.STALE_TIME)
+        self.assertTrue(self.cache.is_stale())
+        self.assertFalse(self.cache.is_stale(max_age=SensorCache.STALE_TIME * 4))
+
+    def test_filtered(self):
+        self.publisher.publish(RobotSensors(exc_curr=10.0))
+        # The low-pass filter starts at the first value
+        self.assertEqual(self.cache.snapshot.exc_curr, 10.0)
+
+        rospy.sleep(SensorCache.FILTER_TIME_CONSTANT)
+        self.publisher.publish(RobotSensors(exc_curr=0.0))
+        self.assertGreater(self.cache.snapshot.exc_curr, 0.0)
+        self.assertLess(self.cache.snapshot.exc_curr, 10.0)
+        self.assertEqual(self.cache.snapshot.msg.exc_curr, 0.0)
+
+    def test_wait_for_sample_timeout(self):
+        start = rospy.get_time()
+        self.assertIsNone(self.cache.wait_for_sample(0, timeout=0.5))
+        self.assertGreaterEqual(rospy.get_time() - start, 0.45)
+
+    def test_wait_for_sample(self):
+        later(0.02, self.publisher.publish, RobotSensors())
+        snapshot = self.cache.wait_for_sample(0, timeout=20.0)
+        self.assertEqual(snapshot.seq, 1)
+
+        # Already newer: returns right away
+        self.assertIs(self.cache.wait_for_sample(0, timeout=0.0), snapshot)
+
+        # Waits for a newer seq, not any message after the call
+        later(0.02, self.publisher.publish, RobotSensors())
+        later(0.04, self.publisher.publish, RobotSensors())
+        self.assertEqual(self.cache.wait_for_sample(2, timeout=20.0).seq, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+import os
+import sys
+import unittest
+
+import numpy as np
+
+# The behavior modules are scripts next to this folder, not a package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from stuck import RingBuffer, SlipEstimator
+
+
+class RingBufferTest(unittest.TestCase):
+    def test_fills_up(self):
+        buffer = RingBuffer(3, 2)
+        self.assertEqual(buffer.window().shape, (0, 2))
+        buffer.append((1, 2))
+        buffer.append((3, 4))
+        np.testing.assert_array_equal(buffer.window(), [[1, 2], [3, 4]])
+
+    def test_overwrites_oldest(self):
+        buffer = RingBuffer(3, 1)
+        for value in range(5):
+            buffer.append((value,))
+        self.assertEqual(buffer.count, 3)
+        self.assertEqual(sorted(buffer.window()[:, 0]), [2, 3, 4])
+
+
+class SlipEstimatorTest(unittest.TestCase):
+    def setUp(self):
+        self.max_wheel_speed = 0.28  # m/s
+        self.estimator = SlipEstimator(20, self.max_wheel_speed, 0.56, 0.02)
+
+    def drive(self, effort, wheel_fraction, ground_fraction, turning=False, samples=20):
+        """Straight (or turning on the spot) at effort, the wheels and the ground following by fractions"""
+        for _ in range(samples):
+            wheel = effort / 127 * self.max_wheel_speed * wheel_fraction
+            if turning:
+                self.estimator.add(-effort, effort, -wheel, wheel, 0.0, ground_fraction * 2 * wheel / 0.56)
+            else:
+                self.estimator.add(effort, effort, wheel, wheel, wheel * ground_fraction, 0.0)
+
+    def test_rolling(self):
+        self.drive(100, 1.0, 1.0)
+        self.assertAlmostEqual(self.estimator.tracking(), 1.0)
+        self.assertAlmostEqual(self.estimator.slip_ratio(), 0.0)
+        self.assertAlmostEqual(self.estimator.estimate(), 0.0)
+
+    def test_reversing(self):
+        self.drive(-100, 1.0, 1.0)
+        self.assertAlmostEqual(self.estimator.estimate(), 0.0)
+
+    def test_turning(self):
+        self.drive(100, 1.0, 1.0, turning=True)
+        self.assertAlmostEqual(self.estimator.estimate(), 0.0)
+
+    def test_stalled(self):
+        self.drive(100, 0.0, 0.0)
+        self.assertAlmostEqual(self.estimator.tracking(), 0.0)
+        self.assertAlmostEqual(self.estimator.estimate(), 1.0)
+
+    def test_spinning_in_place(self):
+        self.drive(100, 1.0, 0.0)
+        self.assertAlmostEqual(self.estimator.slip_ratio(), 1.0)
+        self.assertAlmostEqual(self.estimator.estimate(), 1.0)
+
+    def test_graded(self):
+        self.drive(100, 0.9, 0.5)
+        self.assertAlmostEqual(self.estimator.tracking(), 0.9)
+        self.assertAlmostEqual(self.estimator.estimate(), 0.5)
+
+    def test_pushed_back(self):
+        self.drive(100, -0.5, 1.0)
+        self.assertAlmostEqual(self.estimator.tracking(), -0.5)
+        self.assertAlmostEqual(self.estimator.estimate(), 1.0)
+
+    def test_standing_still(self):
+        self.drive(0, 1.0, 1.0)
+        self.assertIsNone(self.estimator.tracking())
+        self.assertEqual(self.estimator.estimate(), 0.0)
+
+    def test_window(self):
+        self.drive(100, 0.0, 0.0)
+        # Old samples leave the window
+        self.drive(100, 1.0, 1.0)
+        self.assertAlmostEqual(self.estimator.estimate(), 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+import math
+import os
+import sys
+import unittest
+
+# The behavior modules are scripts next to this folder, not a package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from tag_search import TagSearch, wrap_angle
+
+
+class TagSearchTest(unittest.TestCase):
+    def setUp(self):
+        # Camera facing backwards, like the back cameras
+        self.search = TagSearch(math.pi, 0.4, 1.0, 0.3)
+
+    def test_spins_without_prediction(self):
+        self.search.start((0.0, 0.0, 0.0), None)
+        self.assertEqual(self.search.state, TagSearch.SPIN)
+        self.assertEqual(self.search.angular_velocity((0.0, 0.0, 0.0)), 0.4)
+
+    def test_turns_the_camera_towards_the_tag(self):
+        # Tag behind the robot, to its right: the camera faces it with the robot turned left by 45 degrees
+        self.search.start((0.0, 0.0, 0.0), (-1.0, -1.0))
+        self.assertEqual(self.search.state, TagSearch.TURN)
+        self.assertAlmostEqual(wrap_angle(self.search.bearing), math.pi / 4)
+        self.assertEqual(self.search.angular_velocity((0.0, 0.0, 0.0)), 1.0)
+
+    def test_turns_the_shortest_way(self):
+        self.search.start((0.0, 0.0, 0.0), (1.0, -0.1))
+        self.assertEqual(self.search.angular_velocity((0.0, 0.0, 0.0)), 1.0)
+        self.search.start((0.0, 0.0, 0.0), (1.0, 0.1))
+        self.assertEqual(self.search.angular_velocity((0.0, 0.0, 0.0)), -1.0)
+
+    def test_slows_down_near_the_bearing(self):
+        self.search.start((0.0, 0.0, 0.0), (-1.0, 0.0))
+        # Camera already on the tag: sweeping, slowly
+        self.assertEqual(abs(self.search.angular_velocity((0.0, 0.0, 0.0))), 0.3)
+        self.assertEqual(self.search.state, TagSearch.SWEEP)
+
+        self.search.start((0.0, 0.0, 0.0), (-1.0, 0.0))
+        self.assertEqual(abs(self.search.angular_velocity((0.0, 0.0, 0.3))), 0.3)
+        self.assertEqual(abs(self.search.angular_velocity((0.0, 0.0, 1.0))), 1.0)
+
+    def test_sweeps_wider_then_spins(self):
+        self.search.start((0.0, 0.0, 0.0), (-1.0, 0.0))
+        yaw = 0.0
+        targets = []
+        for _ in range(100):
+            self.search.angular_velocity((0.0, 0.0, yaw))
+            if self.search.state == TagSearch.SPIN:
+                break
+            # Teleport onto the next sweep target
+            yaw = self.search.sweep_target()
+            targets.append(yaw)
+
+        self.assertEqual(self.search.state, TagSearch.SPIN)
+        step = self.search.SWEEP_STEP
+        self.assertEqual(targets[:4], [step, -step, 2 * step, -2 * step])
+        self.assertTrue(all(abs(target) <= math.pi for target in targets))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+import math
+import os
+import sys
+import unittest
+
+import numpy as np
+from geometry_msgs.msg import PoseStamped
+from tf.transformations import quaternion_from_euler
+
+# The behavior modules are scripts next to this folder, not a package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import zones
+
+
+def apriltag_pose(x, y, yaw):
+    pose = PoseStamped()
+    pose.pose.position.x = x
+    pose.pose.position.y = y
+    quaternion = quaternion_from_euler(0, 0, yaw)
+    pose.pose.orientation.x = quaternion[0]
+    pose.pose.orientation.y = quaternion[1]
+    pose.pose.orientation.z = quaternion[2]
+    pose.pose.orientation.w = quaternion[3]
+    return pose
+
+
+class ZoneTest(unittest.TestCase):
+    def setUp(self):
+        # 2 x 1, rotated 90 degrees: left to right is +y
+        self.zone = zones.Zone(top_left=(0, 0), top_right=(0, 2), bottom_left=(1, 0), bottom_right=(1, 2))
+
+    def test_middle_and_heading(self):
+        self.assertEqual(self.zone.middle, (0.5, 1.0))
+        self.assertAlmostEqual(self.zone.heading, math.pi / 2)
+
+    def test_contains(self):
+        self.assertTrue(self.zone.contains((0.5, 1.0)))
+        self.assertFalse(self.zone.contains((1.5, 1.0)))
+        np.testing.assert_array_equal(
+            self.zone.contains(np.array([[0.5, 0.1, 0.0], [-0.1, 1.0, 0.0], [0.9, 1.9, 3.0]])), [True, False, True]
+        )
+
+    def test_distance(self):
+        self.assertAlmostEqual(self.zone.distance((2.0, 1.0)), 1.0)
+        self.assertAlmostEqual(self.zone.distance((2.0, 3.0)), math.sqrt(2))
+        self.assertEqual(self.zone.distance((0.5, 1.0)), 0.0)
+        self.assertAlmostEqual(self.zone.distance((0.5, 1.0), signed=True), -0.5)
+        np.testing.assert_allclose(self.zone.distance(np.array([[0.2, 1.0], [1.0, 3.0]]), signed=True), [-0.2, 1.0])
+
+    def test_candidate_poses(self):
+        poses = self.zone.candidate_poses(0.5, 0.25)
+        # 1.5 m usable along, 0.5 m across: 4 x 2 poses
+        self.assertEqual(poses.shape, (8, 3))
+        self.assertTrue(np.all(self.zone.distance(poses, signed=True) <= -0.25 + 1e-9))
+        np.testing.assert_allclose(poses[:, 2], math.pi / 2)
+        self.assertIs(self.zone.candidate_poses(0.5, 0.25), poses)
+
+    def test_candidate_poses_small_zone(self):
+        # Not enough room for the margin, one pose in the middle
+        poses = self.zone.candidate_poses(0.5, 2.0)
+        np.testing.assert_allclose(poses, [[0.5, 1.0, math.pi / 2]])
+
+
+class ArenaFrameTest(unittest.TestCase):
+    def setUp(self):
+        self.frame = zones.ArenaFrame(apriltag_pose(1.0, 2.0, 0.0), is_sim=True)
+
+    def test_to_odom(self):
+        # In sim, the arena x axis is the apriltag's yaw plus 90 degrees
+        np.testing.assert_allclose(self.frame.to_odom((1.0, 0.0)), (1.0, 3.0), atol=1e-9)
+        np.testing.assert_allclose(self.frame.to_odom((0.0, 1.0)), (0.0, 2.0), atol=1e-9)
+        np.testing.assert_allclose(self.frame.rotate((1.0, 0.0)), (0.0, 1.0), atol=1e-9)
+
+    def test_real_robot_turns_the_other_way(self):
+        frame = zones.ArenaFrame(apriltag_pose(1.0, 2.0, 0.0), is_sim=False)
+        np.testing.assert_allclose(frame.to_odom((1.0, 0.0)), (1.0, 1.0), atol=1e-9)
+
+    def test_round_trip(self):
+        points = np.array([[0.0, 0.0], [3.5, -1.0], [6.0, 4.0]])
+        np.testing.assert_allclose(self.frame.to_arena(self.frame.to_odom(points)), points, atol=1e-9)
+
+    def test_zone(self):
+        zone = self.frame.zone(1.0, 1.0, 2.0, 3.0)
+        self.assertTrue(zone.contains(self.frame.to_odom((2.0, 2.5))))
+        self.assertFalse(zone.contains(self.frame.to_odom((0.5, 2.5))))
+        self.assertAlmostEqual(zone.heading, math.pi / 2)
+
+    def test_find_zones(self):
+        pose = apriltag_pose(1.0, 2.0, 0.0)
+        mining = zones.find_mining_zone(pose, True, self.frame)
+        berm = zones.find_berm_zone(pose, True, self.frame)
+        np.testing.assert_allclose(self.frame.to_arena(mining.middle), (5.28, 2.5), atol=1e-9)
+        np.testing.assert_allclose(self.frame.to_arena(berm.middle), (5.78, -0.5), atol=1e-9)
+        # Same zones without the precomputed frame
+        np.testing.assert_allclose(zones.find_mining_zone(pose, True).corners, mining.corners)
+
+
+if __name__ == "__main__":
+    unittest.main()
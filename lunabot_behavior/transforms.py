@@ -0,0 +1,105 @@
+import rospy
+import tf2_ros
+import tf2_geometry_msgs
+from geometry_msgs.msg import PoseStamped, TransformStamped
+
+import threading
+
+TF_EXCEPTIONS = (tf2_ros.LookupException, tf2_ros.ConnectivityException, tf2_ros.ExtrapolationException)
+
+
+class TransformService:
+    '''
+    One long-lived tf2 buffer/listener shared by every behavior module. A buffer only knows the transforms received
+    since it was created, so creating one per lookup means waiting for /tf every time (or failing).
+
+    Lookups are interpolated at the time asked for, and the latest transform of each frame pair is cached, so it can
+    be reused within a control cycle and as a fallback when tf has nothing newer.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buffer: tf2_ros.Buffer = None
+        self.listener: tf2_ros.TransformListener = None
+        self.latest = {}  # (target_frame, source_frame) -> TransformStamped
+
+    def start(self):
+        """
+        Start listening to /tf. Call early (e.g. in a module's __init__), so the buffer is filled when it's needed
+        """
+
+        with self.lock:
+            if self.buffer is None:
+                self.buffer = tf2_ros.Buffer(cache_time=rospy.Duration(10))
+                self.listener = tf2_ros.TransformListener(self.buffer)
+
+    def lookup(self, target_frame: str, source_frame: str, stamp: rospy.Time = None, timeout: float = 0.0) -> TransformStamped:
+        """
+        Transform from source_frame to target_frame, interpolated at stamp (latest available if None).
+        Raises one of TF_EXCEPTIONS if it isn't available within timeout seconds.
+        """
+
+        self.start()
+
+        if stamp is None:
+            stamp = rospy.Time(0)
+
+        transform = self.buffer.lookup_transform(target_frame, source_frame, stamp, rospy.Duration(timeout))
+
+        key = (target_frame, source_frame)
+        with self.lock:
+            cached = self.latest.get(key)
+            if cached is None or transform.header.stamp >= cached.header.stamp:
+                self.latest[key] = transform
+
+        return transform
+
+    def lookup_latest(self, target_frame: str, source_frame: str, max_age: float = None) -> TransformStamped:
+        """
+        Latest transform from source_frame to target_frame. The cached one is used if it's at most max_age
+        seconds old, or if tf doesn't have one right now. Returns None if there never was one.
+        """
+
+        key = (target_frame, source_frame)
+        with self.lock:
+            cached = self.latest.get(key)
+
+        if cached is not None and max_age is not None:
+            if (rospy.Time.now() - cached.header.stamp).to_sec() <= max_age:
+                return cached
+
+        try:
+            return self.lookup(target_frame, source_frame)
+        except TF_EXCEPTIONS:
+            return cached
+
+    def transform_pose(self, pose: PoseStamped, target_frame: str, timeout: float = 0.0) -> PoseStamped:
+        """
+        Transform a pose to target_frame at the time it was stamped with, falling back to the latest transform
+        if tf can't interpolate at that time (e.g. the stamp is too old or zero). Returns None if neither is available.
+        """
+
+        source_frame = pose.header.frame_id
+
+        try:
+            transform = self.lookup(target_frame, source_frame, pose.header.stamp, timeout)
+        except TF_EXCEPTIONS:
+            transform = self.lookup_latest(target_frame, source_frame)
+            if transform is None:
+                return None
+
+        return tf2_geometry_msgs.do_transform_pose(pose, transform)
+
+
+transform_service = TransformService()
+
+def start():
+    # This is done so, in every other module, you can call transforms.transform_pose()
+    # and not every module needs its own buffer
+    transform_service.start()
+
+def transform_pose(pose: PoseStamped, target_frame: str, timeout: float = 0.0) -> PoseStamped:
+    return transform_service.transform_pose(pose, target_frame, timeout)
+
+def lookup_latest(target_frame: str, source_frame: str, max_age: float = None) -> TransformStamped:
+    return transform_service.lookup_latest(target_frame, source_frame, max_age)
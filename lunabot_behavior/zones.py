@@ -3,11 +3,13 @@ from geometry_msgs.msg import PoseStamped
 from nav_msgs.msg import Path
 from tf.transformations import euler_from_quaternion
 import math
+import numpy as np
 
 class Zone:
     def __init__(self, top_left: 'tuple[float]', top_right: 'tuple[float]', bottom_left: 'tuple[float]', bottom_right: 'tuple[float]'):
         """
-        Initialize a zone with four corners. Also keeps track of the middle of the zone
+        Initialize a zone with four corners. Also keeps track of the middle of the zone, and precomputes its edges
+        for the point queries below
         """
 
         # tuples are (x, y) where x is left-right and y is bottom-top
@@ -18,6 +20,89 @@ class Zone:
 
         self.middle = ((bottom_left[0] + top_right[0]) / 2, (bottom_left[1] + top_right[1]) / 2)
 
+        # Corners in order around the zone, and the edge from each one to the next
+        self.corners = np.array([bottom_left, bottom_right, top_right, top_left], dtype=float)
+        self.edges = np.roll(self.corners, -1, axis=0) - self.corners
+        self.edge_lengths_squared = np.maximum(np.sum(self.edges ** 2, axis=1), 1e-12)
+
+        # Left to right is the arena's x axis
+        self.heading = math.atan2(bottom_right[1] - bottom_left[1], bottom_right[0] - bottom_left[0])
+
+        self.candidates = {}  # (spacing, margin) -> candidate poses
+
+    def contains(self, points: np.ndarray) -> np.ndarray:
+        """
+        Whether each (x, y) point is inside the zone (even-odd rule, one test per edge for all the points at once).
+        Takes an (N, 2) array (or poses, the yaw is ignored), or a single point and returns a bool.
+        """
+
+        points = np.asarray(points, dtype=float)
+        single = points.ndim == 1
+        points = np.atleast_2d(points)[:, :2]
+
+        x, y = points[:, 0, None], points[:, 1, None]
+        x0, y0 = self.corners[:, 0], self.corners[:, 1]
+        dx, dy = self.edges[:, 0], self.edges[:, 1]
+
+        # Edges crossing the horizontal line through each point, and where (the others divide by 0 but are masked)
+        crosses = (y0 > y) != (y0 + dy > y)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_crossing = x0 + (y - y0) * dx / dy
+        inside = np.count_nonzero(crosses & (x < x_crossing), axis=1) % 2 == 1
+
+        return bool(inside[0]) if single else inside
+
+    def distance(self, points: np.ndarray, signed: bool = False) -> np.ndarray:
+        """
+        Distance (m) from each (x, y) point to the zone, 0 inside it. If signed, points inside get minus their
+        distance to the border instead. Takes an (N, 2) array (or poses), or a single point and returns a float.
+        """
+
+        points = np.asarray(points, dtype=float)
+        single = points.ndim == 1
+        points = np.atleast_2d(points)[:, :2]
+
+        # Closest point on each edge, for every point
+        offsets = points[:, None, :] - self.corners[None, :, :]
+        along = np.clip(np.sum(offsets * self.edges, axis=2) / self.edge_lengths_squared, 0.0, 1.0)
+        closest = self.corners + along[:, :, None] * self.edges
+        distances = np.min(np.linalg.norm(points[:, None, :] - closest, axis=2), axis=1)
+
+        inside = self.contains(points)
+        distances = np.where(inside, -distances if signed else 0.0, distances)
+
+        return float(distances[0]) if single else distances
+
+    def candidate_poses(self, spacing: float, margin: float = 0.0) -> np.ndarray:
+        """
+        A grid of (x, y, yaw) poses inside the zone, spacing apart and at least margin from its border, facing along
+        the zone (left to right). For picking dig or dump spots. Computed once per (spacing, margin).
+        """
+
+        key = (spacing, margin)
+        if key not in self.candidates:
+            across = self.corners[1] - self.corners[0]  # bottom left to bottom right
+            up = self.corners[3] - self.corners[0]  # bottom left to top left
+
+            fractions = []
+            for side in (across, up):
+                length = np.linalg.norm(side)
+                usable = max(length - 2 * margin, 0.0)
+                count = int(usable // spacing) + 1
+                # Centered in the usable part of the side
+                start = (length - (count - 1) * spacing) / 2
+                fractions.append((start + spacing * np.arange(count)) / max(length, 1e-12))
+
+            u, v = np.meshgrid(fractions[0], fractions[1], indexing="ij")
+            positions = self.corners[0] + u.reshape(-1, 1) * across + v.reshape(-1, 1) * up
+
+            poses = np.empty((len(positions), 3))
+            poses[:, :2] = positions
+            poses[:, 2] = self.heading
+            self.candidates[key] = poses
+
+        return self.candidates[key]
+
     def visualize_zone(self, publisher: rospy.Publisher):
         """
         Visualzies a given zone (its four corners) as a square in rviz.
@@ -62,54 +147,72 @@ class Zone:
 
         publisher.publish(path)
 
-def calc_point_from_apriltag(x: float, y: float, apriltag_pose_in_odom: PoseStamped, is_sim: bool)-> 'tuple[float,float]':
-    """
-    Calculates the (x, y) point from the apriltag's location (given in the odom frame)
-    """
+class ArenaFrame:
+    '''
+    The arena frame, from the start apriltag: x from the start wall to the mining zone, y from the bottom wall up.
+    The affine transform to odom is computed once, then converting points is a matrix product.
+    '''
 
-    roll, pitch, yaw  = euler_from_quaternion([apriltag_pose_in_odom.pose.orientation.x, apriltag_pose_in_odom.pose.orientation.y, apriltag_pose_in_odom.pose.orientation.z, apriltag_pose_in_odom.pose.orientation.w])
+    def __init__(self, apriltag_pose_in_odom: PoseStamped, is_sim: bool):
+        roll, pitch, yaw  = euler_from_quaternion([apriltag_pose_in_odom.pose.orientation.x, apriltag_pose_in_odom.pose.orientation.y, apriltag_pose_in_odom.pose.orientation.z, apriltag_pose_in_odom.pose.orientation.w])
 
-    # Add pi/2 in sim to the initial angle because the apriltag orientation in the odom frame is 90 degrees off (it points to the right instead of outwards)
-    # In the real robot, subtract (go the other way)
+        # Add pi/2 in sim to the initial angle because the apriltag orientation in the odom frame is 90 degrees off (it points to the right instead of outwards)
+        # In the real robot, subtract (go the other way)
 
-    if (is_sim):
-        yaw += math.pi / 2
-    else:
-        yaw -= math.pi / 2 
+        if (is_sim):
+            yaw += math.pi / 2
+        else:
+            yaw -= math.pi / 2 
 
-    x0 = apriltag_pose_in_odom.pose.position.x
-    y0 = apriltag_pose_in_odom.pose.position.y
+        self.yaw = yaw
+        self.rotation = np.array([[math.cos(yaw), -math.sin(yaw)], [math.sin(yaw), math.cos(yaw)]])
+        self.origin = np.array([apriltag_pose_in_odom.pose.position.x, apriltag_pose_in_odom.pose.position.y])
 
-    x1 = x0 + math.cos(yaw) * x - math.sin(yaw) * y
-    y1 = y0 + math.sin(yaw) * x + math.cos(yaw) * y
+    def to_odom(self, points: np.ndarray) -> np.ndarray:
+        """
+        (x, y) points in the arena frame, (N, 2) or a single one, to the odom frame
+        """
 
-    return (x1, y1)
+        return np.asarray(points, dtype=float) @ self.rotation.T + self.origin
 
-def calc_offset(x: float, y: float, apriltag_pose_in_odom: PoseStamped, is_sim: bool)-> 'tuple[float,float]':
-    """
-    Calc the offset from the apriltag's location (without inbuilt position)
-    """
+    def to_arena(self, points: np.ndarray) -> np.ndarray:
+        """
+        (x, y) points in the odom frame, (N, 2) or a single one, to the arena frame
+        """
 
-    roll, pitch, yaw  = euler_from_quaternion([apriltag_pose_in_odom.pose.orientation.x, apriltag_pose_in_odom.pose.orientation.y, apriltag_pose_in_odom.pose.orientation.z, apriltag_pose_in_odom.pose.orientation.w])
+        return (np.asarray(points, dtype=float) - self.origin) @ self.rotation
 
-    # Add pi/2 in sim to the initial angle because the apriltag orientation in the odom frame is 90 degrees off (it points to the right instead of outwards)
-    # In the real robot, subtract (go the other way)
+    def rotate(self, offsets: np.ndarray) -> np.ndarray:
+        """
+        Offsets in the arena frame to the odom frame (rotated, not moved)
+        """
 
-    if (is_sim):
-        yaw += math.pi / 2
-    else:
-        yaw -= math.pi / 2 
+        return np.asarray(offsets, dtype=float) @ self.rotation.T
 
-    x0 = 0
-    y0 = 0
+    def zone(self, x: float, y: float, length_x: float, length_y: float) -> Zone:
+        """
+        The zone from (x, y) to (x + length_x, y + length_y) in the arena frame
+        """
 
-    x1 = x0 + math.cos(yaw) * x - math.sin(yaw) * y
-    y1 = y0 + math.sin(yaw) * x + math.cos(yaw) * y
+        corners = self.to_odom([(x, y + length_y), (x + length_x, y + length_y), (x, y), (x + length_x, y)])
+        return Zone(*(tuple(corner) for corner in corners))
 
-    return (x1, y1)
+def calc_point_from_apriltag(x: float, y: float, apriltag_pose_in_odom: PoseStamped, is_sim: bool)-> 'tuple[float,float]':
+    """
+    Calculates the (x, y) point from the apriltag's location (given in the odom frame)
+    """
+
+    return tuple(ArenaFrame(apriltag_pose_in_odom, is_sim).to_odom((x, y)))
+
+def calc_offset(x: float, y: float, apriltag_pose_in_odom: PoseStamped, is_sim: bool)-> 'tuple[float,float]':
+    """
+    Calc the offset from the apriltag's location (without inbuilt position)
+    """
 
+    return tuple(ArenaFrame(apriltag_pose_in_odom, is_sim).rotate((x, y)))
 
-def find_mining_zone(apriltag_pose_in_odom: PoseStamped, is_sim: bool)->Zone:
+
+def find_mining_zone(apriltag_pose_in_odom: PoseStamped, is_sim: bool, frame: ArenaFrame = None)->Zone:
 
     DIST_X = 3.78 # In meters, the distance from the leftmost wall to the left border of the mining zone
     # KSC = 3.88
@@ -121,14 +224,12 @@ def find_mining_zone(apriltag_pose_in_odom: PoseStamped, is_sim: bool)->Zone:
     LENGTH_Y = 3 # In meters, the length of the mining zone (bottom to top)
     # KSC = 3
 
-    top_left = calc_point_from_apriltag(DIST_X, DIST_Y + LENGTH_Y, apriltag_pose_in_odom, is_sim)
-    top_right = calc_point_from_apriltag(DIST_X + LENGTH_X, DIST_Y + LENGTH_Y, apriltag_pose_in_odom, is_sim)
-    bottom_left = calc_point_from_apriltag(DIST_X, DIST_Y, apriltag_pose_in_odom, is_sim)
-    bottom_right = calc_point_from_apriltag(DIST_X + LENGTH_X, DIST_Y, apriltag_pose_in_odom, is_sim)
+    if frame is None:
+        frame = ArenaFrame(apriltag_pose_in_odom, is_sim)
 
-    return Zone(top_left, top_right, bottom_left, bottom_right)
+    return frame.zone(DIST_X, DIST_Y, LENGTH_X, LENGTH_Y)
 
-def find_berm_zone(apriltag_pose_in_odom: PoseStamped, is_sim: bool)->Zone:
+def find_berm_zone(apriltag_pose_in_odom: PoseStamped, is_sim: bool, frame: ArenaFrame = None)->Zone:
 
     DIST_X = 4.78
     # KSC = ~4.88
@@ -140,9 +241,20 @@ def find_berm_zone(apriltag_pose_in_odom: PoseStamped, is_sim: bool)->Zone:
     LENGTH_Y = -1
     # KSC = ~1
 
-    top_left = calc_point_from_apriltag(DIST_X, DIST_Y + LENGTH_Y, apriltag_pose_in_odom, is_sim)
-    top_right = calc_point_from_apriltag(DIST_X + LENGTH_X, DIST_Y + LENGTH_Y, apriltag_pose_in_odom, is_sim)
-    bottom_left = calc_point_from_apriltag(DIST_X, DIST_Y, apriltag_pose_in_odom, is_sim)
-    bottom_right = calc_point_from_apriltag(DIST_X + LENGTH_X, DIST_Y, apriltag_pose_in_odom, is_sim)
+    if frame is None:
+        frame = ArenaFrame(apriltag_pose_in_odom, is_sim)
+
+    return frame.zone(DIST_X, DIST_Y, LENGTH_X, LENGTH_Y)
+
+def find_berm_apriltag(apriltag_pose_in_odom: PoseStamped, is_sim: bool, frame: ArenaFrame = None)->'tuple[float,float]':
+    """
+    Where the berm apriltag should be (x, y in odom), to search for it there first
+    """
+
+    DIST_X = 5.28 # In meters, from the leftmost wall, on the bottom wall under the berm zone. TODO measure
+    DIST_Y = -1
+
+    if frame is None:
+        frame = ArenaFrame(apriltag_pose_in_odom, is_sim)
 
-    return Zone(top_left, top_right, bottom_left, bottom_right)
+    return tuple(frame.to_odom((DIST_X, DIST_Y)))
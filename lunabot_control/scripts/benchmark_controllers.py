@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Compares path followers offline, on the reference paths of lunabot_control.benchmark with the skid-steer model of
+the differential drive controller. Runs without ROS.
+
+    python3 benchmark_controllers.py                              # every controller, sim.yml parameters
+    python3 benchmark_controllers.py --config real_robot --controllers cem mppi --episodes 5
+    python3 benchmark_controllers.py --paths s_curve u_turn --set mpc_node.w_waypoint=10
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import yaml
+
+SCRIPTS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+CONFIG_DIRECTORY = os.path.join(SCRIPTS_DIRECTORY, "..", "..", "lunabot_config", "config")
+
+# Run from the source tree too, not only from a built workspace
+sys.path.insert(0, os.path.join(SCRIPTS_DIRECTORY, "..", "src"))
+
+from lunabot_control import benchmark
+from lunabot_control.cem_mpc import CEM, MPPI, CEMMPC
+from lunabot_control.pure_pursuit import PurePursuit
+
+
+def load_config(name: str) -> dict:
+    path = name if os.path.isfile(name) else os.path.join(CONFIG_DIRECTORY, name + ".yml")
+    with open(path) as file:
+        return yaml.safe_load(file)
+
+
+def node_params(config: dict, node: str) -> dict:
+    params = dict(config["nav"].get(node, {}))
+    params.setdefault("occ_threshold", config["nav"].get("occ_threshold", 50))
+    return params
+
+
+def make_cem(config: dict, seed: int, method: str = CEM):
+    params = node_params(config, "mpc_node")
+    params["method"] = method
+    return CEMMPC(params, seed=seed), params["frequency"]
+
+
+def make_pure_pursuit(config: dict, seed: int):
+    controller = PurePursuit(node_params(config, "pure_pursuit_node"))
+    return controller, controller.frequency
+
+
+# name -> function(config, seed) returning (controller, control rate in Hz)
+CONTROLLERS = {
+    "cem": make_cem,
+    "mppi": lambda config, seed: make_cem(config, seed, MPPI),
+    "pure_pursuit": make_pure_pursuit,
+}
+
+
+def apply_overrides(config: dict, overrides: list):
+    """node.param=value, for the nodes under nav (value parsed as yaml)"""
+    for override in overrides:
+        key, value = override.split("=", 1)
+        node, param = key.split(".", 1)
+        config["nav"].setdefault(node, {})[param] = yaml.safe_load(value)
+
+
+def model_for(config: dict) -> benchmark.SkidSteerModel:
+    drive = config.get("differential_drive_controller", {})
+    return benchmark.SkidSteerModel(
+        max_speed=drive.get("max_speed", 2.0),
+        max_speed_percentage=drive.get("max_speed_percentage", 0.8),
+    )
+
+
+def format_time(seconds) -> str:
+    return "-" if seconds is None else "%.1f" % seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="sim", help="sim, real_robot or a path to a robot config")
+    parser.add_argument("--controllers", nargs="+", default=list(CONTROLLERS), choices=list(CONTROLLERS))
+    parser.add_argument("--paths", nargs="+", default=None, help="names of reference paths, all by default")
+    parser.add_argument("--episodes", type=int, default=3, help="per controller and path, one seed each")
+    parser.add_argument("--set", nargs="*", default=[], metavar="NODE.PARAM=VALUE", help="override nav parameters")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    apply_overrides(config, args.set)
+
+    paths = benchmark.reference_paths()
+    names = args.paths or list(paths)
+
+    print(
+        "%-12s %-13s %7s %7s %9s %9s %9s %9s %9s"
+        % ("controller", "path", "reached", "time s", "xte mean", "xte rms", "xte max", "tick ms", "p95 ms")
+    )
+
+    for controller_name in args.controllers:
+        summary = []
+        for path_name in names:
+            results = []
+            for seed in range(args.episodes):
+                controller, rate = CONTROLLERS[controller_name](config, seed)
+                results.append(benchmark.run_episode(controller, paths[path_name], model_for(config), control_rate=rate))
+            summary.extend(results)
+
+            times = [result.time_to_goal for result in results if result.reached]
+            print(
+                "%-12s %-13s %3d/%-3d %7s %9.3f %9.3f %9.3f %9.2f %9.2f"
+                % (
+                    controller_name,
+                    path_name,
+                    sum(result.reached for result in results),
+                    len(results),
+                    format_time(np.mean(times) if times else None),
+                    np.mean([result.cross_track_mean for result in results]),
+                    np.sqrt(np.mean([result.cross_track_rms**2 for result in results])),
+                    max(result.cross_track_max for result in results),
+                    1000 * np.mean([result.tick_mean for result in results]),
+                    1000 * np.mean([result.tick_p95 for result in results]),
+                )
+            )
+
+        ticks = sum(result.ticks for result in summary)
+        compute = sum(result.tick_mean * result.ticks for result in summary)
+        print(
+            "%-12s %-13s %3d/%-3d %7s %9.3f %9s %9.3f %9.2f"
+            % (
+                controller_name,
+                "all",
+                sum(result.reached for result in summary),
+                len(summary),
+                "",
+                np.mean([result.cross_track_mean for result in summary]),
+                "",
+                max(result.cross_track_max for result in summary),
+                1000 * compute / ticks,
+            )
+        )
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+import rospy
+
+from lunabot_control.cem_mpc import CEMMPC
+from lunabot_control.follower_node import PathFollowerNode
+from lunabot_control.occupancy import OccupancyMap
+
+# The Python CEM/MPPI MPC as a drop-in for mpc_node: same parameters, topics and /behavior/traversal_enabled
+
+if __name__ == "__main__":
+    rospy.init_node("mpc_node")
+
+    params = rospy.get_param("~")
+    params["occ_threshold"] = rospy.get_param("/nav/occ_threshold", 50)
+
+    occupancy_map = OccupancyMap(params["occ_threshold"])
+    node = PathFollowerNode(CEMMPC(params, occupancy_map), params["frequency"], occupancy_map)
+    node.spin()
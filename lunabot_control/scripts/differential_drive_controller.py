@@ -5,6 +5,7 @@ from geometry_msgs.msg import Twist
 from std_msgs.msg import Int8
 
 from lunabot_msgs.msg import RobotSensors
+from lunabot_control.pid import PIDBank
 
 
 
@@ -26,6 +27,8 @@ class DifferentialDriveController:
         self.i = rospy.get_param("~i", 0.0)  # I gain for PID controller
         self.d = rospy.get_param("~d", 0)  # D gain for PID controller
         self.i_sat = rospy.get_param("~i_saturate", 10)  # Max for integral term
+        self.derivative_time_constant = rospy.get_param("~derivative_time_constant", 0.0)  # seconds, 0 to not filter D
+        self.max_output_rate = rospy.get_param("~max_output_rate", float("inf"))  # fraction of full effort per second
 
         self.lin = 0
         self.ang = 0
@@ -33,15 +36,23 @@ class DifferentialDriveController:
         self._left_vel = 0
         self._right_vel = 0
         self._meters_per_rad = 0.1397
-        self._left_prev_error = 0
-        self._right_prev_error = 0
-
-        self.left_error_sum = 0
-        self.right_error_sum = 0
 
         # Variables for PIDF Velocity Control
 
         self.loop_dt = 1 / self.hz  # Amount of time between calls of this function
+
+        # Left, right wheels. i and i_saturate are per loop (the error was summed without dt), the bank integrates over dt
+        self.pid = PIDBank(
+            self.p,
+            self.i / self.loop_dt,
+            self.d,
+            channels=2,
+            integral_limit=self.i_sat * self.loop_dt,
+            output_limits=(-1, 1),
+            rate_limit=self.max_output_rate,
+            derivative_time_constant=self.derivative_time_constant,
+        )
+
         rate = rospy.Rate(self.hz)
         rospy.on_shutdown(self.shutdown_hook)
 
@@ -61,56 +72,36 @@ class DifferentialDriveController:
         left_drive_msg = Int8()
         right_drive_msg = Int8()
 
-        left_percent_estimate = np.clip(self._left_vel / self._max_speed, -1, 1)
-        right_percent_estimate = np.clip(self._right_vel / self._max_speed, -1, 1)
-        
-
-        WEIGHT = 0.9
-
-        self.lin *= WEIGHT
-        self.ang *= 1/WEIGHT
+        if self.lin == 0 and self.ang == 0:
+            self.pid.reset()
+            left_drive_msg.data = 0
+            right_drive_msg.data = 0
+            self._left_drive_pub.publish(left_drive_msg)
+            self._right_drive_pub.publish(right_drive_msg)
+            return
 
-        left_set = self.lin - self.ang * self.width / 2
-        right_set = self.lin + self.ang * self.width / 2
+        # Measured wheel velocities, in rad/s
+        measured = np.array([self._left_vel, self._right_vel])
 
-        # Measured Velocity in m / s
-        left_measured = self._left_vel * self._meters_per_rad
-        right_measured = self._right_vel * self._meters_per_rad
+        percent_estimate = np.clip(measured / self._max_speed, -1, 1)
 
-        # Calculating error
-        left_error = left_set - left_measured
-        right_error = right_set - right_measured
+        WEIGHT = 0.9
 
-        self.left_error_sum += left_error
-        self.right_error_sum += right_error
+        # Weighted each loop, not compounded on the last command
+        lin = self.lin * WEIGHT
+        ang = self.ang / WEIGHT
 
-        self.left_error_sum = np.clip(self.left_error_sum, -self.i_sat, self.i_sat)
-        self.right_error_sum = np.clip(self.right_error_sum, -self.i_sat, self.i_sat)
+        setpoint = np.array([lin - ang * self.width / 2, lin + ang * self.width / 2])
 
-        # Calculating motor velocities
-        left = (
-            left_percent_estimate
-            + left_error * self.p
-            + self.left_error_sum * self.i
-            + (left_error - self._left_prev_error) / self.loop_dt * self.d
-        )
-        right = (
-            right_percent_estimate
-            + right_error * self.p
-            + self.right_error_sum * self.i
-            + (right_error - self._right_prev_error) / self.loop_dt * self.d
-        )
+        # Calculating error, in m / s
+        error = setpoint - measured * self._meters_per_rad
 
-        # Calculating previous error
-        self._left_prev_error = left_error
-        self._right_prev_error = right_error
+        # Calculating motor velocities, both wheels in one update
+        left, right = self.pid.update(error, self.loop_dt, feedforward=percent_estimate)
 
         left_drive_msg.data = self.constrain(left)
         right_drive_msg.data = self.constrain(right)
 
-        if self.lin == 0 and self.ang == 0:
-            left_drive_msg.data = 0
-            right_drive_msg.data = 0
         self._left_drive_pub.publish(left_drive_msg)
         self._right_drive_pub.publish(right_drive_msg)
 
@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+import rospy
+
+from lunabot_control.follower_node import PathFollowerNode
+from lunabot_control.pure_pursuit import PurePursuit
+
+# Pure pursuit instead of mpc_node for traversal, same topics and /behavior/traversal_enabled
+
+if __name__ == "__main__":
+    rospy.init_node("pure_pursuit_node")
+
+    controller = PurePursuit(rospy.get_param("~", {}))
+    node = PathFollowerNode(controller, controller.frequency)
+    node.spin()
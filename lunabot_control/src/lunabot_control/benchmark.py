@@ -0,0 +1,222 @@
+"""
+Offline closed-loop benchmark for path followers, no ROS master needed
+
+A controller follows a reference path on a simulated skid-steer drivetrain, and each episode reports the
+cross-track error, the time to the goal and the compute time per control tick, so path followers (the CEM/MPPI
+MPC, pure pursuit...) can be compared on the same paths.
+
+A controller is anything with set_path(path), calculate_velocity(pose) -> (linear, angular) or None, and enabled
+(False once it's done with the path), like lunabot_control.cem_mpc.CEMMPC.
+"""
+import math
+import time
+from collections import namedtuple
+
+import numpy as np
+
+EpisodeResult = namedtuple(
+    "EpisodeResult",
+    [
+        "reached",  # the controller finished the path within goal_tolerance of its end
+        "time_to_goal",  # seconds of simulated time, None if not reached
+        "cross_track_mean",  # meters from the path, over the control ticks
+        "cross_track_rms",
+        "cross_track_max",
+        "tick_mean",  # seconds of compute per calculate_velocity
+        "tick_p95",
+        "tick_max",
+        "ticks",
+        "poses",  # (ticks + 1, 3) of x, y, yaw
+    ],
+)
+
+
+class SkidSteerModel:
+    """
+    The drivetrain as the differential drive controller commands it: cmd_vel is weighted (linear * weight, angular
+    / weight), turned into left and right wheel speeds over width, limited to what the motors reach at
+    max_speed_percentage of full effort, and the wheels follow with a first order lag (wheel_time_constant, the
+    velocity PID). The robot then moves on the arc of the wheel speeds, integrated exactly.
+    """
+
+    def __init__(
+        self,
+        width: float = 0.5588,
+        wheel_radius: float = 0.1397,
+        max_speed: float = 2.0,
+        max_speed_percentage: float = 0.8,
+        weight: float = 0.9,
+        wheel_time_constant: float = 0.1,
+    ):
+        """
+        Args:
+            width (float): meters between the wheels
+            wheel_radius (float): meters
+            max_speed (float): rad/s of the wheels at full effort
+            max_speed_percentage (float): of full effort the controller sends at most
+            weight (float): of the differential drive controller, 1 for none
+            wheel_time_constant (float): seconds, 0 for wheels that follow instantly
+        """
+        self.width = width
+        self.max_wheel_speed = max_speed * max_speed_percentage * wheel_radius  # m/s
+        self.weight = weight
+        self.wheel_time_constant = wheel_time_constant
+
+        self.pose = np.zeros(3)
+        self.wheels = np.zeros(2)  # left, right, m/s
+
+    def reset(self, pose):
+        self.pose = np.asarray(pose, dtype=float).copy()
+        self.wheels = np.zeros(2)
+
+    def step(self, linear: float, angular: float, dt: float) -> np.ndarray:
+        """Drives with cmd_vel (linear, angular) for dt seconds, returns the new pose (x, y, yaw)"""
+        linear *= self.weight
+        angular /= self.weight
+
+        setpoint = np.array([linear - angular * self.width / 2, linear + angular * self.width / 2])
+        setpoint = np.clip(setpoint, -self.max_wheel_speed, self.max_wheel_speed)
+
+        if self.wheel_time_constant > 0:
+            self.wheels += (setpoint - self.wheels) * (1 - math.exp(-dt / self.wheel_time_constant))
+        else:
+            self.wheels = setpoint
+
+        left, right = self.wheels
+        linear = (left + right) / 2
+        angular = (right - left) / self.width
+
+        x, y, yaw = self.pose
+        if abs(angular) < 1e-9:
+            x += linear * math.cos(yaw) * dt
+            y += linear * math.sin(yaw) * dt
+        else:
+            # Around the instantaneous center of curvature
+            radius = linear / angular
+            x += radius * (math.sin(yaw + angular * dt) - math.sin(yaw))
+            y -= radius * (math.cos(yaw + angular * dt) - math.cos(yaw))
+            yaw += angular * dt
+
+        self.pose = np.array([x, y, math.atan2(math.sin(yaw), math.cos(yaw))])
+        return self.pose.copy()
+
+
+def resample(points, spacing: float) -> np.ndarray:
+    """A polyline with points every spacing meters along it (the end point kept), like the planner's paths"""
+    points = np.asarray(points, dtype=float)
+    lengths = np.concatenate(([0.0], np.cumsum(np.linalg.norm(np.diff(points, axis=0), axis=1))))
+    distances = np.append(np.arange(0.0, lengths[-1], spacing), lengths[-1])
+    return np.column_stack((np.interp(distances, lengths, points[:, 0]), np.interp(distances, lengths, points[:, 1])))
+
+
+def reference_paths(spacing: float = 0.25) -> dict:
+    """
+    The paths every controller is compared on, by name: (n, 2) of x, y from the origin, with points every spacing
+    meters like the global planner's (every path_sampling_rate-th cell)
+    """
+
+    arc = np.linspace(0, math.pi / 2, 30)
+    u_turn = np.linspace(-math.pi / 2, math.pi / 2, 40)
+    s = np.linspace(0, 4, 80)
+
+    return {
+        "straight": resample([(0, 0), (4, 0)], spacing),
+        "quarter_turn": resample(np.column_stack((1.5 * np.sin(arc), 1.5 * (1 - np.cos(arc)))), spacing),
+        "s_curve": resample(np.column_stack((s, 0.75 * np.sin(s * math.pi / 2))), spacing),
+        "u_turn": resample(
+            np.concatenate(([(0, 0)], np.column_stack((2 + np.cos(u_turn), 1 + np.sin(u_turn))), [(0, 2)])),
+            spacing,
+        ),
+        "zigzag": resample([(0, 0), (1, 0.6), (2, -0.6), (3, 0.6), (4, 0)], spacing),
+        # Start zone to the mining zone around an obstacle, like the arena traversal
+        "arena": resample([(0, 0), (1, 0), (2, 1), (3.5, 1), (4.5, 0.2), (6, 0.2)], spacing),
+    }
+
+
+def cross_track_errors(poses: np.ndarray, path: np.ndarray) -> np.ndarray:
+    """Distance from each pose to the closest segment of the path, for all poses and segments at once"""
+    points = poses[:, None, :2]
+    start, end = path[:-1], path[1:]
+    segment = end - start
+    length_squared = np.maximum(np.sum(segment**2, axis=1), 1e-12)
+
+    t = np.clip(np.sum((points - start) * segment, axis=2) / length_squared, 0, 1)
+    closest = start + t[..., None] * segment
+    return np.min(np.linalg.norm(points - closest, axis=2), axis=1)
+
+
+def run_episode(
+    controller,
+    path,
+    model: SkidSteerModel = None,
+    control_rate: float = 30.0,
+    physics_steps: int = 5,
+    timeout: float = None,
+    goal_tolerance: float = 0.5,
+    start_pose=None,
+) -> EpisodeResult:
+    """Follows a path in closed loop with a controller
+
+    Args:
+        controller: see the module's docstring, set_path is called here
+        path: (n, 2) reference path
+        model (SkidSteerModel): the drivetrain, the default one if None
+        control_rate (float): Hz of the control ticks
+        physics_steps (int): model steps per control tick
+        timeout (float): seconds of simulated time, 20 s plus 10 s per meter of path if None
+        goal_tolerance (float): meters from the end of the path to count as reached
+        start_pose: (x, y, yaw), the start of the path facing along it if None
+
+    Returns:
+        EpisodeResult
+    """
+    path = np.asarray(path, dtype=float)
+    if model is None:
+        model = SkidSteerModel()
+
+    if start_pose is None:
+        start_pose = (path[0, 0], path[0, 1], math.atan2(path[1, 1] - path[0, 1], path[1, 0] - path[0, 0]))
+    model.reset(start_pose)
+
+    if timeout is None:
+        timeout = 20 + 10 * np.sum(np.linalg.norm(np.diff(path, axis=0), axis=1))
+
+    dt = 1 / control_rate
+    poses = [model.pose.copy()]
+    tick_times = []
+    elapsed = 0.0
+    finished = False
+
+    controller.set_path(path)
+
+    while elapsed < timeout:
+        start = time.perf_counter()
+        velocity = controller.calculate_velocity(tuple(model.pose))
+        tick_times.append(time.perf_counter() - start)
+
+        if velocity is None or not controller.enabled:
+            finished = True
+            break
+
+        for _ in range(physics_steps):
+            model.step(velocity[0], velocity[1], dt / physics_steps)
+        elapsed += dt
+        poses.append(model.pose.copy())
+
+    poses = np.array(poses)
+    errors = cross_track_errors(poses, path)
+    tick_times = np.array(tick_times)
+    reached = finished and np.linalg.norm(poses[-1, :2] - path[-1]) <= goal_tolerance
+
+    return EpisodeResult(
+        reached=bool(reached),
+        time_to_goal=elapsed if reached else None,
+        cross_track_mean=float(np.mean(errors)),
+        cross_track_rms=float(np.sqrt(np.mean(errors**2))),
+        cross_track_max=float(np.max(errors)),
+        tick_mean=float(np.mean(tick_times)),
+        tick_p95=float(np.percentile(tick_times, 95)),
+        tick_max=float(np.max(tick_times)),
+        ticks=len(tick_times),
+        poses=poses,
+    )
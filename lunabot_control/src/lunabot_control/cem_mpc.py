@@ -0,0 +1,192 @@
+"""
+Sampling MPC for following the global path, the Python reference of the C++ MPC (lunabot_control/src/mpc.cpp)
+
+Each iteration samples rollout_count velocity sequences of horizon_length steps from a normal distribution,
+models them with the unicycle model, and scores them with the same costs as the C++ MPC (distance and heading
+change from the robot, distance to the path point of each step, occupied cells). All rollouts of an iteration are
+one (rollout_count, horizon_length) array operation, so offline tuning can run many episodes quickly.
+
+- cem: like mpc.cpp, the next distribution is the mean and standard deviation of the top_rollouts cheapest
+  rollouts, and the first velocities of the cheapest rollout of the last iteration are sent.
+- mppi: the next mean is the average of every rollout weighted by exp(-cost / temperature), with the standard
+  deviation kept at 1, and the first velocities of the last mean are sent.
+
+The parameters are the mpc_node ones (nav/mpc_node in lunabot_config/config/*.yml), so weights tuned here carry
+over to the C++ node.
+"""
+import numpy as np
+import yaml
+
+from lunabot_control.occupancy import OccupancyMap
+
+CEM = "cem"
+MPPI = "mppi"
+
+
+def load_params(config_file: str, node: str = "mpc_node") -> dict:
+    """The parameters of a nav node from a lunabot_config robot config (sim.yml, real_robot.yml)
+
+    Args:
+        config_file (str): path to the config
+        node (str): name of the node under nav
+
+    Returns:
+        dict: the node's parameters, with occ_threshold from nav added
+    """
+    with open(config_file) as file:
+        nav = yaml.safe_load(file)["nav"]
+
+    params = dict(nav[node])
+    params.setdefault("occ_threshold", nav.get("occ_threshold", 50))
+    return params
+
+
+def unicycle_rollouts(pose, velocities: np.ndarray, dt: float) -> np.ndarray:
+    """Models velocity sequences from a pose, all at once
+
+    Args:
+        pose: (x, y, yaw) of the robot
+        velocities (np.ndarray): (..., horizon_length, 2) of linear and angular velocities
+        dt (float): seconds per step
+
+    Returns:
+        np.ndarray: (..., horizon_length, 3) of x, y, yaw at the start of each step (the first is the pose)
+    """
+    linear, angular = velocities[..., 0], velocities[..., 1]
+
+    # States before each step: exclusive cumulative sums of the steps
+    yaw_steps = angular * dt
+    yaw = pose[2] + np.cumsum(yaw_steps, axis=-1) - yaw_steps
+
+    x_steps = np.cos(yaw) * linear * dt
+    y_steps = np.sin(yaw) * linear * dt
+    x = pose[0] + np.cumsum(x_steps, axis=-1) - x_steps
+    y = pose[1] + np.cumsum(y_steps, axis=-1) - y_steps
+
+    return np.stack((x, y, yaw), axis=-1)
+
+
+class CEMMPC:
+    def __init__(self, params: dict, occupancy_map: OccupancyMap = None, seed: int = None):
+        """
+        Args:
+            params (dict): mpc_node parameters (rollout_count, top_rollouts, iterations, w_linear, w_angular,
+                w_waypoint, w_occupied, horizon_length, frequency, min_distance_threshold, velocity_limits), and
+                optionally method (cem or mppi), temperature (mppi) and occ_threshold
+            occupancy_map (OccupancyMap): for the occupied cost, an empty one if None
+            seed (int): of the random generator, for repeatable episodes
+        """
+        self.rollout_count = int(params["rollout_count"])
+        self.top_rollouts = int(params["top_rollouts"])
+        self.iterations = int(params["iterations"])
+        self.horizon_length = int(params["horizon_length"])
+        self.dt = 1 / params["frequency"]
+        self.min_distance_threshold = params["min_distance_threshold"]
+
+        self.w_linear = params["w_linear"]
+        self.w_angular = params["w_angular"]
+        self.w_waypoint = params["w_waypoint"]
+        self.w_occupied = params["w_occupied"]
+
+        self.linear_limits = params["velocity_limits"]["linear"]
+        self.angular_limits = params["velocity_limits"]["angular"]
+
+        self.method = params.get("method", CEM)
+        self.temperature = params.get("temperature", 1.0)
+        assert self.method in (CEM, MPPI), "method is cem or mppi"
+        assert self.method == MPPI or self.top_rollouts > 1, "the standard deviation needs 2 top rollouts"
+
+        if occupancy_map is None:
+            occupancy_map = OccupancyMap(params.get("occ_threshold", 50))
+        self.map = occupancy_map
+
+        self.rng = np.random.default_rng(seed)
+
+        self.path = np.zeros((0, 2))
+        self.path_index = 0
+        self.enabled = False
+
+    def set_path(self, path):
+        """New path to follow, (n, 2) of x, y. Targets its first point."""
+        self.path = np.asarray(path, dtype=float).reshape(-1, 2)
+        self.path_index = 0
+        self.enabled = True
+
+    def costs(self, pose, rollouts: np.ndarray) -> np.ndarray:
+        """Costs of modeled rollouts (rollout_count, horizon_length, 3), like MPC::calculate_cost_"""
+        x, y, yaw = rollouts[..., 0], rollouts[..., 1], rollouts[..., 2]
+
+        cost = self.w_linear * ((x - pose[0]) ** 2 + (y - pose[1]) ** 2)
+        cost += self.w_angular * (yaw - pose[2]) ** 2
+
+        # The path point each step should reach
+        waypoints = self.path[np.minimum(self.path_index + np.arange(x.shape[-1]), len(self.path) - 1)]
+        cost += self.w_waypoint * ((x - waypoints[:, 0]) ** 2 + (y - waypoints[:, 1]) ** 2)
+
+        if self.w_occupied != 0:
+            cost += self.w_occupied * self.map.occupied_at(x, y)
+
+        return cost.sum(axis=-1)
+
+    def optimize(self, pose) -> np.ndarray:
+        """The velocities (horizon_length, 2) to follow the path from pose (x, y, yaw)"""
+        means = np.zeros((self.horizon_length, 2))  # v, omega
+        std_devs = np.ones((self.horizon_length, 2))
+
+        for iteration in range(self.iterations):
+            velocities = means + std_devs * self.rng.standard_normal((self.rollout_count, self.horizon_length, 2))
+            costs = self.costs(pose, unicycle_rollouts(pose, velocities, self.dt))
+
+            if self.method == MPPI:
+                weights = np.exp(-(costs - costs.min()) / self.temperature)
+                weights /= weights.sum()
+                means = np.tensordot(weights, velocities, axes=1)
+                continue
+
+            if iteration == self.iterations - 1:
+                return velocities[np.argmin(costs)]
+
+            top = velocities[np.argpartition(costs, self.top_rollouts - 1)[: self.top_rollouts]]
+            means = top.mean(axis=0)
+            std_devs = top.std(axis=0, ddof=1)
+
+        return means
+
+    def update_setpoint(self, pose):
+        """Moves to the next path point once close enough to the current one, stops at the end of the path"""
+        target = self.path[self.path_index]
+        if (pose[0] - target[0]) ** 2 + (pose[1] - target[1]) ** 2 > self.min_distance_threshold**2:
+            return
+
+        if self.path_index == len(self.path) - 1:
+            self.path_index = 0
+            self.enabled = False
+        else:
+            self.path_index += 1
+
+    def calculate_velocity(self, pose) -> tuple:
+        """One control tick, like MPC::calculate_velocity
+
+        Args:
+            pose: (x, y, yaw) of the robot, in the path's frame
+
+        Returns:
+            tuple: (linear, angular) clamped to the velocity limits, (0, 0) at the end of the path or without one,
+                None when there's nothing to follow
+        """
+        if pose is None or not self.enabled:
+            return None
+
+        if len(self.path) == 0:
+            return 0.0, 0.0
+
+        linear, angular = self.optimize(pose)[0]
+
+        self.update_setpoint(pose)
+        if not self.enabled:
+            return 0.0, 0.0
+
+        return (
+            float(np.clip(linear, self.linear_limits[0], self.linear_limits[1])),
+            float(np.clip(angular, self.angular_limits[0], self.angular_limits[1])),
+        )
@@ -0,0 +1,72 @@
+"""
+ROS node around a Python path follower (CEMMPC, PurePursuit), with the topics of mpc_node: the global path, the
+costmap, odometry, /behavior/traversal_enabled, and cmd_vel
+"""
+import math
+import threading
+
+import rospy
+from geometry_msgs.msg import Twist
+from nav_msgs.msg import OccupancyGrid, Odometry, Path
+from std_msgs.msg import Bool
+
+
+class PathFollowerNode:
+    def __init__(self, controller, frequency: float, occupancy_map=None):
+        """
+        Args:
+            controller: with set_path(path), calculate_velocity(pose) and enabled, see lunabot_control.benchmark
+            frequency (float): Hz of the control ticks
+            occupancy_map (OccupancyMap): kept up to date from map_topic if the controller uses one
+        """
+        self.controller = controller
+        self.frequency = frequency
+        self.map = occupancy_map
+
+        self.pose = None
+        self.traversal_enabled = True
+
+        # Callbacks run on their own threads, a new path mustn't land in the middle of a tick
+        self.lock = threading.Lock()
+
+        self._vel_pub = rospy.Publisher(rospy.get_param("/cmd_vel_topic"), Twist, queue_size=10)
+        if self.map is not None:
+            rospy.Subscriber(rospy.get_param("map_topic"), OccupancyGrid, self._grid_cb)
+        rospy.Subscriber(rospy.get_param("global_path_topic"), Path, self._path_cb)
+        rospy.Subscriber(rospy.get_param("/odom_topic"), Odometry, self._odom_cb)
+        rospy.Subscriber("/behavior/traversal_enabled", Bool, self._traversal_cb)
+
+    def _grid_cb(self, msg: OccupancyGrid):
+        self.map.from_msg(msg)
+
+    def _path_cb(self, msg: Path):
+        rospy.logdebug("%s: New path", rospy.get_name())
+        with self.lock:
+            self.controller.set_path([(pose.pose.position.x, pose.pose.position.y) for pose in msg.poses])
+
+    def _odom_cb(self, msg: Odometry):
+        pose = msg.pose.pose
+        q = pose.orientation
+        yaw = math.atan2(2 * (q.z * q.w + q.x * q.y), 1 - 2 * (q.z * q.z + q.y * q.y))
+        self.pose = (pose.position.x, pose.position.y, yaw)
+
+    def _traversal_cb(self, msg: Bool):
+        self.traversal_enabled = msg.data
+        if not self.traversal_enabled:
+            self.publish_velocity(0, 0)
+
+    def publish_velocity(self, linear: float, angular: float):
+        twist = Twist()
+        twist.linear.x = linear
+        twist.angular.z = angular
+        self._vel_pub.publish(twist)
+
+    def spin(self):
+        rate = rospy.Rate(self.frequency)
+        while not rospy.is_shutdown():
+            if self.traversal_enabled:
+                with self.lock:
+                    velocity = self.controller.calculate_velocity(self.pose)
+                if velocity is not None:
+                    self.publish_velocity(*velocity)
+            rate.sleep()
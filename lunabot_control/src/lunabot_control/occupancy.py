@@ -0,0 +1,59 @@
+"""
+Occupancy grid lookups for the Python controllers, the same as lunabot_control/map.h for the C++ MPC
+"""
+import numpy as np
+
+
+class OccupancyMap:
+    def __init__(self, occupied_threshold: int = 50):
+        """Empty until set from a grid
+
+        Args:
+            occupied_threshold (int): cells with a value greater than this are occupied (/nav/occ_threshold)
+        """
+        self.occupied_threshold = occupied_threshold
+        self.grid: np.ndarray = None  # (height, width) of occupancy probabilities, 0-100, -1 unknown
+        self.occupied: np.ndarray = None
+        self.origin = np.zeros(2)
+        self.resolution = -1.0
+
+    @property
+    def initialized(self) -> bool:
+        return self.grid is not None
+
+    def from_data(self, data, resolution: float, width: int, height: int, origin=(0.0, 0.0)):
+        """Sets the map from a flat array in row-major order (like OccupancyGrid.data)"""
+        self.grid = np.asarray(data, dtype=np.int16).reshape(height, width)
+        self.occupied = self.grid > self.occupied_threshold
+        self.resolution = resolution
+        self.origin = np.asarray(origin, dtype=float)
+
+    def from_msg(self, msg):
+        """Sets the map from a nav_msgs/OccupancyGrid"""
+        self.from_data(
+            msg.data,
+            msg.info.resolution,
+            msg.info.width,
+            msg.info.height,
+            (msg.info.origin.position.x, msg.info.origin.position.y),
+        )
+
+    def occupied_at(self, x, y) -> np.ndarray:
+        """Whether the positions (arrays of any shape, in the map's frame) are occupied. Outside the map is occupied.
+
+        Unlike map.h, the flat index is width * row + column (OccupancyGrid's order), map.h uses the height.
+        """
+        x = np.asarray(x, dtype=float)
+        if not self.initialized:
+            return np.zeros(x.shape, dtype=bool)
+
+        # Rounded to the nearest cell, half away from zero like std::round
+        column = np.floor((x - self.origin[0]) / self.resolution + 0.5).astype(int)
+        row = np.floor((np.asarray(y, dtype=float) - self.origin[1]) / self.resolution + 0.5).astype(int)
+
+        height, width = self.grid.shape
+        inside = (column >= 0) & (column < width) & (row >= 0) & (row < height)
+
+        occupied = np.ones(x.shape, dtype=bool)
+        occupied[inside] = self.occupied[row[inside], column[inside]]
+        return occupied
@@ -0,0 +1,135 @@
+"""
+PID control for every controller (the drivetrain, homing, excavation), so a control tick is one update of numpy
+arrays however many channels it controls.
+"""
+import numpy as np
+
+
+def as_channels(value, shape: tuple) -> np.ndarray:
+    return np.broadcast_to(np.asarray(value, dtype=float), shape).copy()
+
+
+class PIDBank:
+    """
+    N PID controllers updated together, one per channel (e.g. the left and right wheels). Gains and limits are
+    scalars (the same for every channel) or arrays with one value per channel.
+
+    output = kf * setpoint + feedforward + kp * error + ki * integral + kd * derivative
+
+    - Anti-windup: the integral is clamped to integral_limit, and stops growing on channels whose output is
+      saturated in the direction the error pushes it (conditional integration).
+    - Derivative filtering: the derivative of the error is low-pass filtered with derivative_time_constant
+      (seconds, 0 for none). There's no derivative on the first update after a reset, instead of a kick.
+    - Output rate limiting: the output changes by at most rate_limit per second, from 0 after a reset.
+    - Output limits: the output is clipped to output_limits (lower, upper).
+
+    Gains are per second: the integral is the sum of error * dt, the derivative is per second.
+    """
+
+    def __init__(
+        self,
+        kp,
+        ki=0.0,
+        kd=0.0,
+        kf=0.0,
+        channels: int = None,
+        integral_limit=np.inf,
+        output_limits: tuple = (-np.inf, np.inf),
+        rate_limit=np.inf,
+        derivative_time_constant=0.0,
+    ):
+        if channels is None:
+            shape = np.broadcast(kp, ki, kd, kf, integral_limit, output_limits[0], output_limits[1], rate_limit).shape
+        else:
+            shape = (channels,)
+
+        self.kp = as_channels(kp, shape)
+        self.ki = as_channels(ki, shape)
+        self.kd = as_channels(kd, shape)
+        self.kf = as_channels(kf, shape)
+        self.integral_limit = as_channels(integral_limit, shape)
+        self.lower = as_channels(output_limits[0], shape)
+        self.upper = as_channels(output_limits[1], shape)
+        self.rate_limit = as_channels(rate_limit, shape)
+        self.derivative_time_constant = as_channels(derivative_time_constant, shape)
+
+        self.integral = np.zeros(shape)
+        self.derivative = np.zeros(shape)
+        self.prev_error = np.zeros(shape)
+        self.output = np.zeros(shape)
+        self.started = np.zeros(shape, dtype=bool)
+
+    @property
+    def channels(self) -> int:
+        return self.output.size
+
+    def reset(self, channels=None):
+        """
+        Forgets the integral, derivative and output of the channels (an index, mask or slice, all if None)
+        """
+
+        if channels is None:
+            channels = slice(None)
+
+        self.integral[channels] = 0
+        self.derivative[channels] = 0
+        self.prev_error[channels] = 0
+        self.output[channels] = 0
+        self.started[channels] = False
+
+    def update(self, error, dt: float, setpoint=0.0, feedforward=0.0) -> np.ndarray:
+        """
+        One control tick of every channel: error (setpoint - measurement, already wrapped for angles) and dt in
+        seconds. setpoint is scaled by kf, feedforward is added as is. Returns the outputs (a new array).
+
+        With dt 0 (e.g. the first sensor reading), nothing is integrated, differentiated or rate limited: the
+        output is the feedforward, proportional and integral so far.
+        """
+
+        error = as_channels(error, self.output.shape)
+
+        if dt > 0:
+            derivative = np.where(self.started, (error - self.prev_error) / dt, 0.0)
+            alpha = dt / (self.derivative_time_constant + dt)
+            self.derivative += alpha * (derivative - self.derivative)
+        self.prev_error = error
+
+        base = self.kf * setpoint + feedforward + self.kp * error + self.kd * self.derivative
+
+        if dt > 0:
+            integral = np.clip(self.integral + error * dt, -self.integral_limit, self.integral_limit)
+            unsaturated = base + self.ki * integral
+            winding_up = ((unsaturated > self.upper) & (self.ki * error > 0)) | ((unsaturated < self.lower) & (self.ki * error < 0))
+            self.integral = np.where(winding_up, self.integral, integral)
+
+        output = np.clip(base + self.ki * self.integral, self.lower, self.upper)
+
+        if dt > 0:
+            max_step = self.rate_limit * dt
+            output = np.clip(output, self.output - max_step, self.output + max_step)
+
+        self.output = output
+        self.started[:] = True
+
+        return self.output.copy()
+
+
+class VelocityPIDController:
+    """
+    Velocity PID Controller
+    Takes in setpoint, PID values, and feedforward term
+    Feedforward term should be max speed in control space / max speed in sensor space (127 / max speed of motor for most cases)
+
+    One channel of a PIDBank, for the scripts that control a single motor
+    """
+
+    def __init__(self, setpoint, kp, ki, kd, kf):
+        self.setpoint = setpoint
+        self.pid = PIDBank(kp, ki, kd, kf, channels=1)
+
+    def set_setpoint(self, setpoint):
+        self.setpoint = setpoint
+        self.pid.reset()  # Reset I when changing goal
+
+    def update(self, state, dt):
+        return float(self.pid.update(self.setpoint - state, dt, setpoint=self.setpoint)[0])
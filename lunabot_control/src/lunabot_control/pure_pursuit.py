@@ -0,0 +1,173 @@
+"""
+Pure pursuit path follower, a low compute alternative to the MPC for traversal
+
+Each tick finds the closest point of the path ahead of the last one, picks the point lookahead meters further
+along the path, and drives on the arc through it (curvature 2 * lateral offset / distance^2). No sampling or
+optimization: a tick is a few array operations on the path near the robot.
+
+- Velocity scheduling: the speed is limited by the path's curvature ahead (max_lateral_acceleration), by the
+  distance left to the goal (max_deceleration), and so the arc's angular velocity stays within its limit.
+- Curvature-adaptive lookahead: lookahead_time seconds at the scheduled speed, within min_lookahead and
+  max_lookahead, so it looks further on straights and cuts fewer corners in turns.
+- When the lookahead point is more than rotate_angle off the robot's heading, it turns in place first.
+"""
+import math
+
+import numpy as np
+
+DEFAULT_PARAMS = {
+    "frequency": 20,
+    "min_lookahead": 0.3,  # meters
+    "max_lookahead": 1.0,
+    "lookahead_time": 1.5,  # seconds
+    "curvature_distance": 0.75,  # meters of path ahead to look for turns
+    "max_lateral_acceleration": 0.15,  # m/s^2
+    "max_deceleration": 0.2,  # m/s^2, to stop at the goal
+    "min_linear": 0.05,  # m/s, so the last few centimeters don't take forever
+    "rotate_angle": 1.0,  # rad
+    "goal_tolerance": 0.15,  # meters
+    "velocity_limits": {"linear": [-0.5, 0.5], "angular": [-0.785, 0.785]},
+}
+
+
+def wrap_angle(angle: float) -> float:
+    return math.atan2(math.sin(angle), math.cos(angle))
+
+
+class PurePursuit:
+    def __init__(self, params: dict = None):
+        """
+        Args:
+            params (dict): pure_pursuit_node parameters (see DEFAULT_PARAMS), missing ones take the defaults
+        """
+        params = {**DEFAULT_PARAMS, **(params or {})}
+
+        self.frequency = params["frequency"]
+        self.min_lookahead = params["min_lookahead"]
+        self.max_lookahead = params["max_lookahead"]
+        self.lookahead_time = params["lookahead_time"]
+        self.curvature_distance = params["curvature_distance"]
+        self.max_lateral_acceleration = params["max_lateral_acceleration"]
+        self.max_deceleration = params["max_deceleration"]
+        self.min_linear = params["min_linear"]
+        self.rotate_angle = params["rotate_angle"]
+        self.goal_tolerance = params["goal_tolerance"]
+
+        self.max_linear = params["velocity_limits"]["linear"][1]
+        self.max_angular = params["velocity_limits"]["angular"][1]
+
+        self.path = np.zeros((0, 2))
+        self.distances = np.zeros(0)  # along the path, to each point
+        self.curvatures = np.zeros(0)  # at each point
+        self.index = 0  # segment the robot was last closest to
+        self.enabled = False
+
+    def set_path(self, path):
+        """New path to follow, (n, 2) of x, y. Starts from its first segment."""
+        path = np.asarray(path, dtype=float).reshape(-1, 2)
+
+        # Repeated points would make zero length segments
+        if len(path) > 1:
+            keep = np.concatenate(([True], np.linalg.norm(np.diff(path, axis=0), axis=1) > 1e-6))
+            path = path[keep]
+
+        self.path = path
+        self.distances = np.concatenate(([0.0], np.cumsum(np.linalg.norm(np.diff(path, axis=0), axis=1))))
+        self.curvatures = self.path_curvatures(path)
+        self.index = 0
+        self.enabled = True
+
+    @staticmethod
+    def path_curvatures(path: np.ndarray) -> np.ndarray:
+        """Curvature at each point, of the circle through it and its neighbours (0 at the ends)"""
+        curvatures = np.zeros(len(path))
+        if len(path) < 3:
+            return curvatures
+
+        a, b, c = path[:-2], path[1:-1], path[2:]
+        cross = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+        sides = np.linalg.norm(b - a, axis=1) * np.linalg.norm(c - b, axis=1) * np.linalg.norm(c - a, axis=1)
+        curvatures[1:-1] = 2 * np.abs(cross) / np.maximum(sides, 1e-12)
+        return curvatures
+
+    def closest(self, position: np.ndarray) -> float:
+        """
+        Distance along the path of the closest point to position, searching from the last closest segment on
+        (the path isn't searched behind the robot, so it doesn't jump back where the path crosses itself)
+        """
+        ahead = np.searchsorted(self.distances, self.distances[self.index] + self.max_lookahead + 1.0)
+        end = min(max(ahead + 1, self.index + 2), len(self.path))
+
+        start, stop = self.path[self.index : end - 1], self.path[self.index + 1 : end]
+        segment = stop - start
+        t = np.clip(np.sum((position - start) * segment, axis=1) / np.sum(segment**2, axis=1), 0, 1)
+        distances = np.linalg.norm(start + t[:, None] * segment - position, axis=1)
+
+        best = int(np.argmin(distances))
+        self.index += best
+        return self.distances[self.index] + t[best] * (self.distances[self.index + 1] - self.distances[self.index])
+
+    def point_at(self, distance: float) -> np.ndarray:
+        """The point distance meters along the path (the end of the path past it)"""
+        return np.array(
+            (np.interp(distance, self.distances, self.path[:, 0]), np.interp(distance, self.distances, self.path[:, 1]))
+        )
+
+    def scheduled_speed(self, along: float) -> float:
+        remaining = self.distances[-1] - along
+
+        curvature_window = (self.distances >= along) & (self.distances <= along + self.curvature_distance)
+        curvature = np.max(self.curvatures[curvature_window], initial=0.0)
+
+        speed = self.max_linear
+        if curvature > 0:
+            speed = min(speed, math.sqrt(self.max_lateral_acceleration / curvature))
+        speed = min(speed, math.sqrt(2 * self.max_deceleration * max(remaining, 0.0)))
+        return max(speed, self.min_linear)
+
+    def calculate_velocity(self, pose) -> tuple:
+        """One control tick
+
+        Args:
+            pose: (x, y, yaw) of the robot, in the path's frame
+
+        Returns:
+            tuple: (linear, angular), (0, 0) at the end of the path or without one, None when there's nothing to
+                follow
+        """
+        if pose is None or not self.enabled:
+            return None
+
+        if len(self.path) == 0:
+            return 0.0, 0.0
+
+        position = np.array(pose[:2], dtype=float)
+        if np.linalg.norm(self.path[-1] - position) <= self.goal_tolerance:
+            self.enabled = False
+            return 0.0, 0.0
+
+        if len(self.path) == 1:
+            along, speed = 0.0, self.min_linear
+        else:
+            along = self.closest(position)
+            speed = self.scheduled_speed(along)
+
+        lookahead = min(max(self.lookahead_time * speed, self.min_lookahead), self.max_lookahead)
+        target = self.point_at(along + lookahead)
+
+        # The target in the robot's frame
+        dx, dy = target - position
+        cos, sin = math.cos(pose[2]), math.sin(pose[2])
+        forward, left = cos * dx + sin * dy, -sin * dx + cos * dy
+
+        heading_error = math.atan2(left, forward)
+        if abs(heading_error) > self.rotate_angle:
+            return 0.0, math.copysign(self.max_angular, heading_error)
+
+        curvature = 2 * left / max(forward**2 + left**2, 1e-9)
+
+        # Slower on tight arcs, so the angular velocity fits without leaving the arc
+        if abs(curvature) * speed > self.max_angular:
+            speed = self.max_angular / abs(curvature)
+
+        return speed, speed * curvature
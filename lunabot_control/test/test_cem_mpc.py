@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+import math
+import os
+import unittest
+
+import numpy as np
+
+from lunabot_control import benchmark
+from lunabot_control.cem_mpc import MPPI, CEMMPC, load_params, unicycle_rollouts
+from lunabot_control.occupancy import OccupancyMap
+
+SIM_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "lunabot_config", "config", "sim.yml")
+
+
+def step_by_step(pose, velocities, dt):
+    """The rollout of one velocity sequence, one step at a time like MPC::calculate_model_"""
+    x, y, yaw = pose
+    states = []
+    for linear, angular in velocities:
+        states.append((x, y, yaw))
+        x += math.cos(yaw) * dt * linear
+        y += math.sin(yaw) * dt * linear
+        yaw += dt * angular
+    return np.array(states)
+
+
+class UnicycleRolloutsTest(unittest.TestCase):
+    def test_matches_step_by_step(self):
+        rng = np.random.default_rng(0)
+        pose = (1.0, -2.0, 0.5)
+        velocities = rng.standard_normal((6, 10, 2))
+
+        rollouts = unicycle_rollouts(pose, velocities, 0.1)
+        self.assertEqual(rollouts.shape, (6, 10, 3))
+        for velocity, rollout in zip(velocities, rollouts):
+            np.testing.assert_allclose(rollout, step_by_step(pose, velocity, 0.1), atol=1e-12)
+
+    def test_starts_at_pose(self):
+        rollouts = unicycle_rollouts((1.0, 2.0, 3.0), np.ones((4, 2)), 0.5)
+        np.testing.assert_allclose(rollouts[0], (1.0, 2.0, 3.0))
+
+
+class OccupancyMapTest(unittest.TestCase):
+    def test_empty(self):
+        occupancy_map = OccupancyMap()
+        self.assertFalse(occupancy_map.initialized)
+        self.assertFalse(occupancy_map.occupied_at(np.zeros((2, 3)), np.zeros((2, 3))).any())
+
+    def test_row_major(self):
+        # 4 columns, 2 rows, at 0.5 m: only the cell in row 1, column 3 (index width * row + column) is occupied
+        data = np.zeros(8, dtype=int)
+        data[4 * 1 + 3] = 100
+        occupancy_map = OccupancyMap(50)
+        occupancy_map.from_data(data, 0.5, 4, 2, origin=(-1.0, 2.0))
+
+        self.assertTrue(occupancy_map.occupied_at(-1.0 + 3 * 0.5, 2.0 + 0.5))
+        self.assertFalse(occupancy_map.occupied_at(-1.0 + 1 * 0.5, 2.0 + 1.5 * 0.5 - 0.01))  # rounds to row 1, column 1
+        self.assertFalse(occupancy_map.occupied_at(-1.0 + 3 * 0.5, 2.0))
+
+        x = np.array([[-1.0, -0.5], [0.5, 0.6]])
+        y = np.array([[2.0, 2.5], [2.5, 2.45]])
+        np.testing.assert_array_equal(occupancy_map.occupied_at(x, y), [[False, False], [True, True]])
+
+    def test_threshold(self):
+        occupancy_map = OccupancyMap(50)
+        occupancy_map.from_data([50, 51, -1, 0], 1.0, 2, 2)
+        np.testing.assert_array_equal(occupancy_map.occupied_at([0, 1, 0, 1], [0, 0, 1, 1]), [False, True, False, False])
+
+    def test_outside(self):
+        occupancy_map = OccupancyMap()
+        occupancy_map.from_data(np.zeros(6), 1.0, 3, 2)
+        np.testing.assert_array_equal(occupancy_map.occupied_at([-1, 3, 0, 0], [0, 0, -1, 2]), [True] * 4)
+
+
+class CEMMPCTest(unittest.TestCase):
+    def setUp(self):
+        self.params = load_params(SIM_CONFIG)
+
+    def test_nothing_to_follow(self):
+        controller = CEMMPC(self.params, seed=0)
+        self.assertIsNone(controller.calculate_velocity((0.0, 0.0, 0.0)))
+        controller.set_path(np.zeros((0, 2)))
+        self.assertEqual(controller.calculate_velocity((0.0, 0.0, 0.0)), (0.0, 0.0))
+
+    def test_seeded(self):
+        path = benchmark.reference_paths()["straight"]
+        velocities = []
+        for _ in range(2):
+            controller = CEMMPC(self.params, seed=3)
+            controller.set_path(path)
+            velocities.append(controller.calculate_velocity((0.0, 0.0, 0.0)))
+        self.assertEqual(velocities[0], velocities[1])
+
+    def test_straight_path(self):
+        # Wheels as fast as the real robot's (real_robot.yml), so the velocity limits aren't saturated
+        path = benchmark.reference_paths()["straight"]
+        for method in ("cem", MPPI):
+            controller = CEMMPC(dict(self.params, method=method), seed=0)
+            result = benchmark.run_episode(controller, path, benchmark.SkidSteerModel(max_speed=4.3), control_rate=self.params["frequency"])
+            self.assertTrue(result.reached, method)
+            self.assertLess(result.cross_track_max, 0.3, method)
+
+    def test_occupied_cost(self):
+        # Straight ahead is occupied, a rollout through it costs more than one beside it
+        occupancy_map = OccupancyMap()
+        data = np.zeros((20, 20), dtype=int)
+        data[8:12, 5:] = 100
+        occupancy_map.from_data(data.ravel(), 0.1, 20, 20, origin=(0.0, -1.0))
+
+        controller = CEMMPC(dict(self.params, w_waypoint=0.0, w_occupied=1.0), occupancy_map, seed=0)
+        controller.set_path([(1.5, 0.0)])
+        rollouts = unicycle_rollouts((0.0, 0.0, 0.0), np.tile((4.0, 0.0), (2, 10, 1)), controller.dt)
+        rollouts[1, :, 1] += 0.5
+        costs = controller.costs((0.0, 0.0, 0.0), rollouts)
+        self.assertGreater(costs[0], costs[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+import unittest
+
+import numpy as np
+
+from lunabot_control.pid import PIDBank, VelocityPIDController
+
+
+class PIDBankTest(unittest.TestCase):
+    def test_channels(self):
+        self.assertEqual(PIDBank(1.0, channels=3).channels, 3)
+        # From per channel gains or limits
+        self.assertEqual(PIDBank([1.0, 2.0]).channels, 2)
+        self.assertEqual(PIDBank(1.0, output_limits=([-1, -2], [1, 2])).channels, 2)
+
+    def test_proportional(self):
+        pid = PIDBank([1.0, 2.0])
+        np.testing.assert_allclose(pid.update([1.0, -1.0], 0.1), [1.0, -2.0])
+
+    def test_integral(self):
+        pid = PIDBank(0.0, ki=2.0, channels=1)
+        for _ in range(10):
+            output = pid.update(1.0, 0.1)
+        np.testing.assert_allclose(output, [2.0])
+        np.testing.assert_allclose(pid.integral, [1.0])
+
+    def test_feedforward(self):
+        pid = PIDBank(1.0, kf=0.5, channels=1)
+        np.testing.assert_allclose(pid.update(0.0, 0.1, setpoint=4.0, feedforward=1.0), [3.0])
+
+    def test_dt_zero(self):
+        pid = PIDBank(1.0, ki=1.0, kd=1.0, kf=1.0, channels=1, rate_limit=0.1)
+        # Nothing integrated, differentiated or rate limited
+        np.testing.assert_allclose(pid.update(2.0, 0.0, setpoint=3.0), [5.0])
+        np.testing.assert_allclose(pid.integral, [0.0])
+        np.testing.assert_allclose(pid.derivative, [0.0])
+
+    def test_no_derivative_kick(self):
+        pid = PIDBank(0.0, kd=1.0, channels=1)
+        np.testing.assert_allclose(pid.update(5.0, 0.1), [0.0])
+        np.testing.assert_allclose(pid.update(6.0, 0.1), [10.0])
+
+    def test_derivative_filter(self):
+        pid = PIDBank(0.0, kd=1.0, channels=1, derivative_time_constant=0.1)
+        pid.update(0.0, 0.1)
+        # Half way with dt equal to the time constant
+        np.testing.assert_allclose(pid.update(1.0, 0.1), [5.0])
+
+    def test_integral_limit(self):
+        pid = PIDBank(0.0, ki=1.0, channels=1, integral_limit=0.5)
+        for _ in range(20):
+            pid.update(1.0, 0.1)
+        np.testing.assert_allclose(pid.integral, [0.5])
+
+    def test_anti_windup(self):
+        pid = PIDBank(1.0, ki=1.0, channels=2, output_limits=(-1.0, 1.0))
+        # Saturated on the first channel, the integral stops there
+        for _ in range(50):
+            output = pid.update([2.0, 0.5], 0.1)
+        np.testing.assert_allclose(output, [1.0, 1.0])
+        self.assertEqual(pid.integral[0], 0.0)
+        np.testing.assert_allclose(pid.integral[1], 0.5)
+
+        # Unwinds straight away once the error changes sign
+        np.testing.assert_allclose(pid.update([-0.5, 0.0], 0.1)[0], -0.5 + pid.integral[0], atol=1e-9)
+        self.assertLess(pid.output[0], 0.0)
+
+    def test_integrates_out_of_saturation(self):
+        pid = PIDBank(1.0, ki=1.0, channels=1, output_limits=(-1.0, 1.0))
+        pid.update(2.0, 0.1)
+        # Saturated high, but the error pulls it down: integrates
+        pid.update(-0.5, 0.1)
+        self.assertLess(pid.integral[0], 0.0)
+
+    def test_rate_limit(self):
+        pid = PIDBank(1.0, channels=1, rate_limit=2.0)
+        np.testing.assert_allclose(pid.update(10.0, 0.1), [0.2])
+        np.testing.assert_allclose(pid.update(10.0, 0.1), [0.4])
+        np.testing.assert_allclose(pid.update(-10.0, 0.1), [0.2])
+
+    def test_output_limits_per_channel(self):
+        pid = PIDBank(1.0, output_limits=([-1.0, -2.0], [1.0, 2.0]))
+        np.testing.assert_allclose(pid.update([5.0, 5.0], 0.1), [1.0, 2.0])
+        np.testing.assert_allclose(pid.update([-5.0, -5.0], 0.1), [-1.0, -2.0])
+
+    def test_reset(self):
+        pid = PIDBank(1.0, ki=1.0, kd=1.0, channels=2, rate_limit=10.0)
+        for _ in range(5):
+            pid.update([1.0, 1.0], 0.1)
+
+        pid.reset(0)
+        self.assertEqual(pid.integral[0], 0.0)
+        self.assertEqual(pid.output[0], 0.0)
+        self.assertFalse(pid.started[0])
+        self.assertGreater(pid.integral[1], 0.0)
+        self.assertTrue(pid.started[1])
+
+        pid.reset()
+        np.testing.assert_array_equal(pid.integral, [0.0, 0.0])
+
+    def test_returns_a_copy(self):
+        pid = PIDBank(1.0, channels=1)
+        output = pid.update(1.0, 0.1)
+        output[0] = 5.0
+        np.testing.assert_allclose(pid.output, [1.0])
+
+
+class VelocityPIDControllerTest(unittest.TestCase):
+    def test_feedforward_and_setpoint(self):
+        controller = VelocityPIDController(2.0, 10.0, 1.0, 0.0, 127 / 4.0)
+        self.assertAlmostEqual(controller.update(2.0, 0.1), 127 / 2.0)
+        self.assertAlmostEqual(controller.update(1.0, 0.1), 127 / 2.0 + 10.0 + 0.1)
+
+        controller.set_setpoint(1.0)
+        self.assertEqual(controller.pid.integral[0], 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+import math
+import unittest
+
+import numpy as np
+
+from lunabot_control import benchmark
+from lunabot_control.pure_pursuit import PurePursuit
+
+
+class PurePursuitTest(unittest.TestCase):
+    def setUp(self):
+        self.controller = PurePursuit()
+        self.straight = np.column_stack((np.linspace(0, 4, 17), np.zeros(17)))
+
+    def test_nothing_to_follow(self):
+        self.assertIsNone(self.controller.calculate_velocity((0.0, 0.0, 0.0)))
+        self.controller.set_path(self.straight)
+        self.assertIsNone(self.controller.calculate_velocity(None))
+
+    def test_empty_path(self):
+        self.controller.set_path(np.zeros((0, 2)))
+        self.assertEqual(self.controller.calculate_velocity((0.0, 0.0, 0.0)), (0.0, 0.0))
+
+    def test_repeated_points(self):
+        self.controller.set_path([(0, 0), (1, 0), (1, 0), (2, 0)])
+        self.assertEqual(len(self.controller.path), 3)
+        np.testing.assert_allclose(self.controller.distances, [0, 1, 2])
+
+    def test_curvatures(self):
+        angles = np.linspace(0, math.pi, 20)
+        path = 2 * np.column_stack((np.cos(angles), np.sin(angles)))
+        curvatures = PurePursuit.path_curvatures(path)
+        self.assertEqual(curvatures[0], 0)
+        self.assertEqual(curvatures[-1], 0)
+        np.testing.assert_allclose(curvatures[1:-1], 0.5)
+        np.testing.assert_allclose(PurePursuit.path_curvatures(self.straight), 0)
+
+    def test_point_at(self):
+        self.controller.set_path(self.straight)
+        np.testing.assert_allclose(self.controller.point_at(1.3), (1.3, 0))
+        np.testing.assert_allclose(self.controller.point_at(10), (4, 0))
+
+    def test_closest_only_searches_ahead(self):
+        # Out and back along the same line
+        self.controller.set_path([(0, 0), (1, 0), (2, 0), (2, 0.1), (1, 0.1), (0, 0.1)])
+        self.assertAlmostEqual(self.controller.closest(np.array([1.9, 0.05])), 1.9)
+        self.assertAlmostEqual(self.controller.closest(np.array([1.5, 0.09])), 2.6, places=6)
+        # Back at the start of the path, but further along it now
+        self.assertAlmostEqual(self.controller.closest(np.array([1.5, 0.0])), 2.6, places=6)
+
+    def test_straight(self):
+        self.controller.set_path(self.straight)
+        linear, angular = self.controller.calculate_velocity((0.0, 0.0, 0.0))
+        self.assertGreater(linear, 0)
+        self.assertAlmostEqual(angular, 0)
+
+    def test_steers_towards_the_path(self):
+        self.controller.set_path(self.straight)
+        _, angular = self.controller.calculate_velocity((0.0, -0.2, 0.0))
+        self.assertGreater(angular, 0)
+        self.controller.set_path(self.straight)
+        _, angular = self.controller.calculate_velocity((0.0, 0.2, 0.0))
+        self.assertLess(angular, 0)
+
+    def test_turns_in_place(self):
+        self.controller.set_path(self.straight)
+        linear, angular = self.controller.calculate_velocity((0.0, 0.0, math.pi))
+        self.assertEqual(linear, 0)
+        self.assertEqual(abs(angular), self.controller.max_angular)
+
+    def test_slows_down(self):
+        self.controller.set_path(self.straight)
+        self.assertAlmostEqual(self.controller.scheduled_speed(0.0), self.controller.max_linear)
+        # Stopping at the goal
+        self.assertLess(self.controller.scheduled_speed(3.9), self.controller.max_linear)
+        self.assertGreaterEqual(self.controller.scheduled_speed(4.0), self.controller.min_linear)
+
+        # In turns
+        angles = np.linspace(0, math.pi, 40)
+        self.controller.set_path(np.column_stack((np.sin(angles), 1 - np.cos(angles))))
+        self.assertAlmostEqual(
+            self.controller.scheduled_speed(0.0), math.sqrt(self.controller.max_lateral_acceleration), places=3
+        )
+
+    def test_angular_limit(self):
+        self.controller.set_path(self.straight)
+        _, angular = self.controller.calculate_velocity((0.0, 0.5, -0.5))
+        self.assertLessEqual(abs(angular), self.controller.max_angular + 1e-9)
+
+    def test_stops_at_the_goal(self):
+        self.controller.set_path(self.straight)
+        self.assertEqual(self.controller.calculate_velocity((3.95, 0.0, 0.0)), (0.0, 0.0))
+        self.assertFalse(self.controller.enabled)
+
+    def test_reference_paths(self):
+        # Wheels as fast as the real robot's (real_robot.yml), so the velocity limits aren't saturated
+        for name, path in benchmark.reference_paths().items():
+            controller = PurePursuit()
+            model = benchmark.SkidSteerModel(max_speed=4.3)
+            result = benchmark.run_episode(controller, path, model, control_rate=controller.frequency)
+            self.assertTrue(result.reached, name)
+            self.assertLess(result.cross_track_max, 0.2, name)
+
+
+if __name__ == "__main__":
+    unittest.main()
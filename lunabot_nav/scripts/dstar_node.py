@@ -8,6 +8,7 @@ from nav_msgs.msg import OccupancyGrid, Odometry, Path
 from tf.transformations import quaternion_from_euler
 
 from lunabot_nav.dstar import Dstar
+from lunabot_nav.global_planner import JPSPlanner, Map
 
 class DstarNode:
 
@@ -26,6 +27,8 @@ class DstarNode:
 
         self.dstar: Dstar = None
 
+        self.jps: JPSPlanner = JPSPlanner() # One-shot planner for the first path to a new goal, while Dstar warms up
+
         self.path_sampling_rate = rospy.get_param("/nav/dstar_node/path_sampling_rate") # Take every <n-th> point from the path
 
         path_topic = rospy.get_param("/nav/global_path_topic")
@@ -90,6 +93,25 @@ class DstarNode:
         self.goal_update_needed = True
 
 
+    def initial_path(self) -> 'list[list[float]]':
+        """
+        Plans to the goal with jump point search on the current map, so a path can be published before Dstar has finished its first search.
+        Returns the path in the same format as Dstar (start -> goal, without the start), or an empty list if there is no path.
+        """
+
+        grid = Map(self.occupancy_threshold)
+
+        # Map cells are centered on the origin, the occupancy grid's origin is the corner of its first cell
+        origin = np.array([self.x_offset, self.y_offset]) + self.resolution / 2
+        grid.from_data(self.map.T.flatten(), self.resolution, self.map.shape[0], self.map.shape[1], origin, self.occupancy_threshold)
+
+        path = self.jps.plan(np.array(self.pose), np.array(self.goal), grid)
+
+        if path is None:
+            return []
+
+        return path[-2::-1].tolist()
+
     def dstar_loop(self):
         """
         Main loop for dstar. Update / manage dstar and its data, and publish the path whenever a new one becomes available.
@@ -117,6 +139,7 @@ class DstarNode:
             # Startup condition: once all data is available, create a new Dstar object and find the path
             if (self.dstar is None) and len(self.map) > 0 and len(self.pose) > 0 and len(self.goal) > 0:
 
+                self.publish_path(self.initial_path())
                 self.dstar = Dstar(self.goal, self.pose, self.map.copy(), self.resolution, self.x_offset, self.y_offset, self.occupancy_threshold)
                 self.publish_path(self.dstar.find_path())
                 self.goal_update_needed = False
@@ -127,8 +150,9 @@ class DstarNode:
 
                 if self.goal_update_needed:
                     # If we've gotten a new goal, it is more efficient to reset the dstar data (as it is all based on goal location)
-                    # so we do so and find a new path
+                    # so we do so and find a new path. Publish a quick one-shot path first, then the Dstar path.
 
+                    self.publish_path(self.initial_path())
                     self.dstar = Dstar(self.goal, self.pose, self.map.copy(), self.resolution, self.x_offset, self.y_offset, self.occupancy_threshold)
                     self.publish_path(self.dstar.find_path())
                     self.goal_update_needed = False
@@ -3,6 +3,7 @@
 import numpy as np
 import rospy
 from geometry_msgs.msg import PoseStamped
+from map_msgs.msg import OccupancyGridUpdate
 from nav_msgs.msg import OccupancyGrid, Odometry, Path
 
 from lunabot_nav.global_planner import Map, RRTStarPlanner
@@ -24,6 +25,7 @@ class GlobalPlannerNode:
 
         # Nav Params
         map_topic = rospy.get_param("map_topic")
+        map_update_topic = rospy.get_param("map_update_topic")
         global_path_topic = rospy.get_param("global_path_topic")
         self.occ_threshold = rospy.get_param("occ_threshold")
         self.bezier_step = rospy.get_param("bezier_step")
@@ -46,6 +48,7 @@ class GlobalPlannerNode:
         self.t_curve = np.arange(0, 1, self.bezier_step)
 
         rospy.Subscriber(map_topic, OccupancyGrid, self.__occ_grid_cb)
+        rospy.Subscriber(map_update_topic, OccupancyGridUpdate, self.__occ_grid_update_cb)
         rospy.Subscriber(odom_topic, Odometry, self.__odom_cb)
         rospy.Subscriber(goal_topic, PoseStamped, self.__goal_cb)
 
@@ -54,6 +57,11 @@ class GlobalPlannerNode:
     def __occ_grid_cb(self, grid_msg):
         self.planner.grid.from_msg(grid_msg)
 
+    def __occ_grid_update_cb(self, update_msg):
+        # Patches apply on top of a full map
+        if self.planner.grid.initialized:
+            self.planner.grid.from_update_msg(update_msg)
+
     def __odom_cb(self, odom_msg):
         pos, _ = pose_to_array(odom_msg.pose.pose)
         self.curr_pos = np.array([pos[0], pos[1]])
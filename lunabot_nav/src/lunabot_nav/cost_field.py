@@ -0,0 +1,171 @@
+"""
+Goal-rooted cost-to-go field over an occupancy grid
+
+The field is computed once per (map, goal) with a vectorized wavefront: every iteration relaxes
+the whole frontier at once with NumPy, for all 8 moves (no corner cutting, diagonals cost
+sqrt(2)), until no cell improves. After that, the distance to the goal from any cell is a
+single lookup, and the next waypoint / full path from any cell is found by descending the
+field in O(path length).
+"""
+import logging
+import math
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class CostField:
+    def __init__(self, map, goal):
+        """Computes the cost-to-go field to goal
+
+        Args:
+            map (Map): initialized occupancy grid, its mask is respected if set
+            goal (np.array): goal configuration of size DOF in GRID frame
+        """
+        assert map.initialized, "Not initalized with set_data or set_msg"
+        self.map = map
+        self.goal = np.asarray(goal, dtype=float)
+
+        # The grid is padded with a ring of occupied cells so neighbours never need bounds checks
+        self.padded_height = map.height + 2
+        self.moves = []
+        for du in (-1, 0, 1):
+            for dv in (-1, 0, 1):
+                if du == 0 and dv == 0:
+                    continue
+                offset = du * self.padded_height + dv
+                if du != 0 and dv != 0:
+                    # diagonal: both cells it passes between must be free
+                    sides = (du * self.padded_height, dv)
+                    self.moves.append((offset, math.sqrt(2), sides))
+                else:
+                    self.moves.append((offset, 1.0, None))
+
+        self.free = None
+        self.cost = None
+        self.compute()
+
+    def to_index(self, state):
+        """Flat index of the padded grid for a c-space state, None if outside the map"""
+        u, v = np.round((np.asarray(state) - self.map.origin) / self.map.resolution)
+        if not (0 <= u < self.map.width and 0 <= v < self.map.height):
+            return None
+        return int(u + 1) * self.padded_height + int(v + 1)
+
+    def to_state(self, index):
+        """c-space state at the center of a flat index of the padded grid"""
+        u, v = divmod(index, self.padded_height)
+        return np.array([u - 1, v - 1]) * self.map.resolution + self.map.origin
+
+    def compute(self):
+        """Runs the wavefront from the goal over the current map"""
+        plan_start = time.perf_counter()
+
+        free = np.zeros((self.map.width + 2, self.padded_height), dtype=bool)
+        free[1:-1, 1:-1] = self.map.grid <= self.map.occ_threshold
+        if self.map.mask is not None:
+            free[1:-1, 1:-1] &= self.map.mask
+        self.free = free.ravel()
+        self.cost = np.full(self.free.size, np.inf)
+
+        goal_index = self.to_index(self.goal)
+        if goal_index is None or not self.free[goal_index]:
+            logger.info("goal is outside the map or in collision")
+            return
+
+        self.cost[goal_index] = 0.0
+        frontier = np.array([goal_index])
+        iterations = 0
+        while frontier.size > 0:
+            improved = []
+            for offset, step, sides in self.moves:
+                neighbours = frontier + offset
+                candidates = self.cost[frontier] + step
+                better = self.free[neighbours] & (candidates < self.cost[neighbours])
+                if sides is not None:
+                    better &= self.free[frontier + sides[0]]
+                    better &= self.free[frontier + sides[1]]
+                if better.any():
+                    np.minimum.at(self.cost, neighbours[better], candidates[better])
+                    improved.append(neighbours[better])
+            frontier = np.unique(np.concatenate(improved)) if improved else improved
+            frontier = np.asarray(frontier, dtype=int)
+            iterations += 1
+
+        logger.info(
+            "cost field: %d iterations, %.3f s",
+            iterations,
+            time.perf_counter() - plan_start,
+        )
+
+    @property
+    def cost_grid(self):
+        """Cost-to-go (m) indexed like map.grid, inf where the goal can't be reached"""
+        cost = self.cost.reshape(self.map.width + 2, self.padded_height)
+        return cost[1:-1, 1:-1] * self.map.resolution
+
+    def cost_to_go(self, state):
+        """Length (m) of the shortest path from state to the goal, inf if unreachable
+
+        Args:
+            state (np.array): configuration of size DOF in GRID frame
+        """
+        index = self.to_index(state)
+        if index is None:
+            return np.inf
+        return self.cost[index] * self.map.resolution
+
+    def next_index(self, index):
+        """Neighbour of index on the shortest path to the goal, None at the goal or if unreachable"""
+        cost = self.cost[index]
+        if cost == 0 or np.isinf(cost):
+            return None
+        best, best_cost = None, cost
+        for offset, step, sides in self.moves:
+            neighbour = index + offset
+            if not self.free[neighbour]:
+                continue
+            if sides is not None and not (
+                self.free[index + sides[0]] and self.free[index + sides[1]]
+            ):
+                continue
+            if self.cost[neighbour] + step <= best_cost:
+                best, best_cost = neighbour, self.cost[neighbour] + step
+        return best
+
+    def next_waypoint(self, state):
+        """Center of the next cell on the shortest path from state, None at the goal or if unreachable
+
+        Args:
+            state (np.array): configuration of size DOF in GRID frame
+        """
+        index = self.to_index(state)
+        if index is None:
+            return None
+        index = self.next_index(index)
+        if index is None:
+            return None
+        return self.to_state(index)
+
+    def path_from(self, state):
+        """Shortest path from state to the goal by descending the field
+
+        Args:
+            state (np.array): configuration of size DOF in GRID frame
+
+        Returns:
+            np.array: c-space states from state to the goal, None if the goal can't be reached
+        """
+        index = self.to_index(state)
+        if index is None or np.isinf(self.cost[index]):
+            return None
+        path = [np.asarray(state, dtype=float)]
+        index = self.next_index(index)
+        while index is not None:
+            path.append(self.to_state(index))
+            index = self.next_index(index)
+        path[-1] = self.goal
+        return np.array(path)
@@ -15,13 +15,14 @@ class Dstar:
     when the map changes by saving the processed data and updating only what is necessary.
     """
 
-    def __init__(self, goal: 'list[float]', start: 'list[float]', init_map: np.ndarray, resolution: float, x_offset: float, y_offset: float, occupancy_threshold: int = 50):
+    def __init__(self, goal: 'list[float]', start: 'list[float]', init_map: np.ndarray, resolution: float, x_offset: float, y_offset: float, occupancy_threshold: int = 50, mask: np.ndarray = None):
         """
         Initializes the Dstar algorithm by setting up the map, node values, start, and the goal. The map/node values will be buffered to include the goal if necessary.
         Creates the priority queue, adds the first node to check, and marks the node's estimate value as 0.
 
         The goal/start should be given in real-world coordinates.
         The map, resolution, and offsets should come from the occupancy map.
+        The optional mask (same shape as the map, True where allowed) restricts the search to a corridor: everything outside it is treated as occupied.
         """
 
         self.node_queue: PriorityQueue = PriorityQueue()
@@ -46,8 +47,11 @@ class Dstar:
         self.buffer_offset_right: int = 0
         self.buffer_offset_down: int = 0
 
+        # Corridor the search is restricted to (None for the whole map)
+        self.mask: np.ndarray = mask
+
         # 2d array occupancy map: Occupancy probabilities from [0 to 100].  Unknown is -1.
-        self.current_map: np.ndarray[int] = init_map
+        self.current_map: np.ndarray[int] = self.apply_mask(init_map)
 
         self.resolution: float = resolution # meters per grid cell
 
@@ -68,6 +72,21 @@ class Dstar:
         # Insert the goal node into the priority queue
         self.insert(self.goal, self.calculate_key(self.goal))
 
+    def apply_mask(self, new_map: np.ndarray) -> np.ndarray:
+        """
+        Marks every cell outside of the corridor mask as occupied. The mask is dropped if the map changes size, since it no longer lines up.
+        """
+
+        if self.mask is None:
+            return new_map
+
+        if self.mask.shape != new_map.shape:
+            rospy.logwarn("Dstar: Corridor mask does not match the map size, planning on the whole map")
+            self.mask = None
+            return new_map
+
+        return np.where(self.mask, new_map, 100)
+
     def update_position(self, coords):
         """
         When receiving a new position from the node, change it to grid coords and update the current node
@@ -506,7 +525,7 @@ class Dstar:
         # set prev_map- keeps track of the old map
         prev_map = self.current_map.copy()
 
-        new_map = np.array(new_map)
+        new_map = self.apply_mask(np.array(new_map))
 
         # compare the prev map with the new one (remove the buffer off of the old map first)
         true_prev_map = prev_map[self.buffer_offset_up:len(prev_map) - self.buffer_offset_down, self.buffer_offset_left:len(prev_map[0]) - self.buffer_offset_right]
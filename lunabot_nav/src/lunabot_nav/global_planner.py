@@ -4,6 +4,7 @@ Global path planner using RRTstar algorithm
 author: Raghava Uppuluri, code adapted from Ahmed Qureshi and AtsushiSakai(@Atsushi_twi)
 """
 import copy
+import heapq
 import logging
 import math
 import os
@@ -11,6 +12,7 @@ import random
 import time
 
 import numpy as np
+from scipy.ndimage import distance_transform_edt
 
 from lunabot_nav.utils import pose_to_array
 
@@ -25,15 +27,27 @@ logger.setLevel(logging.INFO)
 
 
 class Map:
-    """Map class"""
+    """Map class
 
-    def __init__(self, occ_threshold=0.5):
+    Alongside the occupancy grid, the map keeps a Euclidean distance transform of the
+    occupied cells (``self.clearance_grid``, in meters), so clearance queries are a single
+    lookup. Distances are truncated at ``max_clearance`` so patch updates only need to
+    recompute a bounded window around the patch. The transform is computed on the first
+    query after a new grid, so maps that are replaced before being planned on (or only
+    checked cell by cell) don't pay for it.
+    """
+
+    def __init__(self, occ_threshold=0.5, max_clearance=2.0):
         self.resolution = None
         self.origin = None
         self.width = None
         self.height = None
         self.grid = None
         self.occ_threshold = occ_threshold
+        self.max_clearance = max_clearance  # m, distances beyond this are clipped
+        self._clearance_grid = None  # None until queried after a new grid
+        self.mask = None  # cells planners may use, None for the whole map
+        self.mask_spec = None
 
     def from_msg(self, grid_msg):
         self.resolution = grid_msg.info.resolution  # m/cell
@@ -46,6 +60,18 @@ class Map:
         self.grid = np.array(grid_msg.data).reshape(
             (self.width, self.height), order="F"
         )
+        self._clearance_grid = None
+
+    def from_update_msg(self, update_msg):
+        """Applies an OccupancyGridUpdate patch on top of the current grid
+
+        Args:
+            update_msg (map_msgs.msg.OccupancyGridUpdate): patch, row-major with (x, y) as the top left corner
+        """
+        patch = np.array(update_msg.data).reshape(
+            (update_msg.width, update_msg.height), order="F"
+        )
+        self.update_patch(update_msg.x, update_msg.y, patch)
 
     def from_data(
         self, grid, resolution, height, width, origin=np.zeros(2), occ_threshold=0.5
@@ -70,6 +96,81 @@ class Map:
         self.grid = grid.reshape(width, height)
         self.origin = origin
         self.occ_threshold = occ_threshold
+        self._clearance_grid = None
+
+    @property
+    def clearance_cells(self):
+        """Number of cells the clearance is truncated at"""
+        return int(np.ceil(self.max_clearance / self.resolution))
+
+    def _clearance_of(self, grid):
+        """Distance (m) from every cell of grid to the nearest occupied cell, clipped to max_clearance"""
+        free = grid <= self.occ_threshold
+        if free.all():
+            return np.full(grid.shape, self.max_clearance)
+        dist = distance_transform_edt(free) * self.resolution
+        return np.minimum(dist, self.max_clearance)
+
+    @property
+    def clearance_grid(self):
+        """Distance (m) from every cell to the nearest occupied cell, computed on first use"""
+        if self._clearance_grid is None:
+            self.update_clearance()
+        return self._clearance_grid
+
+    def update_clearance(self):
+        """Recomputes the distance transform over the whole grid"""
+        assert self.initialized, "Not initalized with set_data or set_msg"
+        self._clearance_grid = self._clearance_of(self.grid)
+
+    def update_patch(self, x, y, patch):
+        """Writes patch into the grid with its lower corner at cell (x, y) and incrementally
+        updates the distance transform.
+
+        Only cells within max_clearance of the patch can change, and those only depend on
+        obstacles within max_clearance of themselves, so the transform is recomputed on the
+        patch grown by twice that and written back on the patch grown by once.
+
+        Args:
+            x (int): first index of the patch along the grid width
+            y (int): first index of the patch along the grid height
+            patch (np.array): 2D array of occupancy values, indexed like self.grid
+        """
+        assert self.initialized, "Not initalized with set_data or set_msg"
+        w, h = patch.shape
+        self.grid[x : x + w, y : y + h] = patch
+
+        if self._clearance_grid is None:
+            # Not computed yet, the next query computes it with the patch
+            return
+
+        r = self.clearance_cells
+        # window the transform is computed on (patch + 2r)
+        wx0, wy0 = max(x - 2 * r, 0), max(y - 2 * r, 0)
+        wx1, wy1 = min(x + w + 2 * r, self.width), min(y + h + 2 * r, self.height)
+        # region written back (patch + r), relative to the window
+        ux0, uy0 = max(x - r, 0), max(y - r, 0)
+        ux1, uy1 = min(x + w + r, self.width), min(y + h + r, self.height)
+
+        window = self._clearance_of(self.grid[wx0:wx1, wy0:wy1])
+        self._clearance_grid[ux0:ux1, uy0:uy1] = window[
+            ux0 - wx0 : ux1 - wx0, uy0 - wy0 : uy1 - wy0
+        ]
+
+    def clearance(self, state):
+        """Distance (m) from state to the nearest occupied cell, 0 if out of bounds
+
+        Args:
+            state (np.array): position of size DOF in c-space
+
+        Returns:
+            float: clearance, at most self.max_clearance
+        """
+        assert self.initialized, "Not initalized with set_data or set_msg"
+        w, h = self.cspace_to_grid(state)
+        if w >= self.width or h >= self.height:
+            return 0.0
+        return self.clearance_grid[w, h]
 
     def cspace_to_grid(self, state):
         """Converts an np.array in c-space to a discretized index in the occ grid
@@ -94,6 +195,31 @@ class Map:
         y_spec = np.array([0, self.height * self.resolution]) + self.origin[1]
         return x_spec, y_spec
 
+    def set_mask(self, mask):
+        """Restricts planning to a region (e.g. a corridor around a coarse path)
+
+        Args:
+            mask (np.array): boolean array indexed like self.grid, True where planning is allowed. None clears the mask.
+        """
+        self.mask = mask
+        self.mask_spec = None
+        if mask is None:
+            return
+        assert mask.shape == self.grid.shape, "Mask should be the same shape as the grid"
+        xs, ys = np.nonzero(mask)
+        if len(xs) == 0:
+            return
+        x_spec = np.array([xs.min(), xs.max()]) * self.resolution + self.origin[0]
+        y_spec = np.array([ys.min(), ys.max()]) * self.resolution + self.origin[1]
+        self.mask_spec = (x_spec, y_spec)
+
+    @property
+    def sample_spec(self):
+        """c-space bounds to sample states from: the bounding box of the mask if one is set"""
+        if self.mask_spec is not None:
+            return self.mask_spec
+        return self.cspace_spec
+
     @property
     def initialized(self):
         return (
@@ -106,11 +232,12 @@ class Map:
             and self.occ_threshold is not None
         )
 
-    def in_collision(self, node):
+    def in_collision(self, node, radius=0.0):
         """Checks if node corresponds to an occupied state in the occupancy grid
 
         Args:
             node (Node): node to check in collision
+            radius (float, optional): radius (m) of the robot footprint around node. Defaults to 0.0, the single cell.
 
         Returns:
             bool: Returns True if in Collision and False otherwise
@@ -123,8 +250,26 @@ class Map:
         if h < 0 or h >= self.height:
             return True
         logger.debug("uv_ind: (%d,%d)", w, h)
+        if self.mask is not None and not self.mask[w, h]:
+            return True
+        if radius > 0:
+            return self.clearance_grid[w, h] <= radius
         return self.grid[w, h] > self.occ_threshold
 
+    def safe_step(self, state, radius=0.0):
+        """Distance (m) that can be travelled from state in any direction without reaching an
+        occupied cell. Accounts for the rounding of both endpoints to cell centers.
+
+        Args:
+            state (np.array): position of size DOF in c-space
+            radius (float, optional): radius (m) of the robot footprint. Defaults to 0.0.
+
+        Returns:
+            float: safe step, 0 if state is already in collision
+        """
+        margin = self.resolution * np.sqrt(DOF)
+        return max(self.clearance(state) - radius - margin, 0.0)
+
 
 class Node:
     """Node class"""
@@ -176,32 +321,241 @@ class Planner:
         return False
 
 
-# class AStarNode(Node):
-#     def __init__(self,state):
-#         super().__init__(state)
+class JPSPlanner(Planner):
+    """A* with Jump Point Search pruning on the 8-connected occupancy grid
 
-# class AStar(Planner):
-#     def __init__(self):
-#         super().__init__()
-#         self.came_from = {}
-#         self.g_score = defaultdict(np.inf)
-#         self.f_score = defaultdict(np.inf)
+    A fast one-shot planner for uniform cost grids: instead of pushing every neighbour, only
+    jump points (cells where an optimal path may need to turn) go on the open list. Diagonal
+    moves are only allowed when both adjacent cells are free, so paths never cut corners.
+    Search state is kept in flat-index arrays (index = u * height + v).
+    """
 
-#     def h(self, node):
-#         collision_penalty = np.inf if self.in_collision(node) else 0
-#         return self.goal.dist(node) + collision_penalty
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.jump_points = None
+
+    def plan(self, start, goal, map):
+        """Plan path
+
+        Args:
+            start (np.array): start configuration of size DOF in GRID frame
+            goal (np.array): goal configuration of size DOF in GRID frame
+            map (Map): occupancy grid, its mask is respected if set
+
+        Returns:
+            np.array: every cell on the path as c-space states from the goal back to the start, None if no path was found
+        """
+        assert start is not None
+        assert goal is not None
+        assert map is not None
+        self.start = Node(start)
+        self.goal = Node(goal)
+        self.grid = map
+        self.jump_points = None
+        if not self.grid.initialized:
+            logger.info("Occupancy grid not defined yet...")
+            return
 
-#     def plan(self, start, goal):
-#         self.start = Node(start)
-#         self.goal = Node(goal)
-#         open_set = [Node(start)]
+        plan_start = time.perf_counter()
 
-#         heapq.heappush()
+        W, H = map.width, map.height
+        free = map.grid <= map.occ_threshold
+        if map.mask is not None:
+            free &= map.mask
+        free = free.ravel().tolist()
+
+        def walkable(u, v):
+            return 0 <= u < W and 0 <= v < H and free[u * H + v]
+
+        su, sv = (int(i) for i in map.cspace_to_grid(start))
+        gu, gv = (int(i) for i in map.cspace_to_grid(goal))
+        if not walkable(su, sv) or not walkable(gu, gv):
+            logger.info("start or goal in collision")
+            return None
+
+        def jump_straight(u, v, du, dv):
+            # only one of du, dv is nonzero
+            while True:
+                u += du
+                v += dv
+                if not walkable(u, v):
+                    return None
+                if u == gu and v == gv:
+                    return u, v
+                if du != 0:
+                    if (walkable(u, v - 1) and not walkable(u - du, v - 1)) or (
+                        walkable(u, v + 1) and not walkable(u - du, v + 1)
+                    ):
+                        return u, v
+                else:
+                    if (walkable(u - 1, v) and not walkable(u - 1, v - dv)) or (
+                        walkable(u + 1, v) and not walkable(u + 1, v - dv)
+                    ):
+                        return u, v
+
+        def jump(u, v, du, dv):
+            if du == 0 or dv == 0:
+                return jump_straight(u, v, du, dv)
+            while True:
+                if not (walkable(u + du, v) and walkable(u, v + dv)):
+                    return None
+                u += du
+                v += dv
+                if not walkable(u, v):
+                    return None
+                if u == gu and v == gv:
+                    return u, v
+                if (
+                    jump_straight(u, v, du, 0) is not None
+                    or jump_straight(u, v, 0, dv) is not None
+                ):
+                    return u, v
+
+        def directions(u, v, parent):
+            """Pruned set of directions to search from (u, v) given how it was reached"""
+            if parent < 0:
+                dirs = []
+                for du in (-1, 0, 1):
+                    for dv in (-1, 0, 1):
+                        if du == 0 and dv == 0:
+                            continue
+                        if du != 0 and dv != 0:
+                            if walkable(u + du, v) and walkable(u, v + dv):
+                                dirs.append((du, dv))
+                        elif walkable(u + du, v + dv):
+                            dirs.append((du, dv))
+                return dirs
+
+            pu, pv = divmod(parent, H)
+            du = (u > pu) - (u < pu)
+            dv = (v > pv) - (v < pv)
+            dirs = []
+            if du != 0 and dv != 0:
+                next_u, next_v = walkable(u + du, v), walkable(u, v + dv)
+                if next_v:
+                    dirs.append((0, dv))
+                if next_u:
+                    dirs.append((du, 0))
+                if next_u and next_v:
+                    dirs.append((du, dv))
+            elif du != 0:
+                ahead, up, down = (
+                    walkable(u + du, v),
+                    walkable(u, v + 1),
+                    walkable(u, v - 1),
+                )
+                if ahead:
+                    dirs.append((du, 0))
+                    if up:
+                        dirs.append((du, 1))
+                    if down:
+                        dirs.append((du, -1))
+                if up:
+                    dirs.append((0, 1))
+                if down:
+                    dirs.append((0, -1))
+            else:
+                ahead, up, down = (
+                    walkable(u, v + dv),
+                    walkable(u + 1, v),
+                    walkable(u - 1, v),
+                )
+                if ahead:
+                    dirs.append((0, dv))
+                    if up:
+                        dirs.append((1, dv))
+                    if down:
+                        dirs.append((-1, dv))
+                if up:
+                    dirs.append((1, 0))
+                if down:
+                    dirs.append((-1, 0))
+            return dirs
+
+        root2 = math.sqrt(2)
+
+        def octile(du, dv):
+            du, dv = abs(du), abs(dv)
+            return (root2 - 1) * min(du, dv) + max(du, dv)
+
+        start_ind = su * H + sv
+        goal_ind = gu * H + gv
+        g_score = np.full(W * H, np.inf)
+        parent = np.full(W * H, -1, dtype=np.int64)
+        closed = np.zeros(W * H, dtype=bool)
+
+        g_score[start_ind] = 0.0
+        open_list = [(octile(gu - su, gv - sv), 0.0, start_ind)]
+        while open_list:
+            _, g, ind = heapq.heappop(open_list)
+            if closed[ind]:
+                continue
+            closed[ind] = True
+            if ind == goal_ind:
+                break
+
+            u, v = divmod(ind, H)
+            for du, dv in directions(u, v, int(parent[ind])):
+                jump_point = jump(u, v, du, dv)
+                if jump_point is None:
+                    continue
+                ju, jv = jump_point
+                jind = ju * H + jv
+                if closed[jind]:
+                    continue
+                new_g = g + octile(ju - u, jv - v)
+                if new_g < g_score[jind]:
+                    g_score[jind] = new_g
+                    parent[jind] = ind
+                    heapq.heappush(
+                        open_list, (new_g + octile(gu - ju, gv - jv), new_g, jind)
+                    )
+
+        if not closed[goal_ind]:
+            logger.info("path not found")
+            return None
+
+        # walk back the jump points, from the goal to the start
+        jump_points = [goal_ind]
+        while jump_points[-1] != start_ind:
+            jump_points.append(int(parent[jump_points[-1]]))
+        self.jump_points = np.array([divmod(ind, H) for ind in jump_points])
+
+        plan_time = time.perf_counter() - plan_start
+        logger.info("plan time: %.3f", plan_time)
+        return self.get_path_to_goal()
+
+    def get_path_to_goal(self):
+        """Fills in the cells between consecutive jump points (straight or diagonal lines)
+
+        Returns:
+            np.array: c-space states from the goal back to the start, None if no path has been found
+        """
+        if self.jump_points is None:
+            return None
+        cells = [self.jump_points[:1]]
+        for a, b in zip(self.jump_points[:-1], self.jump_points[1:]):
+            steps = np.max(np.abs(b - a))
+            cells.append(a + np.outer(np.arange(1, steps + 1), np.sign(b - a)))
+        cells = np.concatenate(cells)
+        path = cells * self.grid.resolution + self.grid.origin
+        path[0] = self.goal.state
+        if len(path) > 1:
+            path[-1] = self.start.state
+        else:
+            path = np.array([self.goal.state, self.start.state])
+        return path
 
 
 class RRTStarPlanner(Planner):
     def __init__(
-        self, goal_sample_rate=15, max_iter=100, GAMMA=10, disc_step=0.05, **kwargs
+        self,
+        goal_sample_rate=15,
+        max_iter=100,
+        GAMMA=10,
+        disc_step=0.05,
+        robot_radius=0.0,
+        **kwargs
     ):
         """Implements RRT*, a sampling-based planner
 
@@ -210,11 +564,13 @@ class RRTStarPlanner(Planner):
             max_iter (int, optional): Max iterations of the planning loop to run. Defaults to 100.
             GAMMA (int, optional): Hyperparameter that determines nearest nodes to randomly sample node that will be rewired. Defaults to 10.
             discretization_step (float, optional): step size when determining if two points have a collision-free straight-line path between them. Defaults to 0.05.
+            robot_radius (float, optional): radius (m) of the robot footprint used for collision checks. Defaults to 0.0.
         """
         super().__init__(**kwargs)
 
         self.GAMMA = GAMMA
         self.disc_step = disc_step
+        self.robot_radius = robot_radius
 
         self.goal_sample_rate = goal_sample_rate
         self.max_iter = max_iter
@@ -316,7 +672,8 @@ class RRTStarPlanner(Planner):
     def steer_to(self, dest, source):
         """
         Charts a route from source to dest, and checks whether the route is collision-free.
-        Discretizes the route into small steps, and checks for a collision at each step.
+        Discretizes the route into steps of at least disc_step (longer where the map's clearance
+        allows), and checks for a collision at each step.
 
         This function is used in planning() to filter out invalid random samples. You may also find it useful
         for implementing the functions in question 1.
@@ -330,28 +687,31 @@ class RRTStarPlanner(Planner):
             7,1 1,1 6,0
         """
 
-        newNode = copy.deepcopy(source)
         dists = dest.state - source.state
         distTotal = np.linalg.norm(dists)
 
         if distTotal > 0:
-            incrementTotal = distTotal / self.disc_step
-            dists = dists / incrementTotal
-            numSegments = int(math.floor(incrementTotal)) + 1
-            logger.debug("state_check: %s", newNode.state)
-            logger.debug("dists: %s", dists)
-            logger.debug("numSegments: %d", numSegments)
-            stateCurr = Node(newNode.state)
-
-            for i in range(0, numSegments):
-                if self.grid.in_collision(stateCurr):
+            direction = dists / distTotal
+            logger.debug("state_check: %s", source.state)
+            logger.debug("direction: %s", direction)
+            stateCurr = Node(source.state)
+            travelled = 0.0
+
+            # Steps are at least disc_step, and as long as the clearance around the
+            # current state allows, since nothing within that distance can be occupied
+            while travelled < distTotal:
+                if self.grid.in_collision(stateCurr, self.robot_radius):
                     logger.debug("COLLISION")
                     return (False, None)
                 logger.debug("SAFE")
-                stateCurr.state = stateCurr.state + dists
+                travelled += max(
+                    self.disc_step,
+                    self.grid.safe_step(stateCurr.state, self.robot_radius),
+                )
+                stateCurr.state = source.state + direction * min(travelled, distTotal)
                 logger.debug("state_check: %s", stateCurr.state)
 
-            if self.grid.in_collision(dest):
+            if self.grid.in_collision(dest, self.robot_radius):
                 return (False, None)
             return (True, distTotal)
         else:
@@ -366,7 +726,7 @@ class RRTStarPlanner(Planner):
             Node(state=np.array(dof)): random sample
         """
         if random.randint(0, 100) > self.goal_sample_rate:
-            x_spec, y_spec = self.grid.cspace_spec
+            x_spec, y_spec = self.grid.sample_spec
             sample = [
                 np.random.uniform(*x_spec),
                 np.random.uniform(*y_spec),
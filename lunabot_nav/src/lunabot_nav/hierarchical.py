@@ -0,0 +1,231 @@
+"""
+Multi-resolution planner: plans on a max-pooled (conservative) coarse costmap first, then
+refines at full resolution only inside a corridor around the coarse path, so the work per
+replan scales with the path length instead of the map area.
+"""
+import logging
+import time
+
+import numpy as np
+from scipy.ndimage import distance_transform_edt
+
+from lunabot_nav.dstar import Dstar
+from lunabot_nav.global_planner import Map, Node, Planner
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def occupancy_pyramid(grid, levels, factor=2):
+    """Builds a max-pooled pyramid of an occupancy grid
+
+    A coarse cell takes the highest occupancy of the cells it covers, so free coarse cells are
+    free at every finer level. Grids that don't divide evenly are padded with unknown (-1).
+
+    Args:
+        grid (np.array): 2D occupancy grid
+        levels (int): number of coarsened levels to build
+        factor (int, optional): cells per coarse cell along each axis, per level. Defaults to 2.
+
+    Returns:
+        list(np.array): [grid, grid coarsened once, ..., grid coarsened levels times]
+    """
+    pyramid = [grid]
+    for _ in range(levels):
+        fine = pyramid[-1]
+        w, h = -(-fine.shape[0] // factor), -(-fine.shape[1] // factor)
+        padded = np.full((w * factor, h * factor), -1, dtype=fine.dtype)
+        padded[: fine.shape[0], : fine.shape[1]] = fine
+        pyramid.append(padded.reshape(w, factor, h, factor).max(axis=(1, 3)))
+    return pyramid
+
+
+def coarsen_map(map, grid, factor):
+    """Wraps a coarsened grid from occupancy_pyramid in a Map aligned with the original
+
+    Args:
+        map (Map): full resolution map
+        grid (np.array): grid coarsened by factor
+        factor (int): total cells per coarse cell along each axis
+
+    Returns:
+        Map: coarse map, with cell centers in the middle of the fine cells they cover
+    """
+    coarse = Map(map.occ_threshold, map.max_clearance)
+    coarse.from_data(
+        grid.flatten(),
+        map.resolution * factor,
+        grid.shape[1],
+        grid.shape[0],
+        origin=map.origin + (factor - 1) / 2 * map.resolution,
+        occ_threshold=map.occ_threshold,
+    )
+    return coarse
+
+
+def corridor_mask(map, path, radius):
+    """Cells of map within radius of a polyline
+
+    Only the bounding box of the path (grown by radius) is processed.
+
+    Args:
+        map (Map): map the mask is for
+        path (np.array): N x DOF waypoints in c-space
+        radius (float): half width (m) of the corridor
+
+    Returns:
+        np.array: boolean mask indexed like map.grid
+    """
+    path = np.asarray(path, dtype=float)
+    points = [path[:1]]
+    for a, b in zip(path[:-1], path[1:]):
+        n = int(np.ceil(np.linalg.norm(b - a) / map.resolution)) + 1
+        points.append(np.linspace(a, b, n))
+    cells = np.round((np.concatenate(points) - map.origin) / map.resolution).astype(int)
+
+    r = int(np.ceil(radius / map.resolution))
+    lower = np.maximum(cells.min(axis=0) - r, 0)
+    upper = np.minimum(cells.max(axis=0) + r + 1, map.grid.shape)
+
+    mask = np.zeros(map.grid.shape, dtype=bool)
+    if np.any(upper <= lower):
+        return mask
+
+    window = np.zeros(upper - lower, dtype=bool)
+    cells = cells - lower
+    inside = np.all((cells >= 0) & (cells < window.shape), axis=1)
+    window[cells[inside, 0], cells[inside, 1]] = True
+    if not window.any():
+        return mask
+
+    dist = distance_transform_edt(~window) * map.resolution
+    mask[lower[0] : upper[0], lower[1] : upper[1]] = dist <= radius
+    return mask
+
+
+def dstar_to_map_frame(path, map):
+    """Dstar rounds states to the nearest cell but returns cell centers half a cell further
+    along each axis, shift them back onto the cells of map"""
+    return np.array(path) - map.resolution / 2
+
+
+class HierarchicalPlanner(Planner):
+    def __init__(self, fine_planner=None, levels=2, corridor_radius=0.5, **kwargs):
+        """Coarse-to-fine planner
+
+        Args:
+            fine_planner (Planner, optional): planner used at full resolution, it is passed the map with the corridor set as its mask. Defaults to None, which uses Dstar.
+            levels (int, optional): number of times the map is halved for the coarse search. Defaults to 2.
+            corridor_radius (float, optional): half width (m) of the corridor around the coarse path. Defaults to 0.5.
+        """
+        super().__init__(**kwargs)
+        self.fine_planner = fine_planner
+        self.levels = levels
+        self.corridor_radius = corridor_radius
+        self.corridor = None
+        self.path = None
+
+    def plan(self, start, goal, map):
+        """Plan path
+
+        Args:
+            start (np.array): start configuration of size DOF in GRID frame
+            goal (np.array): goal configuration of size DOF in GRID frame
+            map (Map): full resolution map
+
+        Returns:
+            np.array: list of c-space states from the goal back to the start, None if no path was found
+        """
+        assert start is not None
+        assert goal is not None
+        assert map is not None
+        self.start = Node(start)
+        self.goal = Node(goal)
+        self.grid = map
+        self.path = None
+        if not self.grid.initialized:
+            logger.info("Occupancy grid not defined yet...")
+            return
+
+        plan_start = time.perf_counter()
+
+        factor = 2**self.levels
+        coarse = coarsen_map(map, occupancy_pyramid(map.grid, self.levels)[-1], factor)
+        coarse_path = self.plan_coarse(start, goal, coarse)
+
+        self.corridor = None
+        if coarse_path is not None:
+            waypoints = np.vstack([start, coarse_path, goal])
+            self.corridor = corridor_mask(map, waypoints, self.corridor_radius)
+
+        path = self.plan_fine(start, goal, map, self.corridor)
+        if path is None and self.corridor is not None:
+            logger.info("no path inside the corridor, planning on the whole map")
+            path = self.plan_fine(start, goal, map, None)
+
+        logger.info("plan time: %.3f", time.perf_counter() - plan_start)
+        self.path = path
+        return path
+
+    def plan_coarse(self, start, goal, coarse):
+        """Runs Dstar on the coarse map
+
+        Returns:
+            np.array: coarse waypoints from the start to the goal, None if no path was found
+        """
+        dstar = Dstar(
+            goal,
+            start,
+            coarse.grid.T,
+            coarse.resolution,
+            coarse.origin[0],
+            coarse.origin[1],
+            coarse.occ_threshold,
+        )
+        path = dstar.find_path()
+        if len(path) == 0:
+            return None
+        return dstar_to_map_frame(path, coarse)
+
+    def plan_fine(self, start, goal, map, corridor):
+        """Plans at full resolution, restricted to corridor (None for the whole map)
+
+        Returns:
+            np.array: list of c-space states from the goal back to the start, None if no path was found
+        """
+        if self.fine_planner is not None:
+            prev_mask = map.mask
+            map.set_mask(corridor)
+            try:
+                return self.fine_planner.plan(start, goal, map)
+            finally:
+                map.set_mask(prev_mask)
+
+        dstar = Dstar(
+            goal,
+            start,
+            map.grid.T,
+            map.resolution,
+            map.origin[0],
+            map.origin[1],
+            map.occ_threshold,
+            mask=None if corridor is None else corridor.T,
+        )
+        path = dstar.find_path()
+        if len(path) == 0:
+            return None
+        path = dstar_to_map_frame(path, map)
+        # Dstar gives start -> goal without the start, match get_path_to_goal (goal -> start)
+        return (
+            np.vstack([goal, path[-2::-1], start])
+            if len(path) > 1
+            else np.array([goal, start])
+        )
+
+    def get_path_to_goal(self):
+        """The path found by the last call to plan
+
+        Returns:
+            np.array: c-space states from the goal back to the start, None if no path has been found
+        """
+        return self.path
@@ -0,0 +1,114 @@
+"""
+Binary snapshot format for occupancy grids, for planner benchmarks and offline debugging
+
+Each snapshot is a fixed size header followed by the raw int8 grid:
+
+    magic (4s) | version (uint16) | pad (2) | resolution (float64) | origin x, y (float64)
+    | width, height (uint32) | stamp (float64) | width * height int8 cells
+
+The cells are laid out like Map.grid (indexed [x, y], C order), so a snapshot is a zero-copy
+view of the file. Snapshots can be appended one after another to the same file, and loading
+maps the whole file once with np.memmap and only parses the headers.
+"""
+import os
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+MAGIC = b"LBOG"
+VERSION = 1
+HEADER = struct.Struct("<4sH2xdddIId")
+
+Snapshot = namedtuple("Snapshot", ["resolution", "origin", "stamp", "grid"])
+
+
+def write_snapshot(file, grid, resolution, origin=np.zeros(2), stamp=0.0, append=True):
+    """Writes a single occupancy grid snapshot
+
+    Args:
+        file (str): path of the snapshot file
+        grid (np.array): 2D occupancy grid (width x height), values in [-1, 100]
+        resolution (float): resolution m/cell
+        origin (np.array): the (x,y) offset of the grid in the robot cspace
+        stamp (float, optional): time of the snapshot in seconds. Defaults to 0.0.
+        append (bool, optional): append to the file instead of overwriting it. Defaults to True.
+    """
+    grid = np.ascontiguousarray(grid, dtype=np.int8)
+    assert grid.ndim == 2, "grid should be 2D (width x height)"
+    width, height = grid.shape
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        resolution,
+        origin[0],
+        origin[1],
+        width,
+        height,
+        stamp,
+    )
+    with open(file, "ab" if append else "wb") as snapshot_file:
+        snapshot_file.write(header)
+        snapshot_file.write(grid.tobytes())
+
+
+def save_map(map, file, stamp=0.0, append=True):
+    """Writes an initialized lunabot_nav.global_planner.Map as a snapshot"""
+    assert map.initialized, "Not initalized with set_data or set_msg"
+    write_snapshot(file, map.grid, map.resolution, map.origin, stamp, append)
+
+
+def load_snapshots(file):
+    """Memory maps every snapshot in a file
+
+    Args:
+        file (str): path of the snapshot file
+
+    Returns:
+        list(Snapshot): snapshots in the order they were written, grids are read-only views of the file
+    """
+    if os.path.getsize(file) == 0:
+        return []
+
+    data = np.memmap(file, dtype=np.int8, mode="r")
+    snapshots = []
+    offset = 0
+    while offset < len(data):
+        magic, version, resolution, x, y, width, height, stamp = HEADER.unpack_from(
+            data, offset
+        )
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(
+                "%s: bad snapshot header at byte %d (magic %r, version %d)"
+                % (file, offset, magic, version)
+            )
+        offset += HEADER.size
+        grid = data[offset : offset + width * height].reshape(width, height)
+        offset += width * height
+        snapshots.append(Snapshot(resolution, np.array([x, y]), stamp, grid))
+    return snapshots
+
+
+def snapshot_to_map(snapshot, occ_threshold=50):
+    """Copies a snapshot into a new lunabot_nav.global_planner.Map
+
+    Args:
+        snapshot (Snapshot): loaded snapshot
+        occ_threshold (int, optional): occupancy value above which a cell is in collision. Defaults to 50.
+
+    Returns:
+        Map: map with the snapshot's grid, resolution and origin
+    """
+    from lunabot_nav.global_planner import Map
+
+    width, height = snapshot.grid.shape
+    map = Map(occ_threshold)
+    map.from_data(
+        np.array(snapshot.grid),
+        snapshot.resolution,
+        height,
+        width,
+        origin=snapshot.origin.copy(),
+        occ_threshold=occ_threshold,
+    )
+    return map
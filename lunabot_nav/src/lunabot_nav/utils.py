@@ -9,26 +9,23 @@ logging.getLogger("matplotlib").setLevel(logging.WARNING)
 
 
 def grid_to_file(grid, cols, file="map_grid.txt"):
-    s = ""
+    """Human-readable text dump of a flat grid, see lunabot_nav.snapshot for a reloadable format"""
+    parts = []
     for i in range(len(grid)):
-        s += str(grid[i])
-        s += " "
+        parts.append(str(grid[i]))
+        parts.append(" ")
         if i % cols == 0:
-            s += "\n"
+            parts.append("\n")
     with open(file, "w") as text_file:
-        text_file.write(s)
+        text_file.write("".join(parts))
 
 
 def grid_to_file_rc(grid, file="map_grid_rc.txt"):
-    s = ""
-    for i in range(len(grid)):
-        for j in range(len(grid[0])):
-            s += str(grid[i][j])
-            s += " "
-        s += "\n"
+    """Human-readable text dump of a 2D grid, see lunabot_nav.snapshot for a reloadable format"""
+    lines = ["".join(str(cell) + " " for cell in row) + "\n" for row in grid]
 
     with open(file, "w") as text_file:
-        text_file.write(s)
+        text_file.write("".join(lines))
 
 
 def visualize(planner, rnd):
@@ -40,8 +40,8 @@ class MPC_Test:
         left_vel = vel.twist.linear.x - 0.5 * self.robot_width * vel.twist.angular.z
         right_vel = vel.twist.linear.x + 0.5 * self.robot_width * vel.twist.angular.z
         if left_vel == right_vel:
-            self.odom.pose.position.x += left_vel * math.cos(self.angle)
-            self.odom.pose.position.y += left_vel * math.sin(self.angle)
+            self.odom.pose.pose.position.x += left_vel * math.cos(self.angle) * self.delta_t
+            self.odom.pose.pose.position.y += left_vel * math.sin(self.angle) * self.delta_t
         else:
             r = self.robot_width / 2 * (left_vel + right_vel) / (right_vel - left_vel)
             w = (right_vel - left_vel) / self.robot_width
@@ -60,7 +60,8 @@ class MPC_Test:
                 + iccy
             )
             self.angle += w * self.delta_t
-            self.odom.pose.pose.quaternion = quaternion_from_euler(0, 0, self.angle)
+            orientation = self.odom.pose.pose.orientation
+            orientation.x, orientation.y, orientation.z, orientation.w = quaternion_from_euler(0, 0, self.angle)
         path = Path()
         p1 = PoseStamped()
         p1.pose.position.x = self.odom.pose.pose.position.x
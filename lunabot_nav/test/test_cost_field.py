@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+import unittest
+
+import numpy as np
+
+from lunabot_nav.cost_field import CostField
+from lunabot_nav.global_planner import JPSPlanner, Map, Node
+
+
+class CostFieldTest(unittest.TestCase):
+    def setUp(self):
+        self.resolution = 0.1
+        self.map = Map(50)
+
+    def test_free_map(self):
+        self.map.from_data(np.zeros(400), self.resolution, 20, 20)
+        field = CostField(self.map, np.array([1.5, 0.7]))
+        self.assertAlmostEqual(field.cost_to_go(np.array([1.5, 0.7])), 0.0)
+        self.assertAlmostEqual(
+            field.cost_to_go(np.array([0.0, 0.0])),
+            (8 + 7 * np.sqrt(2)) * self.resolution,
+        )
+        self.assertEqual(field.cost_grid.shape, self.map.grid.shape)
+        self.assertEqual(field.cost_to_go(np.array([5.0, 5.0])), np.inf)
+
+    def test_blocked(self):
+        grid = np.zeros((20, 20))
+        grid[10, :] = 100
+        self.map.from_data(grid.flatten(), self.resolution, 20, 20)
+        field = CostField(self.map, np.array([1.9, 1.9]))
+        self.assertEqual(field.cost_to_go(np.array([0.0, 0.0])), np.inf)
+        self.assertIsNone(field.path_from(np.array([0.0, 0.0])))
+        self.assertIsNone(field.next_waypoint(np.array([0.0, 0.0])))
+
+    def test_matches_jps_on_random_maps(self):
+        rng = np.random.default_rng(1)
+        planner = JPSPlanner()
+        goal = np.array([2.4, 2.4])
+        for _ in range(10):
+            grid = (rng.random((25, 25)) < 0.25) * 100
+            grid[0, 0] = grid[24, 24] = 0
+            self.map.from_data(grid.flatten(), self.resolution, 25, 25)
+            field = CostField(self.map, goal)
+
+            start = np.array([0.0, 0.0])
+            path = planner.plan(start, goal, self.map)
+            if path is None:
+                self.assertEqual(field.cost_to_go(start), np.inf)
+                continue
+            expected = np.sum(np.linalg.norm(np.diff(path, axis=0), axis=1))
+            self.assertAlmostEqual(field.cost_to_go(start), expected)
+
+            descent = field.path_from(start)
+            np.testing.assert_array_equal(descent[0], start)
+            np.testing.assert_array_equal(descent[-1], goal)
+            for state in descent:
+                self.assertFalse(self.map.in_collision(Node(state)))
+            length = np.sum(np.linalg.norm(np.diff(descent, axis=0), axis=1))
+            self.assertAlmostEqual(length, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+import unittest
+
+import numpy as np
+
+from lunabot_nav.global_planner import Map, Node
+from lunabot_nav.hierarchical import (
+    HierarchicalPlanner,
+    corridor_mask,
+    occupancy_pyramid,
+)
+
+
+class HierarchicalPlannerTest(unittest.TestCase):
+    def setUp(self):
+        self.resolution = 0.1
+        dims = [40, 40]
+        grid = np.zeros(dims, dtype=int)
+        grid[0:30, 20:22] = 100  # wall with a gap at the far end
+        self.map = Map(50)
+        self.map.from_data(grid.flatten(), self.resolution, *dims)
+
+    def test_pyramid_is_conservative(self):
+        grid = np.zeros((5, 7), dtype=int)
+        grid[4, 6] = 100
+        pyramid = occupancy_pyramid(grid, 2)
+        self.assertEqual(pyramid[1].shape, (3, 4))
+        self.assertEqual(pyramid[2].shape, (2, 2))
+        self.assertEqual(pyramid[1][2, 3], 100)
+        self.assertEqual(pyramid[2][1, 1], 100)
+        self.assertEqual(pyramid[2][0, 0], 0)
+
+    def test_corridor(self):
+        path = np.array([[0.5, 0.5], [0.5, 3.5]])
+        mask = corridor_mask(self.map, path, 0.35)
+        self.assertTrue(mask[5, 5])
+        self.assertTrue(mask[5, 35])
+        self.assertTrue(mask[8, 20])
+        self.assertFalse(mask[9, 20])
+        self.assertFalse(mask[20, 20])
+
+    def test_plan_around_wall(self):
+        planner = HierarchicalPlanner(levels=2, corridor_radius=0.4)
+        start = np.array([0.5, 0.5])
+        goal = np.array([0.5, 3.5])
+        path = planner.plan(start, goal, self.map)
+        self.assertIsNotNone(path, "path around wall")
+        np.testing.assert_array_equal(path[0], goal)
+        np.testing.assert_array_equal(path[-1], start)
+        for state in path:
+            self.assertFalse(self.map.in_collision(Node(state)))
+        # the corridor should only cover part of the map
+        self.assertLess(planner.corridor.sum(), self.map.grid.size)
+        self.assertIsNone(self.map.mask)
+        np.testing.assert_array_equal(planner.get_path_to_goal(), path)
+
+    def test_no_path_before_plan(self):
+        planner = HierarchicalPlanner()
+        self.assertIsNone(planner.get_path_to_goal())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+import unittest
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from lunabot_nav.global_planner import JPSPlanner, Map, Node
+
+
+def octile_shortest_path(free, start, goal):
+    """Reference Dijkstra on the 8-connected grid without corner cutting"""
+    W, H = free.shape
+    rows, cols, costs = [], [], []
+    for u in range(W):
+        for v in range(H):
+            if not free[u, v]:
+                continue
+            for du in (-1, 0, 1):
+                for dv in (-1, 0, 1):
+                    nu, nv = u + du, v + dv
+                    if (du, dv) == (0, 0) or not (0 <= nu < W and 0 <= nv < H):
+                        continue
+                    if not free[nu, nv]:
+                        continue
+                    if du != 0 and dv != 0 and not (free[nu, v] and free[u, nv]):
+                        continue
+                    rows.append(u * H + v)
+                    cols.append(nu * H + nv)
+                    costs.append(np.hypot(du, dv))
+    graph = coo_matrix((costs, (rows, cols)), shape=(W * H, W * H)).tocsr()
+    dist = dijkstra(graph, indices=start[0] * H + start[1])
+    return dist[goal[0] * H + goal[1]]
+
+
+class JPSTest(unittest.TestCase):
+    def setUp(self):
+        self.resolution = 0.1
+        self.planner = JPSPlanner()
+        self.map = Map(50)
+
+    def path_cost(self, path):
+        cells = np.round((path - self.map.origin) / self.resolution)
+        return np.sum(np.linalg.norm(np.diff(cells, axis=0), axis=1))
+
+    def check_path(self, path, start, goal):
+        np.testing.assert_array_equal(path[0], goal)
+        np.testing.assert_array_equal(path[-1], start)
+        for state in path:
+            self.assertFalse(self.map.in_collision(Node(state)))
+        steps = np.abs(np.diff(self.map.cspace_to_grid(path).astype(int), axis=0))
+        self.assertLessEqual(steps.max(), 1, "path should be 8-connected")
+
+    def test_free_map(self):
+        self.map.from_data(np.zeros(400), self.resolution, 20, 20)
+        start, goal = np.array([0.0, 0.0]), np.array([1.5, 0.7])
+        path = self.planner.plan(start, goal, self.map)
+        self.check_path(path, start, goal)
+        self.assertAlmostEqual(self.path_cost(path), 8 + 7 * np.sqrt(2))
+
+    def test_blocked(self):
+        grid = np.zeros((20, 20))
+        grid[10, :] = 100
+        self.map.from_data(grid.flatten(), self.resolution, 20, 20)
+        path = self.planner.plan(np.array([0.0, 0.0]), np.array([1.9, 1.9]), self.map)
+        self.assertIsNone(path)
+
+    def test_optimal_on_random_maps(self):
+        rng = np.random.default_rng(0)
+        for _ in range(10):
+            grid = (rng.random((25, 25)) < 0.25) * 100
+            grid[0, 0] = grid[24, 24] = 0
+            self.map.from_data(grid.flatten(), self.resolution, 25, 25)
+            start, goal = np.array([0.0, 0.0]), np.array([2.4, 2.4])
+
+            expected = octile_shortest_path(grid <= 50, (0, 0), (24, 24))
+            path = self.planner.plan(start, goal, self.map)
+            if np.isinf(expected):
+                self.assertIsNone(path)
+                continue
+            self.check_path(path, start, goal)
+            self.assertAlmostEqual(self.path_cost(path), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
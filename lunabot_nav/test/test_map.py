@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+from lunabot_nav.global_planner import Map, Node
+
+G1 = [
+    [0, 0, 0, 0, 0],
+    [0, 0, 1, 0, 0],
+    [0, 0, 1, 0, 0],
+    [0, 0, 0, 0, 0],
+    [0, 0, 0, 0, 0],
+]
+
+
+class MapClearanceTest(unittest.TestCase):
+    def setUp(self):
+        self.resolution = 0.1
+        self.map = Map(max_clearance=0.5)
+        self.map.from_data(np.array(G1).flatten(), self.resolution, 5, 5)
+
+    def test_clearance(self):
+        self.assertEqual(self.map.clearance(np.array([0.1, 0.2])), 0.0)
+        self.assertAlmostEqual(self.map.clearance(np.array([0.0, 0.2])), 0.1)
+        self.assertAlmostEqual(self.map.clearance(np.array([0.0, 0.0])), np.sqrt(0.05))
+        self.assertEqual(self.map.clearance(np.array([-0.5, 0.0])), 0.0)
+
+    def test_footprint_collision(self):
+        node = Node(np.array([0.0, 0.2]))
+        self.assertFalse(self.map.in_collision(node))
+        self.assertTrue(self.map.in_collision(node, radius=0.1))
+        self.assertFalse(self.map.in_collision(node, radius=0.05))
+
+    def test_patch_matches_full_update(self):
+        dims = [50, 50]
+        grid = np.zeros(dims)
+        grid[10:15, 10:15] = 1
+        self.map.from_data(grid.flatten(), self.resolution, *dims)
+        self.map.clearance_grid  # computed, so the patches update it incrementally
+
+        patch = np.zeros((4, 6))
+        patch[1, 2] = 1
+        self.map.update_patch(30, 20, patch)
+        # clear the original block with a second patch
+        self.map.update_patch(10, 10, np.zeros((5, 5)))
+        incremental = self.map.clearance_grid.copy()
+
+        self.map.update_clearance()
+        np.testing.assert_allclose(incremental, self.map.clearance_grid)
+
+    def test_lazy_clearance(self):
+        dims = [50, 50]
+        grid = np.zeros(dims)
+        grid[10:15, 10:15] = 1
+        self.map.from_data(grid.flatten(), self.resolution, *dims)
+        self.assertIsNone(self.map._clearance_grid)
+
+        # Cell checks and patches don't need it
+        self.assertTrue(self.map.in_collision(Node(np.array([1.2, 1.2]))))
+        self.map.update_patch(10, 10, np.zeros((5, 5)))
+        self.assertIsNone(self.map._clearance_grid)
+
+        # The first footprint check computes it, with the patch applied
+        self.assertFalse(self.map.in_collision(Node(np.array([1.2, 1.2])), radius=0.1))
+        self.assertIsNotNone(self.map._clearance_grid)
+        np.testing.assert_allclose(self.map.clearance_grid, 0.5)
+
+    def test_update_msg(self):
+        # OccupancyGridUpdate data is row-major: 3 cells along x, 2 rows along y, from cell (1, 3)
+        update_msg = SimpleNamespace(x=1, y=3, width=3, height=2, data=[0, 0, 100, 0, 100, 0])
+        self.map.from_update_msg(update_msg)
+        self.assertEqual(self.map.grid[3, 3], 100)
+        self.assertEqual(self.map.grid[2, 4], 100)
+        self.assertEqual(self.map.grid[1:4, 3:5].sum(), 200)
+        self.assertEqual(self.map.clearance(np.array([0.3, 0.3])), 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
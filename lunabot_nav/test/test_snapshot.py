@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from lunabot_nav.global_planner import Map
+from lunabot_nav.snapshot import (
+    load_snapshots,
+    save_map,
+    snapshot_to_map,
+    write_snapshot,
+)
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        fd, self.file = tempfile.mkstemp(suffix=".grid")
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.file)
+
+    def test_empty_file(self):
+        self.assertEqual(load_snapshots(self.file), [])
+
+    def test_append_sequence(self):
+        grids = [np.random.randint(-1, 101, size=(30, 20)) for _ in range(5)]
+        for i, grid in enumerate(grids):
+            write_snapshot(self.file, grid, 0.05, np.array([1.0, -2.0]), stamp=i)
+
+        snapshots = load_snapshots(self.file)
+        self.assertEqual(len(snapshots), len(grids))
+        for i, (snapshot, grid) in enumerate(zip(snapshots, grids)):
+            self.assertEqual(snapshot.stamp, i)
+            self.assertEqual(snapshot.resolution, 0.05)
+            np.testing.assert_array_equal(snapshot.origin, [1.0, -2.0])
+            np.testing.assert_array_equal(snapshot.grid, grid)
+
+    def test_overwrite(self):
+        write_snapshot(self.file, np.zeros((4, 4)), 0.1)
+        write_snapshot(self.file, np.ones((3, 5)), 0.1, append=False)
+        snapshots = load_snapshots(self.file)
+        self.assertEqual(len(snapshots), 1)
+        self.assertEqual(snapshots[0].grid.shape, (3, 5))
+
+    def test_map_roundtrip(self):
+        grid = np.zeros((10, 10), dtype=int)
+        grid[4:6, 2:8] = 100
+        map = Map(50)
+        map.from_data(grid.flatten(), 0.1, 10, 10, origin=np.array([0.5, 0.5]))
+        save_map(map, self.file)
+
+        loaded = snapshot_to_map(load_snapshots(self.file)[0])
+        np.testing.assert_array_equal(loaded.grid, map.grid)
+        np.testing.assert_array_equal(loaded.origin, map.origin)
+        np.testing.assert_allclose(loaded.clearance_grid, map.clearance_grid)
+
+
+if __name__ == "__main__":
+    unittest.main()